@@ -34,6 +34,10 @@ python speech_to_text_buffered_infer_ctc.py \
 # NOTE:
     You can use `DEBUG=1 python speech_to_text_buffered_infer_ctc.py ...` to print out the
     predictions of the model, and ground-truth text if presents in manifest.
+
+    For CPU inference over many long recordings, set `parallel_files=4 parallel_processes=8` to transcribe
+    the files in 8 processes, each packing the chunks of 4 files into every batch. Finished transcriptions are
+    saved to `<output_filename>.partial`, and are not transcribed again if the run is restarted.
 """
 import contextlib
 import copy
@@ -50,10 +54,11 @@ from omegaconf import OmegaConf
 from nemo.collections.asr.models import EncDecCTCModel, EncDecHybridRNNTCTCModel
 from nemo.collections.asr.parts.submodules.ctc_decoding import CTCDecodingConfig
 from nemo.collections.asr.parts.utils.eval_utils import cal_write_wer
-from nemo.collections.asr.parts.utils.streaming_utils import FrameBatchASR
+from nemo.collections.asr.parts.utils.streaming_utils import FrameBatchASR, MultiFileFrameBatchASR
 from nemo.collections.asr.parts.utils.transcribe_utils import (
     compute_output_filename,
     get_buffered_pred_feat,
+    get_buffered_pred_feat_parallel,
     setup_model,
     write_transcription,
 )
@@ -90,6 +95,10 @@ class TranscriptionConfig:
     total_buffer_in_secs: float = 4.0  # Length of buffer (chunk + left and right padding) in seconds
     model_stride: int = 8  # Model downsampling factor, 8 for Citrinet and FasConformer models and 4 for Conformer models.
 
+    # File-parallel chunked configs, for CPU inference over many long recordings
+    parallel_files: int = 0  # If > 0, number of files whose chunks are packed into each batch
+    parallel_processes: int = 1  # Number of processes transcribing files in parallel, if parallel_files > 0
+
     # Decoding strategy for CTC models
     decoding: CTCDecodingConfig = CTCDecodingConfig()
 
@@ -213,24 +222,48 @@ def main(cfg: TranscriptionConfig) -> TranscriptionConfig:
     mid_delay = math.ceil((chunk_len + (total_buffer - chunk_len) / 2) / model_stride_in_secs)
     logging.info(f"tokens_per_chunk is {tokens_per_chunk}, mid_delay is {mid_delay}")
 
-    frame_asr = FrameBatchASR(
-        asr_model=asr_model, frame_len=chunk_len, total_buffer=cfg.total_buffer_in_secs, batch_size=cfg.batch_size,
-    )
+    partial_manifest = None
+    if cfg.parallel_files > 0:
+        frame_asr = MultiFileFrameBatchASR(
+            asr_model=asr_model,
+            frame_len=chunk_len,
+            total_buffer=cfg.total_buffer_in_secs,
+            batch_size=cfg.batch_size,
+            num_files=cfg.parallel_files,
+        )
+        # transcriptions are saved as soon as every file is done, so that an interrupted run can be resumed
+        partial_manifest = f"{cfg.output_filename}.partial"
+        hyps = get_buffered_pred_feat_parallel(
+            frame_asr,
+            tokens_per_chunk,
+            mid_delay,
+            model_stride_in_secs,
+            manifest,
+            filepaths,
+            num_processes=cfg.parallel_processes,
+            partial_manifest=partial_manifest,
+        )
+    else:
+        frame_asr = FrameBatchASR(
+            asr_model=asr_model, frame_len=chunk_len, total_buffer=cfg.total_buffer_in_secs, batch_size=cfg.batch_size,
+        )
 
-    hyps = get_buffered_pred_feat(
-        frame_asr,
-        chunk_len,
-        tokens_per_chunk,
-        mid_delay,
-        model_cfg.preprocessor,
-        model_stride_in_secs,
-        asr_model.device,
-        manifest,
-        filepaths,
-    )
+        hyps = get_buffered_pred_feat(
+            frame_asr,
+            chunk_len,
+            tokens_per_chunk,
+            mid_delay,
+            model_cfg.preprocessor,
+            model_stride_in_secs,
+            asr_model.device,
+            manifest,
+            filepaths,
+        )
     output_filename, pred_text_attr_name = write_transcription(
         hyps, cfg, model_name, filepaths=filepaths, compute_langs=False, compute_timestamps=False
     )
+    if partial_manifest is not None:
+        os.remove(partial_manifest)
     logging.info(f"Finished writing predictions to {output_filename}!")
 
     if cfg.calculate_wer:
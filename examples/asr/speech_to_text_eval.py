@@ -37,6 +37,7 @@ for full list of arguments >>
     only_score_manifest: Bool, when set will skip audio transcription and just calculate WER of provided manifest.
     scores_per_sample: Bool, compute metrics for each sample separately (if only_score_manifest=True, scores per sample
     will be added to the manifest at the dataset_manifest path)
+    scoring_num_workers: Int, number of worker processes used to compute WER/CER (0 to use the main process)
 
 # Usage
 
@@ -71,7 +72,7 @@ import torch
 import transcribe_speech
 from omegaconf import MISSING, OmegaConf, open_dict
 
-from nemo.collections.asr.metrics.wer import word_error_rate
+from nemo.collections.asr.metrics.corpus_wer import ErrorCounts, iter_error_counts
 from nemo.collections.asr.parts.utils.transcribe_utils import (
     PunctuationCapitalization,
     TextProcessingConfig,
@@ -98,6 +99,7 @@ class EvaluationConfig(transcribe_speech.TranscriptionConfig):
 
     only_score_manifest: bool = False
     scores_per_sample: bool = False
+    scoring_num_workers: int = 0
 
     text_processing: Optional[TextProcessingConfig] = TextProcessingConfig(
         punctuation_marks=".,?", separate_punctuation=False, do_lowercase=False, rm_punctuation=False,
@@ -191,8 +193,12 @@ def main(cfg: EvaluationConfig):
         )
 
     # Compute the WER
-    cer = word_error_rate(hypotheses=predicted_text, references=ground_truth_text, use_cer=True)
-    wer = word_error_rate(hypotheses=predicted_text, references=ground_truth_text, use_cer=False)
+    pairs = list(zip(predicted_text, ground_truth_text))
+    # texts are not stripped, as in `word_error_rate`
+    cer = sum(
+        iter_error_counts(pairs, use_cer=True, num_workers=cfg.scoring_num_workers, strip=False), ErrorCounts()
+    ).error_rate
+    wer = sum(iter_error_counts(pairs, use_cer=False, num_workers=cfg.scoring_num_workers), ErrorCounts()).error_rate
 
     if cfg.use_cer:
         metric_name = 'CER'
@@ -133,6 +133,9 @@ class ASRManifestProcessor:
         bos_id: Id of beginning of sequence symbol to append if not None.
         eos_id: Id of end of sequence symbol to append if not None.
         pad_id: Id of pad symbol. Defaults to 0.
+        index_by_file_id: If True, saves a mapping from filename base (ID) to index in data.
+        manifest_cache_dir: Optional directory for the compiled (memory-mapped) manifest cache.
+        manifest_num_workers: Number of processes used to parse and tokenize the manifests.
     """
 
     def __init__(
@@ -146,6 +149,8 @@ class ASRManifestProcessor:
         eos_id: Optional[int] = None,
         pad_id: int = 0,
         index_by_file_id: bool = False,
+        manifest_cache_dir: Optional[str] = None,
+        manifest_num_workers: int = 1,
     ):
         self.parser = parser
 
@@ -156,6 +161,8 @@ class ASRManifestProcessor:
             max_duration=max_duration,
             max_number=max_utts,
             index_by_file_id=index_by_file_id,
+            manifest_cache_dir=manifest_cache_dir,
+            num_workers=manifest_num_workers,
         )
 
         self.eos_id = eos_id
@@ -423,6 +430,8 @@ class _AudioTextDataset(Dataset):
         pad_id: Id of pad symbol. Defaults to 0
         return_sample_id (bool): whether to return the sample_id as a part of each sample
         channel_selector (int | Iterable[int] | str): select a single channel or a subset of channels from multi-channel audio. If set to `'average'`, it performs averaging across channels. Disabled if set to `None`. Defaults to `None`. Uses zero-based indexing.
+        manifest_cache_dir (str): If set, parsed and tokenized manifests are compiled into a memory-mapped cache under this directory and reused by later runs. Defaults to `None`.
+        manifest_num_workers (int): Number of processes used to parse and tokenize the manifests. Defaults to 1.
     """
 
     @property
@@ -452,6 +461,8 @@ class _AudioTextDataset(Dataset):
         pad_id: int = 0,
         return_sample_id: bool = False,
         channel_selector: Optional[ChannelSelectorType] = None,
+        manifest_cache_dir: Optional[str] = None,
+        manifest_num_workers: int = 1,
     ):
         if type(manifest_filepath) == str:
             manifest_filepath = manifest_filepath.split(",")
@@ -468,6 +479,8 @@ class _AudioTextDataset(Dataset):
             bos_id=bos_id,
             eos_id=eos_id,
             pad_id=pad_id,
+            manifest_cache_dir=manifest_cache_dir,
+            manifest_num_workers=manifest_num_workers,
         )
         self.featurizer = WaveformFeaturizer(sample_rate=sample_rate, int_values=int_values, augmentor=augmentor)
         self.trim = trim
@@ -547,6 +560,8 @@ class AudioToCharDataset(_AudioTextDataset):
         eos_id: Id of end of sequence symbol to append if not None
         return_sample_id (bool): whether to return the sample_id as a part of each sample
         channel_selector (int | Iterable[int] | str): select a single channel or a subset of channels from multi-channel audio. If set to `'average'`, it performs averaging across channels. Disabled if set to `None`. Defaults to `None`. Uses zero-based indexing.
+        manifest_cache_dir (str): If set, parsed and tokenized manifests are compiled into a memory-mapped cache under this directory and reused by later runs. Defaults to `None`.
+        manifest_num_workers (int): Number of processes used to parse and tokenize the manifests. Defaults to 1.
     """
 
     @property
@@ -580,6 +595,8 @@ class AudioToCharDataset(_AudioTextDataset):
         parser: Union[str, Callable] = 'en',
         return_sample_id: bool = False,
         channel_selector: Optional[ChannelSelectorType] = None,
+        manifest_cache_dir: Optional[str] = None,
+        manifest_num_workers: int = 1,
     ):
         self.labels = labels
 
@@ -602,6 +619,8 @@ class AudioToCharDataset(_AudioTextDataset):
             pad_id=pad_id,
             return_sample_id=return_sample_id,
             channel_selector=channel_selector,
+            manifest_cache_dir=manifest_cache_dir,
+            manifest_num_workers=manifest_num_workers,
         )
 
 
@@ -640,6 +659,8 @@ class AudioToBPEDataset(_AudioTextDataset):
             tokens to beginning and ending of speech respectively.
         return_sample_id (bool): whether to return the sample_id as a part of each sample
         channel_selector (int | Iterable[int] | str): select a single channel or a subset of channels from multi-channel audio. If set to `'average'`, it performs averaging across channels. Disabled if set to `None`. Defaults to `None`. Uses zero-based indexing.
+        manifest_cache_dir (str): If set, parsed and tokenized manifests are compiled into a memory-mapped cache under this directory and reused by later runs. Defaults to `None`.
+        manifest_num_workers (int): Number of processes used to parse and tokenize the manifests. Defaults to 1.
     """
 
     @property
@@ -667,6 +688,8 @@ class AudioToBPEDataset(_AudioTextDataset):
         use_start_end_token: bool = True,
         return_sample_id: bool = False,
         channel_selector: Optional[ChannelSelectorType] = None,
+        manifest_cache_dir: Optional[str] = None,
+        manifest_num_workers: int = 1,
     ):
         if use_start_end_token and hasattr(tokenizer, "bos_id") and tokenizer.bos_id > 0:
             bos_id = tokenizer.bos_id
@@ -701,6 +724,11 @@ class AudioToBPEDataset(_AudioTextDataset):
                 t = self._tokenizer.text_to_ids(*args)
                 return t
 
+            def parse_batch(self, texts):
+                if not self.is_aggregate and hasattr(self._tokenizer, 'batch_text_to_ids'):
+                    return self._tokenizer.batch_text_to_ids(texts)
+                return [self(text) for text in texts]
+
         super().__init__(
             manifest_filepath=manifest_filepath,
             parser=TokenizerWrapper(tokenizer),
@@ -716,6 +744,8 @@ class AudioToBPEDataset(_AudioTextDataset):
             trim=trim,
             return_sample_id=return_sample_id,
             channel_selector=channel_selector,
+            manifest_cache_dir=manifest_cache_dir,
+            manifest_num_workers=manifest_num_workers,
         )
 
 
@@ -1286,6 +1316,11 @@ class TarredAudioToBPEDataset(_TarredAudioToTextDataset):
                 t = self._tokenizer.text_to_ids(*args)
                 return t
 
+            def parse_batch(self, texts):
+                if not self.is_aggregate and hasattr(self._tokenizer, 'batch_text_to_ids'):
+                    return self._tokenizer.batch_text_to_ids(texts)
+                return [self(text) for text in texts]
+
         super().__init__(
             audio_tar_filepaths=audio_tar_filepaths,
             manifest_filepath=manifest_filepath,
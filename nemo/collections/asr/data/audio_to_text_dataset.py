@@ -156,6 +156,8 @@ def get_char_dataset(config: dict, augmentor: Optional['AudioAugmentor'] = None)
         parser=config.get('parser', 'en'),
         return_sample_id=config.get('return_sample_id', False),
         channel_selector=config.get('channel_selector', None),
+        manifest_cache_dir=config.get('manifest_cache_dir', None),
+        manifest_num_workers=config.get('manifest_num_workers', 1),
     )
     return dataset
 
@@ -236,6 +238,8 @@ def get_bpe_dataset(
         use_start_end_token=config.get('use_start_end_token', True),
         return_sample_id=config.get('return_sample_id', False),
         channel_selector=config.get('channel_selector', None),
+        manifest_cache_dir=config.get('manifest_cache_dir', None),
+        manifest_num_workers=config.get('manifest_num_workers', 1),
     )
     return dataset
 
@@ -0,0 +1,334 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming corpus-level WER/CER scoring.
+
+Hypothesis/reference pairs are scored in chunks, optionally in a process pool, into mergeable `ErrorCounts`
+(insertions, deletions, substitutions and reference tokens). Counts of utterances are summed into a corpus total
+and into groups keyed by arbitrary manifest fields (e.g. speaker), so manifests of any size are scored in constant
+memory.
+
+By default, as in jiwer (and `word_error_rate_detail` and `word_error_rate_per_utt`), character edit operations are
+counted on texts stripped of leading and trailing whitespace, while all characters of the reference are counted as
+tokens. `word_error_rate` does not strip the texts, pass `strip=False` to match its CER. WER is not affected.
+"""
+
+import itertools
+import json
+import multiprocessing
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    from rapidfuzz.distance import Levenshtein
+
+    RAPIDFUZZ_AVAILABLE = True
+except (ImportError, ModuleNotFoundError):
+    RAPIDFUZZ_AVAILABLE = False
+
+__all__ = [
+    'ErrorCounts',
+    'ErrorRateAggregator',
+    'count_errors',
+    'count_errors_batch',
+    'iter_error_counts',
+    'score_manifest',
+]
+
+
+@dataclass
+class ErrorCounts:
+    """Edit operation counts of one or more hypothesis/reference pairs, merged with `+`."""
+
+    insertions: int = 0
+    deletions: int = 0
+    substitutions: int = 0
+    tokens: int = 0
+    utterances: int = 0
+
+    @property
+    def errors(self) -> int:
+        return self.insertions + self.deletions + self.substitutions
+
+    def _rate(self, count: int) -> float:
+        return 1.0 * count / self.tokens if self.tokens != 0 else float('inf')
+
+    @property
+    def error_rate(self) -> float:
+        """Word (or character) error rate, inf if there are no reference tokens."""
+        return self._rate(self.errors)
+
+    @property
+    def ins_rate(self) -> float:
+        return self._rate(self.insertions)
+
+    @property
+    def del_rate(self) -> float:
+        return self._rate(self.deletions)
+
+    @property
+    def sub_rate(self) -> float:
+        return self._rate(self.substitutions)
+
+    def __add__(self, other: 'ErrorCounts') -> 'ErrorCounts':
+        return ErrorCounts(
+            insertions=self.insertions + other.insertions,
+            deletions=self.deletions + other.deletions,
+            substitutions=self.substitutions + other.substitutions,
+            tokens=self.tokens + other.tokens,
+            utterances=self.utterances + other.utterances,
+        )
+
+    def __iadd__(self, other: 'ErrorCounts') -> 'ErrorCounts':
+        self.insertions += other.insertions
+        self.deletions += other.deletions
+        self.substitutions += other.substitutions
+        self.tokens += other.tokens
+        self.utterances += other.utterances
+        return self
+
+    def as_dict(self, eval_metric: str = 'wer') -> Dict[str, Union[int, float]]:
+        """Returns the summary in the format of `cal_write_wer`."""
+        return {
+            'samples': self.utterances,
+            'tokens': self.tokens,
+            eval_metric: self.error_rate,
+            'ins_rate': self.ins_rate,
+            'del_rate': self.del_rate,
+            'sub_rate': self.sub_rate,
+        }
+
+
+def _edit_ops(hypothesis: List[str], reference: List[str]) -> Tuple[int, int, int]:
+    """Returns the number of (insertions, deletions, substitutions) turning the reference into the hypothesis."""
+    if RAPIDFUZZ_AVAILABLE:
+        # same alignment as jiwer, which is used by `word_error_rate_detail`
+        insertions = deletions = substitutions = 0
+        for tag, _, _ in Levenshtein.editops(reference, hypothesis).as_list():
+            if tag == 'insert':
+                insertions += 1
+            elif tag == 'delete':
+                deletions += 1
+            else:
+                substitutions += 1
+        return insertions, deletions, substitutions
+
+    # dynamic programming over (errors, insertions, deletions, substitutions) of reference prefixes,
+    # the error total equals the edit distance, ties may be split differently than in jiwer
+    prev = [(j, j, 0, 0) for j in range(len(hypothesis) + 1)]
+    for i, ref_token in enumerate(reference, start=1):
+        cur = [(i, 0, i, 0)]
+        for j, hyp_token in enumerate(hypothesis, start=1):
+            diag = prev[j - 1]
+            if ref_token == hyp_token:
+                best = diag
+            else:
+                best = (diag[0] + 1, diag[1], diag[2], diag[3] + 1)
+            up, left = prev[j], cur[j - 1]
+            best = min(best, (up[0] + 1, up[1], up[2] + 1, up[3]), (left[0] + 1, left[1] + 1, left[2], left[3]))
+            cur.append(best)
+        prev = cur
+    return prev[-1][1], prev[-1][2], prev[-1][3]
+
+
+def count_errors(hypothesis: str, reference: str, use_cer: bool = False, strip: bool = True) -> ErrorCounts:
+    """
+    Computes edit operation counts of a single hypothesis/reference pair.
+
+    Args:
+        hypothesis: hypothesis text
+        reference: reference text
+        use_cer: set True to count characters instead of words
+        strip: set False to align the characters of the unstripped texts, as `word_error_rate` does
+
+    Returns:
+        ErrorCounts of the pair
+    """
+    if use_cer:
+        h_list = list(hypothesis)
+        r_list = list(reference)
+        if strip:
+            # jiwer strips the texts before aligning characters
+            h_ops, r_ops = list(hypothesis.strip()), list(reference.strip())
+        else:
+            h_ops, r_ops = h_list, r_list
+    else:
+        h_list = hypothesis.split()
+        r_list = reference.split()
+        h_ops, r_ops = h_list, r_list
+
+    if len(r_list) == 0:
+        return ErrorCounts(insertions=len(h_list), utterances=1)
+    insertions, deletions, substitutions = _edit_ops(h_ops, r_ops)
+    return ErrorCounts(
+        insertions=insertions, deletions=deletions, substitutions=substitutions, tokens=len(r_list), utterances=1
+    )
+
+
+def count_errors_batch(
+    pairs: Sequence[Tuple[str, str]], use_cer: bool = False, strip: bool = True
+) -> List[ErrorCounts]:
+    """Computes edit operation counts for a chunk of (hypothesis, reference) pairs."""
+    return [count_errors(hypothesis, reference, use_cer=use_cer, strip=strip) for hypothesis, reference in pairs]
+
+
+def _chunks(iterable: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_error_counts(
+    pairs: Iterable[Tuple[str, str]],
+    use_cer: bool = False,
+    num_workers: int = 0,
+    chunk_size: int = 1024,
+    max_pending_chunks: Optional[int] = None,
+    strip: bool = True,
+) -> Iterator[ErrorCounts]:
+    """
+    Streams edit operation counts of (hypothesis, reference) pairs, in the order of the pairs.
+
+    Args:
+        pairs: iterable of (hypothesis, reference) pairs, consumed lazily
+        use_cer: set True to count characters instead of words
+        num_workers: number of worker processes, 0 scores the pairs in the current process
+        chunk_size: number of pairs sent to a worker at once
+        max_pending_chunks: maximum number of chunks read ahead of the returned counts when scoring in worker
+            processes, defaults to `2 * num_workers`. Bounds the memory used for large inputs.
+        strip: set False to align the characters of the unstripped texts, as `word_error_rate` does
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+    score_chunk = partial(count_errors_batch, use_cer=use_cer, strip=strip)
+    if num_workers <= 0:
+        for chunk in _chunks(pairs, chunk_size):
+            yield from score_chunk(chunk)
+        return
+
+    if max_pending_chunks is None:
+        max_pending_chunks = 2 * num_workers
+    if max_pending_chunks <= 0:
+        raise ValueError(f"max_pending_chunks must be > 0, got {max_pending_chunks}")
+    with multiprocessing.Pool(processes=num_workers) as pool:
+        # unlike `pool.imap`, which reads the whole input ahead, only a window of chunks is scored at once
+        pending = deque()
+        for chunk in _chunks(pairs, chunk_size):
+            pending.append(pool.apply_async(score_chunk, (chunk,)))
+            if len(pending) >= max_pending_chunks:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+class ErrorRateAggregator:
+    """
+    Mergeable corpus-level error counts, in total and grouped by the values of manifest fields.
+
+    Args:
+        group_by: names of manifest fields (e.g. 'speaker') to group the counts by.
+            Samples without a field are not added to its groups.
+    """
+
+    def __init__(self, group_by: Sequence[str] = ()):
+        self.total = ErrorCounts()
+        self.groups: Dict[str, Dict[Any, ErrorCounts]] = {field: {} for field in group_by}
+
+    def add(self, counts: ErrorCounts, sample: Optional[Dict[str, Any]] = None):
+        """Adds counts of an utterance (or several), `sample` provides the values of the group fields."""
+        self.total += counts
+        if sample is None:
+            return
+        for field, groups in self.groups.items():
+            if field not in sample:
+                continue
+            value = sample[field]
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, sort_keys=True)
+            if value not in groups:
+                groups[value] = ErrorCounts()
+            groups[value] += counts
+
+    def merge(self, other: 'ErrorRateAggregator') -> 'ErrorRateAggregator':
+        """Adds (inplace) the counts of another aggregator, e.g. computed on another shard."""
+        self.total += other.total
+        for field, other_groups in other.groups.items():
+            groups = self.groups.setdefault(field, {})
+            for value, counts in other_groups.items():
+                if value not in groups:
+                    groups[value] = ErrorCounts()
+                groups[value] += counts
+        return self
+
+    def as_dict(self, eval_metric: str = 'wer') -> Dict[str, Any]:
+        """Returns the total summary, with summaries of groups under the name of their field."""
+        result = self.total.as_dict(eval_metric)
+        for field, groups in self.groups.items():
+            result[field] = {value: counts.as_dict(eval_metric) for value, counts in groups.items()}
+        return result
+
+
+def score_manifest(
+    manifest_filepath: Union[str, List[str]],
+    hypothesis_field: str = 'pred_text',
+    reference_field: str = 'text',
+    use_cer: bool = False,
+    group_by: Sequence[str] = (),
+    num_workers: int = 0,
+    chunk_size: int = 1024,
+    text_processor: Optional[Callable[[str], str]] = None,
+) -> ErrorRateAggregator:
+    """
+    Scores manifest(s) with hypotheses and references, reading them line by line.
+
+    Args:
+        manifest_filepath: path (or list of paths) to manifest files
+        hypothesis_field: name of the field with the hypothesis text
+        reference_field: name of the field with the reference text
+        use_cer: set True to compute the character error rate
+        group_by: names of fields to group the counts by, e.g. ['speaker']
+        num_workers: number of worker processes, 0 scores the pairs in the current process
+        chunk_size: number of pairs sent to a worker at once
+        text_processor: optional function applied to both texts before scoring (e.g. lower casing)
+
+    Returns:
+        ErrorRateAggregator with the total and the grouped counts
+    """
+    if isinstance(manifest_filepath, str):
+        manifest_filepath = manifest_filepath.split(',')
+    aggregator = ErrorRateAggregator(group_by=group_by)
+    # group field values of the pairs which are being scored, results are returned in order
+    pending_groups = deque()
+
+    def pairs():
+        for path in manifest_filepath:
+            with open(path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    sample = json.loads(line)
+                    hypothesis, reference = sample[hypothesis_field], sample[reference_field]
+                    if text_processor is not None:
+                        hypothesis, reference = text_processor(hypothesis), text_processor(reference)
+                    pending_groups.append({field: sample[field] for field in group_by if field in sample})
+                    yield hypothesis, reference
+
+    for counts in iter_error_counts(pairs(), use_cer=use_cer, num_workers=num_workers, chunk_size=chunk_size):
+        aggregator.add(counts, pending_groups.popleft())
+    return aggregator
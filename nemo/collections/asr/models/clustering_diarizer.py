@@ -21,6 +21,7 @@ import tempfile
 from copy import deepcopy
 from typing import Any, List, Optional, Union
 
+import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
 from pytorch_lightning.utilities import rank_zero_only
@@ -30,6 +31,12 @@ from nemo.collections.asr.metrics.der import score_labels
 from nemo.collections.asr.models.classification_models import EncDecClassificationModel
 from nemo.collections.asr.models.label_models import EncDecSpeakerLabelModel
 from nemo.collections.asr.parts.mixins.mixins import DiarizationMixin
+from nemo.collections.asr.parts.utils.embedding_cache import (
+    EmbeddingStore,
+    audio_file_fingerprint,
+    model_fingerprint,
+    subsegment_keys,
+)
 from nemo.collections.asr.parts.utils.speaker_utils import (
     audio_rttm_map,
     get_embs_and_timestamps,
@@ -102,6 +109,7 @@ class ClusteringDiarizer(torch.nn.Module, Model, DiarizationMixin):
         self.multiscale_embeddings_and_timestamps = {}
         self._init_speaker_model(speaker_model)
         self._speaker_params = self._cfg.diarizer.speaker_embeddings.parameters
+        self._embedding_store = None
 
         # Clustering params
         self._cluster_params = self._diarizer_params.clustering.parameters
@@ -345,11 +353,50 @@ class ClusteringDiarizer(torch.nn.Module, Model, DiarizationMixin):
         Optionally you may save the intermediate speaker embeddings for debugging or any use.
         """
         logging.info("Extracting embeddings for Diarization")
-        self._setup_spkr_test_data(manifest_file)
         self.embeddings = {}
-        self._speaker_model.eval()
         self.time_stamps = {}
 
+        with open(manifest_file, 'r', encoding='utf-8') as manifest:
+            subsegments = [json.loads(line.strip()) for line in manifest.readlines()]
+
+        embedding_store = self._get_embedding_store()
+        if embedding_store is None:
+            all_embs = self._run_embedding_extraction(manifest_file, scale_idx, num_scales)
+        else:
+            all_embs = self._lookup_or_extract_embeddings(
+                embedding_store, manifest_file, subsegments, scale_idx, num_scales
+            )
+
+        for i, dic in enumerate(subsegments):
+            uniq_name = get_uniqname_from_filepath(dic['audio_filepath'])
+            if uniq_name in self.embeddings:
+                self.embeddings[uniq_name] = torch.cat((self.embeddings[uniq_name], all_embs[i].view(1, -1)))
+            else:
+                self.embeddings[uniq_name] = all_embs[i].view(1, -1)
+            if uniq_name not in self.time_stamps:
+                self.time_stamps[uniq_name] = []
+            start = dic['offset']
+            end = start + dic['duration']
+            self.time_stamps[uniq_name].append([start, end])
+
+        if self._speaker_params.save_embeddings:
+            embedding_dir = os.path.join(self._speaker_dir, 'embeddings')
+            if not os.path.exists(embedding_dir):
+                os.makedirs(embedding_dir, exist_ok=True)
+
+            prefix = get_uniqname_from_filepath(manifest_file)
+            name = os.path.join(embedding_dir, prefix)
+            self._embeddings_file = name + f'_embeddings.pkl'
+            pkl.dump(self.embeddings, open(self._embeddings_file, 'wb'))
+            logging.info("Saved embedding files to {}".format(embedding_dir))
+
+    def _run_embedding_extraction(self, manifest_file: str, scale_idx: int, num_scales: int) -> torch.Tensor:
+        """
+        Runs the speaker model on all segments of manifest_file and returns their embeddings in manifest order.
+        """
+        self._setup_spkr_test_data(manifest_file)
+        self._speaker_model.eval()
+
         all_embs = torch.empty([0])
         for test_batch in tqdm(
             self._speaker_model.test_dataloader(),
@@ -365,32 +412,54 @@ class ClusteringDiarizer(torch.nn.Module, Model, DiarizationMixin):
                 embs = embs.view(-1, emb_shape)
                 all_embs = torch.cat((all_embs, embs.cpu().detach()), dim=0)
             del test_batch
+        return all_embs
 
-        with open(manifest_file, 'r', encoding='utf-8') as manifest:
-            for i, line in enumerate(manifest.readlines()):
-                line = line.strip()
-                dic = json.loads(line)
-                uniq_name = get_uniqname_from_filepath(dic['audio_filepath'])
-                if uniq_name in self.embeddings:
-                    self.embeddings[uniq_name] = torch.cat((self.embeddings[uniq_name], all_embs[i].view(1, -1)))
-                else:
-                    self.embeddings[uniq_name] = all_embs[i].view(1, -1)
-                if uniq_name not in self.time_stamps:
-                    self.time_stamps[uniq_name] = []
-                start = dic['offset']
-                end = start + dic['duration']
-                self.time_stamps[uniq_name].append([start, end])
-
-        if self._speaker_params.save_embeddings:
-            embedding_dir = os.path.join(self._speaker_dir, 'embeddings')
-            if not os.path.exists(embedding_dir):
-                os.makedirs(embedding_dir, exist_ok=True)
-
-            prefix = get_uniqname_from_filepath(manifest_file)
-            name = os.path.join(embedding_dir, prefix)
-            self._embeddings_file = name + f'_embeddings.pkl'
-            pkl.dump(self.embeddings, open(self._embeddings_file, 'wb'))
-            logging.info("Saved embedding files to {}".format(embedding_dir))
+    def _get_embedding_store(self) -> Optional[EmbeddingStore]:
+        """
+        Returns the embedding store of the speaker model if `embedding_cache_dir` is set, otherwise None.
+        """
+        embedding_cache_dir = self._speaker_params.get('embedding_cache_dir', None)
+        if embedding_cache_dir is None:
+            return None
+        if self._embedding_store is None:
+            fingerprint = model_fingerprint(self._speaker_model, sample_rate=self._cfg.sample_rate)
+            self._embedding_store = EmbeddingStore(embedding_cache_dir, fingerprint)
+        return self._embedding_store
+
+    def _lookup_or_extract_embeddings(
+        self,
+        embedding_store: EmbeddingStore,
+        manifest_file: str,
+        subsegments: List[dict],
+        scale_idx: int,
+        num_scales: int,
+    ) -> torch.Tensor:
+        """
+        Looks up the embeddings of all subsegments in the embedding store, and extracts and stores only
+        the embeddings of subsegments which are not cached. Embeddings are stored in float16, so cached and
+        freshly extracted embeddings are both returned with float16 precision.
+        """
+        keys = subsegment_keys(
+            [audio_file_fingerprint(dic['audio_filepath']) for dic in subsegments],
+            [dic['offset'] for dic in subsegments],
+            [dic['duration'] for dic in subsegments],
+        )
+        found, all_embs = embedding_store.lookup(keys)
+        logging.info(f"Found {found.sum()} of {len(keys)} embeddings in embedding store {embedding_store.path}")
+        if not found.all():
+            missing = np.nonzero(~found)[0]
+            missing_manifest_file = os.path.splitext(manifest_file)[0] + '_uncached.json'
+            with open(missing_manifest_file, 'w', encoding='utf-8') as fp:
+                for i in missing:
+                    fp.write(json.dumps(subsegments[i]) + '\n')
+            missing_embs = self._run_embedding_extraction(missing_manifest_file, scale_idx, num_scales)
+            missing_embs = missing_embs.float().numpy().astype(np.float16)
+            embedding_store.add(keys[missing], missing_embs)
+            embedding_store.flush()
+            if all_embs.shape[1] != missing_embs.shape[1]:
+                all_embs = np.zeros((len(keys), missing_embs.shape[1]), dtype=np.float16)
+            all_embs[missing] = missing_embs
+        return torch.from_numpy(all_embs.astype(np.float32))
 
     def path2audio_files_to_manifest(self, paths2audio_files, manifest_filepath):
         with open(manifest_filepath, 'w', encoding='utf-8') as fp:
@@ -58,6 +58,10 @@ class ASRDatasetConfig(nemo.core.classes.dataset.DatasetConfig):
     use_start_end_token: bool = False
     return_sample_id: Optional[bool] = False
 
+    # Compiled manifest cache and parallel manifest parsing (non-tarred datasets)
+    manifest_cache_dir: Optional[str] = None
+    manifest_num_workers: int = 1
+
     # bucketing params
     bucketing_strategy: str = "synced_randomized"
     bucketing_batch_size: Optional[Any] = None
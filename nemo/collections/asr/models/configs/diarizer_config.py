@@ -115,6 +115,8 @@ class SpeakerEmbeddingsParams(DiarizerComponentConfig):
     multiscale_weights: Tuple[float] = (1, 1, 1, 1, 1)
     # save speaker embeddings in pickle format. True if clustering result is used for other models, such as MSDD.
     save_embeddings: bool = True
+    # directory of the embedding store, embeddings are reused across scales and reruns. None disables caching.
+    embedding_cache_dir: Optional[str] = None
 
 
 @dataclass
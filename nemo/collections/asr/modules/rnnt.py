@@ -448,6 +448,22 @@ class StatelessTransducerDecoder(rnnt_abstract.AbstractRNNTDecoder, Exportable):
             return None
         return [states[0][mask]]
 
+    def index_select_states(
+        self, states: Optional[List[torch.Tensor]], indices: torch.Tensor
+    ) -> Optional[List[torch.Tensor]]:
+        """
+        Return states selected by indices
+        Args:
+            states: states for the batch
+            indices: long tensor with indices of the batch elements to select (can contain repeated indices)
+
+        Returns:
+            selected states
+        """
+        if states is None:
+            return None
+        return [states[0].index_select(0, indices)]
+
     def batch_score_hypothesis(
         self, hypotheses: List[rnnt_utils.Hypothesis], cache: Dict[Tuple[int], Any], batch_states: List[torch.Tensor]
     ) -> Tuple[torch.Tensor, List[torch.Tensor], torch.Tensor]:
@@ -1172,6 +1188,20 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder, Exportable, AdapterModuleMi
         # LSTM in PyTorch returns a tuple of 2 tensors as a state
         return states[0][:, mask], states[1][:, mask]
 
+    def index_select_states(
+        self, states: Tuple[torch.Tensor, torch.Tensor], indices: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Return states selected by indices
+        Args:
+            states: states for the batch
+            indices: long tensor with indices of the batch elements to select (can contain repeated indices)
+
+        Returns:
+            selected states
+        """
+        return states[0].index_select(1, indices), states[1].index_select(1, indices)
+
     # Adapter method overrides
     def add_adapter(self, name: str, cfg: DictConfig):
         # Update the config with correct input dim
@@ -349,3 +349,15 @@ class AbstractRNNTDecoder(NeuralModule, ABC):
             states filtered by mask (same type as `states`)
         """
         raise NotImplementedError()
+
+    def index_select_states(self, states: Any, indices: torch.Tensor) -> Any:
+        """
+        Return states selected by indices
+        Args:
+            states: states for the batch (preferably a list of tensors, but not limited to)
+            indices: long tensor with indices of the batch elements to select (can contain repeated indices)
+
+        Returns:
+            selected states (same type as `states`), batch dimension is the same as for `indices`
+        """
+        raise NotImplementedError()
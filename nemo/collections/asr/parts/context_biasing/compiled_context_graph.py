@@ -0,0 +1,367 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiled context-biasing graph with an on-disk, memory-mapped format.
+
+`ContextGraphCTC` is rebuilt from tokenized words on every launch. A compiled graph keeps the CSR transition
+arrays of the graph (see `CSRContextGraph`) together with the tokenized phrases it was built from, so it is
+loaded without tokenization or graph construction, and updated incrementally:
+
+    <path>/
+        CURRENT                 # name of the current revision directory
+        rev-<revision>/
+            meta.json           # format version, revision, blank id, words and user metadata
+            row_ptr.npy, tokens.npy, next_states.npy, is_end.npy, word_ids.npy
+            phrase_offsets.npy, phrase_tokens.npy, phrase_word_ids.npy
+
+Revisions are written to a temporary directory, renamed, and published by atomically replacing `CURRENT`,
+so readers never see a partial graph. Arrays are memory-mapped copy-on-write and shared between processes
+through the page cache.
+"""
+
+import json
+import os
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from nemo.collections.asr.parts.context_biasing.context_graph_ctc import CSRContextGraph
+from nemo.utils import logging
+
+__all__ = ['CompiledContextGraph']
+
+CONTEXT_GRAPH_FORMAT_VERSION = 1
+
+_ARRAYS = (
+    'row_ptr',
+    'tokens',
+    'next_states',
+    'is_end',
+    'word_ids',
+    'phrase_offsets',
+    'phrase_tokens',
+    'phrase_word_ids',
+)
+
+
+def _revision_number(revision_name: str) -> int:
+    """Returns the revision number of a `rev-<revision>-<suffix>` directory name."""
+    return int(revision_name.split('-')[1])
+
+
+class _GraphEditor:
+    """
+    Mutable view of a CSR graph for inserting phrases. Transitions of the states visited by an insertion are
+    copied into dicts, all other states keep their CSR transitions.
+    """
+
+    def __init__(self, graph: CSRContextGraph):
+        self.graph = graph
+        self.num_states = graph.num_states
+        self.transitions: Dict[int, Dict[int, int]] = {}
+        self.is_end: List[bool] = []
+        self.word_ids: List[int] = []
+
+    def next(self, state: int) -> Dict[int, int]:
+        if state not in self.transitions:
+            begin, end = self.graph.row_ptr[state], self.graph.row_ptr[state + 1]
+            self.transitions[state] = dict(
+                zip(self.graph.tokens[begin:end].tolist(), self.graph.next_states[begin:end].tolist())
+            )
+        return self.transitions[state]
+
+    def new_state(self, is_end: bool = False, word_id: int = -1) -> int:
+        state = self.num_states
+        self.num_states += 1
+        self.transitions[state] = {}
+        self.is_end.append(is_end)
+        self.word_ids.append(word_id)
+        return state
+
+    def add_phrase(self, tokens: List[int], word_id: int, blank: int):
+        """Adds the states and transitions of a tokenization as ContextGraphCTC.add_to_graph does."""
+        prev_state = 0
+        prev_token = None
+        for i, token in enumerate(tokens):
+            is_end = i == len(tokens) - 1
+            prev_next = self.next(prev_state)
+            if token not in prev_next:
+                state = self.new_state(is_end=is_end, word_id=word_id if is_end else -1)
+                self.next(state)[token] = state
+                prev_next[token] = state
+
+                # add blank node:
+                if prev_state != 0:
+                    if blank in prev_next:
+                        # blank node already exists
+                        self.next(prev_next[blank])[token] = state
+                    else:
+                        # create new blank node
+                        blank_state = self.new_state()
+                        self.next(blank_state)[blank] = blank_state
+                        self.next(blank_state)[token] = state
+                        prev_next[blank] = blank_state
+
+            # in case of two consecutive equal tokens
+            if token == prev_token:
+                if blank in prev_next and token in self.next(prev_next[blank]):
+                    prev_state = self.next(prev_next[blank])[token]
+                    prev_token = token
+                    continue
+                # create new token
+                state = self.new_state(is_end=is_end, word_id=word_id if is_end else -1)
+                if blank in prev_next:
+                    self.next(prev_next[blank])[token] = state
+                    self.next(state)[token] = state
+                else:
+                    # create new blank node
+                    blank_state = self.new_state()
+                    self.next(blank_state)[blank] = blank_state
+                    self.next(blank_state)[token] = state
+                    prev_next[blank] = blank_state
+            # rewrite previous node
+            if prev_state != prev_next[token]:
+                prev_state = prev_next[token]
+            else:
+                prev_state = self.next(prev_next[blank])[token]
+            prev_token = token
+
+    def finalize(self) -> Tuple[np.ndarray, ...]:
+        """Returns (row_ptr, tokens, next_states, is_end, word_ids) with the inserted states and transitions."""
+        graph = self.graph
+        old_num_states = graph.num_states
+        old_sources = np.repeat(np.arange(old_num_states), np.diff(graph.row_ptr))
+        is_edited = np.zeros(self.num_states, dtype=bool)
+        is_edited[list(self.transitions)] = True
+        keep = ~is_edited[old_sources]
+
+        edited_states = sorted(self.transitions)
+        new_sources = np.repeat(edited_states, [len(self.transitions[s]) for s in edited_states]).astype(np.int64)
+        new_tokens = [token for s in edited_states for token in self.transitions[s]]
+        new_next_states = [next_state for s in edited_states for next_state in self.transitions[s].values()]
+
+        sources = np.concatenate([old_sources[keep], new_sources])
+        # stable sort keeps the order of the transitions of every state
+        order = np.argsort(sources, kind='stable')
+        tokens = np.concatenate([graph.tokens[keep], np.asarray(new_tokens, dtype=np.int64)])[order]
+        next_states = np.concatenate([graph.next_states[keep], np.asarray(new_next_states, dtype=np.int64)])[order]
+        row_ptr = np.zeros(self.num_states + 1, dtype=np.int64)
+        row_ptr[1:] = np.cumsum(np.bincount(sources, minlength=self.num_states))
+        is_end = np.concatenate([graph.is_end, np.asarray(self.is_end, dtype=bool)])
+        word_ids = np.concatenate([graph.word_ids, np.asarray(self.word_ids, dtype=np.int64)])
+        return row_ptr, tokens, next_states, is_end, word_ids
+
+
+@dataclass
+class CompiledContextGraph(CSRContextGraph):
+    """
+    CSR context-biasing graph with the tokenized phrases it was built from, which can be saved, memory-mapped
+    and updated incrementally. It is used by run_word_spotter_batch as any CSRContextGraph, and spots the same
+    words as ContextGraphCTC built from the same phrases in the same order.
+
+    Args:
+        phrase_offsets: int64 [num_phrases + 1], offsets of the tokens of every phrase in phrase_tokens
+        phrase_tokens: int64, concatenated token ids of all phrases (tokenizations of words)
+        phrase_word_ids: int64 [num_phrases], index in words of the word of every phrase
+        revision: incremented by every update
+        metadata: JSON-serializable user data saved with the graph (e.g. the tokenizer of the token ids)
+    """
+
+    phrase_offsets: np.ndarray = None
+    phrase_tokens: np.ndarray = None
+    phrase_word_ids: np.ndarray = None
+    revision: int = 0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def empty(cls, blank_id: int, metadata: Optional[Dict[str, Any]] = None) -> 'CompiledContextGraph':
+        """Returns a graph with only the root state."""
+        return cls(
+            row_ptr=np.zeros(2, dtype=np.int64),
+            tokens=np.zeros(0, dtype=np.int64),
+            next_states=np.zeros(0, dtype=np.int64),
+            is_end=np.zeros(1, dtype=bool),
+            word_ids=np.full(1, -1, dtype=np.int64),
+            words=[],
+            blank_id=blank_id,
+            phrase_offsets=np.zeros(1, dtype=np.int64),
+            phrase_tokens=np.zeros(0, dtype=np.int64),
+            phrase_word_ids=np.zeros(0, dtype=np.int64),
+            metadata=dict(metadata or {}),
+        )
+
+    @classmethod
+    def build(
+        cls, word_items: List[tuple], blank_id: int, metadata: Optional[Dict[str, Any]] = None
+    ) -> 'CompiledContextGraph':
+        """
+        Builds a graph from word items in the format of ContextGraphCTC.add_to_graph.
+
+        Args:
+            word_items: a list of word items, each word item is a tuple of (word, tokenizations),
+                        where tokenizations is a list of token id lists
+            blank_id: the id of blank token in ASR model
+            metadata: JSON-serializable user data saved with the graph
+        """
+        graph = cls.empty(blank_id, metadata)
+        graph.insert(word_items)
+        graph.revision = 0
+        return graph
+
+    @property
+    def num_phrases(self) -> int:
+        return len(self.phrase_word_ids)
+
+    def phrases(self) -> Iterable[Tuple[str, List[int]]]:
+        """Yields (word, token ids) of all phrases in insertion order."""
+        offsets = self.phrase_offsets.tolist()
+        tokens = self.phrase_tokens.tolist()
+        for p, word_id in enumerate(self.phrase_word_ids.tolist()):
+            yield self.words[word_id], tokens[offsets[p] : offsets[p + 1]]
+
+    def insert(self, word_items: List[tuple]):
+        """
+        Inserts words with their tokenizations. Only the states on the paths of the new phrases are edited,
+        the transition arrays are then re-sorted in O(num_transitions log num_transitions).
+
+        Args:
+            word_items: a list of word items, each word item is a tuple of (word, tokenizations),
+                        where tokenizations is a list of token id lists
+        """
+        editor = _GraphEditor(self)
+        word_index = {word: i for i, word in enumerate(self.words)}
+        words = list(self.words)
+        phrase_lengths, phrase_tokens, phrase_word_ids = [], [], []
+        for word, tokenizations in word_items:
+            if word not in word_index:
+                word_index[word] = len(words)
+                words.append(word)
+            for tokens in tokenizations:
+                tokens = [int(token) for token in tokens]
+                if not tokens:
+                    continue
+                editor.add_phrase(tokens, word_index[word], self.blank_id)
+                phrase_lengths.append(len(tokens))
+                phrase_tokens.extend(tokens)
+                phrase_word_ids.append(word_index[word])
+        if not phrase_word_ids:
+            return
+
+        self.row_ptr, self.tokens, self.next_states, self.is_end, self.word_ids = editor.finalize()
+        self.words = words
+        self.phrase_offsets = np.concatenate(
+            [self.phrase_offsets, self.phrase_offsets[-1] + np.cumsum(phrase_lengths, dtype=np.int64)]
+        )
+        self.phrase_tokens = np.concatenate([self.phrase_tokens, np.asarray(phrase_tokens, dtype=np.int64)])
+        self.phrase_word_ids = np.concatenate([self.phrase_word_ids, np.asarray(phrase_word_ids, dtype=np.int64)])
+        self.revision += 1
+
+    def delete(self, words: Iterable[str]):
+        """
+        Deletes words with all their tokenizations. States may be shared by several phrases, so the graph is
+        rebuilt from the stored token ids of the remaining phrases, without tokenization.
+
+        Args:
+            words: words to delete, unknown words are ignored
+        """
+        words = set(words)
+        if not words & set(self.words):
+            return
+        remaining = [(word, [tokens]) for word, tokens in self.phrases() if word not in words]
+        graph = CompiledContextGraph.build(remaining, self.blank_id)
+        for name in _ARRAYS:
+            setattr(self, name, getattr(graph, name))
+        self.words = graph.words
+        self.revision += 1
+
+    def save(self, path: str, keep_revisions: int = 2):
+        """
+        Saves the graph as a new revision under `path` and publishes it, older revisions are removed
+        except the last `keep_revisions` (readers may still memory-map them). The revision number continues
+        after the revisions already saved to `path`, also if the graph was rebuilt from scratch.
+        """
+        os.makedirs(path, exist_ok=True)
+        saved_revisions = [_revision_number(name) for name in os.listdir(path) if name.startswith('rev-')]
+        if saved_revisions:
+            self.revision = max(self.revision, max(saved_revisions) + 1)
+        revision_name = f'rev-{self.revision:08d}-{uuid.uuid4().hex[:8]}'
+        tmp_path = os.path.join(path, f'.tmp-{revision_name}')
+        os.makedirs(tmp_path)
+        try:
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+            meta = dict(
+                version=CONTEXT_GRAPH_FORMAT_VERSION,
+                revision=self.revision,
+                blank_id=self.blank_id,
+                num_states=self.num_states,
+                num_phrases=self.num_phrases,
+                words=self.words,
+                metadata=self.metadata,
+            )
+            with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.rename(tmp_path, os.path.join(path, revision_name))
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        current_tmp = os.path.join(path, f'.CURRENT-{uuid.uuid4().hex}')
+        with open(current_tmp, 'w') as f:
+            f.write(revision_name)
+        os.replace(current_tmp, os.path.join(path, 'CURRENT'))
+        logging.info(f"Saved context graph revision {self.revision} ({self.num_phrases} phrases) to {path}")
+
+        revisions = sorted((name for name in os.listdir(path) if name.startswith('rev-')), key=_revision_number)
+        for name in revisions[: max(len(revisions) - keep_revisions, 0)]:
+            if name != revision_name:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """Returns True if a graph was saved to `path`."""
+        return os.path.exists(os.path.join(path, 'CURRENT'))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CompiledContextGraph':
+        """
+        Loads the current revision of the graph saved to `path`.
+
+        Args:
+            path: directory of the graph
+            mmap: memory-map the arrays copy-on-write instead of reading them into memory
+        """
+        with open(os.path.join(path, 'CURRENT'), 'r') as f:
+            revision_path = os.path.join(path, f.read().strip())
+        with open(os.path.join(revision_path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['version'] != CONTEXT_GRAPH_FORMAT_VERSION:
+            raise ValueError(
+                f"Context graph {path} has format version {meta['version']}, "
+                f"expected {CONTEXT_GRAPH_FORMAT_VERSION}, please rebuild it"
+            )
+        arrays = {
+            name: np.load(os.path.join(revision_path, f'{name}.npy'), mmap_mode='c' if mmap else None)
+            for name in _ARRAYS
+        }
+        return cls(
+            words=meta['words'],
+            blank_id=meta['blank_id'],
+            revision=meta['revision'],
+            metadata=meta['metadata'],
+            **arrays,
+        )
@@ -32,8 +32,10 @@
 # https://github.com/k2-fsa/icefall/blob/11d816d174076ec9485ab8b1d36af2592514e348/icefall/context_graph.py
 
 from collections import deque
+from dataclasses import dataclass
 from typing import Dict, List, Optional
 
+import numpy as np
 
 try:
     import graphviz
@@ -240,3 +242,73 @@ class ContextGraphCTC:
                 printed_arcs.add((output, input, arc))
 
         return dot
+
+
+@dataclass
+class CSRContextGraph:
+    """
+    Context-biasing graph compiled into CSR (compressed sparse row) transition arrays for the batched word spotter.
+    Transitions of state s are tokens[row_ptr[s]:row_ptr[s + 1]], leading to next_states[row_ptr[s]:row_ptr[s + 1]],
+    in the order of ContextState.next. The root state is 0.
+
+    Args:
+        row_ptr: int64 [num_states + 1], offsets of the transitions of every state
+        tokens: int64 [num_transitions], token ids of the transitions
+        next_states: int64 [num_transitions], destination states of the transitions
+        is_end: bool [num_states], True for end states of context biasing words
+        word_ids: int64 [num_states], index in words of the word of end states, -1 for other states
+        words: context biasing words
+        blank_id: the id of blank token in ASR model
+    """
+
+    row_ptr: np.ndarray
+    tokens: np.ndarray
+    next_states: np.ndarray
+    is_end: np.ndarray
+    word_ids: np.ndarray
+    words: List[str]
+    blank_id: int
+
+    @property
+    def num_states(self) -> int:
+        return len(self.row_ptr) - 1
+
+    @classmethod
+    def from_context_graph(cls, context_graph: ContextGraphCTC) -> 'CSRContextGraph':
+        """Compiles the states of context_graph (in breadth-first order) into CSR arrays."""
+        states = [context_graph.root]
+        state_ids = {context_graph.root.index: 0}
+        queue = deque([context_graph.root])
+        while queue:
+            state = queue.popleft()
+            for node in state.next.values():
+                if node.index not in state_ids:
+                    state_ids[node.index] = len(states)
+                    states.append(node)
+                    queue.append(node)
+
+        row_ptr = np.zeros(len(states) + 1, dtype=np.int64)
+        tokens, next_states = [], []
+        is_end = np.zeros(len(states), dtype=bool)
+        word_ids = np.full(len(states), -1, dtype=np.int64)
+        words = {}
+        for i, state in enumerate(states):
+            for token, node in state.next.items():
+                if not isinstance(token, (int, np.integer)):
+                    raise ValueError(f"CSRContextGraph requires token ids, got token {token!r}")
+                tokens.append(token)
+                next_states.append(state_ids[node.index])
+            row_ptr[i + 1] = len(tokens)
+            if state.is_end:
+                is_end[i] = True
+                word_ids[i] = words.setdefault(state.word, len(words))
+
+        return cls(
+            row_ptr=row_ptr,
+            tokens=np.asarray(tokens, dtype=np.int64),
+            next_states=np.asarray(next_states, dtype=np.int64),
+            is_end=is_end,
+            word_ids=word_ids,
+            words=list(words),
+            blank_id=context_graph.blank_token,
+        )
@@ -13,11 +13,16 @@
 # limitations under the License.
 
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import numpy as np
+import torch
 
-from nemo.collections.asr.parts.context_biasing.context_graph_ctc import ContextGraphCTC, ContextState
+from nemo.collections.asr.parts.context_biasing.context_graph_ctc import (
+    ContextGraphCTC,
+    ContextState,
+    CSRContextGraph,
+)
 
 
 @dataclass
@@ -120,16 +125,15 @@ def find_best_hyps(spotted_words: List[WSHyp], intersection_threshold: int = 10)
 
     hyp_intervals_dict = {}
     for hyp in spotted_words:
-        hyp_interval = set(range(hyp.start_frame, hyp.end_frame + 1))
-        h_interval_name = f"{hyp.start_frame}_{hyp.end_frame}"
+        h_interval_name = (hyp.start_frame, hyp.end_frame)
         insert_new_hyp = True
 
         # check hyp intersection with all the elements in hyp_intervals_dict
         for h_interval_key in hyp_intervals_dict:
             # get left and right interval values
-            l, r = int(h_interval_key.split("_")[0]), int(h_interval_key.split("_")[1])
-            current_dict_interval = set(range(l, r + 1))
-            intersection_part = 100 / len(current_dict_interval) * len(hyp_interval & current_dict_interval)
+            l, r = h_interval_key
+            intersection_len = max(0, min(r, hyp.end_frame) - max(l, hyp.start_frame) + 1)
+            intersection_part = 100 / (r - l + 1) * intersection_len
             # in case of intersection:
             if intersection_part >= intersection_threshold:
                 if hyp.score > hyp_intervals_dict[h_interval_key].score:
@@ -363,3 +367,209 @@ def run_word_spotter(
     best_hyp_list = filter_wb_hyps(best_hyp_list, ctc_word_alignment)
 
     return best_hyp_list
+
+
+def _segment_max(values: torch.Tensor, segments: torch.Tensor, num_segments: int) -> torch.Tensor:
+    """Maximum of values in each segment, -inf for empty segments."""
+    result = torch.full([num_segments], float('-inf'), dtype=values.dtype, device=values.device)
+    return result.scatter_reduce(0, segments, values, reduce='amax')
+
+
+def _exclusive_segment_cummax(values: torch.Tensor, segments: torch.Tensor) -> torch.Tensor:
+    """
+    Maximum of the preceding values of the same segment for every value, -inf if there are none.
+    Segments must be contiguous and numbered in increasing order, -inf values are ignored.
+    """
+    is_finite = values > float('-inf')
+    if not is_finite.any():
+        return torch.full_like(values, float('-inf'))
+    min_value = values[is_finite].min()
+    # shift the values of every segment above all values of the preceding segments, the scan only returns indices
+    offset = values[is_finite].max() - min_value + 1.0
+    shifted = torch.where(is_finite, values - min_value + segments * offset, values)
+    _, max_idx = torch.cummax(shifted, dim=0)
+    prev_max_idx = torch.cat([max_idx.new_zeros([1]), max_idx[:-1]])
+    has_prev = segments[prev_max_idx] == segments
+    has_prev[0] = False
+    has_prev &= is_finite[prev_max_idx]
+    return torch.where(has_prev, values[prev_max_idx], torch.full_like(values, float('-inf')))
+
+
+def run_word_spotter_batch(
+    logprobs: Union[torch.Tensor, List[np.ndarray]],
+    context_graph: Union[ContextGraphCTC, CSRContextGraph],
+    asr_model,
+    logprobs_lengths: Optional[torch.Tensor] = None,
+    blank_idx: int = 0,
+    beam_threshold: float = 5.0,
+    cb_weight: float = 3.0,
+    ctc_ali_token_weight: float = 0.5,
+    keyword_threshold: float = -5.0,
+    blank_threshold: float = 0.8,
+    non_blank_threshold: float = 0.001,
+) -> List[List[WSHyp]]:
+    """
+    Batched CTC-based Word Spotter, the tensorized version of run_word_spotter with the same results.
+    The context graph is compiled into CSR transition arrays (CSRContextGraph). At each frame, all transitions of
+    all active tokens of all utterances are expanded with vectorized gathers. The running beam pruning of
+    run_word_spotter is computed with a segmented cumulative maximum over the transitions, in the same order.
+
+    Args:
+        logprobs: CTC logprobs [Batch, Time, Vocab+blank], or a list of [Time, Vocab+blank] arrays
+        context_graph: Context-Biasing graph, compile it once with CSRContextGraph.from_context_graph for reuse
+        asr_model: ASR model (ctc or hybrid-transducer-ctc)
+        logprobs_lengths: number of frames of every utterance [Batch], required for padded tensors
+        blank_idx: blank index in ASR model
+        beam_threshold: threshold for beam pruning
+        cb_weight: context biasing weight
+        ctc_ali_token_weight: additional token weight for word-level ctc alignment
+        keyword_threshold: auxiliary weight for pruning final hypotheses
+        blank_threshold: blank threshold (probability) for preliminary hypotheses pruning
+        non_blank_threshold: non-blank threshold (probability) for preliminary hypotheses pruning
+
+    Returns:
+        final list of spotted hypotheses WSHyp for every utterance
+    """
+    if isinstance(logprobs, (list, tuple)):
+        logprobs_lengths = torch.tensor([len(x) for x in logprobs], dtype=torch.long)
+        logprobs = torch.nn.utils.rnn.pad_sequence([torch.as_tensor(x) for x in logprobs], batch_first=True)
+    elif logprobs_lengths is None:
+        logprobs_lengths = torch.full([logprobs.shape[0]], logprobs.shape[1], dtype=torch.long)
+    if not isinstance(context_graph, CSRContextGraph):
+        context_graph = CSRContextGraph.from_context_graph(context_graph)
+
+    device = logprobs.device
+    batch_size, max_time = logprobs.shape[0], logprobs.shape[1]
+    lengths = logprobs_lengths.to(device)
+    row_ptr = torch.from_numpy(context_graph.row_ptr).to(device)
+    graph_tokens = torch.from_numpy(context_graph.tokens).to(device)
+    graph_next_states = torch.from_numpy(context_graph.next_states).to(device)
+    is_end = torch.from_numpy(context_graph.is_end).to(device)
+    word_ids = torch.from_numpy(context_graph.word_ids).to(device)
+    # end states which are the last in the branch (only one self-loop transition)
+    is_last_state = is_end & (row_ptr[1:] - row_ptr[:-1] == 1)
+    num_states = context_graph.num_states
+    neg_inf = float('-inf')
+
+    # move threshold probabilities to log space
+    blank_threshold = np.log(blank_threshold)
+    non_blank_threshold = np.log(non_blank_threshold)
+
+    # active tokens of all utterances (ordered by utterance): batch index, graph state, score and start frame
+    token_batch = torch.zeros([0], dtype=torch.long, device=device)
+    token_state = torch.zeros([0], dtype=torch.long, device=device)
+    token_score = torch.zeros([0], dtype=torch.float64, device=device)
+    token_start = torch.zeros([0], dtype=torch.long, device=device)
+    spotted_items, spotted_scores = [], []
+
+    for frame in range(max_time):
+        frame_logprobs = logprobs[:, frame]
+        is_active = lengths > frame
+        keep = is_active[token_batch]
+        # add an empty token (located in the graph root) at each new frame to start new word spotting,
+        # skip empty token by the blank_threshold
+        root_batch = torch.nonzero(is_active & (frame_logprobs[:, blank_idx] <= blank_threshold)).squeeze(1)
+        token_batch = torch.cat([token_batch[keep], root_batch])
+        order = torch.argsort(token_batch, stable=True)
+        token_batch = token_batch[order]
+        token_state = torch.cat([token_state[keep], torch.zeros_like(root_batch)])[order]
+        token_score = torch.cat([token_score[keep], torch.zeros_like(root_batch, dtype=torch.float64)])[order]
+        token_start = torch.cat([token_start[keep], torch.full_like(root_batch, frame)])[order]
+        if token_batch.shape[0] == 0:
+            continue
+
+        # expand all transitions of all tokens
+        num_transitions = row_ptr[token_state + 1] - row_ptr[token_state]
+        source = torch.repeat_interleave(torch.arange(token_batch.shape[0], device=device), num_transitions)
+        transition_offsets = torch.cumsum(num_transitions, dim=0) - num_transitions
+        edges = (
+            row_ptr[token_state][source] + torch.arange(source.shape[0], device=device) - transition_offsets[source]
+        )
+        batch = token_batch[source]
+        tokens = graph_tokens[edges]
+        states = graph_next_states[edges]
+        transition_logprobs = frame_logprobs[batch, tokens].to(torch.float64)
+        # add cb_weight only for non-blank tokens
+        scores = token_score[source] + transition_logprobs + cb_weight * (tokens != blank_idx)
+        # skip non-blank token by the non_blank_threshold if empty token
+        is_skipped_root = (token_state[source] == 0) & (transition_logprobs < non_blank_threshold)
+
+        # running beam pruning: the best score is reset after a token which set it and finished its branch,
+        # so segments of transitions are split at such tokens until no new reset is found
+        is_utterance_start = torch.ones_like(batch, dtype=torch.bool)
+        is_utterance_start[1:] = batch[1:] != batch[:-1]
+        is_reset = torch.zeros_like(is_utterance_start)
+        positions = torch.arange(batch.shape[0], device=device)
+        while True:
+            is_segment_start = is_utterance_start.clone()
+            is_segment_start[1:] |= is_reset[:-1]
+            segments = torch.cumsum(is_segment_start, dim=0) - 1
+            best_scores = _exclusive_segment_cummax(
+                torch.where(is_skipped_root, torch.full_like(scores, neg_inf), scores), segments
+            )
+            is_skipped = is_skipped_root | (scores < best_scores - beam_threshold)
+            # add a word as spotted if token reached the end of word state in context graph
+            is_spotted = ~is_skipped & is_end[states] & (scores > keyword_threshold)
+            is_new_reset = is_spotted & is_last_state[states] & (scores > best_scores) & ~is_reset
+            if not is_new_reset.any():
+                break
+            # only the first new reset of each segment is final
+            num_segments = int(segments[-1]) + 1
+            first_reset = torch.full([num_segments], batch.shape[0], dtype=torch.long, device=device).scatter_reduce(
+                0, segments[is_new_reset], positions[is_new_reset], reduce='amin'
+            )
+            is_reset[first_reset[first_reset < batch.shape[0]]] = True
+
+        if is_spotted.any():
+            spotted_items.append(
+                torch.stack(
+                    [
+                        batch[is_spotted],
+                        word_ids[states[is_spotted]],
+                        token_start[source[is_spotted]],
+                        torch.full_like(batch[is_spotted], frame),
+                    ]
+                )
+            )
+            spotted_scores.append(scores[is_spotted])
+        keep = ~is_skipped & ~(is_spotted & is_last_state[states])
+        source, batch, states, scores = source[keep], batch[keep], states[keep], scores[keep]
+
+        # beam pruning
+        keep = scores > _segment_max(scores, batch, batch_size)[batch] - beam_threshold
+        source, batch, states, scores = source[keep], batch[keep], states[keep], scores[keep]
+
+        # state pruning: leave only the best token (the first among equal ones) on each state of each utterance
+        _, state_keys = torch.unique(batch * num_states + states, return_inverse=True)
+        num_keys = int(state_keys.max()) + 1 if state_keys.shape[0] else 0
+        is_best = scores == _segment_max(scores, state_keys, num_keys)[state_keys]
+        positions = torch.arange(scores.shape[0], device=device)
+        best_positions = torch.full([num_keys], scores.shape[0], dtype=torch.long, device=device).scatter_reduce(
+            0, state_keys[is_best], positions[is_best], reduce='amin'
+        )
+        keep, _ = torch.sort(best_positions)
+
+        token_batch, token_state, token_score = batch[keep], states[keep], scores[keep]
+        token_start = token_start[source[keep]]
+
+    spotted_words = [[] for _ in range(batch_size)]
+    for items, scores in zip(spotted_items, spotted_scores):
+        for b, word_id, start_frame, end_frame, score in zip(*items.cpu().tolist(), scores.cpu().tolist()):
+            spotted_words[b].append(
+                WSHyp(word=context_graph.words[word_id], score=score, start_frame=start_frame, end_frame=end_frame)
+            )
+
+    best_hyp_lists = []
+    for b in range(batch_size):
+        # find best hyps for spotted keywords (in case of hyps overlapping):
+        best_hyp_list = find_best_hyps(spotted_words[b])
+        # filter hyps according to word-level ctc alignment to avoid a high false accept rate
+        ctc_word_alignment = get_ctc_word_alignment(
+            logprobs[b, : logprobs_lengths[b]].cpu().numpy(),
+            asr_model,
+            token_weight=ctc_ali_token_weight,
+            blank_idx=blank_idx,
+        )
+        best_hyp_lists.append(filter_wb_hyps(best_hyp_list, ctc_word_alignment))
+
+    return best_hyp_lists
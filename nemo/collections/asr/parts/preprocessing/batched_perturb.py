@@ -0,0 +1,770 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched audio augmentation.
+
+The perturbations in :mod:`nemo.collections.asr.parts.preprocessing.perturb` are applied to one
+:class:`AudioSegment` at a time inside the dataloader workers. :class:`BatchedAudioAugmentor` applies the same
+augmentation configs to a padded batch of signals after collation, with vectorized torch operations which run
+on CPU or on the device of the batch:
+
+    augmentor = process_batched_augmentations(cfg.train_ds.augmentor)
+    ...
+    signal, signal_len = augmentor.perturb(signal, signal_len, sample_rate=16000)
+
+Noise and room impulse responses are drawn from an :class:`AudioBank` preloaded from the manifests of the
+original perturbations. A bank holds `bank_size` signals and is reloaded with a new random subset of the manifest
+every `bank_refresh_interval` draws. These can be set for all perturbations as arguments of
+`process_batched_augmentations`, or per perturbation in the augmentor config:
+
+    augmentor:
+      noise:
+        prob: 0.5
+        manifest_path: /path/to/noise_manifest.json
+        bank_size: 512
+        max_bank_duration: 10.0
+        bank_refresh_interval: 1000
+
+Perturbations without a batched implementation are applied per sample on CPU.
+"""
+
+import copy
+import math
+import random
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from omegaconf import DictConfig, OmegaConf
+
+from nemo.collections.asr.parts.preprocessing.perturb import (
+    AudioAugmentor,
+    GainPerturbation,
+    ImpulsePerturbation,
+    NoisePerturbation,
+    Perturbation,
+    RirAndNoisePerturbation,
+    ShiftPerturbation,
+    SpeedPerturbation,
+    WhiteNoisePerturbation,
+    process_augmentations,
+    read_one_audiosegment,
+)
+from nemo.collections.asr.parts.preprocessing.segment import AudioSegment
+from nemo.utils import logging
+
+__all__ = [
+    'AudioBank',
+    'BatchedPerturbation',
+    'BatchedGainPerturbation',
+    'BatchedWhiteNoisePerturbation',
+    'BatchedShiftPerturbation',
+    'BatchedSpeedPerturbation',
+    'BatchedImpulsePerturbation',
+    'BatchedNoisePerturbation',
+    'BatchedRirAndNoisePerturbation',
+    'PerSamplePerturbation',
+    'BatchedAudioAugmentor',
+    'batched_perturbation_types',
+    'register_batched_perturbation',
+    'process_batched_augmentations',
+]
+
+# keys of the augmentor config of a perturbation which configure its audio bank
+AUDIO_BANK_CONFIG_KEYS = ('bank_size', 'max_bank_duration', 'bank_refresh_interval')
+
+
+def _uniform(low: float, high: float, size: int, device: torch.device) -> torch.Tensor:
+    return (low + (high - low) * torch.rand(size, dtype=torch.float64)).to(device)
+
+
+def _time_mask(lengths: torch.Tensor, max_len: int) -> torch.Tensor:
+    return torch.arange(max_len, device=lengths.device)[None, :] < lengths[:, None]
+
+
+def _rms_db(signal: torch.Tensor, lengths: torch.Tensor) -> torch.Tensor:
+    """Per-row RMS in dB over the valid samples, as `AudioSegment.rms_db`."""
+    mean_square = (signal.double() ** 2).sum(dim=-1) / lengths.clamp(min=1)
+    return 10 * torch.log10(mean_square)
+
+
+def _gather_rows(signal: torch.Tensor, rows: torch.Tensor, index: torch.Tensor, valid: torch.Tensor) -> torch.Tensor:
+    """Returns `signal[rows[b], index[b, t]]` where `valid[b, t]`, zero elsewhere."""
+    flat_index = rows[:, None] * signal.shape[-1] + index.clamp(0, signal.shape[-1] - 1)
+    return torch.where(
+        valid, signal.reshape(-1)[flat_index], torch.zeros((), dtype=signal.dtype, device=signal.device)
+    )
+
+
+def _fft_convolve(signal: torch.Tensor, kernel: torch.Tensor) -> torch.Tensor:
+    """Full linear convolution of every row of `signal` with the matching row of `kernel`."""
+    out_len = signal.shape[-1] + kernel.shape[-1] - 1
+    n_fft = 2 ** math.ceil(math.log2(out_len))
+    spec = torch.fft.rfft(signal, n=n_fft) * torch.fft.rfft(kernel, n=n_fft)
+    return torch.fft.irfft(spec, n=n_fft)[..., :out_len]
+
+
+@lru_cache(maxsize=64)
+def _sinc_resample_kernel(orig_freq: int, new_freq: int, lowpass_filter_width: int = 6, rolloff: float = 0.99):
+    """
+    Windowed sinc interpolation kernel for polyphase resampling, for frequencies reduced by their gcd.
+    Kernels are cached, as the same few rates are resampled for every batch.
+    """
+    base_freq = min(orig_freq, new_freq) * rolloff
+    width = math.ceil(lowpass_filter_width * orig_freq / base_freq)
+    idx = torch.arange(-width, width + orig_freq, dtype=torch.float64)[None, None] / orig_freq
+    t = torch.arange(0, -new_freq, -1, dtype=torch.float64)[:, None, None] / new_freq + idx
+    t = (t * base_freq).clamp(-lowpass_filter_width, lowpass_filter_width)
+    window = torch.cos(t * math.pi / lowpass_filter_width / 2) ** 2
+    t = t * math.pi
+    kernel = torch.where(t == 0, torch.ones_like(t), torch.sin(t) / t)
+    return kernel * window * (base_freq / orig_freq), width
+
+
+def sinc_resample(signal: torch.Tensor, orig_sr: int, target_sr: int) -> torch.Tensor:
+    """Band-limited resampling of a batch of signals `[B, T]` from `orig_sr` to `target_sr`.
+
+    Returns `[B, ceil(T * target_sr / orig_sr)]` samples.
+    """
+    gcd = math.gcd(int(orig_sr), int(target_sr))
+    orig_freq, new_freq = int(orig_sr) // gcd, int(target_sr) // gcd
+    if orig_freq == new_freq:
+        return signal
+    kernel, width = _sinc_resample_kernel(orig_freq, new_freq)
+    kernel = kernel.to(device=signal.device, dtype=signal.dtype)
+    num_signals, length = signal.shape
+    padded = torch.nn.functional.pad(signal, (width, width + orig_freq))
+    resampled = torch.nn.functional.conv1d(padded[:, None], kernel, stride=orig_freq)
+    resampled = resampled.transpose(1, 2).reshape(num_signals, -1)
+    return resampled[:, : math.ceil(new_freq * length / orig_freq)]
+
+
+class AudioBank:
+    """
+    Bank of noise or impulse response signals preloaded from the manifest of a per-sample perturbation,
+    stored as a padded tensor.
+
+    Args:
+        perturbation: `NoisePerturbation` or `ImpulsePerturbation` whose manifest (or tarred audio) is sampled.
+        bank_size: number of signals to load.
+        max_duration: if given, signals longer than this many seconds are cropped to a random window.
+        refresh_interval: if given, the bank is reloaded with a new random subset of the signals after this many
+            draws. Otherwise the same `bank_size` signals are used for the whole training, which limits the
+            augmentation diversity for large noise or impulse response sets.
+    """
+
+    def __init__(
+        self,
+        perturbation: Perturbation,
+        bank_size: int = 128,
+        max_duration: Optional[float] = None,
+        refresh_interval: Optional[int] = None,
+    ):
+        if refresh_interval is not None and refresh_interval <= 0:
+            raise ValueError(f"refresh_interval must be positive, got {refresh_interval}")
+        self._perturbation = perturbation
+        self._bank_size = bank_size
+        self._max_duration = max_duration
+        self._refresh_interval = refresh_interval
+        self._num_draws = 0
+        self._sample_rate = None
+        self._signals = None
+        self._lengths = None
+        self._device_cache = {}
+
+    def _load(self, sample_rate: int):
+        p = self._perturbation
+        segments = []
+        for _ in range(self._bank_size):
+            segment = read_one_audiosegment(
+                p._manifest,
+                sample_rate,
+                tarred_audio=p._tarred_audio,
+                audio_dataset=p._data_iterator,
+                noise_bank=p._noise_bank,
+            )
+            samples = segment.samples
+            if samples.ndim > 1:
+                samples = samples[:, 0]
+            if self._max_duration is not None and len(samples) > self._max_duration * sample_rate:
+                crop = int(self._max_duration * sample_rate)
+                start = random.randint(0, len(samples) - crop)
+                samples = samples[start : start + crop]
+            segments.append(samples)
+
+        lengths = [len(samples) for samples in segments]
+        signals = np.zeros((len(segments), max(lengths)), dtype=np.float32)
+        for i, samples in enumerate(segments):
+            signals[i, : len(samples)] = samples
+        logging.info(f"Loaded {len(segments)} signals ({signals.nbytes / 2 ** 20:.1f} MB) into an audio bank")
+        self._signals = torch.from_numpy(signals)
+        self._lengths = torch.tensor(lengths, dtype=torch.long)
+        self._sample_rate = sample_rate
+        self._num_draws = 0
+        self._device_cache = {}
+
+    def get(self, sample_rate: int, device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the bank signals `[N, L]` and their lengths `[N]` at `sample_rate`, on `device`."""
+        refresh = self._refresh_interval is not None and self._num_draws >= self._refresh_interval
+        if self._sample_rate != sample_rate or refresh:
+            self._load(sample_rate)
+        if device not in self._device_cache:
+            self._device_cache[device] = (self._signals.to(device), self._lengths.to(device))
+        return self._device_cache[device]
+
+    def sample(self, batch_size: int, sample_rate: int, device: torch.device) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Draws `batch_size` random signals. Returns the padded signals `[B, L]` and their lengths `[B]`."""
+        signals, lengths = self.get(sample_rate, device)
+        self._num_draws += 1
+        rows = torch.randint(0, len(lengths), (batch_size,)).to(device)
+        lengths = lengths[rows]
+        max_len = max(int(lengths.max()), 1) if batch_size else 1
+        return signals[rows, :max_len], lengths
+
+    def __len__(self):
+        return self._bank_size
+
+
+class BatchedPerturbation(object):
+    """
+    Perturbation applied to a padded batch of single-channel signals.
+
+    `perturb` receives the signals `[B, T]`, their lengths `[B]`, the sample rate, and a boolean mask `[B]`
+    of the rows to perturb, and returns the perturbed signals and lengths. Padding is kept at zero.
+    """
+
+    def max_augmentation_length(self, length):
+        return length
+
+    def perturb(
+        self, signal: torch.Tensor, lengths: torch.Tensor, sample_rate: int, mask: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        raise NotImplementedError
+
+    @classmethod
+    def from_perturbation(cls, perturbation: Perturbation, **kwargs) -> 'BatchedPerturbation':
+        """Builds the batched equivalent of a per-sample perturbation, with the same parameters."""
+        raise NotImplementedError
+
+
+class BatchedGainPerturbation(BatchedPerturbation):
+    """Batched `GainPerturbation`."""
+
+    def __init__(self, min_gain_dbfs=-10, max_gain_dbfs=10):
+        self._min_gain_dbfs = min_gain_dbfs
+        self._max_gain_dbfs = max_gain_dbfs
+
+    @classmethod
+    def from_perturbation(cls, perturbation: GainPerturbation, **kwargs):
+        return cls(perturbation._min_gain_dbfs, perturbation._max_gain_dbfs)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        gain = _uniform(self._min_gain_dbfs, self._max_gain_dbfs, len(signal), signal.device)
+        scale = torch.where(mask, 10.0 ** (gain / 20.0), torch.ones_like(gain))
+        return signal * scale[:, None].to(signal.dtype), lengths
+
+
+class BatchedWhiteNoisePerturbation(BatchedPerturbation):
+    """Batched `WhiteNoisePerturbation`."""
+
+    def __init__(self, min_level=-90, max_level=-46):
+        self.min_level = int(min_level)
+        self.max_level = int(max_level)
+
+    @classmethod
+    def from_perturbation(cls, perturbation: WhiteNoisePerturbation, **kwargs):
+        return cls(perturbation.min_level, perturbation.max_level)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        level_db = torch.randint(self.min_level, self.max_level, (len(signal),)).to(signal.device)
+        scale = torch.where(mask, 10.0 ** (level_db / 20.0), torch.zeros_like(level_db, dtype=torch.float))
+        noise = torch.randn_like(signal) * scale[:, None].to(signal.dtype)
+        return signal + noise * _time_mask(lengths, signal.shape[-1]), lengths
+
+
+class BatchedShiftPerturbation(BatchedPerturbation):
+    """Batched `ShiftPerturbation`."""
+
+    def __init__(self, min_shift_ms=-5.0, max_shift_ms=5.0):
+        self._min_shift_ms = min_shift_ms
+        self._max_shift_ms = max_shift_ms
+
+    @classmethod
+    def from_perturbation(cls, perturbation: ShiftPerturbation, **kwargs):
+        return cls(perturbation._min_shift_ms, perturbation._max_shift_ms)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        shift_ms = _uniform(self._min_shift_ms, self._max_shift_ms, len(signal), signal.device)
+        # rows shifted by more than their duration are left untouched
+        mask = mask & (shift_ms.abs() / 1000 <= lengths / sample_rate)
+        shift = torch.where(mask, torch.div(shift_ms * sample_rate, 1000, rounding_mode='floor'), 0).long()
+        time = torch.arange(signal.shape[-1], device=signal.device)[None, :]
+        index = time + shift[:, None]
+        valid = (index >= 0) & (index < lengths[:, None]) & (time < lengths[:, None])
+        rows = torch.arange(len(signal), device=signal.device)
+        return _gather_rows(signal, rows, index, valid), lengths
+
+
+class BatchedSpeedPerturbation(BatchedPerturbation):
+    """
+    Batched `SpeedPerturbation`, with band-limited sinc resampling of all rows sharing a speed rate at once.
+
+    Target sampling rates are rounded to multiples of `sr / 100`, i.e. 1% speed steps, which keeps the polyphase
+    resampling kernels small.
+    """
+
+    def __init__(self, sr, min_speed_rate=0.9, max_speed_rate=1.1, num_rates=5):
+        self._sr = sr
+        self._min_rate = min_speed_rate
+        self._max_rate = max_speed_rate
+        self._num_rates = num_rates
+        if num_rates > 0:
+            self._rates = np.linspace(self._min_rate, self._max_rate, self._num_rates, endpoint=True)
+
+    @classmethod
+    def from_perturbation(cls, perturbation: SpeedPerturbation, **kwargs):
+        return cls(perturbation._sr, perturbation._min_rate, perturbation._max_rate, perturbation._num_rates)
+
+    def max_augmentation_length(self, length):
+        return length * self._max_rate
+
+    def _sample_target_sr(self, batch_size: int) -> np.ndarray:
+        if self._num_rates < 0:
+            rates = np.random.uniform(self._min_rate, self._max_rate, size=batch_size)
+        else:
+            rates = self._rates[np.random.randint(0, len(self._rates), size=batch_size)]
+        # rows with identity speed rate are not augmented
+        step = max(self._sr // 100, 1)
+        return np.where(rates == 1.0, self._sr, np.round(self._sr * rates / step).astype(np.int64) * step)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        target_sr = self._sample_target_sr(len(signal))
+        target_sr[~mask.cpu().numpy()] = self._sr
+        if np.all(target_sr == self._sr):
+            return signal, lengths
+
+        new_lengths = lengths.clone()
+        resampled = {}
+        for new_sr in np.unique(target_sr[target_sr != self._sr]):
+            rows = torch.from_numpy(np.flatnonzero(target_sr == new_sr)).to(signal.device)
+            group = signal[rows, : int(lengths[rows].max())]
+            resampled[int(new_sr)] = (rows, sinc_resample(group, self._sr, int(new_sr)))
+            new_lengths[rows] = torch.ceil(lengths[rows] * float(new_sr) / self._sr).long()
+
+        max_len = max(int(new_lengths.max()), 1)
+        output = torch.zeros(len(signal), max_len, dtype=signal.dtype, device=signal.device)
+        unchanged = torch.from_numpy(np.flatnonzero(target_sr == self._sr)).to(signal.device)
+        output[unchanged, : min(max_len, signal.shape[-1])] = signal[unchanged, :max_len]
+        for rows, group in resampled.values():
+            output[rows, : group.shape[-1]] = group[:, :max_len]
+        output = output * _time_mask(new_lengths, max_len)
+        return output, new_lengths
+
+
+class BatchedImpulsePerturbation(BatchedPerturbation):
+    """Batched `ImpulsePerturbation`, convolving every row with a random impulse response in the frequency domain."""
+
+    def __init__(self, bank: AudioBank, normalize_impulse=False, shift_impulse=False):
+        self._bank = bank
+        self._normalize_impulse = normalize_impulse
+        self._shift_impulse = shift_impulse
+
+    @classmethod
+    def from_perturbation(
+        cls,
+        perturbation: ImpulsePerturbation,
+        bank_size=128,
+        max_bank_duration=None,
+        bank_refresh_interval=None,
+        **kwargs,
+    ):
+        bank = AudioBank(
+            perturbation, bank_size=bank_size, max_duration=max_bank_duration, refresh_interval=bank_refresh_interval
+        )
+        return cls(bank, perturbation._normalize_impulse, perturbation._shift_impulse)
+
+    def apply(self, signal, lengths, sample_rate):
+        """Convolves all rows of `signal` with random impulse responses."""
+        impulse, impulse_lengths = self._bank.sample(len(signal), sample_rate, signal.device)
+        impulse = impulse.to(signal.dtype)
+        if self._normalize_impulse:
+            # normalize the impulse response to zero mean and amplitude 1
+            impulse_mask = _time_mask(impulse_lengths, impulse.shape[-1])
+            impulse = impulse - impulse.sum(dim=-1, keepdim=True) / impulse_lengths[:, None].clamp(min=1)
+            impulse = impulse * impulse_mask
+            impulse = impulse / impulse.abs().amax(dim=-1, keepdim=True).clamp(min=1e-12)
+
+        convolved = _fft_convolve(signal, impulse)
+
+        # compensate the dominant path propagation delay
+        time = torch.arange(signal.shape[-1], device=signal.device)[None, :]
+        shift = impulse.abs().argmax(dim=-1) if self._shift_impulse else torch.zeros_like(lengths)
+        valid = time < lengths[:, None]
+        rows = torch.arange(len(signal), device=signal.device)
+        output = _gather_rows(
+            convolved, rows, time + shift[:, None], valid & (time + shift[:, None] < convolved.shape[-1])
+        )
+
+        # normalize data samples to [-1,1] after rir convolution to avoid nans with fp16 training
+        return output / output.abs().amax(dim=-1, keepdim=True).clamp(min=1e-12)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        if not mask.any():
+            return signal, lengths
+        rows = torch.nonzero(mask).squeeze(-1)
+        signal = signal.clone()
+        signal[rows] = self.apply(signal[rows], lengths[rows], sample_rate)
+        return signal, lengths
+
+
+class BatchedNoisePerturbation(BatchedPerturbation):
+    """Batched `NoisePerturbation`, mixing every row with a random signal of a noise bank at a random SNR."""
+
+    def __init__(self, bank: AudioBank, min_snr_db=10, max_snr_db=50, max_gain_db=300.0):
+        self._bank = bank
+        self._min_snr_db = min_snr_db
+        self._max_snr_db = max_snr_db
+        self._max_gain_db = max_gain_db
+
+    @classmethod
+    def from_perturbation(
+        cls,
+        perturbation: NoisePerturbation,
+        bank_size=128,
+        max_bank_duration=None,
+        bank_refresh_interval=None,
+        **kwargs,
+    ):
+        bank = AudioBank(
+            perturbation, bank_size=bank_size, max_duration=max_bank_duration, refresh_interval=bank_refresh_interval
+        )
+        return cls(bank, perturbation._min_snr_db, perturbation._max_snr_db, perturbation._max_gain_db)
+
+    def _noise_gain(self, data_rms, noise, noise_lengths):
+        snr_db = _uniform(self._min_snr_db, self._max_snr_db, len(noise), noise.device)
+        noise_gain_db = (data_rms - _rms_db(noise, noise_lengths) - snr_db).clamp(max=self._max_gain_db)
+        return 10.0 ** (noise_gain_db / 20.0)
+
+    def add_background_noise(self, signal, lengths, sample_rate, mask, noise, noise_lengths, data_rms=None):
+        """Batched `NoisePerturbation.perturb_with_input_noise`, with one noise row per signal row."""
+        if data_rms is None:
+            data_rms = _rms_db(signal, lengths)
+        gain = torch.where(mask, self._noise_gain(data_rms, noise, noise_lengths), torch.zeros_like(data_rms))
+
+        # longer noise: random noise window of the signal length, shorter noise: added at a random offset
+        longer = noise_lengths > lengths
+        start_time = torch.rand(len(signal), dtype=torch.float64).to(signal.device) * (noise_lengths - lengths)
+        start = torch.where(longer, torch.round(start_time).long(), 0)
+        offset = (
+            torch.rand(len(signal), dtype=torch.float64).to(signal.device) * (lengths - noise_lengths + 1)
+        ).long()
+        offset = torch.where(longer, 0, offset)
+
+        time = torch.arange(signal.shape[-1], device=signal.device)[None, :]
+        index = time - offset[:, None] + start[:, None]
+        valid = (time >= offset[:, None]) & (index < noise_lengths[:, None]) & (time < lengths[:, None])
+        rows = torch.arange(len(signal), device=signal.device)
+        return signal + _gather_rows(noise, rows, index, valid) * gain[:, None].to(signal.dtype)
+
+    def add_foreground_noise(
+        self, signal, lengths, sample_rate, mask, noise, noise_lengths, data_rms=None, max_noise_dur=2, max_additions=1
+    ):
+        """Batched `NoisePerturbation.perturb_with_foreground_noise`, with one noise row per signal row."""
+        if data_rms is None:
+            data_rms = _rms_db(signal, lengths)
+        gain = torch.where(mask, self._noise_gain(data_rms, noise, noise_lengths), torch.zeros_like(data_rms))
+        num_additions = torch.randint(1, max_additions + 1, (len(signal),)).to(signal.device)
+
+        time = torch.arange(signal.shape[-1], device=signal.device)[None, :]
+        rows = torch.arange(len(signal), device=signal.device)
+        for addition in range(max_additions):
+            noise_dur = _uniform(0.0, max_noise_dur, len(signal), signal.device)
+            start_time = torch.rand(len(signal), dtype=torch.float64).to(signal.device) * noise_lengths / sample_rate
+            start = torch.round(start_time * sample_rate).long()
+            end = torch.round(torch.minimum(noise_lengths / sample_rate, start_time + noise_dur) * sample_rate).long()
+            segment_len = torch.minimum(end - start, lengths)
+            offset = (
+                torch.rand(len(signal), dtype=torch.float64).to(signal.device) * (lengths - segment_len + 1)
+            ).long()
+
+            index = time - offset[:, None] + start[:, None]
+            valid = (time >= offset[:, None]) & (time < (offset + segment_len)[:, None])
+            valid = valid & (num_additions > addition)[:, None]
+            signal = signal + _gather_rows(noise, rows, index, valid) * gain[:, None].to(signal.dtype)
+        return signal
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        if not mask.any():
+            return signal, lengths
+        noise, noise_lengths = self._bank.sample(len(signal), sample_rate, signal.device)
+        signal = self.add_background_noise(signal, lengths, sample_rate, mask, noise.to(signal.dtype), noise_lengths)
+        return signal, lengths
+
+
+class BatchedRirAndNoisePerturbation(BatchedPerturbation):
+    """
+    Batched `RirAndNoisePerturbation`.
+
+    Per-sample original sampling rates are not known after collation, so noise is drawn from the noise set
+    with the highest original sampling rate, which is the fallback of `RirAndNoisePerturbation` as well.
+    """
+
+    def __init__(
+        self,
+        rir_perturber: BatchedImpulsePerturbation,
+        rir_prob=0.5,
+        fg_noise_perturber: Optional[BatchedNoisePerturbation] = None,
+        noise_prob=1.0,
+        max_additions=5,
+        max_duration=2.0,
+        bg_noise_perturber: Optional[BatchedNoisePerturbation] = None,
+        bg_noise_prob=1.0,
+        apply_noise_rir=False,
+    ):
+        self._rir_perturber = rir_perturber
+        self._rir_prob = rir_prob
+        self._fg_noise_perturber = fg_noise_perturber
+        self._noise_prob = noise_prob
+        self._max_additions = max_additions
+        self._max_duration = max_duration
+        self._bg_noise_perturber = bg_noise_perturber
+        self._bg_noise_prob = bg_noise_prob
+        self._apply_noise_rir = apply_noise_rir
+
+    @classmethod
+    def from_perturbation(cls, perturbation: RirAndNoisePerturbation, **kwargs):
+        def noise_perturber(perturbers):
+            if perturbers is None:
+                return None
+            return BatchedNoisePerturbation.from_perturbation(perturbers[max(perturbers.keys())], **kwargs)
+
+        return cls(
+            rir_perturber=BatchedImpulsePerturbation.from_perturbation(perturbation._rir_perturber, **kwargs),
+            rir_prob=perturbation._rir_prob,
+            fg_noise_perturber=noise_perturber(perturbation._fg_noise_perturbers),
+            noise_prob=perturbation._noise_prob,
+            max_additions=perturbation._max_additions,
+            max_duration=perturbation._max_duration,
+            bg_noise_perturber=noise_perturber(perturbation._bg_noise_perturbers),
+            bg_noise_prob=perturbation._bg_noise_prob,
+            apply_noise_rir=perturbation._apply_noise_rir,
+        )
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        def sample_mask(prob):
+            return mask & (torch.rand(len(signal)).to(signal.device) < prob)
+
+        signal, lengths = self._rir_perturber.perturb(signal, lengths, sample_rate, sample_mask(self._rir_prob))
+        data_rms = _rms_db(signal, lengths)
+
+        if self._fg_noise_perturber is not None:
+            fg_mask = sample_mask(self._noise_prob)
+            noise, noise_lengths = self._fg_noise_perturber._bank.sample(len(signal), sample_rate, signal.device)
+            noise = noise.to(signal.dtype)
+            if self._apply_noise_rir:
+                noise = self._rir_perturber.apply(noise, noise_lengths, sample_rate)
+            signal = self._fg_noise_perturber.add_foreground_noise(
+                signal,
+                lengths,
+                sample_rate,
+                fg_mask,
+                noise,
+                noise_lengths,
+                data_rms=data_rms,
+                max_noise_dur=self._max_duration,
+                max_additions=self._max_additions,
+            )
+
+        if self._bg_noise_perturber is not None:
+            bg_mask = sample_mask(self._bg_noise_prob)
+            noise, noise_lengths = self._bg_noise_perturber._bank.sample(len(signal), sample_rate, signal.device)
+            signal = self._bg_noise_perturber.add_background_noise(
+                signal, lengths, sample_rate, bg_mask, noise.to(signal.dtype), noise_lengths, data_rms=data_rms
+            )
+        return signal, lengths
+
+
+class PerSamplePerturbation(BatchedPerturbation):
+    """
+    Applies a per-sample `Perturbation` to every selected row on CPU, for perturbations without a batched
+    implementation (e.g. `TranscodePerturbation`, which runs `sox`).
+    """
+
+    def __init__(self, perturbation: Perturbation):
+        self._perturbation = perturbation
+
+    @classmethod
+    def from_perturbation(cls, perturbation: Perturbation, **kwargs):
+        return cls(perturbation)
+
+    def max_augmentation_length(self, length):
+        return self._perturbation.max_augmentation_length(length)
+
+    def perturb(self, signal, lengths, sample_rate, mask):
+        rows = torch.nonzero(mask).squeeze(-1).tolist()
+        if not rows:
+            return signal, lengths
+
+        signal_cpu = signal.detach().float().cpu().numpy()
+        outputs = {}
+        for row in rows:
+            segment = AudioSegment(signal_cpu[row, : int(lengths[row])].copy(), sample_rate)
+            self._perturbation.perturb(segment)
+            outputs[row] = torch.as_tensor(segment._samples, dtype=signal.dtype)
+
+        new_lengths = lengths.clone()
+        for row, samples in outputs.items():
+            new_lengths[row] = len(samples)
+        max_len = max(int(new_lengths.max()), 1)
+        output = torch.zeros(len(signal), max_len, dtype=signal.dtype, device=signal.device)
+        output[:, : min(max_len, signal.shape[-1])] = signal[:, :max_len]
+        for row, samples in outputs.items():
+            output[row] = 0
+            output[row, : len(samples)] = samples.to(signal.device)
+        return output, new_lengths
+
+
+batched_perturbation_types = {
+    SpeedPerturbation: BatchedSpeedPerturbation,
+    GainPerturbation: BatchedGainPerturbation,
+    ImpulsePerturbation: BatchedImpulsePerturbation,
+    ShiftPerturbation: BatchedShiftPerturbation,
+    NoisePerturbation: BatchedNoisePerturbation,
+    WhiteNoisePerturbation: BatchedWhiteNoisePerturbation,
+    RirAndNoisePerturbation: BatchedRirAndNoisePerturbation,
+}
+
+
+def register_batched_perturbation(perturbation: type, batched_perturbation: type):
+    """Registers the batched implementation of a per-sample perturbation type."""
+    if perturbation in batched_perturbation_types:
+        raise KeyError(
+            f"Batched perturbation for {perturbation.__name__} exists: {batched_perturbation_types[perturbation]}."
+        )
+    batched_perturbation_types[perturbation] = batched_perturbation
+
+
+class BatchedAudioAugmentor(object):
+    """
+    Applies a list of `(prob, BatchedPerturbation)` to a padded batch of signals. As in `AudioAugmentor`,
+    every perturbation is applied to each row independently with probability `prob`.
+    """
+
+    def __init__(self, perturbations: Optional[List[Tuple[float, BatchedPerturbation]]] = None):
+        self._pipeline = perturbations if perturbations is not None else []
+
+    def perturb(
+        self, signal: torch.Tensor, lengths: torch.Tensor, sample_rate: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            signal: padded single-channel signals `[B, T]`.
+            lengths: number of valid samples of each signal `[B]`.
+            sample_rate: sample rate of the signals.
+
+        Returns:
+            Perturbed signals, possibly padded to a different length, and their lengths.
+        """
+        if signal.dim() != 2:
+            raise ValueError(f"Expected signal with shape [B, T], got {tuple(signal.shape)}")
+        lengths = lengths.to(signal.device).long()
+        signal = signal * _time_mask(lengths, signal.shape[-1])
+        with torch.no_grad():
+            for prob, p in self._pipeline:
+                mask = torch.rand(len(signal)).to(signal.device) < prob
+                if mask.any():
+                    signal, lengths = p.perturb(signal, lengths, sample_rate, mask)
+        return signal, lengths
+
+    def max_augmentation_length(self, length):
+        newlen = length
+        for prob, p in self._pipeline:
+            newlen = p.max_augmentation_length(newlen)
+        return newlen
+
+    @classmethod
+    def from_augmentor(
+        cls,
+        augmentor: AudioAugmentor,
+        bank_size: int = 128,
+        max_bank_duration: Optional[float] = None,
+        bank_refresh_interval: Optional[int] = None,
+        bank_configs: Optional[List[Dict]] = None,
+    ):
+        """
+        Builds the batched equivalent of an `AudioAugmentor`.
+
+        Args:
+            augmentor: per-sample augmentor, e.g. from `process_augmentations`.
+            bank_size: number of signals preloaded for each noise or impulse response manifest.
+            max_bank_duration: if given, bank signals are cropped to this many seconds.
+            bank_refresh_interval: if given, banks are reloaded with new random signals after this many draws.
+            bank_configs: optional per-perturbation overrides of the above arguments, one dict for each
+                perturbation of the augmentor pipeline.
+        """
+        if bank_configs is not None and len(bank_configs) != len(augmentor._pipeline):
+            raise ValueError(
+                f"Got {len(bank_configs)} audio bank configs for {len(augmentor._pipeline)} perturbations"
+            )
+        perturbations = []
+        for idx, (prob, p) in enumerate(augmentor._pipeline):
+            batched_type = batched_perturbation_types.get(type(p), PerSamplePerturbation)
+            if batched_type is PerSamplePerturbation:
+                logging.info(f"No batched implementation of {type(p).__name__}, it will be applied per sample on CPU")
+            bank_config = dict(
+                bank_size=bank_size, max_bank_duration=max_bank_duration, bank_refresh_interval=bank_refresh_interval
+            )
+            if bank_configs is not None:
+                bank_config.update(bank_configs[idx])
+            perturbations.append((prob, batched_type.from_perturbation(p, **bank_config)))
+        return cls(perturbations=perturbations)
+
+
+def process_batched_augmentations(
+    augmenter,
+    global_rank=0,
+    world_size=1,
+    bank_size: int = 128,
+    max_bank_duration: Optional[float] = None,
+    bank_refresh_interval: Optional[int] = None,
+) -> Optional[BatchedAudioAugmentor]:
+    """
+    Batched counterpart of `process_augmentations`. Accepts the same augmentation configs (or an
+    `AudioAugmentor`) and returns a `BatchedAudioAugmentor` to apply to collated batches.
+
+    The config of each perturbation may additionally set `bank_size`, `max_bank_duration` and
+    `bank_refresh_interval`, which override the arguments of the same name for the audio bank of that perturbation.
+    """
+    if isinstance(augmenter, BatchedAudioAugmentor):
+        return augmenter
+    bank_configs = None
+    if isinstance(augmenter, (dict, DictConfig)):
+        if isinstance(augmenter, DictConfig):
+            augmenter = OmegaConf.to_container(augmenter, resolve=True)
+        augmenter = copy.deepcopy(augmenter)
+        bank_configs = [
+            {key: augment_kwargs.pop(key) for key in AUDIO_BANK_CONFIG_KEYS if key in augment_kwargs}
+            for augment_kwargs in augmenter.values()
+        ]
+    augmenter = process_augmentations(augmenter, global_rank=global_rank, world_size=world_size)
+    if augmenter is None:
+        return None
+    return BatchedAudioAugmentor.from_augmentor(
+        augmenter,
+        bank_size=bank_size,
+        max_bank_duration=max_bank_duration,
+        bank_refresh_interval=bank_refresh_interval,
+        bank_configs=bank_configs,
+    )
@@ -0,0 +1,287 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory-mapped noise and room impulse response banks.
+
+`NoisePerturbation` and `ImpulsePerturbation` decode a random audio file for every augmented utterance.
+A noise bank decodes all signals of a manifest once, resampled to the target sample rate, into a single
+float16 array with an offset index:
+
+    <bank_dir>/noise-bank-<sha1(manifests, sample_rate)>/
+        meta.json
+        audio.f16       # concatenated signals
+        offsets.npy     # int64, signal i is audio[offsets[i]:offsets[i + 1]]
+
+The arrays are memory-mapped, so the bank is shared by all dataloader workers through the page cache and
+audio decoding disappears from the augmentation hot path. Banks are written to a temporary directory and
+atomically renamed; `meta.json` marks a complete bank.
+
+A `<bank>.lock` file records the host and PID of the process building a bank, and its modification time is
+refreshed while the bank is being built. Locks of dead processes on the same host, or locks which have not been
+refreshed for `stale_lock_timeout` seconds, are removed by waiting processes, so a crashed builder does not block
+them.
+"""
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from os.path import expanduser
+from typing import Dict, List, Union
+
+import numpy as np
+
+from nemo.collections.asr.parts.preprocessing.segment import AudioSegment
+from nemo.collections.common.parts.preprocessing import collections, parsers
+from nemo.collections.common.parts.preprocessing.manifest_cache import is_cached, manifest_fingerprint
+from nemo.utils import logging
+
+__all__ = ['CompiledNoiseBank', 'NoiseBank', 'build_noise_bank', 'get_noise_bank_path']
+
+NOISE_BANK_VERSION = 1
+
+# seconds between refreshes of the modification time of the lock of a bank being built
+LOCK_HEARTBEAT_INTERVAL = 10.0
+
+
+def get_noise_bank_path(bank_dir: str, manifest_path: Union[str, List[str]], sample_rate: int) -> str:
+    """Returns the directory of the bank of the signals in `manifest_path` at `sample_rate`."""
+    key = hashlib.sha1(
+        f'{NOISE_BANK_VERSION}:{manifest_fingerprint(manifest_path)}:{sample_rate}'.encode('utf-8')
+    ).hexdigest()
+    return os.path.join(expanduser(bank_dir), f'noise-bank-{key}')
+
+
+def build_noise_bank(manifest_path: Union[str, List[str]], sample_rate: int, path: str):
+    """
+    Decodes all signals of `manifest_path` at `sample_rate` and writes them as a bank to `path`.
+    If another process finished writing the same bank first, the freshly written copy is discarded.
+    """
+    manifest = collections.ASRAudioText(manifest_path, parser=parsers.make_parser([]))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex}'
+    os.makedirs(tmp_path)
+    try:
+        offsets = [0]
+        with open(os.path.join(tmp_path, 'audio.f16'), 'wb') as f:
+            for entry in manifest:
+                offset = 0 if entry.offset is None else entry.offset
+                duration = 0 if entry.duration is None else entry.duration
+                segment = AudioSegment.from_file(
+                    entry.audio_file, target_sr=sample_rate, offset=offset, duration=duration
+                )
+                if segment.num_channels > 1:
+                    raise ValueError(f"Noise banks only support single-channel audio, got {entry.audio_file}")
+                f.write(segment.samples.astype(np.float16).tobytes())
+                offsets.append(offsets[-1] + segment.num_samples)
+        np.save(os.path.join(tmp_path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64))
+        meta = dict(version=NOISE_BANK_VERSION, sample_rate=sample_rate, num_signals=len(offsets) - 1)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        logging.info(f"Built noise bank {path} with {len(offsets) - 1} signals ({offsets[-1] * 2 / 2 ** 20:.1f} MB)")
+        os.rename(tmp_path, path)
+    except OSError:
+        if not is_cached(path):
+            raise
+        logging.info(f"Noise bank {path} was written by another process, discarding local copy")
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _try_lock(lock_path: str) -> bool:
+    """Creates the lock file with the host and PID of the current process. Returns False if it already exists."""
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as f:
+        json.dump(dict(host=socket.gethostname(), pid=os.getpid()), f)
+    return True
+
+
+def _remove_lock(lock_path: str):
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_stale_lock(lock_path: str, stale_lock_timeout: float) -> bool:
+    """Returns True if the owner of the lock died on this host, or the lock was not refreshed in time."""
+    try:
+        mtime = os.path.getmtime(lock_path)
+        with open(lock_path, 'r') as f:
+            owner = json.load(f)
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # the owner is still writing the lock, or it was created by an older version
+        owner = {}
+    if isinstance(owner, dict) and owner.get('host') == socket.gethostname() and 'pid' in owner:
+        if not _pid_alive(owner['pid']):
+            return True
+    return time.time() - mtime > stale_lock_timeout
+
+
+@contextmanager
+def _lock_heartbeat(lock_path: str, interval: float = LOCK_HEARTBEAT_INTERVAL):
+    """Refreshes the modification time of `lock_path` every `interval` seconds in a background thread."""
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(interval):
+            try:
+                os.utime(lock_path)
+            except FileNotFoundError:
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+class CompiledNoiseBank:
+    """Memory-mapped signals of a noise bank at a single sample rate."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.sample_rate = self.meta['sample_rate']
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        if self.offsets[-1] > 0:
+            self.audio = np.memmap(os.path.join(path, 'audio.f16'), dtype=np.float16, mode='r')
+        else:
+            self.audio = np.zeros(0, dtype=np.float16)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        """Returns a float16 view of signal `idx`."""
+        return self.audio[self.offsets[idx] : self.offsets[idx + 1]]
+
+    def read_one_audiosegment(self) -> AudioSegment:
+        """Returns a random signal of the bank."""
+        samples = self[random.randrange(len(self))]
+        return AudioSegment(samples.astype(np.float32), self.sample_rate)
+
+    def __reduce__(self):
+        # re-open the memory maps instead of pickling their content
+        return (CompiledNoiseBank, (self.path,))
+
+
+class NoiseBank:
+    """
+    Noise or impulse response bank of the signals of a manifest, compiled on first use at every requested
+    sample rate.
+
+    Only one process builds a missing bank, other processes wait for its completion marker and memory-map
+    the result. If the builder died, its lock is detected as stale and another process takes over. If the bank
+    does not appear within `timeout` seconds, it is built locally.
+
+    Args:
+        manifest_path: manifest file(s) with the paths of the noise or impulse response files.
+        bank_dir: directory where compiled banks are stored.
+        timeout: seconds to wait for a bank being built by another process.
+        stale_lock_timeout: seconds after which the lock of a builder which stopped refreshing it is removed.
+            Must be larger than `LOCK_HEARTBEAT_INTERVAL`.
+    """
+
+    def __init__(
+        self,
+        manifest_path: Union[str, List[str]],
+        bank_dir: str,
+        timeout: float = 3600.0,
+        stale_lock_timeout: float = 120.0,
+    ):
+        if stale_lock_timeout <= LOCK_HEARTBEAT_INTERVAL:
+            raise ValueError(
+                f"stale_lock_timeout must be larger than {LOCK_HEARTBEAT_INTERVAL}s, got {stale_lock_timeout}"
+            )
+        self._manifest_path = manifest_path
+        self._bank_dir = bank_dir
+        self._timeout = timeout
+        self._stale_lock_timeout = stale_lock_timeout
+        self._banks: Dict[int, CompiledNoiseBank] = {}
+
+    def get(self, sample_rate: int) -> CompiledNoiseBank:
+        """Returns the bank at `sample_rate`, loading or building it if needed."""
+        if sample_rate not in self._banks:
+            path = get_noise_bank_path(self._bank_dir, self._manifest_path, sample_rate)
+            if not is_cached(path):
+                self._build(path, sample_rate)
+            self._banks[sample_rate] = CompiledNoiseBank(path)
+        return self._banks[sample_rate]
+
+    def _build(self, path: str, sample_rate: int, poll_interval: float = 1.0):
+        lock_path = f'{path}.lock'
+        os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+        deadline = time.monotonic() + self._timeout
+        waiting = False
+        while not is_cached(path):
+            if _try_lock(lock_path):
+                try:
+                    # the previous owner may have completed the bank right before releasing the lock
+                    if not is_cached(path):
+                        with _lock_heartbeat(lock_path):
+                            build_noise_bank(self._manifest_path, sample_rate, path)
+                finally:
+                    _remove_lock(lock_path)
+                return
+
+            if _is_stale_lock(lock_path, self._stale_lock_timeout):
+                logging.warning(f"Removing stale lock {lock_path} of noise bank {path}")
+                _remove_lock(lock_path)
+                continue
+
+            if time.monotonic() > deadline:
+                logging.warning(f"Timed out after {self._timeout}s waiting for noise bank {path}, building it locally")
+                build_noise_bank(self._manifest_path, sample_rate, path)
+                return
+
+            if not waiting:
+                logging.info(f"Waiting for noise bank {path} to be built by another process")
+                waiting = True
+            time.sleep(poll_interval)
+
+    def read_one_audiosegment(self, target_sr: int) -> AudioSegment:
+        """Returns a random signal at `target_sr`, as `read_one_audiosegment` of the manifest would."""
+        return self.get(target_sr).read_one_audiosegment()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_banks'] = {}
+        return state
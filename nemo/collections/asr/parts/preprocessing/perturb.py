@@ -46,6 +46,7 @@ import numpy as np
 import soundfile as sf
 from scipy import signal
 
+from nemo.collections.asr.parts.preprocessing.noise_bank import NoiseBank
 from nemo.collections.asr.parts.preprocessing.segment import AudioSegment
 from nemo.collections.common.parts.preprocessing import collections, parsers
 from nemo.core.classes import IterableDataset
@@ -70,7 +71,10 @@ except (ImportError, ModuleNotFoundError):
     HAVE_NUMBA = False
 
 
-def read_one_audiosegment(manifest, target_sr, tarred_audio=False, audio_dataset=None):
+def read_one_audiosegment(manifest, target_sr, tarred_audio=False, audio_dataset=None, noise_bank=None):
+    if noise_bank is not None:
+        return noise_bank.read_one_audiosegment(target_sr)
+
     if tarred_audio:
         if audio_dataset is None:
             raise TypeError("Expected augmentation dataset but got None")
@@ -88,6 +92,14 @@ def read_one_audiosegment(manifest, target_sr, tarred_audio=False, audio_dataset
     return AudioSegment.from_file(audio_file, target_sr=target_sr, offset=offset, duration=duration)
 
 
+def _make_noise_bank(manifest_path, audio_tar_filepaths, bank_dir, bank_timeout=3600.0) -> Optional[NoiseBank]:
+    if bank_dir is None:
+        return None
+    if audio_tar_filepaths:
+        raise ValueError("Noise banks are built from manifests of audio files and cannot be used with tarred audio")
+    return NoiseBank(manifest_path, bank_dir, timeout=bank_timeout)
+
+
 class Perturbation(object):
     def max_augmentation_length(self, length):
         return length
@@ -343,6 +355,9 @@ class ImpulsePerturbation(Perturbation):
         normalize_impulse (bool): Normalize impulse response to zero mean and amplitude 1
         shift_impulse (bool): Shift impulse response to adjust for delay at the beginning
         rng (int): Random seed. Default is None
+        bank_dir (str): If given, RIRs are decoded once into a memory-mapped bank stored in this directory
+            (see `NoiseBank`) instead of being read from disk for every sample. Not supported with tarred audio.
+        bank_timeout (float): Seconds to wait for a bank being built by another process
     """
 
     def __init__(
@@ -353,6 +368,8 @@ class ImpulsePerturbation(Perturbation):
         normalize_impulse=False,
         shift_impulse=False,
         rng=None,
+        bank_dir=None,
+        bank_timeout=3600.0,
     ):
         self._manifest = collections.ASRAudioText(manifest_path, parser=parsers.make_parser([]), index_by_file_id=True)
         self._audiodataset = None
@@ -360,6 +377,7 @@ class ImpulsePerturbation(Perturbation):
         self._normalize_impulse = normalize_impulse
         self._shift_impulse = shift_impulse
         self._data_iterator = None
+        self._noise_bank = _make_noise_bank(manifest_path, audio_tar_filepaths, bank_dir, bank_timeout)
 
         if audio_tar_filepaths:
             self._tarred_audio = True
@@ -371,7 +389,11 @@ class ImpulsePerturbation(Perturbation):
 
     def perturb(self, data):
         impulse = read_one_audiosegment(
-            self._manifest, data.sample_rate, tarred_audio=self._tarred_audio, audio_dataset=self._data_iterator,
+            self._manifest,
+            data.sample_rate,
+            tarred_audio=self._tarred_audio,
+            audio_dataset=self._data_iterator,
+            noise_bank=self._noise_bank,
         )
 
         # normalize if necessary
@@ -446,6 +468,9 @@ class NoisePerturbation(Perturbation):
         shuffle_n (int): Shuffle parameter for shuffling buffered files from the tar files
         orig_sr (int): Original sampling rate of the noise files
         rng (int): Random seed. Default is None
+        bank_dir (str): If given, noise files are decoded once into a memory-mapped bank stored in this directory
+            (see `NoiseBank`) instead of being read from disk for every sample. Not supported with tarred audio.
+        bank_timeout (float): Seconds to wait for a bank being built by another process
     """
 
     def __init__(
@@ -458,12 +483,15 @@ class NoisePerturbation(Perturbation):
         audio_tar_filepaths=None,
         shuffle_n=100,
         orig_sr=16000,
+        bank_dir=None,
+        bank_timeout=3600.0,
     ):
         self._manifest = collections.ASRAudioText(manifest_path, parser=parsers.make_parser([]), index_by_file_id=True)
         self._audiodataset = None
         self._tarred_audio = False
         self._orig_sr = orig_sr
         self._data_iterator = None
+        self._noise_bank = _make_noise_bank(manifest_path, audio_tar_filepaths, bank_dir, bank_timeout)
 
         if audio_tar_filepaths:
             self._tarred_audio = True
@@ -483,7 +511,11 @@ class NoisePerturbation(Perturbation):
 
     def get_one_noise_sample(self, target_sr):
         return read_one_audiosegment(
-            self._manifest, target_sr, tarred_audio=self._tarred_audio, audio_dataset=self._data_iterator
+            self._manifest,
+            target_sr,
+            tarred_audio=self._tarred_audio,
+            audio_dataset=self._data_iterator,
+            noise_bank=self._noise_bank,
         )
 
     def perturb(self, data, ref_mic=0):
@@ -492,9 +524,7 @@ class NoisePerturbation(Perturbation):
             data (AudioSegment): audio data
             ref_mic (int): reference mic index for scaling multi-channel audios
         """
-        noise = read_one_audiosegment(
-            self._manifest, data.sample_rate, tarred_audio=self._tarred_audio, audio_dataset=self._data_iterator,
-        )
+        noise = self.get_one_noise_sample(data.sample_rate)
         self.perturb_with_input_noise(data, noise, ref_mic=ref_mic)
 
     def perturb_with_input_noise(self, data, noise, data_rms=None, ref_mic=0):
@@ -855,6 +885,9 @@ class RirAndNoisePerturbation(Perturbation):
             bg_noise_tar_filepaths: Tar files, if noise files are tarred
             bg_orig_sample_rate: Original sampling rate of background noise audio
             rng: Random seed. Default is None
+            bank_dir: If given, RIRs and noise files are decoded once into memory-mapped banks stored in this
+                directory (see `NoiseBank`). Only used for sources which are not tarred.
+            bank_timeout: Seconds to wait for a bank being built by another process
 
     """
 
@@ -880,6 +913,8 @@ class RirAndNoisePerturbation(Perturbation):
         bg_noise_tar_filepaths=None,
         bg_orig_sample_rate=None,
         rng=None,
+        bank_dir=None,
+        bank_timeout=3600.0,
     ):
 
         self._rir_prob = rir_prob
@@ -891,6 +926,8 @@ class RirAndNoisePerturbation(Perturbation):
             audio_tar_filepaths=rir_tar_filepaths,
             shuffle_n=rir_shuffle_n,
             shift_impulse=True,
+            bank_dir=None if rir_tar_filepaths else bank_dir,
+            bank_timeout=bank_timeout,
         )
         self._fg_noise_perturbers = None
         self._bg_noise_perturbers = None
@@ -907,6 +944,8 @@ class RirAndNoisePerturbation(Perturbation):
                     max_snr_db=max_snr_db[i],
                     audio_tar_filepaths=noise_tar_filepaths[i],
                     orig_sr=orig_sr,
+                    bank_dir=None if noise_tar_filepaths[i] else bank_dir,
+                    bank_timeout=bank_timeout,
                 )
         self._max_additions = max_additions
         self._max_duration = max_duration
@@ -923,6 +962,8 @@ class RirAndNoisePerturbation(Perturbation):
                     max_snr_db=bg_max_snr_db[i],
                     audio_tar_filepaths=bg_noise_tar_filepaths[i],
                     orig_sr=orig_sr,
+                    bank_dir=None if bg_noise_tar_filepaths[i] else bank_dir,
+                    bank_timeout=bank_timeout,
                 )
 
         self._apply_noise_rir = apply_noise_rir
@@ -0,0 +1,413 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched CTC prefix beam search with an optional token-level n-gram language model.
+
+All utterances and all beams of a batch are expanded together with tensor operations, so no external
+decoder package is needed and the throughput scales with the batch size.
+
+The language model is an ARPA file over the tokens of the acoustic model, e.g. the intermediate ARPA file
+written by ``scripts/asr_language_modeling/ngram_lm/train_kenlm.py`` with ``preserve_arpa=True``.
+It is compiled into flat arrays:
+
+    offsets     # int64 [S + 1], n-grams continuing state s are entries offsets[s]:offsets[s + 1]
+    tokens      # int64 [E], last token of the n-gram
+    logprobs    # float32 [E], natural log probability of the n-gram
+    next_states # int64 [E], state reached after the n-gram
+    backoffs    # float32 [S], natural log backoff weight of the state
+    parents     # int64 [S], state of the longest proper suffix of the context
+
+where a state is an n-gram context of at most `order - 1` tokens, and state 0 is the empty context.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from nemo.utils import logging
+
+__all__ = ['TokenNGramLM', 'batched_ctc_prefix_beam_search']
+
+# prefix hashes are updated as hash * _HASH_MULTIPLIER + token + 1 (int64 overflow wraps around)
+_HASH_MULTIPLIER = 1000003
+
+# log10 probability KenLM assigns to unknown words if the ARPA file has no <unk> entry
+_DEFAULT_UNK_LOG10_PROB = -100.0
+
+
+class TokenNGramLM:
+    """
+    Token-level n-gram language model compiled from an ARPA file for batched scoring.
+
+    The label space of the model is `[0, vocab_size)` for the tokens of the acoustic model (without blank),
+    and `vocab_size` for the end of sentence symbol `</s>`. N-grams with symbols outside of `symbol_map`
+    are dropped.
+
+    Args:
+        offsets, tokens, logprobs, next_states, backoffs, parents: compiled arrays, see module docstring.
+        unigrams: float32 [vocab_size + 1], natural log unigram probabilities (the row of the empty context).
+        unigram_next_states: int64 [vocab_size + 1], states reached after every token from the empty context.
+        bos_state: state of the start of sentence context `<s>`.
+        order: order of the n-gram model.
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        tokens: np.ndarray,
+        logprobs: np.ndarray,
+        next_states: np.ndarray,
+        backoffs: np.ndarray,
+        parents: np.ndarray,
+        unigrams: np.ndarray,
+        unigram_next_states: np.ndarray,
+        bos_state: int,
+        order: int,
+    ):
+        self.order = order
+        self.bos_state = bos_state
+        self.vocab_size = len(unigrams) - 1
+        self.eos_id = self.vocab_size
+        self.num_states = len(backoffs)
+        self._arrays = dict(
+            offsets=torch.from_numpy(offsets),
+            tokens=torch.from_numpy(tokens),
+            logprobs=torch.from_numpy(logprobs),
+            next_states=torch.from_numpy(next_states),
+            backoffs=torch.from_numpy(backoffs),
+            parents=torch.from_numpy(parents),
+            unigrams=torch.from_numpy(unigrams),
+            unigram_next_states=torch.from_numpy(unigram_next_states),
+        )
+        self._device_arrays = {}
+
+    @classmethod
+    def from_arpa(cls, arpa_path: str, symbol_map: Dict[str, int]) -> 'TokenNGramLM':
+        """
+        Reads a token-level ARPA file.
+
+        Args:
+            arpa_path: path to the ARPA file.
+            symbol_map: maps the symbols of the ARPA file to the token ids of the acoustic model,
+                in `[0, len(symbol_map))`.
+        """
+        vocab_size = len(symbol_map)
+        eos_id, bos_id = vocab_size, vocab_size + 1
+        ids = dict(symbol_map)
+        ids['</s>'] = eos_id
+        ids['<s>'] = bos_id
+
+        ngrams = {}  # tuple of ids -> (ln prob, ln backoff)
+        order = 0
+        unk_logprob = _DEFAULT_UNK_LOG10_PROB * math.log(10)
+        num_dropped = 0
+        current_order = None
+        with open(arpa_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('\\'):
+                    current_order = int(line[1:].split('-')[0]) if line.endswith('-grams:') else None
+                    order = max(order, current_order or 0)
+                    continue
+                if current_order is None:
+                    continue
+                fields = line.split()
+                logprob = float(fields[0]) * math.log(10)
+                words = fields[1 : 1 + current_order]
+                backoff = float(fields[1 + current_order]) * math.log(10) if len(fields) > 1 + current_order else 0.0
+                if current_order == 1 and words[0] == '<unk>':
+                    unk_logprob = logprob
+                    continue
+                if any(word not in ids for word in words):
+                    num_dropped += 1
+                    continue
+                ngrams[tuple(ids[word] for word in words)] = (logprob, backoff)
+
+        if order == 0:
+            raise ValueError(f"No n-grams found in ARPA file {arpa_path}")
+        if num_dropped > 0:
+            logging.warning(f"Dropped {num_dropped} n-grams with symbols outside of the vocabulary from {arpa_path}")
+
+        # contexts of at most order - 1 tokens are states, state 0 is the empty context
+        states = {(): 0}
+        for ngram in ngrams:
+            for length in range(1, min(len(ngram), order - 1) + 1):
+                # prefixes of n-grams are contexts even if the ARPA file misses them
+                if ngram[:length] not in states and ngram[length - 1] != eos_id:
+                    states[ngram[:length]] = len(states)
+
+        def longest_state(context: Tuple[int, ...]) -> int:
+            for start in range(max(0, len(context) - (order - 1)), len(context)):
+                if context[start:] in states:
+                    return states[context[start:]]
+            return 0
+
+        num_states = len(states)
+        backoffs = np.zeros(num_states, dtype=np.float32)
+        parents = np.zeros(num_states, dtype=np.int64)
+        for context, state in states.items():
+            if context:
+                backoffs[state] = ngrams.get(context, (0.0, 0.0))[1]
+                parents[state] = longest_state(context[1:])
+
+        unigrams = np.full(vocab_size + 1, unk_logprob, dtype=np.float32)
+        entry_states, entry_tokens, entry_logprobs, entry_next_states = [], [], [], []
+        for ngram, (logprob, _) in ngrams.items():
+            if ngram[-1] == bos_id or (len(ngram) > 1 and ngram[:-1] not in states):
+                continue
+            if len(ngram) == 1:
+                unigrams[ngram[0]] = logprob
+                continue
+            entry_states.append(states[ngram[:-1]])
+            entry_tokens.append(ngram[-1])
+            entry_logprobs.append(logprob)
+            entry_next_states.append(0 if ngram[-1] == eos_id else longest_state(ngram))
+
+        entry_states = np.asarray(entry_states, dtype=np.int64)
+        entry_tokens = np.asarray(entry_tokens, dtype=np.int64)
+        sort_idx = np.lexsort((entry_tokens, entry_states))
+        offsets = np.zeros(num_states + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_states, minlength=num_states), out=offsets[1:])
+
+        lm = cls(
+            offsets=offsets,
+            tokens=entry_tokens[sort_idx],
+            logprobs=np.asarray(entry_logprobs, dtype=np.float32)[sort_idx],
+            next_states=np.asarray(entry_next_states, dtype=np.int64)[sort_idx],
+            backoffs=backoffs,
+            parents=parents,
+            unigrams=unigrams,
+            unigram_next_states=np.asarray(
+                [longest_state((token,)) for token in range(vocab_size)] + [0], dtype=np.int64
+            ),
+            bos_state=states.get((bos_id,), 0),
+            order=order,
+        )
+        logging.info(
+            f"Loaded {order}-gram token LM from {arpa_path} with {num_states} states and {len(ngrams)} n-grams"
+        )
+        return lm
+
+    def _get_arrays(self, device: torch.device) -> Dict[str, torch.Tensor]:
+        if device not in self._device_arrays:
+            self._device_arrays[device] = {name: array.to(device) for name, array in self._arrays.items()}
+        return self._device_arrays[device]
+
+    def score_all(self, states: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Scores all continuations of a batch of states.
+
+        Args:
+            states: int64 tensor of shape [N] with LM states.
+
+        Returns:
+            A tuple of a float tensor [N, vocab_size + 1] with the natural log probabilities of every token
+            (and `</s>` in the last column) following the states, and an int64 tensor [N, vocab_size + 1] with
+            the states reached after every token.
+        """
+        arrays = self._get_arrays(states.device)
+        # beams frequently share states, every state is scored only once
+        unique_states, inverse = torch.unique(states, return_inverse=True)
+        num_unique, num_labels = unique_states.shape[0], self.vocab_size + 1
+
+        scores = torch.full((num_unique, num_labels), float('nan'), device=states.device)
+        next_states = arrays['unigram_next_states'].expand(num_unique, -1).clone()
+        accumulated_backoff = torch.zeros(num_unique, device=states.device)
+        current = unique_states
+        rows = torch.arange(num_unique, device=states.device)
+        # walk the backoff chains, the longest context defines the score of a token
+        while True:
+            not_root = current != 0
+            current, rows = current[not_root], rows[not_root]
+            if current.shape[0] == 0:
+                break
+            starts = arrays['offsets'][current]
+            counts = arrays['offsets'][current + 1] - starts
+            entry_rows = torch.repeat_interleave(rows, counts)
+            first_entries = torch.repeat_interleave(starts - (torch.cumsum(counts, 0) - counts), counts)
+            entries = first_entries + torch.arange(entry_rows.shape[0], device=states.device)
+            entry_tokens = arrays['tokens'][entries]
+            unset = torch.isnan(scores[entry_rows, entry_tokens])
+            entry_rows, entry_tokens, entries = entry_rows[unset], entry_tokens[unset], entries[unset]
+            scores[entry_rows, entry_tokens] = accumulated_backoff[entry_rows] + arrays['logprobs'][entries]
+            next_states[entry_rows, entry_tokens] = arrays['next_states'][entries]
+            accumulated_backoff[rows] += arrays['backoffs'][current]
+            current = arrays['parents'][current]
+
+        unset = torch.isnan(scores)
+        scores = torch.where(unset, accumulated_backoff[:, None] + arrays['unigrams'][None, :], scores)
+        return scores[inverse], next_states[inverse]
+
+
+def batched_ctc_prefix_beam_search(
+    log_probs: torch.Tensor,
+    lengths: torch.Tensor,
+    blank_id: int,
+    beam_size: int,
+    lm: Optional[TokenNGramLM] = None,
+    beam_alpha: float = 1.0,
+    beam_beta: float = 0.0,
+) -> List[List[Tuple[float, List[int]]]]:
+    """
+    CTC prefix beam search over a batch of utterances.
+
+    Every frame expands all beams of all utterances at once. Candidates are scored with
+    `acoustic_score + beam_alpha * lm_score + beam_beta * seq_length`, where the LM score of a finished
+    hypothesis includes the end of sentence probability.
+
+    Args:
+        log_probs: float tensor [B, T, V + 1] of log probabilities, including the blank.
+        lengths: int tensor [B] with the number of valid frames of every utterance.
+        blank_id: index of the blank label.
+        beam_size: number of prefixes kept after every frame.
+        lm: optional token-level n-gram LM over the V non-blank labels (in order of their index).
+        beam_alpha: weight of the LM score.
+        beam_beta: weight of the hypothesis length.
+
+    Returns:
+        For every utterance, a list of up to `beam_size` (score, token ids) tuples sorted by decreasing score.
+    """
+    device = log_probs.device
+    batch_size, max_time, num_classes = log_probs.shape
+    num_labels = num_classes - 1
+    label_ids = torch.tensor([idx for idx in range(num_classes) if idx != blank_id], device=device)
+    if lm is not None and lm.vocab_size != num_labels:
+        raise ValueError(f"LM vocabulary size {lm.vocab_size} does not match the number of labels {num_labels}")
+
+    log_probs = log_probs.float()
+    lengths = lengths.to(device)
+    label_log_probs = log_probs.index_select(2, label_ids)
+    blank_log_probs = log_probs[:, :, blank_id]
+
+    neg_inf = float('-inf')
+    shape = (batch_size, beam_size)
+    p_blank = torch.full(shape, neg_inf, device=device)
+    p_blank[:, 0] = 0.0
+    p_non_blank = torch.full(shape, neg_inf, device=device)
+    last_label = torch.full(shape, -1, dtype=torch.long, device=device)
+    seq_length = torch.zeros(shape, dtype=torch.long, device=device)
+    lm_score = torch.zeros(shape, device=device)
+    lm_state = torch.full(shape, lm.bos_state if lm is not None else 0, dtype=torch.long, device=device)
+    # hashes of the prefixes and of the prefixes without their last label, used to merge equal prefixes
+    prefix_hash = torch.zeros(shape, dtype=torch.long, device=device)
+    parent_hash = torch.full(shape, -1, dtype=torch.long, device=device)
+
+    beam_idx = torch.arange(beam_size, device=device)[None, :].expand(shape)
+    source_beams, emitted_labels = [], []
+    for t in range(int(lengths.max().item()) if batch_size > 0 else 0):
+        frame_log_probs = label_log_probs[:, t]
+        p_total = torch.logaddexp(p_blank, p_non_blank)
+        valid = p_total > neg_inf
+        has_label = last_label >= 0
+        last_clamped = last_label.clamp(min=0)
+        last_label_log_prob = frame_log_probs.gather(1, last_clamped)
+
+        # prefixes that do not change: blank, or a repetition of the last label
+        stay_blank = p_total + blank_log_probs[:, t, None]
+        stay_non_blank = torch.where(has_label, p_non_blank + last_label_log_prob, neg_inf)
+
+        # prefixes extended by a label, the last label can only follow a blank
+        extend = p_total[:, :, None] + frame_log_probs[:, None, :]
+        extend.scatter_(
+            2,
+            last_clamped[:, :, None],
+            torch.where(has_label, p_blank + last_label_log_prob, extend.gather(2, last_clamped[:, :, None])[..., 0])[
+                :, :, None
+            ],
+        )
+
+        # prefix j equals prefix k extended by the last label of j: merge the extension into j
+        match = (parent_hash[:, :, None] == prefix_hash[:, None, :]) & valid[:, :, None] & valid[:, None, :]
+        has_match = match.any(dim=2)
+        flat_extend = extend.view(batch_size, beam_size * num_labels)
+        merge_idx = match.int().argmax(dim=2) * num_labels + last_clamped
+        merged = flat_extend.gather(1, merge_idx)
+        stay_non_blank = torch.where(has_match, torch.logaddexp(stay_non_blank, merged), stay_non_blank)
+        match_batch, match_beam = has_match.nonzero(as_tuple=True)
+        flat_extend[match_batch, merge_idx[match_batch, match_beam]] = neg_inf
+
+        stay_scores = torch.logaddexp(stay_blank, stay_non_blank) + beam_alpha * lm_score + beam_beta * seq_length
+        extend_scores = extend + beam_beta * (seq_length[:, :, None] + 1)
+        if lm is not None:
+            token_lm_scores, token_lm_states = lm.score_all(lm_state.view(-1))
+            token_lm_scores = token_lm_scores[:, :num_labels].reshape(batch_size, beam_size, num_labels)
+            token_lm_states = token_lm_states[:, :num_labels].reshape(batch_size, beam_size, num_labels)
+            extend_scores = extend_scores + beam_alpha * (lm_score[:, :, None] + token_lm_scores)
+
+        candidate_scores = torch.cat([stay_scores, extend_scores.view(batch_size, -1)], dim=1)
+        _, best = candidate_scores.topk(beam_size, dim=1)
+        is_stay = best < beam_size
+        extend_idx = (best - beam_size).clamp(min=0)
+        source = torch.where(is_stay, best, extend_idx // num_labels)
+        label = torch.where(is_stay, -1, extend_idx % num_labels)
+        label_clamped = label.clamp(min=0)
+
+        new_p_blank = torch.where(is_stay, stay_blank.gather(1, source), neg_inf)
+        new_p_non_blank = torch.where(is_stay, stay_non_blank.gather(1, source), flat_extend.gather(1, extend_idx))
+        source_hash = prefix_hash.gather(1, source)
+        new_prefix_hash = torch.where(is_stay, source_hash, source_hash * _HASH_MULTIPLIER + label + 1)
+        new_parent_hash = torch.where(is_stay, parent_hash.gather(1, source), source_hash)
+        new_last_label = torch.where(is_stay, last_label.gather(1, source), label)
+        new_seq_length = seq_length.gather(1, source) + (~is_stay).long()
+        new_lm_score = lm_score.gather(1, source)
+        new_lm_state = lm_state.gather(1, source)
+        if lm is not None:
+            extend_lm_idx = source * num_labels + label_clamped
+            chosen_lm_scores = token_lm_scores.reshape(batch_size, -1).gather(1, extend_lm_idx)
+            chosen_lm_states = token_lm_states.reshape(batch_size, -1).gather(1, extend_lm_idx)
+            new_lm_score = torch.where(is_stay, new_lm_score, new_lm_score + chosen_lm_scores)
+            new_lm_state = torch.where(is_stay, new_lm_state, chosen_lm_states)
+
+        # finished utterances keep their beams
+        active = (t < lengths)[:, None]
+        p_blank = torch.where(active, new_p_blank, p_blank)
+        p_non_blank = torch.where(active, new_p_non_blank, p_non_blank)
+        prefix_hash = torch.where(active, new_prefix_hash, prefix_hash)
+        parent_hash = torch.where(active, new_parent_hash, parent_hash)
+        last_label = torch.where(active, new_last_label, last_label)
+        seq_length = torch.where(active, new_seq_length, seq_length)
+        lm_score = torch.where(active, new_lm_score, lm_score)
+        lm_state = torch.where(active, new_lm_state, lm_state)
+        source_beams.append(torch.where(active, source, beam_idx))
+        emitted_labels.append(torch.where(active, label, -1))
+
+    if lm is not None:
+        eos_scores, _ = lm.score_all(lm_state.view(-1))
+        lm_score = lm_score + eos_scores[:, lm.eos_id].view(batch_size, beam_size)
+    final_scores = torch.logaddexp(p_blank, p_non_blank) + beam_alpha * lm_score + beam_beta * seq_length
+    final_scores, order = final_scores.sort(dim=1, descending=True)
+
+    # follow the back pointers to recover the label sequences
+    current = order
+    labels = np.full((len(source_beams), batch_size, beam_size), -1, dtype=np.int64)
+    for t in range(len(source_beams) - 1, -1, -1):
+        labels[t] = emitted_labels[t].gather(1, current).cpu().numpy()
+        current = source_beams[t].gather(1, current)
+
+    label_ids = label_ids.cpu().numpy()
+    final_scores = final_scores.cpu().numpy()
+    results = []
+    for b in range(batch_size):
+        hypotheses = []
+        for k in range(beam_size):
+            if final_scores[b, k] == neg_inf:
+                break
+            sequence = labels[:, b, k]
+            hypotheses.append((float(final_scores[b, k]), label_ids[sequence[sequence >= 0]].tolist()))
+        results.append(hypotheses)
+    return results
@@ -214,10 +214,12 @@ class BeamCTCInfer(AbstractBeamCTCInfer):
             self.search_algorithm = self._pyctcdecode_beam_search
         elif search_type == "flashlight":
             self.search_algorithm = self.flashlight_beam_search
+        elif search_type == "batched":
+            self.search_algorithm = self.batched_beam_search
         else:
             raise NotImplementedError(
                 f"The search type ({search_type}) supplied is not supported!\n"
-                f"Please use one of : (default, nemo, pyctcdecode)"
+                f"Please use one of : (default, nemo, pyctcdecode, flashlight, batched)"
             )
 
         # Log the beam search algorithm
@@ -242,6 +244,7 @@ class BeamCTCInfer(AbstractBeamCTCInfer):
         self.default_beam_scorer = None
         self.pyctcdecode_beam_scorer = None
         self.flashlight_beam_scorer = None
+        self.batched_beam_lm = None
         self.token_offset = 0
 
     @typecheck()
@@ -559,6 +562,86 @@ class BeamCTCInfer(AbstractBeamCTCInfer):
 
         return nbest_hypotheses
 
+    @torch.no_grad()
+    def batched_beam_search(
+        self, x: torch.Tensor, out_len: torch.Tensor
+    ) -> List[Union[rnnt_utils.Hypothesis, rnnt_utils.NBestHypotheses]]:
+        """
+        Batched CTC prefix beam search, with an optional token-level ARPA n-gram LM. Does not require
+        any external decoder package. Should support Char and Subword models.
+
+        Args:
+            x: Tensor of shape [B, T, V+1], where B is the batch size, T is the maximum sequence length,
+                and V is the vocabulary size. The tensor contains log-probabilities.
+            out_len: Tensor of shape [B], contains lengths of each sequence in the batch.
+
+        Returns:
+            A list of NBestHypotheses objects, one for each sequence in the batch.
+        """
+        if self.compute_timestamps:
+            raise ValueError(
+                f"Beam Search with strategy `{self.search_type}` does not support time stamp calculation!"
+            )
+
+        if self.batched_beam_lm is None and self.kenlm_path is not None:
+            # Check for filepath
+            if not os.path.exists(self.kenlm_path):
+                raise FileNotFoundError(
+                    f"ARPA file not found at : {self.kenlm_path}. " f"Please set a valid path in the decoding config."
+                )
+
+            # Subword tokens are encoded as unicode characters by the LM training script, see `default_beam_search`
+            if self.decoding_type == 'subword':
+                symbol_map = {chr(idx + self.token_offset): idx for idx in range(len(self.vocab))}
+            else:
+                # char models
+                symbol_map = dict(self.vocab_index_map)
+
+            # Must import at runtime to avoid circular dependency due to module level import.
+            from nemo.collections.asr.parts.submodules.ctc_batched_beam_decoding import TokenNGramLM
+
+            self.batched_beam_lm = TokenNGramLM.from_arpa(self.kenlm_path, symbol_map)
+
+        from nemo.collections.asr.parts.submodules.ctc_batched_beam_decoding import batched_ctc_prefix_beam_search
+
+        if out_len is None:
+            out_len = torch.full([x.shape[0]], x.shape[1], dtype=torch.long)
+
+        beams_batch = batched_ctc_prefix_beam_search(
+            x,
+            out_len,
+            blank_id=self.blank_id,
+            beam_size=self.beam_size,
+            lm=self.batched_beam_lm,
+            beam_alpha=self.beam_alpha,
+            beam_beta=self.beam_beta,
+        )
+
+        # For each sample in the batch
+        nbest_hypotheses = []
+        for beams_idx, beams in enumerate(beams_batch):
+            # For each beam candidate / hypothesis in each sample
+            hypotheses = []
+            for score, pred_token_ids in beams:
+                hypothesis = rnnt_utils.Hypothesis(
+                    score=score, y_sequence=pred_token_ids, dec_state=None, timestep=[], last_token=None
+                )
+
+                # If alignment must be preserved, we preserve a view of the output logprobs.
+                # Note this view is shared amongst all beams within the sample, be sure to clone it if you
+                # require specific processing for each sample in the beam.
+                # This is done to preserve memory.
+                if self.preserve_alignments:
+                    hypothesis.alignments = x[beams_idx][: out_len[beams_idx]]
+
+                hypotheses.append(hypothesis)
+
+            # Wrap the result in NBestHypothesis.
+            hypotheses = rnnt_utils.NBestHypotheses(hypotheses)
+            nbest_hypotheses.append(hypotheses)
+
+        return nbest_hypotheses
+
     def set_decoding_type(self, decoding_type: str):
         super().set_decoding_type(decoding_type)
 
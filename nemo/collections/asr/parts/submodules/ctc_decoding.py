@@ -22,7 +22,11 @@ import torch
 from omegaconf import DictConfig, OmegaConf
 
 from nemo.collections.asr.parts.submodules import ctc_beam_decoding, ctc_greedy_decoding
-from nemo.collections.asr.parts.utils.asr_confidence_utils import ConfidenceConfig, ConfidenceMixin
+from nemo.collections.asr.parts.utils.asr_confidence_utils import (
+    ConfidenceConfig,
+    ConfidenceMixin,
+    concat_to_tensor,
+)
 from nemo.collections.asr.parts.utils.rnnt_utils import Hypothesis, NBestHypotheses
 from nemo.collections.common.tokenizers.aggregate_tokenizer import DummyTokenizer
 from nemo.collections.common.tokenizers.tokenizer_spec import TokenizerSpec
@@ -178,6 +182,12 @@ class AbstractCTCDecoding(ConfidenceMixin):
                         float, the strength of the sequence length penalty on the final score of a token.
                         final_score = acoustic_score + beam_alpha * lm_score + beam_beta * seq_length.
 
+                    search_type:
+                        str, the beam search algorithm of the `beam` strategy. Can be one of:
+                        -   default (DeepSpeed KenLM based decoding, requires the external ctc_decoders package).
+                        -   batched (in-tree prefix beam search of the whole batch with an optional token-level
+                            ARPA LM at `kenlm_path`, requires no external package).
+
                     kenlm_path:
                         str, path to a KenLM ARPA or .binary file (depending on the strategy chosen).
                         If the path is invalid (file is not found at path), will raise a deferred error at the moment
@@ -269,7 +279,7 @@ class AbstractCTCDecoding(ConfidenceMixin):
             self.decoding = ctc_beam_decoding.BeamCTCInfer(
                 blank_id=blank_id,
                 beam_size=self.cfg.beam.get('beam_size', 1),
-                search_type='default',
+                search_type=self.cfg.beam.get('search_type', 'default'),
                 return_best_hypothesis=self.cfg.beam.get('return_best_hypothesis', True),
                 preserve_alignments=self.preserve_alignments,
                 compute_timestamps=self.compute_timestamps,
@@ -519,29 +529,52 @@ class AbstractCTCDecoding(ConfidenceMixin):
                     Expected: (decoded_prediction, token_repetitions)\n
                     The method invocation is expected between .decode_hypothesis() and .compute_ctc_timestamps()"""
                 )
-            token_repetitions = hyp.text[2]
+        token_repetitions = [hyp.text[2] for hyp in hypotheses_list]
+        for hyp in hypotheses_list:
             hyp.text = hyp.text[:2]
-            token_confidence = []
-            if self.exclude_blank_from_confidence:
-                non_blank_frame_confidence = hyp.non_blank_frame_confidence
-                i = 0
-                for tr in token_repetitions:
-                    # token repetition can be zero
-                    j = i + tr
-                    token_confidence.append(self._aggregate_confidence(non_blank_frame_confidence[i:j]))
-                    i = j
-            else:
-                # <blank> tokens are considered to belong to the last non-blank token, if any.
-                token_lengths = hyp.text[1]
-                if len(token_lengths) > 0:
-                    ts = token_lengths[0]
-                    for tl in token_lengths[1:] + [len(hyp.frame_confidence)]:
-                        token_confidence.append(self._aggregate_confidence(hyp.frame_confidence[ts : ts + tl]))
-                        ts += tl
-            hyp.token_confidence = token_confidence
+
+        # confidence of all frames of all hypotheses, token confidence is aggregated over spans of frames at once
+        num_frames = torch.tensor([len(hyp.frame_confidence) for hyp in hypotheses_list], dtype=torch.long)
+        frame_offsets = num_frames.cumsum(0) - num_frames
+        frame_confidence = concat_to_tensor((hyp.frame_confidence for hyp in hypotheses_list), dtype=torch.float64)
+        num_tokens = torch.tensor([len(tr) for tr in token_repetitions], dtype=torch.long)
+        token_hyp_ids = torch.repeat_interleave(torch.arange(len(hypotheses_list)), num_tokens)
+        if self.exclude_blank_from_confidence:
+            # the repetitions of a token are consecutive non-blank frames
+            timesteps = [
+                hyp.timestep['timestep'] if isinstance(hyp.timestep, dict) else hyp.timestep for hyp in hypotheses_list
+            ]
+            num_non_blank = torch.tensor([len(ts) for ts in timesteps], dtype=torch.long)
+            non_blank_frames = concat_to_tensor(timesteps, dtype=torch.long)
+            confidence = frame_confidence[non_blank_frames + torch.repeat_interleave(frame_offsets, num_non_blank)]
+            lengths = concat_to_tensor(token_repetitions, dtype=torch.long)
+            # spans start at the non-blank frames of their hypotheses
+            lengths_offsets = torch.zeros_like(num_tokens).index_add_(0, token_hyp_ids, lengths)
+            starts = lengths.cumsum(0) - lengths
+            starts += torch.repeat_interleave(
+                (num_non_blank.cumsum(0) - num_non_blank) - (lengths_offsets.cumsum(0) - lengths_offsets), num_tokens
+            )
+        else:
+            # <blank> tokens are considered to belong to the last non-blank token, if any.
+            confidence = frame_confidence
+            token_lengths = concat_to_tensor((hyp.text[1] for hyp in hypotheses_list), dtype=torch.long)
+            token_lengths_offsets = torch.zeros_like(num_tokens).index_add_(0, token_hyp_ids, token_lengths)
+            starts = token_lengths.cumsum(0) + torch.repeat_interleave(
+                frame_offsets - (token_lengths_offsets.cumsum(0) - token_lengths_offsets), num_tokens
+            )
+            # a token ends at the start of the next token or at the end of the frames of its hypothesis
+            ends = torch.roll(starts, -1)
+            is_last = torch.ones_like(token_hyp_ids, dtype=torch.bool)
+            is_last[:-1] = token_hyp_ids[1:] != token_hyp_ids[:-1]
+            ends[is_last] = (frame_offsets + num_frames)[token_hyp_ids[is_last]]
+            lengths = ends - starts
+        token_confidence = self._aggregate_confidence_spans(confidence, starts, lengths)
+        token_offsets = [0] + num_tokens.cumsum(0).tolist()
+        for i, hyp in enumerate(hypotheses_list):
+            hyp.token_confidence = token_confidence[token_offsets[i] : token_offsets[i + 1]]
         if self.preserve_word_confidence:
-            for hyp in hypotheses_list:
-                hyp.word_confidence = self._aggregate_token_confidence(hyp)
+            for hyp, word_confidence in zip(hypotheses_list, self._aggregate_word_confidence(hypotheses_list)):
+                hyp.word_confidence = word_confidence
         return hypotheses_list
 
     @abstractmethod
@@ -1008,6 +1041,12 @@ class CTCDecoding(AbstractCTCDecoding):
                         float, the strength of the sequence length penalty on the final score of a token.
                         final_score = acoustic_score + beam_alpha * lm_score + beam_beta * seq_length.
 
+                    search_type:
+                        str, the beam search algorithm of the `beam` strategy. Can be one of:
+                        -   default (DeepSpeed KenLM based decoding, requires the external ctc_decoders package).
+                        -   batched (in-tree prefix beam search of the whole batch with an optional token-level
+                            ARPA LM at `kenlm_path`, requires no external package).
+
                     kenlm_path:
                         str, path to a KenLM ARPA or .binary file (depending on the strategy chosen).
                         If the path is invalid (file is not found at path), will raise a deferred error at the moment
@@ -1047,6 +1086,18 @@ class CTCDecoding(AbstractCTCDecoding):
             self.decode_tokens_to_str(hypothesis.text[0]).split(), hypothesis.token_confidence
         )
 
+    def _get_word_spans(self, hypothesis: Hypothesis) -> Tuple[List[int], List[int]]:
+        """
+        Implemented by subclass in order to find the tokens of every word for `_aggregate_word_confidence`.
+
+        Args:
+            hypothesis: Hypothesis
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word.
+        """
+        return self._get_word_spans_chars(self.decode_tokens_to_str(hypothesis.text[0]).split())
+
     def decode_tokens_to_str(self, tokens: List[int]) -> str:
         """
         Implemented by subclass in order to decoder a token list into a string.
@@ -1221,6 +1272,12 @@ class CTCBPEDecoding(AbstractCTCDecoding):
                         float, the strength of the sequence length penalty on the final score of a token.
                         final_score = acoustic_score + beam_alpha * lm_score + beam_beta * seq_length.
 
+                    search_type:
+                        str, the beam search algorithm of the `beam` strategy. Can be one of:
+                        -   default (DeepSpeed KenLM based decoding, requires the external ctc_decoders package).
+                        -   batched (in-tree prefix beam search of the whole batch with an optional token-level
+                            ARPA LM at `kenlm_path`, requires no external package).
+
                     kenlm_path:
                         str, path to a KenLM ARPA or .binary file (depending on the strategy chosen).
                         If the path is invalid (file is not found at path), will raise a deferred error at the moment
@@ -1267,6 +1324,22 @@ class CTCBPEDecoding(AbstractCTCDecoding):
             self.decode_tokens_to_str(hypothesis.text[0]).split(), hypothesis.token_confidence, hypothesis.text[0]
         )
 
+    def _get_word_spans(self, hypothesis: Hypothesis) -> Tuple[List[int], List[int]]:
+        """
+        Implemented by subclass in order to find the tokens of every word for `_aggregate_word_confidence`.
+
+        **Note**: Only supports Sentencepiece based tokenizers!
+
+        Args:
+            hypothesis: Hypothesis
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word.
+        """
+        return self._get_word_spans_subwords_sentencepiece(
+            self.decode_tokens_to_str(hypothesis.text[0]).split(), hypothesis.text[0]
+        )
+
     def decode_tokens_to_str(self, tokens: List[int]) -> str:
         """
         Implemented by subclass in order to decoder a token list into a string.
@@ -440,9 +440,13 @@ class GreedyBatchedCTCInfer(Typing, ConfidenceMethodMixin):
         predictions_labels = predictions_labels.cpu()
         out_len = out_len.cpu()
 
-        if self.preserve_alignments or self.preserve_frame_confidence:
+        if self.preserve_alignments:
             predictions = predictions.cpu()
 
+        if self.preserve_frame_confidence:
+            # confidence of all frames of the batch at once, padded frames are dropped below
+            frame_confidence = self._get_confidence_tensor(x).cpu()
+
         hypotheses = []
 
         # This mimics the for loop in GreedyCTCInfer::forward.
@@ -466,7 +470,7 @@ class GreedyBatchedCTCInfer(Typing, ConfidenceMethodMixin):
                 # Or do a prefix sum on out_len
                 hypothesis.timestep = torch.nonzero(non_blank_ids_mask[i], as_tuple=False)[:, 0].cpu().tolist()
             if self.preserve_frame_confidence:
-                hypothesis.frame_confidence = self._get_confidence(predictions[i, : out_len[i], :])
+                hypothesis.frame_confidence = frame_confidence[i, : out_len[i]].tolist()
 
             hypotheses.append(hypothesis)
 
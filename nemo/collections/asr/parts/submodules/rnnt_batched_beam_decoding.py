@@ -0,0 +1,222 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Optional, Tuple
+
+import torch
+
+from nemo.collections.asr.modules import rnnt_abstract
+from nemo.collections.asr.parts.utils.rnnt_utils import BatchedBeamHyps
+
+
+class ModifiedAESBatchedRNNTComputer:
+    """
+    Batched modified adaptive expansion search (mAES) for RNNT models, based on
+    [Accelerating RNN Transducer Inference via Adaptive Expansion Search](https://ieeexplore.ieee.org/document/9250505)
+
+    All utterances of the batch are decoded together: hypotheses are stored as [B, beam, T] tensors
+    (`BatchedBeamHyps`), decoder states of all hypotheses are kept in a single batched state and gathered by index,
+    and hypotheses with equal transcripts are recombined using transcript hashes (instead of the prefix search).
+
+    For every frame, each hypothesis is expanded at most `maes_num_steps` times. At every step the candidates of each
+    hypothesis are its `beam_size + maes_expansion_beta` best labels which are within `maes_expansion_gamma` of the
+    best one (prune-by-value). Blank candidates end the frame, the best `beam_size + maes_expansion_beta` label
+    candidates of each utterance are expanded further. Expansions of the last step are closed with blank.
+    """
+
+    def __init__(
+        self,
+        decoder: rnnt_abstract.AbstractRNNTDecoder,
+        joint: rnnt_abstract.AbstractRNNTJoint,
+        beam_size: int,
+        maes_num_steps: int = 2,
+        maes_expansion_beta: int = 2,
+        maes_expansion_gamma: float = 2.3,
+        softmax_temperature: float = 1.0,
+    ):
+        """
+        Args:
+            decoder: Prediction network from RNN-T
+            joint: Joint module from RNN-T
+            beam_size: number of hypotheses kept for every utterance
+            maes_num_steps: maximum number of expansions of a hypothesis per frame
+            maes_expansion_beta: number of additional label candidates, in addition to the beam size
+            maes_expansion_gamma: log probability margin for prune-by-value
+            softmax_temperature: scales the logits of the joint prior to computing log_softmax
+        """
+        self.decoder = decoder
+        self.joint = joint
+        self._blank_index = decoder.blank_idx
+        self.beam_size = beam_size
+        self.num_steps = maes_num_steps
+        self.max_candidates = beam_size + maes_expansion_beta
+        self.expansion_gamma = maes_expansion_gamma
+        self.softmax_temperature = softmax_temperature
+
+    def _joint_log_probs(self, encoder_frames: torch.Tensor, decoder_output: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            encoder_frames: projected encoder output for the current frame of each utterance, [B, 1, H]
+            decoder_output: projected decoder output for each hypothesis, [B, N, H]
+
+        Returns:
+            log probabilities of shape [B, N, V + 1]
+        """
+        logits = self.joint.joint_after_projection(encoder_frames, decoder_output)[:, 0]
+        return torch.log_softmax(logits / self.softmax_temperature, dim=-1)
+
+    def _select_states(self, states: Any, num_hyps: int, beam_indices: torch.Tensor) -> Any:
+        """Gather decoder states of `num_hyps` hypotheses per utterance by beam indices of shape [B, N']."""
+        batch_size = beam_indices.shape[0]
+        batch_offsets = torch.arange(batch_size, device=beam_indices.device)[:, None] * num_hyps
+        return self.decoder.index_select_states(states, (batch_offsets + beam_indices).view(-1))
+
+    def _merge(
+        self,
+        kept: Optional[Tuple[BatchedBeamHyps, torch.Tensor, Any]],
+        candidates: Tuple[BatchedBeamHyps, torch.Tensor, Any],
+    ) -> Tuple[BatchedBeamHyps, torch.Tensor, Any]:
+        """
+        Merge candidates, which end the current frame, into the kept hypotheses: recombine hypotheses with equal
+        transcripts and keep the best `beam_size` hypotheses.
+        """
+        if kept is None:
+            hyps, decoder_output, states = candidates
+            hyps.recombine_()
+            hyps, beam_indices = hyps.topk(self.beam_size)
+            return (
+                hyps,
+                decoder_output.gather(1, beam_indices[:, :, None].expand(-1, -1, decoder_output.shape[-1])),
+                self._select_states(states, candidates[0].beam_size, beam_indices),
+            )
+
+        kept_hyps, kept_decoder_output, kept_states = kept
+        candidate_hyps, candidate_decoder_output, candidate_states = candidates
+        num_kept, num_candidates = kept_hyps.beam_size, candidate_hyps.beam_size
+        hyps = kept_hyps.concat(candidate_hyps)
+        hyps.recombine_()
+        hyps, beam_indices = hyps.topk(self.beam_size)
+
+        decoder_output = torch.cat((kept_decoder_output, candidate_decoder_output), dim=1)
+        decoder_output = decoder_output.gather(1, beam_indices[:, :, None].expand(-1, -1, decoder_output.shape[-1]))
+        from_kept = beam_indices < num_kept
+        states = self._select_states(candidate_states, num_candidates, (beam_indices - num_kept).clamp(min=0))
+        self.decoder.batch_replace_states_mask(
+            src_states=self._select_states(kept_states, num_kept, beam_indices.clamp(max=num_kept - 1)),
+            dst_states=states,
+            mask=from_kept.view(-1),
+        )
+        return hyps, decoder_output, states
+
+    def __call__(self, encoder_output: torch.Tensor, encoder_output_length: torch.Tensor) -> BatchedBeamHyps:
+        """
+        Args:
+            encoder_output: output from the encoder, [B, T, D]
+            encoder_output_length: lengths of the utterances in `encoder_output`
+
+        Returns:
+            BatchedBeamHyps with `beam_size` hypotheses for every utterance
+        """
+        batch_size, max_time, _unused = encoder_output.shape
+        device = encoder_output.device
+        beam_size = self.beam_size
+        neg_inf = float('-inf')
+
+        # do not recalculate joint projection, project only once
+        encoder_output_projected = self.joint.project_encoder(encoder_output)
+        float_dtype = encoder_output_projected.dtype
+        encoder_output_length = encoder_output_length.to(device)
+
+        hyps = BatchedBeamHyps(
+            batch_size=batch_size, beam_size=beam_size, init_length=max_time, device=device, float_dtype=float_dtype
+        )
+        # decoder output for the start of sequence symbol, stateless decoders return no state for it
+        decoder_output, state = self.decoder.predict(None, None, add_sos=False, batch_size=batch_size * beam_size)
+        if state is None:
+            state = self.decoder.initialize_state(decoder_output)
+        decoder_output = self.joint.project_prednet(decoder_output).view(batch_size, beam_size, -1)
+
+        for t in range(int(encoder_output_length.max().item()) if batch_size > 0 else 0):
+            active_mask = t < encoder_output_length
+            encoder_frames = encoder_output_projected[:, t : t + 1]
+            kept = None
+
+            # hypotheses to expand, initially all hypotheses from the previous frame
+            expand_hyps, expand_decoder_output, expand_state = hyps, decoder_output, state
+            for step in range(self.num_steps):
+                num_hyps = expand_hyps.beam_size
+                log_probs = self._joint_log_probs(encoder_frames, expand_decoder_output)
+                num_classes = log_probs.shape[-1]
+
+                # prune-by-value among the best candidates of each hypothesis
+                top_log_probs, top_labels = log_probs.topk(min(self.max_candidates, num_classes), dim=-1)
+                top_scores = expand_hyps.scores[:, :, None] + top_log_probs
+                top_scores = torch.where(
+                    top_scores >= top_scores[:, :, :1] - self.expansion_gamma, top_scores, neg_inf
+                )
+                is_blank = top_labels == self._blank_index
+
+                # blank candidates end the frame
+                blank_scores = torch.where(is_blank, top_scores, neg_inf).max(dim=-1).values
+                kept = self._merge(kept, (expand_hyps.with_scores(blank_scores), expand_decoder_output, expand_state))
+
+                # label candidates are expanded further
+                label_scores = torch.where(is_blank, neg_inf, top_scores).view(batch_size, -1)
+                expand_scores, expand_indices = label_scores.topk(
+                    min(self.max_candidates, label_scores.shape[-1]), dim=-1
+                )
+                valid = torch.logical_and(expand_scores > neg_inf, active_mask[:, None])
+                if not valid.any():
+                    break
+                source_beams = torch.div(expand_indices, top_labels.shape[-1], rounding_mode='floor')
+                # invalid expansions get label 0, which is safe for the decoder embedding
+                labels = torch.where(valid, top_labels.view(batch_size, -1).gather(1, expand_indices), 0)
+                label_log_probs = top_log_probs.view(batch_size, -1).gather(1, expand_indices)
+
+                expand_hyps = expand_hyps.select(source_beams)
+                expand_hyps.add_results_(labels, torch.full_like(labels, t), label_log_probs)
+                expand_hyps.scores = torch.where(valid, expand_hyps.scores, neg_inf)
+
+                expand_state = self._select_states(expand_state, num_hyps, source_beams)
+                expand_decoder_output, expand_state, *_ = self.decoder.predict(
+                    labels.view(-1, 1), expand_state, add_sos=False, batch_size=labels.numel()
+                )
+                expand_decoder_output = self.joint.project_prednet(expand_decoder_output).view(
+                    batch_size, labels.shape[1], -1
+                )
+
+                if step == self.num_steps - 1:
+                    # expansions of the last step are closed with blank
+                    log_probs = self._joint_log_probs(encoder_frames, expand_decoder_output)
+                    kept = self._merge(
+                        kept,
+                        (
+                            expand_hyps.with_scores(expand_hyps.scores + log_probs[:, :, self._blank_index]),
+                            expand_decoder_output,
+                            expand_state,
+                        ),
+                    )
+
+            kept_hyps, kept_decoder_output, kept_state = kept
+            # finished utterances keep their hypotheses
+            kept_hyps.replace_masked_(hyps, torch.logical_not(active_mask))
+            decoder_output = torch.where(active_mask[:, None, None], kept_decoder_output, decoder_output)
+            self.decoder.batch_replace_states_mask(
+                src_states=state,
+                dst_states=kept_state,
+                mask=torch.logical_not(active_mask)[:, None].expand(-1, beam_size).reshape(-1),
+            )
+            hyps, state = kept_hyps, kept_state
+
+        return hyps
@@ -35,10 +35,13 @@ import torch
 from tqdm import tqdm
 
 from nemo.collections.asr.modules import rnnt_abstract
+from nemo.collections.asr.parts.submodules.rnnt_batched_beam_decoding import ModifiedAESBatchedRNNTComputer
 from nemo.collections.asr.parts.utils.rnnt_utils import (
+    DecoderStateCache,
     HATJointOutput,
     Hypothesis,
     NBestHypotheses,
+    batched_beam_hyps_to_hypotheses,
     is_prefix,
     select_k_expansions,
 )
@@ -135,6 +138,12 @@ class BeamRNNTInfer(Typing):
 
                     This beam search technique can possibly obtain superior WER while sacrificing some evaluation time.
 
+                `maes_batch` = batched modified adaptive expansion search. All samples of the batch are decoded
+                    together, hypotheses are stored as tensors, and hypotheses with equal transcripts are recombined
+                    instead of performing the prefix search. Uses the same `maes_*` arguments as `maes`
+                    (except `maes_prefix_alpha`), but does not support `ngram_lm_model`, `hat_subtract_ilm`,
+                    `preserve_alignments` and partial hypotheses.
+
         score_norm: bool, whether to normalize the scores of the log probabilities.
 
         return_best_hypothesis: bool, decides whether to return a single hypothesis (the best out of N),
@@ -197,6 +206,12 @@ class BeamRNNTInfer(Typing):
             Alpha weight of N-gram LM
         tokens_type: str
             Tokenization type ['subword', 'char']
+
+        decoder_cache_size: Maximum number of label prefixes whose prediction network outputs and states are
+            cached (least recently used prefixes are evicted first). The cache is shared by all samples of the batch,
+            unless partial hypotheses are provided. None disables the size limit.
+            Hit and miss counters of the last call are available from `decoder_cache.stats()`, the counts of each
+            sample are stored in `decoder_cache_stats` of its returned hypotheses.
     """
 
     @property
@@ -238,6 +253,7 @@ class BeamRNNTInfer(Typing):
         ngram_lm_alpha: float = 0.0,
         hat_subtract_ilm: bool = False,
         hat_ilm_weight: float = 0.0,
+        decoder_cache_size: Optional[int] = 10000,
     ):
         self.decoder = decoder_model
         self.joint = joint_model
@@ -268,10 +284,12 @@ class BeamRNNTInfer(Typing):
             # self.search_algorithm = self.nsc_beam_search
         elif search_type == "maes":
             self.search_algorithm = self.modified_adaptive_expansion_search
+        elif search_type == "maes_batch":
+            self.search_algorithm = self.modified_adaptive_expansion_search_batch
         else:
             raise NotImplementedError(
                 f"The search type ({search_type}) supplied is not supported!\n"
-                f"Please use one of : (default, tsd, alsd, nsc)"
+                f"Please use one of : (default, tsd, alsd, nsc, maes, maes_batch)"
             )
 
         if tsd_max_sym_exp_per_step is None:
@@ -298,16 +316,16 @@ class BeamRNNTInfer(Typing):
         if self.search_type == 'maes' and self.maes_prefix_alpha < 0:
             raise ValueError("`maes_prefix_alpha` must be a positive integer.")
 
-        if self.search_type == 'maes' and self.vocab_size < beam_size + maes_expansion_beta:
+        if self.search_type in ['maes', 'maes_batch'] and self.vocab_size < beam_size + maes_expansion_beta:
             raise ValueError(
                 f"beam_size ({beam_size}) + expansion_beta ({maes_expansion_beta}) "
                 f"should be smaller or equal to vocabulary size ({self.vocab_size})."
             )
 
-        if search_type == 'maes':
+        if search_type in ['maes', 'maes_batch']:
             self.max_candidates += maes_expansion_beta
 
-        if self.search_type == 'maes' and self.maes_num_steps < 2:
+        if self.search_type in ['maes', 'maes_batch'] and self.maes_num_steps < 2:
             raise ValueError("`maes_num_steps` must be greater than 1.")
 
         if softmax_temperature != 1.0 and language_model is not None:
@@ -323,6 +341,13 @@ class BeamRNNTInfer(Typing):
 
         self.token_offset = 0
 
+        # checked before the n-gram LM is loaded and the HAT joint is validated
+        if self.search_type == 'maes_batch' and self.beam_size > 1:
+            if ngram_lm_model or hat_subtract_ilm:
+                raise NotImplementedError("`ngram_lm_model` and `hat_subtract_ilm` are not supported for `maes_batch`")
+            if preserve_alignments:
+                raise NotImplementedError("`preserve_alignments` is not supported for `maes_batch`")
+
         if ngram_lm_model:
             if KENLM_AVAILABLE:
                 self.ngram_lm = kenlm.Model(ngram_lm_model)
@@ -340,6 +365,21 @@ class BeamRNNTInfer(Typing):
         self.hat_subtract_ilm = hat_subtract_ilm
         self.hat_ilm_weight = hat_ilm_weight
 
+        # prediction network outputs and states of label prefixes, shared by all search steps
+        self.decoder_cache = DecoderStateCache(decoder_cache_size)
+
+        self._batched_computer = None
+        if self.search_type == 'maes_batch' and self.beam_size > 1:
+            self._batched_computer = ModifiedAESBatchedRNNTComputer(
+                decoder=self.decoder,
+                joint=self.joint,
+                beam_size=self.beam_size,
+                maes_num_steps=self.maes_num_steps,
+                maes_expansion_beta=self.maes_expansion_beta,
+                maes_expansion_gamma=self.maes_expansion_gamma,
+                softmax_temperature=self.softmax_temperature,
+            )
+
     @typecheck()
     def __call__(
         self,
@@ -376,6 +416,18 @@ class BeamRNNTInfer(Typing):
             self.decoder.eval()
             self.joint.eval()
 
+            if self._batched_computer is not None:
+                hypotheses = self.modified_adaptive_expansion_search_batch(
+                    encoder_output, encoded_lengths, partial_hypotheses=partial_hypotheses
+                )
+                self.decoder.train(decoder_training_state)
+                self.joint.train(joint_training_state)
+                return (hypotheses,)
+
+            # the decoder may have been updated since the last call
+            self.decoder_cache.clear()
+            self.decoder_cache.reset_stats()
+
             hypotheses = []
             with tqdm(
                 range(encoder_output.size(0)),
@@ -402,13 +454,22 @@ class BeamRNNTInfer(Typing):
                         # Extract partial hypothesis if exists
                         partial_hypothesis = partial_hypotheses[batch_idx] if partial_hypotheses is not None else None
 
+                        # decoder states of label prefixes depend on the partial hypothesis of the sample
+                        if partial_hypotheses is not None:
+                            self.decoder_cache.clear()
+
                         # Execute the specific search strategy
+                        counters = self.decoder_cache.counters()
                         nbest_hyps = self.search_algorithm(
                             inseq, logitlen, partial_hypotheses=partial_hypothesis
                         )  # sorted list of hypothesis
 
                         # Prepare the list of hypotheses
                         nbest_hyps = pack_hypotheses(nbest_hyps)
+                        for key, value in self.decoder_cache.counters().items():
+                            counters[key] = value - counters[key]
+                        for hyp in nbest_hyps:
+                            hyp.decoder_cache_stats = dict(counters)
 
                         # Pack the result
                         if self.return_best_hypothesis:
@@ -417,6 +478,8 @@ class BeamRNNTInfer(Typing):
                             best_hypothesis = NBestHypotheses(nbest_hyps)  # type: NBestHypotheses
                         hypotheses.append(best_hypothesis)
 
+            logging.debug(f"Decoder state cache: {self.decoder_cache.stats()}")
+
         self.decoder.train(decoder_training_state)
         self.joint.train(joint_training_state)
         if self.hat_subtract_ilm:
@@ -424,6 +487,36 @@ class BeamRNNTInfer(Typing):
 
         return (hypotheses,)
 
+    def modified_adaptive_expansion_search_batch(
+        self,
+        h: torch.Tensor,
+        encoded_lengths: torch.Tensor,
+        partial_hypotheses: Optional[List[Hypothesis]] = None,
+    ) -> List[Union[Hypothesis, NBestHypotheses]]:
+        """
+        Batched modified Adaptive Expansion Search, decodes all samples of the batch together.
+        See `ModifiedAESBatchedRNNTComputer` for details.
+
+        Args:
+            h: Encoded speech features (B, T_max, D_enc)
+            encoded_lengths: Lengths of the encoder outputs (B)
+            partial_hypotheses: Not supported
+
+        Returns:
+            List of best hypotheses (when `return_best_hypothesis=True`) or NBestHypotheses for every sample
+        """
+        if partial_hypotheses is not None:
+            raise NotImplementedError("`partial_hypotheses` support is not supported")
+
+        with self.decoder.as_frozen(), self.joint.as_frozen():
+            dtype = next(self.joint.parameters()).dtype
+            batched_hyps = self._batched_computer(h.to(dtype=dtype), encoded_lengths)
+
+        nbest_hyps = batched_beam_hyps_to_hypotheses(batched_hyps, score_norm=self.score_norm)
+        if self.return_best_hypothesis:
+            return [hyps.n_best_hypotheses[0] for hyps in nbest_hyps]
+        return nbest_hyps
+
     def sort_nbest(self, hyps: List[Hypothesis]) -> List[Hypothesis]:
         """Sort hypotheses by score or score given sequence length.
 
@@ -471,7 +564,7 @@ class BeamRNNTInfer(Typing):
                 hyp.dec_state = partial_hypotheses.dec_state
                 hyp.dec_state = _states_to_device(hyp.dec_state, h.device)
 
-        cache = {}
+        cache = self.decoder_cache
 
         # Initialize state and first token
         y, state, _ = self.decoder.score_hypothesis(hyp, cache)
@@ -560,7 +653,7 @@ class BeamRNNTInfer(Typing):
 
         # Initialize first hypothesis for the beam (blank)
         kept_hyps = [Hypothesis(score=0.0, y_sequence=[self.blank], dec_state=dec_state, timestep=[-1], length=0)]
-        cache = {}
+        cache = self.decoder_cache
 
         if partial_hypotheses is not None:
             if len(partial_hypotheses.y_sequence) > 0:
@@ -707,7 +800,7 @@ class BeamRNNTInfer(Typing):
                 length=0,
             )
         ]
-        cache = {}
+        cache = self.decoder_cache
 
         # Initialize alignments
         if self.preserve_alignments:
@@ -886,7 +979,7 @@ class BeamRNNTInfer(Typing):
             B[0].alignments = [[]]
 
         final = []
-        cache = {}
+        cache = self.decoder_cache
 
         # ALSD runs for T + U_max steps
         for i in range(h_length + u_max):
@@ -1101,7 +1194,7 @@ class BeamRNNTInfer(Typing):
             )
         ]
 
-        cache = {}
+        cache = self.decoder_cache
 
         # Initialize alignment buffer
         if self.preserve_alignments:
@@ -1503,3 +1596,4 @@ class BeamRNNTInferConfig:
     ngram_lm_alpha: Optional[float] = 0.0
     hat_subtract_ilm: bool = False
     hat_ilm_weight: float = 0.0
+    decoder_cache_size: Optional[int] = 10000
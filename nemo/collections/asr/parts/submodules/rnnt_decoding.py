@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import copy
+import itertools
 import re
 from abc import abstractmethod
 from dataclasses import dataclass, field, is_dataclass
@@ -23,7 +24,12 @@ import torch
 from omegaconf import OmegaConf
 
 from nemo.collections.asr.parts.submodules import rnnt_beam_decoding, rnnt_greedy_decoding
-from nemo.collections.asr.parts.utils.asr_confidence_utils import ConfidenceConfig, ConfidenceMixin
+from nemo.collections.asr.parts.utils.asr_confidence_utils import (
+    ConfidenceConfig,
+    ConfidenceMixin,
+    concat_to_tensor,
+    get_span_indices,
+)
 from nemo.collections.asr.parts.utils.rnnt_utils import Hypothesis, NBestHypotheses
 from nemo.collections.common.tokenizers.aggregate_tokenizer import AggregateTokenizer
 from nemo.collections.common.tokenizers.tokenizer_spec import TokenizerSpec
@@ -39,7 +45,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
             strategy: str value which represents the type of decoding that can occur.
                 Possible values are :
                 -   greedy, greedy_batch (for greedy decoding).
-                -   beam, tsd, alsd (for beam search decoding).
+                -   beam, tsd, alsd, maes, maes_batch (for beam search decoding).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -188,6 +194,10 @@ class AbstractRNNTDecoding(ConfidenceMixin):
 
                 softmax_temperature: Scales the logits of the joint prior to computing log_softmax.
 
+                decoder_cache_size: Maximum number of label prefixes whose prediction network outputs and states
+                    are cached during beam search (least recently used prefixes are evicted first).
+                    None disables the limit. Not used by `maes_batch`.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         blank_id: The id of the RNNT blank token.
@@ -231,7 +241,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                     "currently only greedy and greedy_batch inference is supported for multi-blank models"
                 )
 
-        possible_strategies = ['greedy', 'greedy_batch', 'beam', 'tsd', 'alsd', 'maes']
+        possible_strategies = ['greedy', 'greedy_batch', 'beam', 'tsd', 'alsd', 'maes', 'maes_batch']
         if self.cfg.strategy not in possible_strategies:
             raise ValueError(f"Decoding strategy must be one of {possible_strategies}")
 
@@ -240,7 +250,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
             if self.cfg.strategy in ['greedy', 'greedy_batch']:
                 self.preserve_alignments = self.cfg.greedy.get('preserve_alignments', False)
 
-            elif self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes']:
+            elif self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes', 'maes_batch']:
                 self.preserve_alignments = self.cfg.beam.get('preserve_alignments', False)
 
         # Update compute timestamps
@@ -248,7 +258,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
             if self.cfg.strategy in ['greedy', 'greedy_batch']:
                 self.compute_timestamps = self.cfg.greedy.get('compute_timestamps', False)
 
-            elif self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes']:
+            elif self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes', 'maes_batch']:
                 self.compute_timestamps = self.cfg.beam.get('compute_timestamps', False)
 
         # Test if alignments are being preserved for RNNT
@@ -267,7 +277,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
         # Confidence estimation is not implemented for these strategies
         if (
             not self.preserve_frame_confidence
-            and self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes']
+            and self.cfg.strategy in ['beam', 'tsd', 'alsd', 'maes', 'maes_batch']
             and self.cfg.beam.get('preserve_frame_confidence', False)
         ):
             raise NotImplementedError(f"Confidence calculation is not supported for strategy `{self.cfg.strategy}`")
@@ -375,6 +385,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                 score_norm=self.cfg.beam.get('score_norm', True),
                 softmax_temperature=self.cfg.beam.get('softmax_temperature', 1.0),
                 preserve_alignments=self.preserve_alignments,
+                decoder_cache_size=self.cfg.beam.get('decoder_cache_size', 10000),
             )
 
         elif self.cfg.strategy == 'tsd':
@@ -389,6 +400,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                 tsd_max_sym_exp_per_step=self.cfg.beam.get('tsd_max_sym_exp', 10),
                 softmax_temperature=self.cfg.beam.get('softmax_temperature', 1.0),
                 preserve_alignments=self.preserve_alignments,
+                decoder_cache_size=self.cfg.beam.get('decoder_cache_size', 10000),
             )
 
         elif self.cfg.strategy == 'alsd':
@@ -403,6 +415,7 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                 alsd_max_target_len=self.cfg.beam.get('alsd_max_target_len', 2),
                 softmax_temperature=self.cfg.beam.get('softmax_temperature', 1.0),
                 preserve_alignments=self.preserve_alignments,
+                decoder_cache_size=self.cfg.beam.get('decoder_cache_size', 10000),
             )
 
         elif self.cfg.strategy == 'maes':
@@ -420,6 +433,28 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                 maes_expansion_beta=self.cfg.beam.get('maes_expansion_beta', 2.0),
                 softmax_temperature=self.cfg.beam.get('softmax_temperature', 1.0),
                 preserve_alignments=self.preserve_alignments,
+                decoder_cache_size=self.cfg.beam.get('decoder_cache_size', 10000),
+                ngram_lm_model=self.cfg.beam.get('ngram_lm_model', None),
+                ngram_lm_alpha=self.cfg.beam.get('ngram_lm_alpha', 0.0),
+                hat_subtract_ilm=self.cfg.beam.get('hat_subtract_ilm', False),
+                hat_ilm_weight=self.cfg.beam.get('hat_ilm_weight', 0.0),
+            )
+
+        elif self.cfg.strategy == 'maes_batch':
+
+            self.decoding = rnnt_beam_decoding.BeamRNNTInfer(
+                decoder_model=decoder,
+                joint_model=joint,
+                beam_size=self.cfg.beam.beam_size,
+                return_best_hypothesis=decoding_cfg.beam.get('return_best_hypothesis', True),
+                search_type='maes_batch',
+                score_norm=self.cfg.beam.get('score_norm', True),
+                maes_num_steps=self.cfg.beam.get('maes_num_steps', 2),
+                maes_expansion_gamma=self.cfg.beam.get('maes_expansion_gamma', 2.3),
+                maes_expansion_beta=self.cfg.beam.get('maes_expansion_beta', 2.0),
+                softmax_temperature=self.cfg.beam.get('softmax_temperature', 1.0),
+                preserve_alignments=self.preserve_alignments,
+                decoder_cache_size=self.cfg.beam.get('decoder_cache_size', 10000),
                 ngram_lm_model=self.cfg.beam.get('ngram_lm_model', None),
                 ngram_lm_alpha=self.cfg.beam.get('ngram_lm_alpha', 0.0),
                 hat_subtract_ilm=self.cfg.beam.get('hat_subtract_ilm', False),
@@ -626,27 +661,48 @@ class AbstractRNNTDecoding(ConfidenceMixin):
                 for hyp in hypotheses_list:
                     hyp.token_confidence = hyp.non_blank_frame_confidence
             else:
-                for hyp in hypotheses_list:
-                    offset = 0
-                    token_confidence = []
-                    if len(hyp.timestep) > 0:
-                        for ts, te in zip(hyp.timestep, hyp.timestep[1:] + [len(hyp.frame_confidence)]):
-                            if ts != te:
-                                # <blank> tokens are considered to belong to the last non-blank token, if any.
-                                token_confidence.append(
-                                    self._aggregate_confidence(
-                                        [hyp.frame_confidence[ts][offset]]
-                                        + [fc[0] for fc in hyp.frame_confidence[ts + 1 : te]]
-                                    )
-                                )
-                                offset = 0
-                            else:
-                                token_confidence.append(hyp.frame_confidence[ts][offset])
-                                offset += 1
-                    hyp.token_confidence = token_confidence
+                # <blank> tokens are considered to belong to the last non-blank token, if any:
+                # a token is aggregated with the first score of every frame up to the frame of the next token.
+                # Spans of all hypotheses are aggregated at once.
+                token_confidence = [hyp.non_blank_frame_confidence for hyp in hypotheses_list]
+                timesteps = [
+                    torch.as_tensor(
+                        hyp.timestep['timestep'] if isinstance(hyp.timestep, dict) else hyp.timestep, dtype=torch.long
+                    )
+                    for hyp in hypotheses_list
+                ]
+                num_tokens = torch.tensor([len(tc) for tc in token_confidence], dtype=torch.long)
+                num_frames = torch.tensor([len(hyp.frame_confidence) for hyp in hypotheses_list], dtype=torch.long)
+                token_hyp_ids = torch.repeat_interleave(torch.arange(len(hypotheses_list)), num_tokens)
+                total_tokens = int(num_tokens.sum())
+                confidence = concat_to_tensor(
+                    itertools.chain(
+                        token_confidence, ([fc[0] for fc in hyp.frame_confidence] for hyp in hypotheses_list)
+                    ),
+                    dtype=torch.float64,
+                )
+                token_starts = torch.cat(timesteps) if timesteps else torch.zeros(0, dtype=torch.long)
+                # a token ends at the frame of the next token or at the end of the frames of its hypothesis
+                token_ends = torch.roll(token_starts, -1)
+                is_last = torch.ones_like(token_hyp_ids, dtype=torch.bool)
+                is_last[:-1] = token_hyp_ids[1:] != token_hyp_ids[:-1]
+                token_ends[is_last] = num_frames[token_hyp_ids[is_last]]
+                frame_offsets = total_tokens + (num_frames.cumsum(0) - num_frames)[token_hyp_ids]
+                blank_indices, blank_span_ids = get_span_indices(
+                    token_starts + 1 + frame_offsets, (token_ends - token_starts - 1).clamp(min=0)
+                )
+                token_ids = torch.arange(total_tokens)
+                token_confidence = self._aggregate_confidence_segments(
+                    confidence[torch.cat((token_ids, blank_indices))],
+                    torch.cat((token_ids, blank_span_ids)),
+                    total_tokens,
+                ).tolist()
+                token_offsets = [0] + num_tokens.cumsum(0).tolist()
+                for i, hyp in enumerate(hypotheses_list):
+                    hyp.token_confidence = token_confidence[token_offsets[i] : token_offsets[i + 1]]
         if self.preserve_word_confidence:
-            for hyp in hypotheses_list:
-                hyp.word_confidence = self._aggregate_token_confidence(hyp)
+            for hyp, word_confidence in zip(hypotheses_list, self._aggregate_word_confidence(hypotheses_list)):
+                hyp.word_confidence = word_confidence
         return hypotheses_list
 
     @abstractmethod
@@ -1020,7 +1076,7 @@ class RNNTDecoding(AbstractRNNTDecoding):
 
                 -   greedy, greedy_batch (for greedy decoding).
 
-                -   beam, tsd, alsd (for beam search decoding).
+                -   beam, tsd, alsd, maes, maes_batch (for beam search decoding).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -1169,6 +1225,10 @@ class RNNTDecoding(AbstractRNNTDecoding):
 
                     softmax_temperature: Scales the logits of the joint prior to computing log_softmax.
 
+                    decoder_cache_size: Maximum number of label prefixes whose prediction network outputs and states
+                        are cached during beam search (least recently used prefixes are evicted first).
+                        None disables the limit. Not used by `maes_batch`.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         vocabulary: The vocabulary (excluding the RNNT blank token) which will be used for decoding.
@@ -1211,6 +1271,18 @@ class RNNTDecoding(AbstractRNNTDecoding):
         """
         return self._aggregate_token_confidence_chars(hypothesis.words, hypothesis.token_confidence)
 
+    def _get_word_spans(self, hypothesis: Hypothesis) -> Tuple[List[int], List[int]]:
+        """
+        Implemented by subclass in order to find the tokens of every word for `_aggregate_word_confidence`.
+
+        Args:
+            hypothesis: Hypothesis
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word.
+        """
+        return self._get_word_spans_chars(hypothesis.words)
+
     def decode_tokens_to_str(self, tokens: List[int]) -> str:
         """
         Implemented by subclass in order to decoder a token list into a string.
@@ -1278,7 +1350,7 @@ class RNNTBPEDecoding(AbstractRNNTDecoding):
 
                 -   greedy, greedy_batch (for greedy decoding).
 
-                -   beam, tsd, alsd (for beam search decoding).
+                -   beam, tsd, alsd, maes, maes_batch (for beam search decoding).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -1442,6 +1514,10 @@ class RNNTBPEDecoding(AbstractRNNTDecoding):
 
                     softmax_temperature: Scales the logits of the joint prior to computing log_softmax.
 
+                    decoder_cache_size: Maximum number of label prefixes whose prediction network outputs and states
+                        are cached during beam search (least recently used prefixes are evicted first).
+                        None disables the limit. Not used by `maes_batch`.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         tokenizer: The tokenizer which will be used for decoding.
@@ -1479,6 +1555,20 @@ class RNNTBPEDecoding(AbstractRNNTDecoding):
             hypothesis.words, hypothesis.token_confidence, hypothesis.y_sequence
         )
 
+    def _get_word_spans(self, hypothesis: Hypothesis) -> Tuple[List[int], List[int]]:
+        """
+        Implemented by subclass in order to find the tokens of every word for `_aggregate_word_confidence`.
+
+        **Note**: Only supports Sentencepiece based tokenizers!
+
+        Args:
+            hypothesis: Hypothesis
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word.
+        """
+        return self._get_word_spans_subwords_sentencepiece(hypothesis.words, hypothesis.y_sequence)
+
     def decode_tokens_to_str(self, tokens: List[int]) -> str:
         """
         Implemented by subclass in order to decoder a token list into a string.
@@ -12,12 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import math
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from functools import partial
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
+import numpy as np
 import torch
 from omegaconf import DictConfig, OmegaConf
 
@@ -288,6 +290,82 @@ def get_confidence_aggregation_bank():
     return confidence_aggregation_bank
 
 
+def get_confidence_segment_aggregation_bank():
+    """Generate a dictionary with batched counterparts of the confidence aggregation functions.
+
+    Each function takes confidence scores `x` [N], the segment index of every score `segment_ids` [N]
+    and the number of segments `num_segments`, and aggregates the scores of all segments with a single
+    `scatter_reduce`. Scores are aggregated in float64. As with `get_confidence_aggregation_bank`,
+    empty segments are aggregated to 1 by `prod` and raise a ValueError with the other functions.
+
+    Supported confidence aggregation functions:
+        min: minimum
+        max: maximum
+        mean: arithmetic mean
+        prod: product
+
+    Returns:
+        dictionary with functions.
+    """
+
+    def segment_reduce(reduce: str):
+        def aggregate(x: torch.Tensor, segment_ids: torch.Tensor, num_segments: int) -> torch.Tensor:
+            x = x.to(dtype=torch.float64)
+            if reduce == "prod":
+                # the product of an empty segment is 1, as for `math.prod`
+                output = torch.ones(num_segments, dtype=x.dtype, device=x.device)
+            else:
+                if len(segment_ids) < num_segments or torch.any(
+                    torch.bincount(segment_ids, minlength=num_segments) == 0
+                ):
+                    raise ValueError(f"Cannot aggregate confidence of an empty segment with `{reduce}`")
+                output = torch.zeros(num_segments, dtype=x.dtype, device=x.device)
+            return output.scatter_reduce_(0, segment_ids, x, reduce=reduce, include_self=False)
+
+        return aggregate
+
+    return {
+        "mean": segment_reduce("mean"),
+        "min": segment_reduce("amin"),
+        "max": segment_reduce("amax"),
+        "prod": segment_reduce("prod"),
+    }
+
+
+def get_span_indices(starts: torch.Tensor, lengths: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Get the indices of the elements of spans `[starts[i], starts[i] + lengths[i])` and the span of every index.
+
+    Args:
+        starts: start of every span [S]
+        lengths: length of every span [S]
+
+    Returns:
+        indices: concatenated indices of all spans [sum(lengths)]
+        span_ids: span of every index [sum(lengths)]
+    """
+    span_ids = torch.repeat_interleave(torch.arange(len(lengths), device=lengths.device), lengths)
+    span_offsets = lengths.cumsum(0) - lengths
+    indices = torch.arange(len(span_ids), device=lengths.device) + (starts - span_offsets)[span_ids]
+    return indices, span_ids
+
+
+def concat_to_tensor(sequences: Iterable[Iterable], dtype: torch.dtype) -> torch.Tensor:
+    """Concatenate sequences of numbers into a 1D CPU tensor.
+
+    The numbers are collected with `np.fromiter`, which is several times faster than calling `torch.tensor`
+    on a list of Python numbers.
+
+    Args:
+        sequences: sequences of numbers, e.g. the frame confidence of every hypothesis
+        dtype: dtype of the tensor
+
+    Returns:
+        1D tensor with the numbers of all sequences.
+    """
+    numpy_dtype = torch.empty(0, dtype=dtype).numpy().dtype
+    return torch.from_numpy(np.fromiter(itertools.chain.from_iterable(sequences), dtype=numpy_dtype))
+
+
 class ConfidenceMethodMixin(ABC):
     """Confidence Method Mixin class.
 
@@ -371,6 +449,11 @@ class ConfidenceMixin(ABC):
         # define aggregation functions
         self.confidence_aggregation_bank = get_confidence_aggregation_bank()
         self._aggregate_confidence = self.confidence_aggregation_bank[self.word_confidence_aggregation]
+        self._aggregate_confidence_segments = get_confidence_segment_aggregation_bank()[
+            self.word_confidence_aggregation
+        ]
+        # token id -> (token, decoded token text), see `_get_word_spans_subwords_sentencepiece`
+        self._token_text_cache = {}
 
         # Update preserve frame confidence
         if self.cfg.strategy in ['greedy', 'greedy_batch']:
@@ -411,6 +494,72 @@ class ConfidenceMixin(ABC):
         """
         raise NotImplementedError()
 
+    def _get_word_spans(self, hypothesis: Hypothesis) -> Tuple[List[int], List[int]]:
+        """Implemented by subclass in order to find the tokens of every word for `_aggregate_word_confidence`.
+
+        Args:
+            hypothesis: Hypothesis
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word of the hypothesis.
+        """
+        raise NotImplementedError()
+
+    def _aggregate_confidence_spans(
+        self, confidence: torch.Tensor, starts: torch.Tensor, lengths: torch.Tensor
+    ) -> List[float]:
+        """Aggregate spans of confidence scores with a single segmented reduction.
+
+        Args:
+            confidence: confidence scores [N]
+            starts: start of every span [S]
+            lengths: length of every span [S]
+
+        Returns:
+            A list of S aggregated confidence scores.
+        """
+        indices, span_ids = get_span_indices(starts, lengths)
+        return self._aggregate_confidence_segments(confidence[indices], span_ids, len(lengths)).tolist()
+
+    def _aggregate_word_confidence(self, hypotheses_list: List[Hypothesis]) -> List[List[float]]:
+        """Aggregate token confidence to a word-level confidence for all hypotheses of a batch at once.
+
+        Batched counterpart of `_aggregate_token_confidence`, words are found with `_get_word_spans`.
+
+        Args:
+            hypotheses_list: List of Hypothesis with `token_confidence`.
+
+        Returns:
+            A list of word-level confidence scores of every hypothesis.
+        """
+        word_spans = [self._get_word_spans(hyp) for hyp in hypotheses_list]
+        num_tokens = torch.tensor([len(hyp.token_confidence) for hyp in hypotheses_list], dtype=torch.long)
+        num_words = torch.tensor([len(starts) for starts, _ in word_spans], dtype=torch.long)
+        token_offsets = torch.repeat_interleave(num_tokens.cumsum(0) - num_tokens, num_words)
+        confidence = concat_to_tensor((hyp.token_confidence for hyp in hypotheses_list), dtype=torch.float64)
+        starts = concat_to_tensor((starts for starts, _ in word_spans), dtype=torch.long) + token_offsets
+        lengths = concat_to_tensor((lengths for _, lengths in word_spans), dtype=torch.long)
+        # spans must not run into the tokens of the next hypothesis
+        token_ends = token_offsets + torch.repeat_interleave(num_tokens, num_words)
+        lengths = torch.minimum(lengths, token_ends - starts).clamp(min=0)
+        word_confidence = self._aggregate_confidence_spans(confidence, starts, lengths)
+        word_offsets = [0] + num_words.cumsum(0).tolist()
+        return [word_confidence[word_offsets[i] : word_offsets[i + 1]] for i in range(len(hypotheses_list))]
+
+    def _get_word_spans_chars(self, words: List[str]) -> Tuple[List[int], List[int]]:
+        """Find the tokens of every word for character-based models.
+
+        Args:
+            words: List of words of a hypothesis.
+
+        Returns:
+            Starts and lengths of the spans of tokens of every word.
+        """
+        lengths = [len(word) for word in words]
+        # we assume that there is exactly one space token between words and exclude it from word confidence
+        starts = list(itertools.accumulate((word_len + 1 for word_len in lengths[:-1]), initial=0))
+        return starts[: len(lengths)], lengths
+
     def _aggregate_token_confidence_chars(self, words: List[str], token_confidence: List[float]) -> List[float]:
         """Implementation of token confidence aggregation for character-based models.
 
@@ -421,57 +570,81 @@ class ConfidenceMixin(ABC):
         Returns:
             A list of word-level confidence scores.
         """
-        word_confidence = []
-        i = 0
-        for word in words:
-            word_len = len(word)
-            word_confidence.append(self._aggregate_confidence(token_confidence[i : i + word_len]))
-            # we assume that there is exactly one space token between words and exclude it from word confidence
-            i += word_len + 1
-        return word_confidence
+        return [
+            self._aggregate_confidence(token_confidence[i : i + word_len])
+            for i, word_len in zip(*self._get_word_spans_chars(words))
+        ]
 
-    def _aggregate_token_confidence_subwords_sentencepiece(
-        self, words: List[str], token_confidence: List[float], token_ids: List[int]
-    ) -> List[float]:
-        """Implementation of token confidence aggregation for subword-based models.
+    def _get_word_spans_subwords_sentencepiece(
+        self, words: List[str], token_ids: List[int]
+    ) -> Tuple[List[int], List[int]]:
+        """Find the tokens of every word for subword-based models.
 
         **Note**: Only supports Sentencepiece based tokenizers !
 
         Args:
             words: List of words of a hypothesis.
-            token_confidence: List of token-level confidence scores of a hypothesis.
             token_ids: List of token ids of a hypothesis.
 
         Returns:
-            A list of word-level confidence scores.
+            Starts and lengths of the spans of tokens of every word.
         """
-        word_confidence = []
+        if isinstance(token_ids, torch.Tensor):
+            token_ids = token_ids.tolist()
+        starts, lengths = [], []
         # run only if there are final words
         if len(words) > 0:
             j = 0
             prev_unk = False
             prev_underline = False
             for i, token_id in enumerate(token_ids):
-                token = self.decode_ids_to_tokens([int(token_id)])[0]
-                token_text = self.decode_tokens_to_str([int(token_id)])
+                token_id = int(token_id)
+                if token_id not in self._token_text_cache:
+                    self._token_text_cache[token_id] = (
+                        self.decode_ids_to_tokens([token_id])[0],
+                        self.decode_tokens_to_str([token_id]),
+                    )
+                token, token_text = self._token_text_cache[token_id]
                 # treat `<unk>` as a separate word regardless of the next token
                 # to match the result of `tokenizer.ids_to_text`
                 if (token != token_text or prev_unk) and i > j:
                     # do not add confidence for `▁` if the current token starts with `▁`
                     # to match the result of `tokenizer.ids_to_text`
                     if not prev_underline:
-                        word_confidence.append(self._aggregate_confidence(token_confidence[j:i]))
+                        starts.append(j)
+                        lengths.append(i - j)
                     j = i
                 prev_unk = token == '<unk>'
                 prev_underline = token == '▁'
             if not prev_underline:
-                word_confidence.append(self._aggregate_confidence(token_confidence[j : len(token_ids)]))
-        if len(words) != len(word_confidence):
+                starts.append(j)
+                lengths.append(len(token_ids) - j)
+        if len(words) != len(starts):
             raise RuntimeError(
                 f"""Something went wrong with word-level confidence aggregation.\n
             Please check these values for debugging:\n
             len(words): {len(words)},\n
-            len(word_confidence): {len(word_confidence)},\n
+            len(word_confidence): {len(starts)},\n
             recognized text: `{' '.join(words)}`"""
             )
-        return word_confidence
+        return starts, lengths
+
+    def _aggregate_token_confidence_subwords_sentencepiece(
+        self, words: List[str], token_confidence: List[float], token_ids: List[int]
+    ) -> List[float]:
+        """Implementation of token confidence aggregation for subword-based models.
+
+        **Note**: Only supports Sentencepiece based tokenizers !
+
+        Args:
+            words: List of words of a hypothesis.
+            token_confidence: List of token-level confidence scores of a hypothesis.
+            token_ids: List of token ids of a hypothesis.
+
+        Returns:
+            A list of word-level confidence scores.
+        """
+        return [
+            self._aggregate_confidence(token_confidence[i : i + word_len])
+            for i, word_len in zip(*self._get_word_spans_subwords_sentencepiece(words, token_ids))
+        ]
@@ -0,0 +1,224 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed, memory-mapped store of speaker embeddings.
+
+Diarization extracts an embedding for every subsegment of every scale, and repeats the extraction on every run
+even if only clustering parameters change. The store keys an embedding by the content of the audio file,
+the subsegment offset and duration, and the fingerprint of the speaker model:
+
+    <store_dir>/<model fingerprint>/
+        shard-<uuid>/
+            meta.json
+            keys.npy        # uint64, sha1 of (audio file hash, offset, duration) truncated to 64 bits
+            embs.f16        # float16 [num_keys, emb_dim]
+
+Shards are immutable, written to a temporary directory and atomically renamed; `meta.json` marks a complete
+shard, so concurrent writers never expose partial shards. Embeddings are memory-mapped and a lookup of any
+number of keys is a single `searchsorted` over the sorted keys of all shards.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from os.path import expanduser
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from nemo.utils import logging
+
+__all__ = ['EmbeddingStore', 'audio_file_fingerprint', 'model_fingerprint', 'subsegment_keys']
+
+EMBEDDING_STORE_VERSION = 1
+
+# (absolute path, size, mtime) -> content hash, avoids re-hashing audio files within a process
+_AUDIO_FINGERPRINTS: Dict[Tuple[str, int, int], str] = {}
+
+
+def audio_file_fingerprint(audio_file: str, block_size: int = 2 ** 20) -> str:
+    """Returns the sha1 of the content of `audio_file`, so copies and renamed files share their embeddings."""
+    audio_file = os.path.abspath(expanduser(audio_file))
+    stat = os.stat(audio_file)
+    stat_key = (audio_file, stat.st_size, stat.st_mtime_ns)
+    if stat_key not in _AUDIO_FINGERPRINTS:
+        sha1 = hashlib.sha1()
+        with open(audio_file, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha1.update(block)
+        _AUDIO_FINGERPRINTS[stat_key] = sha1.hexdigest()
+    return _AUDIO_FINGERPRINTS[stat_key]
+
+
+def model_fingerprint(model: torch.nn.Module, sample_rate: int = None) -> str:
+    """Returns the sha1 of the parameters and buffers of `model` (and the input sample rate)."""
+    sha1 = hashlib.sha1(f'{EMBEDDING_STORE_VERSION}:{sample_rate}'.encode('utf-8'))
+    for name, tensor in model.state_dict().items():
+        tensor = tensor.detach().cpu().contiguous()
+        sha1.update(f'{name}:{tensor.dtype}:{tuple(tensor.shape)}'.encode('utf-8'))
+        sha1.update(tensor.view(-1).view(torch.uint8).numpy().tobytes() if tensor.numel() else b'')
+    return sha1.hexdigest()
+
+
+def subsegment_keys(audio_fingerprints: Sequence[str], offsets: Sequence[float], durations: Sequence[float]):
+    """
+    Returns uint64 keys of subsegments of audio files, offsets and durations are rounded to milliseconds.
+
+    Args:
+        audio_fingerprints: `audio_file_fingerprint` of the audio file of every subsegment
+        offsets: start of every subsegment in seconds
+        durations: duration of every subsegment in seconds
+
+    Returns:
+        keys (np.ndarray): uint64 key of every subsegment
+    """
+    keys = np.empty(len(audio_fingerprints), dtype=np.uint64)
+    for i, (fingerprint, offset, duration) in enumerate(zip(audio_fingerprints, offsets, durations)):
+        digest = hashlib.sha1(f'{fingerprint}:{round(offset * 1000)}:{round(duration * 1000)}'.encode('utf-8'))
+        keys[i] = np.frombuffer(digest.digest()[:8], dtype='<u8')[0]
+    return keys
+
+
+class EmbeddingStore:
+    """
+    Embeddings of a speaker model, stored in memory-mapped float16 shards under `store_dir`.
+
+    New embeddings are buffered by `add` and written as a new shard by `flush`. Shards written by other
+    processes become visible after `reload`.
+
+    Args:
+        store_dir: root directory of the store, shared by all models.
+        model_fingerprint: fingerprint of the model which computes the embeddings, see `model_fingerprint`.
+    """
+
+    def __init__(self, store_dir: str, model_fingerprint: str):
+        self.path = os.path.join(expanduser(store_dir), model_fingerprint)
+        self.emb_dim = None
+        self._pending_keys: List[np.ndarray] = []
+        self._pending_embs: List[np.ndarray] = []
+        self.reload()
+
+    def reload(self):
+        """Memory-maps all complete shards and rebuilds the sorted key index."""
+        self._shards: List[np.ndarray] = []
+        keys, shard_ids = [], []
+        shard_dirs = sorted(os.listdir(self.path)) if os.path.isdir(self.path) else []
+        for shard_dir in shard_dirs:
+            shard_path = os.path.join(self.path, shard_dir)
+            if not shard_dir.startswith('shard-') or not os.path.exists(os.path.join(shard_path, 'meta.json')):
+                continue
+            with open(os.path.join(shard_path, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            if meta['version'] != EMBEDDING_STORE_VERSION:
+                continue
+            if self.emb_dim is not None and meta['emb_dim'] != self.emb_dim:
+                raise ValueError(f"Shard {shard_path} has emb_dim {meta['emb_dim']}, expected {self.emb_dim}")
+            self.emb_dim = meta['emb_dim']
+            keys.append(np.load(os.path.join(shard_path, 'keys.npy')))
+            shard_ids.append(np.full(meta['num_keys'], len(self._shards), dtype=np.int32))
+            self._shards.append(
+                np.memmap(
+                    os.path.join(shard_path, 'embs.f16'),
+                    dtype=np.float16,
+                    mode='r',
+                    shape=(meta['num_keys'], meta['emb_dim']),
+                )
+            )
+
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+        shard_ids = np.concatenate(shard_ids) if shard_ids else np.zeros(0, dtype=np.int32)
+        rows = np.concatenate([np.arange(len(shard)) for shard in self._shards]) if self._shards else shard_ids
+        # the same key may be written by concurrent runs, the stable sort keeps the first occurrence first
+        order = np.argsort(keys, kind='stable')
+        self._keys, self._shard_ids, self._rows = keys[order], shard_ids[order], rows[order]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _find(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        keys = np.asarray(keys, dtype=np.uint64)
+        idx = np.searchsorted(self._keys, keys)
+        found = idx < len(self._keys)
+        found[found] = self._keys[idx[found]] == keys[found]
+        return found, idx
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Returns a bool mask of `keys` which are in the store (pending keys are not)."""
+        return self._find(keys)[0]
+
+    def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bulk lookup of embeddings.
+
+        Args:
+            keys: uint64 keys, see `subsegment_keys`
+
+        Returns:
+            found (np.ndarray): bool mask of the keys which are in the store
+            embs (np.ndarray): float16 [len(keys), emb_dim] embeddings, zeros for keys which were not found
+        """
+        found, idx = self._find(keys)
+        embs = np.zeros((len(found), self.emb_dim or 0), dtype=np.float16)
+        idx = idx[found]
+        out_rows = np.nonzero(found)[0]
+        shard_ids, rows = self._shard_ids[idx], self._rows[idx]
+        for shard_id in np.unique(shard_ids):
+            in_shard = shard_ids == shard_id
+            embs[out_rows[in_shard]] = self._shards[shard_id][rows[in_shard]]
+        return found, embs
+
+    def add(self, keys: np.ndarray, embs: np.ndarray):
+        """Buffers embeddings `embs` [len(keys), emb_dim] of `keys`, they are written by `flush`."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        embs = np.asarray(embs).astype(np.float16)
+        if embs.ndim != 2 or embs.shape[0] != len(keys):
+            raise ValueError(f"Expected embeddings of shape [{len(keys)}, emb_dim], got {list(embs.shape)}")
+        if self.emb_dim is not None and embs.shape[1] != self.emb_dim:
+            raise ValueError(f"Expected embeddings of dimension {self.emb_dim}, got {embs.shape[1]}")
+        self.emb_dim = embs.shape[1]
+        self._pending_keys.append(keys)
+        self._pending_embs.append(embs)
+
+    def flush(self):
+        """Writes the buffered embeddings (without keys which are already stored) as a new shard."""
+        if not self._pending_keys:
+            return
+        keys, embs = np.concatenate(self._pending_keys), np.concatenate(self._pending_embs)
+        self._pending_keys, self._pending_embs = [], []
+        keys, first = np.unique(keys, return_index=True)
+        keep = ~self.contains(keys)
+        keys, embs = keys[keep], embs[first[keep]]
+        if len(keys) == 0:
+            return
+
+        shard_name = f'shard-{uuid.uuid4().hex}'
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = os.path.join(self.path, f'.tmp-{shard_name}')
+        os.makedirs(tmp_path)
+        try:
+            np.save(os.path.join(tmp_path, 'keys.npy'), keys)
+            with open(os.path.join(tmp_path, 'embs.f16'), 'wb') as f:
+                f.write(np.ascontiguousarray(embs).tobytes())
+            meta = dict(version=EMBEDDING_STORE_VERSION, num_keys=len(keys), emb_dim=int(embs.shape[1]))
+            with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            os.rename(tmp_path, os.path.join(self.path, shard_name))
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        logging.info(f"Added {len(keys)} embeddings to embedding store {self.path}")
+        self.reload()
@@ -19,7 +19,7 @@ from typing import Optional, Tuple, Union
 from torchmetrics.text import SacreBLEUScore
 from torchmetrics.text.rouge import ROUGEScore
 
-from nemo.collections.asr.metrics.wer import word_error_rate_detail
+from nemo.collections.asr.metrics.corpus_wer import ErrorCounts, iter_error_counts
 from nemo.utils import logging
 from nemo.utils.nemo_logging import LogMode
 
@@ -166,10 +166,12 @@ def cal_write_wer(
     ignore_punctuation: bool = False,
     punctuations: Optional[list] = None,
     strip_punc_space: bool = False,
+    num_workers: int = 0,
 ) -> Tuple[str, dict, str]:
-    """ 
-    Calculate wer, inserion, deletion and substitution rate based on groundtruth text and pred_text_attr_name (pred_text) 
+    """
+    Calculate wer, inserion, deletion and substitution rate based on groundtruth text and pred_text_attr_name (pred_text)
     We use WER in function name as a convention, but Error Rate (ER) currently support Word Error Rate (WER) and Character Error Rate (CER)
+    Edit operations are counted in `num_workers` worker processes (0 to count them in the current process).
     """
     samples = []
     hyps = []
@@ -206,22 +208,18 @@ def cal_write_wer(
                 ref = ref.lower()
                 hyp = hyp.lower()
 
-            wer, tokens, ins_rate, del_rate, sub_rate = word_error_rate_detail(
-                hypotheses=[hyp], references=[ref], use_cer=use_cer
-            )
-            sample[eval_metric] = wer  # evaluatin metric, could be word error rate of character error rate
-            sample['tokens'] = tokens  # number of word/characters/tokens
-            sample['ins_rate'] = ins_rate  # insertion error rate
-            sample['del_rate'] = del_rate  # deletion error rate
-            sample['sub_rate'] = sub_rate  # substitution error rate
-
             samples.append(sample)
             hyps.append(hyp)
             refs.append(ref)
 
-    total_wer, total_tokens, total_ins_rate, total_del_rate, total_sub_rate = word_error_rate_detail(
-        hypotheses=hyps, references=refs, use_cer=use_cer
-    )
+    total_counts = ErrorCounts()
+    for sample, counts in zip(samples, iter_error_counts(zip(hyps, refs), use_cer=use_cer, num_workers=num_workers)):
+        sample[eval_metric] = counts.error_rate  # evaluatin metric, could be word error rate of character error rate
+        sample['tokens'] = counts.tokens  # number of word/characters/tokens
+        sample['ins_rate'] = counts.ins_rate  # insertion error rate
+        sample['del_rate'] = counts.del_rate  # deletion error rate
+        sample['sub_rate'] = counts.sub_rate  # substitution error rate
+        total_counts += counts
 
     if not output_filename:
         output_manifest_w_wer = pred_manifest
@@ -234,14 +232,7 @@ def cal_write_wer(
             fout.write('\n')
             fout.flush()
 
-    total_res = {
-        "samples": len(samples),
-        "tokens": total_tokens,
-        eval_metric: total_wer,
-        "ins_rate": total_ins_rate,
-        "del_rate": total_del_rate,
-        "sub_rate": total_sub_rate,
-    }
+    total_res = total_counts.as_dict(eval_metric)
     return output_manifest_w_wer, total_res, eval_metric
 
 
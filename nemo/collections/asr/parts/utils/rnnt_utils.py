@@ -26,8 +26,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
 
 import torch
 
@@ -85,6 +86,9 @@ class Hypothesis:
     tokens: (Optional) A list of decoded tokens (can be characters or word-pieces.
 
     last_token (Optional): A token or batch of tokens which was predicted in the last step.
+
+    decoder_cache_stats: (Optional) Hits, misses and evictions of the decoder state cache while decoding
+        the sample, set by beam search algorithms that use a `DecoderStateCache`.
     """
 
     score: float
@@ -104,6 +108,7 @@ class Hypothesis:
     ngram_lm_state: Optional[Union[Dict[str, Any], List[Any]]] = None
     tokens: Optional[Union[List[int], torch.Tensor]] = None
     last_token: Optional[torch.Tensor] = None
+    decoder_cache_stats: Optional[Dict[str, int]] = None
 
     @property
     def non_blank_frame_confidence(self) -> List[float]:
@@ -115,6 +120,9 @@ class Hypothesis:
         non_blank_frame_confidence = []
         # self.timestep can be a dict for RNNT
         timestep = self.timestep['timestep'] if isinstance(self.timestep, dict) else self.timestep
+        if isinstance(timestep, torch.Tensor):
+            # indexing with Python ints is much faster than with 0-dim tensors
+            timestep = timestep.tolist()
         if len(timestep) != 0 and self.frame_confidence is not None:
             if any(isinstance(i, list) for i in self.frame_confidence):  # rnnt
                 t_prev = -1
@@ -222,6 +230,79 @@ def select_k_expansions(
     return k_expansions
 
 
+class DecoderStateCache:
+    """
+    LRU cache of prediction network outputs and states, keyed by the label prefix of a hypothesis.
+    Used as the `cache` argument of `AbstractRNNTDecoder.score_hypothesis` and `batch_score_hypothesis`.
+
+    The prediction network only depends on the label prefix, so the cache can be shared by all expansions,
+    time steps and utterances which start from the same decoder state. Hits and misses are counted by
+    membership checks, which the decoders perform before every prediction network call.
+
+    Args:
+        max_size: maximum number of cached prefixes, the least recently used prefixes are evicted first.
+            None means that the cache is unbounded.
+    """
+
+    def __init__(self, max_size: Optional[int] = None):
+        if max_size is not None and max_size <= 0:
+            raise ValueError(f"max_size must be > 0 or None, got {max_size}")
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return True
+        self.misses += 1
+        return False
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._entries[key]
+        self._entries.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.max_size is not None and len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all entries, counters are kept."""
+        self._entries.clear()
+
+    def reset_stats(self):
+        """Reset the hit, miss and eviction counters."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Returns the counters as a dictionary."""
+        return dict(
+            hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self), hit_rate=self.hit_rate
+        )
+
+    def counters(self) -> Dict[str, int]:
+        """Returns the hit, miss and eviction counters, used to compute the counts of a single sample."""
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
 class BatchedHyps:
     """Class to store batched hypotheses (labels, time_indices, scores) for efficient RNNT decoding"""
 
@@ -390,6 +471,186 @@ class BatchedHyps:
         self.current_lengths += active_mask
 
 
+class BatchedBeamHyps:
+    """
+    Class to store batched beam search hypotheses (labels, time_indices, scores) for efficient RNNT decoding.
+    All tensors are of shape [batch_size, beam_size, ...], invalid hypotheses have the score of -inf.
+    """
+
+    # prefix hashes are updated as hash * _HASH_MULTIPLIER + label + 1 (int64 overflow wraps around)
+    _HASH_MULTIPLIER = 1000003
+
+    def __init__(
+        self,
+        batch_size: int,
+        beam_size: int,
+        init_length: int,
+        device: Optional[torch.device] = None,
+        float_dtype: Optional[torch.dtype] = None,
+    ):
+        """
+
+        Args:
+            batch_size: batch size for hypotheses
+            beam_size: number of hypotheses for each element of the batch
+            init_length: initial estimate for the length of hypotheses (if the real length is higher, tensors will be reallocated)
+            device: device for storing hypotheses
+            float_dtype: float type for scores
+        """
+        if init_length <= 0:
+            raise ValueError(f"init_length must be > 0, got {init_length}")
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be > 0, got {batch_size}")
+        if beam_size <= 0:
+            raise ValueError(f"beam_size must be > 0, got {beam_size}")
+        self._max_length = init_length
+        self.batch_size = batch_size
+        self.beam_size = beam_size
+
+        # batch of current lengths of hypotheses
+        self.current_lengths = torch.zeros((batch_size, beam_size), device=device, dtype=torch.long)
+        # tensor for storing transcripts
+        self.transcript = torch.zeros((batch_size, beam_size, self._max_length), device=device, dtype=torch.long)
+        # tensor for storing timesteps corresponding to transcripts
+        self.timesteps = torch.zeros((batch_size, beam_size, self._max_length), device=device, dtype=torch.long)
+        # accumulated scores for hypotheses, only the first hypothesis (empty transcript) is valid initially
+        self.scores = torch.full((batch_size, beam_size), float('-inf'), device=device, dtype=float_dtype)
+        self.scores[:, 0] = 0.0
+        # hashes of the transcripts, used for recombination of hypotheses with equal transcripts
+        self.transcript_hash = torch.zeros((batch_size, beam_size), device=device, dtype=torch.long)
+
+    @classmethod
+    def _from_tensors(
+        cls,
+        current_lengths: torch.Tensor,
+        transcript: torch.Tensor,
+        timesteps: torch.Tensor,
+        scores: torch.Tensor,
+        transcript_hash: torch.Tensor,
+    ) -> 'BatchedBeamHyps':
+        hyps = cls.__new__(cls)
+        hyps.batch_size, hyps.beam_size, hyps._max_length = transcript.shape
+        hyps.current_lengths = current_lengths
+        hyps.transcript = transcript
+        hyps.timesteps = timesteps
+        hyps.scores = scores
+        hyps.transcript_hash = transcript_hash
+        return hyps
+
+    def _allocate_more(self):
+        """
+        Allocate 2x space for tensors, similar to common C++ std::vector implementations
+        to maintain O(1) insertion time complexity
+        """
+        self.transcript = torch.cat((self.transcript, torch.zeros_like(self.transcript)), dim=-1)
+        self.timesteps = torch.cat((self.timesteps, torch.zeros_like(self.timesteps)), dim=-1)
+        self._max_length *= 2
+
+    def select(self, beam_indices: torch.Tensor) -> 'BatchedBeamHyps':
+        """
+        Returns new hypotheses gathered from the beams of the current hypotheses.
+
+        Args:
+            beam_indices: tensor of shape [batch_size, new_beam_size] with indices of beams to select
+        """
+        storage_indices = beam_indices[:, :, None].expand(-1, -1, self._max_length)
+        return self._from_tensors(
+            current_lengths=self.current_lengths.gather(1, beam_indices),
+            transcript=self.transcript.gather(1, storage_indices),
+            timesteps=self.timesteps.gather(1, storage_indices),
+            scores=self.scores.gather(1, beam_indices),
+            transcript_hash=self.transcript_hash.gather(1, beam_indices),
+        )
+
+    def with_scores(self, scores: torch.Tensor) -> 'BatchedBeamHyps':
+        """
+        Returns hypotheses sharing the transcripts with the current hypotheses, with new scores.
+        The storage is shared, so the result should not be modified inplace.
+        """
+        return self._from_tensors(
+            current_lengths=self.current_lengths,
+            transcript=self.transcript,
+            timesteps=self.timesteps,
+            scores=scores,
+            transcript_hash=self.transcript_hash,
+        )
+
+    def concat(self, other: 'BatchedBeamHyps') -> 'BatchedBeamHyps':
+        """Returns new hypotheses with the beams of `other` appended to the beams of the current hypotheses."""
+        while self._max_length < other._max_length:
+            self._allocate_more()
+        while other._max_length < self._max_length:
+            other._allocate_more()
+        return self._from_tensors(
+            current_lengths=torch.cat((self.current_lengths, other.current_lengths), dim=1),
+            transcript=torch.cat((self.transcript, other.transcript), dim=1),
+            timesteps=torch.cat((self.timesteps, other.timesteps), dim=1),
+            scores=torch.cat((self.scores, other.scores), dim=1),
+            transcript_hash=torch.cat((self.transcript_hash, other.transcript_hash), dim=1),
+        )
+
+    def replace_masked_(self, other: 'BatchedBeamHyps', mask: torch.Tensor):
+        """
+        Replace (inplace) hypotheses of the batch elements selected by `mask` with the hypotheses from `other`.
+
+        Args:
+            other: hypotheses with the same batch and beam size
+            mask: tensor of shape [batch_size] selecting batch elements to replace
+        """
+        while self._max_length < other._max_length:
+            self._allocate_more()
+        while other._max_length < self._max_length:
+            other._allocate_more()
+        torch.where(mask[:, None], other.current_lengths, self.current_lengths, out=self.current_lengths)
+        torch.where(mask[:, None, None], other.transcript, self.transcript, out=self.transcript)
+        torch.where(mask[:, None, None], other.timesteps, self.timesteps, out=self.timesteps)
+        torch.where(mask[:, None], other.scores, self.scores, out=self.scores)
+        torch.where(mask[:, None], other.transcript_hash, self.transcript_hash, out=self.transcript_hash)
+
+    def add_results_(self, labels: torch.Tensor, time_indices: torch.Tensor, scores: torch.Tensor):
+        """
+        Add results (inplace) from a decoding step to all hypotheses.
+        We assume that labels are non-blanks.
+
+        Args:
+            labels: tensor of shape [batch_size, beam_size] with non-blank labels to add
+            time_indices: tensor of time index for each label
+            scores: label scores
+        """
+        if self.current_lengths.max().item() >= self._max_length:
+            self._allocate_more()
+        self.scores += scores
+        self.transcript.scatter_(2, self.current_lengths[:, :, None], labels[:, :, None])
+        self.timesteps.scatter_(2, self.current_lengths[:, :, None], time_indices[:, :, None])
+        self.transcript_hash = self.transcript_hash * self._HASH_MULTIPLIER + labels + 1
+        self.current_lengths += 1
+
+    def recombine_(self):
+        """
+        Merge (inplace) hypotheses with equal transcripts within each batch element:
+        the first hypothesis of the group gets the log-sum-exp of the scores, the others become invalid.
+        """
+        valid = self.scores > float('-inf')
+        same = (
+            (self.transcript_hash[:, :, None] == self.transcript_hash[:, None, :])
+            & (self.current_lengths[:, :, None] == self.current_lengths[:, None, :])
+            & valid[:, :, None]
+            & valid[:, None, :]
+        )
+        is_first = torch.logical_and(
+            same.int().argmax(dim=-1) == torch.arange(self.beam_size, device=same.device)[None, :], valid
+        )
+        merged_scores = torch.where(same, self.scores[:, None, :], float('-inf')).logsumexp(dim=-1)
+        self.scores = torch.where(is_first, merged_scores, float('-inf'))
+
+    def topk(self, k: int) -> Tuple['BatchedBeamHyps', torch.Tensor]:
+        """
+        Returns the best `k` hypotheses of each batch element, and their beam indices of shape [batch_size, k].
+        """
+        _, beam_indices = self.scores.topk(k, dim=1)
+        return self.select(beam_indices), beam_indices
+
+
 class BatchedAlignments:
     """
     Class to store batched alignments (logits, labels, frame_confidence).
@@ -603,7 +864,8 @@ def batched_hyps_to_hypotheses(
             alignment_logits = alignments.logits.cpu()
             alignment_labels = alignments.labels.cpu()
         if alignments.with_frame_confidence:
-            frame_confidence = alignments.frame_confidence.cpu()
+            # confidence of the whole batch is converted at once, not element by element
+            frame_confidence = alignments.frame_confidence.cpu().tolist()
 
         # for each hypothesis - aggregate alignment using unique_consecutive for time indices (~itertools.groupby)
         for i in range(len(hypotheses)):
@@ -620,8 +882,42 @@ def batched_hyps_to_hypotheses(
                         [(alignment_logits[i, start + j], alignment_labels[i, start + j]) for j in range(timestep_cnt)]
                     )
                 if alignments.with_frame_confidence:
-                    hypotheses[i].frame_confidence.append(
-                        [frame_confidence[i, start + j] for j in range(timestep_cnt)]
-                    )
+                    hypotheses[i].frame_confidence.append(frame_confidence[i][start : start + timestep_cnt])
                 start += timestep_cnt
     return hypotheses
+
+
+def batched_beam_hyps_to_hypotheses(batched_hyps: BatchedBeamHyps, score_norm: bool = True) -> List[NBestHypotheses]:
+    """
+    Convert batched beam hypotheses to a list of NBestHypotheses objects, sorted with the best hypothesis first.
+
+    Args:
+        batched_hyps: BatchedBeamHyps object
+        score_norm: whether to sort the hypotheses by the score normalized by the length of the hypothesis
+            (including the start of sequence symbol, same as `BeamRNNTInfer.sort_nbest`)
+
+    Returns:
+        list of NBestHypotheses objects
+    """
+    scores = batched_hyps.scores.cpu()
+    lengths = batched_hyps.current_lengths.cpu()
+    transcript = batched_hyps.transcript.cpu()
+    timesteps = batched_hyps.timesteps.cpu()
+    sort_scores = scores / (lengths + 1) if score_norm else scores
+    nbest_hypotheses = []
+    for i in range(batched_hyps.batch_size):
+        hypotheses = []
+        for j in sort_scores[i].argsort(descending=True).tolist():
+            if scores[i, j] == float('-inf'):
+                continue
+            hypotheses.append(
+                Hypothesis(
+                    score=scores[i, j].item(),
+                    y_sequence=transcript[i, j, : lengths[i, j]],
+                    timestep=timesteps[i, j, : lengths[i, j]],
+                    alignments=None,
+                    dec_state=None,
+                )
+            )
+        nbest_hypotheses.append(NBestHypotheses(hypotheses))
+    return nbest_hypotheses
@@ -0,0 +1,408 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse
+import torch
+from scipy.sparse.csgraph import connected_components, laplacian
+from scipy.sparse.linalg import eigsh, lobpcg
+
+from nemo.collections.asr.parts.utils.offline_clustering import (
+    NMESC,
+    ScalerMinMax,
+    SpeakerClustering,
+    SpectralClustering,
+    cos_similarity,
+    split_input_data,
+)
+
+
+def get_normalized_embs(emb: torch.Tensor, eps: float = 3.5e-4) -> torch.Tensor:
+    """
+    Normalize embedding vectors to unit length in the same way as `cos_similarity`.
+    """
+    emb = emb.float()
+    return emb / (torch.norm(emb, dim=1).unsqueeze(1) + eps)
+
+
+def get_argmin_mat_sorted(timestamps_in_scales: List[torch.Tensor]) -> List[torch.Tensor]:
+    """
+    Same mapping between the base scale and other scales as `get_argmin_mat`, found with a binary search
+    over the sorted segment anchors of each scale instead of the (base segments) x (segments) distance matrix.
+    """
+    base_scale_anchor = torch.mean(timestamps_in_scales[-1], dim=1)
+    session_scale_mapping_list = []
+    for time_stamps_float in timestamps_in_scales:
+        curr_scale_anchor, sort_index = torch.sort(torch.mean(time_stamps_float, dim=1), stable=True)
+        right = torch.searchsorted(curr_scale_anchor, base_scale_anchor).clamp(max=len(curr_scale_anchor) - 1)
+        left = (right - 1).clamp(min=0)
+        # the first segment of equal anchors has the smallest index, as with argmin
+        left = torch.searchsorted(curr_scale_anchor, curr_scale_anchor[left])
+        left_dist = torch.abs(curr_scale_anchor[left] - base_scale_anchor)
+        right_dist = torch.abs(curr_scale_anchor[right] - base_scale_anchor)
+        left_index, right_index = sort_index[left], sort_index[right]
+        use_left = (left_dist < right_dist) | ((left_dist == right_dist) & (left_index < right_index))
+        session_scale_mapping_list.append(torch.where(use_left, left_index, right_index))
+    return session_scale_mapping_list
+
+
+def get_knn_multiscale_cos_affinity(
+    multiscale_weights: torch.Tensor,
+    embeddings_in_scales: List[torch.Tensor],
+    timestamps_in_scales: List[torch.Tensor],
+    n_neighbors: int,
+    block_size: Optional[int] = None,
+    device: torch.device = torch.device('cpu'),
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Find the top `n_neighbors` base-scale segments of each base-scale segment by the multiscale fused cosine
+    similarity, without building the N by N affinity matrix of `getMultiScaleCosAffinityMatrix`.
+    The fused similarity rows are calculated in blocks of `block_size` segments, so that the memory usage is
+    O(block_size x N) and the top-k selection is exact.
+
+    NOTE: The per-scale min-max normalization of `getMultiScaleCosAffinityMatrix` is not applied, since it requires
+    the minimum of the full matrix. It is an affine map for each scale and changes the neighbor ranks only slightly.
+
+    Args:
+        multiscale_weights (Tensor):
+            Tensor containing multiscale weights
+            Dimensions: (Number of scales) x 1
+        embeddings_in_scales (list):
+            List containing split embedding tensors by each scale
+        timestamps_in_scales (list):
+            List containing split timestamps tensors by each scale
+        n_neighbors (int):
+            The number of top values that are selected from each row. Each segment is its own nearest neighbor
+            as in `getKneighborsConnections`.
+        block_size (int):
+            The number of rows calculated at once. If None, it is chosen to keep a block under 64M values.
+        device (torch.device):
+            Torch device variable
+
+    Returns:
+        knn_sim (Tensor):
+            Fused cosine similarity values of the neighbors in descending order.
+            Dimensions: (Number of base-scale segments) x (n_neighbors)
+        knn_index (Tensor):
+            Indices of the neighbors.
+            Dimensions: (Number of base-scale segments) x (n_neighbors)
+    """
+    multiscale_weights = torch.squeeze(multiscale_weights, dim=0).float().to(device)
+    session_scale_mapping_list = get_argmin_mat_sorted(timestamps_in_scales)
+    num_segments = len(timestamps_in_scales[-1])
+    n_neighbors = min(n_neighbors, num_segments)
+    if block_size is None:
+        block_size = max(1, min(num_segments, 2 ** 26 // num_segments))
+
+    norm_embs = [get_normalized_embs(emb.to(device)) for emb in embeddings_in_scales]
+    mappings = [mapping.to(device) for mapping in session_scale_mapping_list]
+    knn_sim_list, knn_index_list = [], []
+    for start in range(0, num_segments, block_size):
+        end = min(start + block_size, num_segments)
+        block_sim = torch.zeros(end - start, num_segments, device=device)
+        for scale_idx, (norm_emb, mapping) in enumerate(zip(norm_embs, mappings)):
+            scale_sim = torch.mm(norm_emb[mapping[start:end]], norm_emb.t())
+            block_sim += multiscale_weights[scale_idx] * scale_sim[:, mapping]
+        # cos_similarity fills the diagonal with 1, every segment is the nearest neighbor of itself
+        block_rows = torch.arange(end - start, device=device)
+        block_sim[block_rows, block_rows + start] = multiscale_weights.sum()
+        knn_sim, knn_index = torch.topk(block_sim, n_neighbors, dim=1)
+        knn_sim_list.append(knn_sim.cpu())
+        knn_index_list.append(knn_index.cpu())
+    return torch.cat(knn_sim_list), torch.cat(knn_index_list)
+
+
+def getSparseAffinityGraphMat(knn_index: torch.Tensor, p_value: int) -> scipy.sparse.csr_matrix:
+    """
+    Sparse version of `getAffinityGraphMat`: binarize the top-p neighbors of each segment from
+    the k-NN indices, then symmetrize the binarized graph matrix. Self connections are dropped
+    since `getLaplacian` fills the diagonal with zeros.
+    """
+    num_segments = knn_index.shape[0]
+    rows = np.repeat(np.arange(num_segments), p_value)
+    cols = knn_index[:, :p_value].numpy().ravel()
+    keep = rows != cols
+    binarized_graph = scipy.sparse.csr_matrix(
+        (np.ones(keep.sum(), dtype=np.float32), (rows[keep], cols[keep])), shape=(num_segments, num_segments)
+    )
+    return 0.5 * (binarized_graph + binarized_graph.T)
+
+
+def isSparseGraphFullyConnected(affinity_mat: scipy.sparse.spmatrix) -> bool:
+    """
+    Check whether the given sparse affinity matrix is a fully connected graph.
+    """
+    n_components, _ = connected_components(affinity_mat, directed=False)
+    return n_components == 1
+
+
+def sparseEigDecompose(
+    affinity_mat: scipy.sparse.spmatrix,
+    n_eigs: int,
+    eig_solver: str = 'lobpcg',
+    tol: Optional[float] = None,
+    max_iter: int = 500,
+    random_state: int = 0,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Calculate the `n_eigs` smallest eigenvalues and eigenvectors of the Laplacian matrix of a sparse affinity
+    matrix with a partial eigensolver, instead of the full decomposition of `eigDecompose`.
+
+    Args:
+        affinity_mat (scipy.sparse.spmatrix):
+            Symmetric sparse affinity matrix without self connections
+        n_eigs (int):
+            Number of eigenpairs to be calculated
+        eig_solver (str):
+            'lobpcg' for LOBPCG with a Jacobi preconditioner or 'lanczos' for implicitly restarted Lanczos (ARPACK).
+        tol (float):
+            Solver tolerance, None for the default tolerance of the solver.
+        max_iter (int):
+            Maximum number of LOBPCG iterations.
+        random_state (int):
+            Seed of the initial vectors.
+
+    Returns:
+        lambdas (Tensor):
+            The smallest eigenvalues in ascending order
+        diffusion_map (Tensor):
+            The corresponding eigenvectors. Dimensions: (Number of segments) x (n_eigs)
+    """
+    num_segments = affinity_mat.shape[0]
+    lap = laplacian(affinity_mat.astype(np.float64)).tocsr()
+    if num_segments <= max(5 * n_eigs, 64):
+        # the partial solvers need a few times more rows than eigenpairs
+        lambdas, diffusion_map = np.linalg.eigh(lap.toarray())
+        lambdas, diffusion_map = lambdas[:n_eigs], diffusion_map[:, :n_eigs]
+    elif eig_solver == 'lobpcg':
+        rng = np.random.default_rng(random_state)
+        init_vecs = rng.standard_normal((num_segments, n_eigs))
+        # the constant vector is the eigenvector of the zero eigenvalue of every connected Laplacian
+        init_vecs[:, 0] = 1.0
+        degree = lap.diagonal()
+        precond = scipy.sparse.diags(1.0 / np.where(degree > 0, degree, 1.0))
+        lambdas, diffusion_map = lobpcg(lap, init_vecs, M=precond, tol=tol, maxiter=max_iter, largest=False)
+    elif eig_solver == 'lanczos':
+        rng = np.random.default_rng(random_state)
+        lambdas, diffusion_map = eigsh(
+            lap, k=n_eigs, which='SA', tol=0 if tol is None else tol, v0=rng.random(num_segments)
+        )
+    else:
+        raise ValueError(f"Unknown eig_solver: {eig_solver}, should be either 'lobpcg' or 'lanczos'")
+
+    sort_index = np.argsort(lambdas)
+    lambdas = torch.from_numpy(np.ascontiguousarray(lambdas[sort_index])).float()
+    diffusion_map = torch.from_numpy(np.ascontiguousarray(diffusion_map[:, sort_index])).float()
+    return lambdas, diffusion_map
+
+
+class SparseSpectralClustering(SpectralClustering):
+    """
+    Spectral clustering on a sparse (scipy) affinity matrix. Spectral embeddings are obtained with a
+    partial eigensolver for the `n_clusters` smallest eigenpairs instead of the full eigendecomposition.
+    """
+
+    def __init__(
+        self,
+        n_clusters: int = 8,
+        random_state: int = 0,
+        n_random_trials: int = 1,
+        eig_solver: str = 'lobpcg',
+        cuda: bool = False,
+        device: torch.device = torch.device('cpu'),
+    ):
+        super().__init__(
+            n_clusters=n_clusters, random_state=random_state, n_random_trials=n_random_trials, cuda=cuda, device=device
+        )
+        self.eig_solver = eig_solver
+
+    def getSpectralEmbeddings(
+        self, affinity_mat: scipy.sparse.spmatrix, n_spks: int = 8, cuda: bool = False
+    ) -> torch.Tensor:
+        """
+        Calculate the smallest eigenvectors of the sparse Laplacian matrix to extract spectral embeddings.
+        """
+        _, diffusion_map = sparseEigDecompose(
+            affinity_mat, n_eigs=n_spks, eig_solver=self.eig_solver, random_state=self.random_state
+        )
+        inv_idx = torch.arange(diffusion_map.size(1) - 1, -1, -1).long()
+        return diffusion_map[:, inv_idx].to(self.device)
+
+
+class SparseSpeakerClustering:
+    """
+    Speaker clustering for long-form audio on a sparse k-NN affinity graph.
+
+    `SpeakerClustering` builds the dense N by N affinity matrix and runs a full eigendecomposition,
+    which is quadratic in memory and cubic in time for N segments. Here:
+        - NME analysis estimates the number of speakers and the p-value on an affinity matrix of
+          subsampled segments, as `NMESC` does with `use_subsampling_for_nme=True`.
+        - The top-p neighbors of every segment are found in blocks (`get_knn_multiscale_cos_affinity`),
+          so the affinity graph has O(N x p) entries.
+        - Spectral embeddings are the smallest eigenvectors of the sparse Laplacian from a partial
+          eigensolver (LOBPCG or Lanczos).
+    Sessions with at most `max_dense_segments` segments are clustered with `SpeakerClustering`.
+
+    Args:
+        max_neighbors (int):
+            The upper bound for the number of neighbors of each segment in the affinity graph.
+            The p-value estimated by NME analysis is scaled to the session length and capped by this value.
+        eig_solver (str):
+            'lobpcg' or 'lanczos', see `sparseEigDecompose`.
+        block_size (int):
+            The number of affinity rows calculated at once, None to choose it automatically.
+        max_dense_segments (int):
+            Sessions with at most this number of base-scale segments are clustered with `SpeakerClustering`.
+        min_samples_for_nmesc, nme_mat_size, sparse_search, maj_vote_spk_count, cuda:
+            See `SpeakerClustering`.
+    """
+
+    def __init__(
+        self,
+        max_neighbors: int = 64,
+        eig_solver: str = 'lobpcg',
+        block_size: Optional[int] = None,
+        max_dense_segments: int = 3000,
+        min_samples_for_nmesc: int = 6,
+        nme_mat_size: int = 512,
+        sparse_search: bool = True,
+        maj_vote_spk_count: bool = False,
+        cuda: bool = False,
+    ):
+        if eig_solver not in ('lobpcg', 'lanczos'):
+            raise ValueError(f"Unknown eig_solver: {eig_solver}, should be either 'lobpcg' or 'lanczos'")
+        self.max_neighbors = max_neighbors
+        self.eig_solver = eig_solver
+        self.block_size = block_size
+        self.max_dense_segments = max_dense_segments
+        self.nme_mat_size = nme_mat_size
+        self.sparse_search = sparse_search
+        self.maj_vote_spk_count = maj_vote_spk_count
+        self.cuda = cuda
+        self.device = torch.device("cuda") if self.cuda else torch.device("cpu")
+        self.speaker_clustering = SpeakerClustering(
+            min_samples_for_nmesc=min_samples_for_nmesc,
+            nme_mat_size=nme_mat_size,
+            sparse_search=sparse_search,
+            maj_vote_spk_count=maj_vote_spk_count,
+            cuda=cuda,
+        )
+        self.embeddings_in_scales: List[torch.Tensor] = [torch.Tensor(0)]
+        self.timestamps_in_scales: List[torch.Tensor] = [torch.Tensor(0)]
+
+    def get_subsampled_affinity_mat(
+        self, multiscale_weights: torch.Tensor, subsample_index: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Calculate the multiscale cosine affinity matrix of the subsampled base-scale segments,
+        which equals `getMultiScaleCosAffinityMatrix` followed by the subsampling of `NMESC`
+        up to the min-max normalization.
+        """
+        multiscale_weights = torch.squeeze(multiscale_weights, dim=0).to(self.device)
+        session_scale_mapping_list = get_argmin_mat_sorted(self.timestamps_in_scales)
+        fused_sim_d = torch.zeros(len(subsample_index), len(subsample_index), device=self.device)
+        for scale_idx, mapping_argmat in enumerate(session_scale_mapping_list):
+            emb_t = self.embeddings_in_scales[scale_idx][mapping_argmat[subsample_index]].float().to(self.device)
+            fused_sim_d += multiscale_weights[scale_idx] * ScalerMinMax(cos_similarity(emb_t, emb_t))
+        return fused_sim_d
+
+    def forward_infer(
+        self,
+        embeddings_in_scales: torch.Tensor,
+        timestamps_in_scales: torch.Tensor,
+        multiscale_segment_counts: torch.LongTensor,
+        multiscale_weights: torch.Tensor,
+        oracle_num_speakers: int = -1,
+        max_num_speakers: int = 8,
+        max_rp_threshold: float = 0.15,
+        enhanced_count_thres: int = 40,
+        sparse_search_volume: int = 30,
+        fixed_thres: float = -1.0,
+        kmeans_random_trials: int = 1,
+    ) -> torch.LongTensor:
+        """
+        Estimate the number of speakers and the p-value on subsampled segments, build the sparse k-NN
+        affinity graph and perform sparse spectral clustering. See `SpeakerClustering.forward_infer`
+        for the argument information.
+
+        Returns:
+            (LongTensor): Speaker labels for the segments in the provided input embeddings.
+        """
+        self.embeddings_in_scales, self.timestamps_in_scales = split_input_data(
+            embeddings_in_scales, timestamps_in_scales, multiscale_segment_counts
+        )
+        num_segments = self.embeddings_in_scales[-1].shape[0]
+        if num_segments <= self.max_dense_segments:
+            Y = self.speaker_clustering.forward_infer(
+                embeddings_in_scales=embeddings_in_scales,
+                timestamps_in_scales=timestamps_in_scales,
+                multiscale_segment_counts=multiscale_segment_counts,
+                multiscale_weights=multiscale_weights,
+                oracle_num_speakers=oracle_num_speakers,
+                max_num_speakers=max_num_speakers,
+                max_rp_threshold=max_rp_threshold,
+                enhanced_count_thres=enhanced_count_thres,
+                sparse_search_volume=sparse_search_volume,
+                fixed_thres=fixed_thres,
+                kmeans_random_trials=kmeans_random_trials,
+            )
+            return Y
+
+        if oracle_num_speakers > 0:
+            max_num_speakers = oracle_num_speakers
+
+        # NME analysis on the subsampled segments, the p-value is scaled back to the session length
+        subsample_ratio = max(1, int(num_segments / self.nme_mat_size))
+        subsample_index = torch.arange(0, num_segments, subsample_ratio)
+        nmesc = NMESC(
+            self.get_subsampled_affinity_mat(multiscale_weights, subsample_index),
+            max_num_speakers=max_num_speakers,
+            max_rp_threshold=max_rp_threshold,
+            sparse_search=self.sparse_search,
+            sparse_search_volume=sparse_search_volume,
+            use_subsampling_for_nme=False,
+            fixed_thres=fixed_thres,
+            maj_vote_spk_count=self.maj_vote_spk_count,
+            parallelism=False,
+            cuda=self.cuda,
+            device=self.device,
+        )
+        est_num_of_spk, p_hat_value = nmesc.forward()
+        p_value = max(2, min(int(p_hat_value.item()) * subsample_ratio, self.max_neighbors))
+
+        _, knn_index = get_knn_multiscale_cos_affinity(
+            multiscale_weights=multiscale_weights,
+            embeddings_in_scales=self.embeddings_in_scales,
+            timestamps_in_scales=self.timestamps_in_scales,
+            n_neighbors=self.max_neighbors,
+            block_size=self.block_size,
+            device=self.device,
+        )
+        # Add neighbors until the graph is fully connected, as `getMinimumConnection` does.
+        affinity_mat = getSparseAffinityGraphMat(knn_index, p_value)
+        while not isSparseGraphFullyConnected(affinity_mat) and p_value < knn_index.shape[1]:
+            p_value = min(2 * p_value, knn_index.shape[1])
+            affinity_mat = getSparseAffinityGraphMat(knn_index, p_value)
+
+        n_clusters = int(oracle_num_speakers) if oracle_num_speakers > 0 else int(est_num_of_spk.item())
+        spectral_model = SparseSpectralClustering(
+            n_clusters=n_clusters,
+            n_random_trials=kmeans_random_trials,
+            eig_solver=self.eig_solver,
+            cuda=self.cuda,
+            device=self.device,
+        )
+        return spectral_model.forward(affinity_mat)
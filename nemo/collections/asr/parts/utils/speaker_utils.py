@@ -30,6 +30,7 @@ from tqdm import tqdm
 from nemo.collections.asr.data.audio_to_label import repeat_signal
 from nemo.collections.asr.parts.utils.longform_clustering import LongFormSpeakerClustering
 from nemo.collections.asr.parts.utils.offline_clustering import SpeakerClustering, get_argmin_mat, split_input_data
+from nemo.collections.asr.parts.utils.sparse_clustering import SparseSpeakerClustering
 from nemo.utils import logging
 
 """
@@ -464,11 +465,31 @@ def perform_clustering(
         logging.warning("cuda=False, using CPU for eigen decomposition. This might slow down the clustering process.")
         cuda = False
 
-    speaker_clustering = LongFormSpeakerClustering(cuda=cuda)
+    use_sparse_affinity = clustering_params.get('use_sparse_affinity', False)
+    if use_sparse_affinity:
+        speaker_clustering = SparseSpeakerClustering(
+            max_neighbors=clustering_params.get('max_neighbors', 64),
+            eig_solver=clustering_params.get('eig_solver', 'lobpcg'),
+            maj_vote_spk_count=clustering_params.get('maj_vote_spk_count', False),
+            cuda=cuda,
+        )
+        long_form_kwargs = {}
+    else:
+        speaker_clustering = LongFormSpeakerClustering(cuda=cuda)
+        long_form_kwargs = {
+            'chunk_cluster_count': clustering_params.get('chunk_cluster_count', None),
+            'embeddings_per_chunk': clustering_params.get('embeddings_per_chunk', None),
+        }
 
     if clustering_params.get('export_script_module', False):
-        speaker_clustering = torch.jit.script(speaker_clustering)
-        torch.jit.save(speaker_clustering, 'speaker_clustering_script.pt')
+        if use_sparse_affinity:
+            logging.warning(
+                "export_script_module=True is ignored with use_sparse_affinity=True, "
+                "the sparse speaker clustering cannot be exported as a TorchScript module."
+            )
+        else:
+            speaker_clustering = torch.jit.script(speaker_clustering)
+            torch.jit.save(speaker_clustering, 'speaker_clustering_script.pt')
 
     for uniq_id, audio_rttm_values in tqdm(AUDIO_RTTM_MAP.items(), desc='clustering', leave=True, disable=not verbose):
         uniq_embs_and_timestamps = embs_and_timestamps[uniq_id]
@@ -491,8 +512,7 @@ def perform_clustering(
             max_num_speakers=int(clustering_params.max_num_speakers),
             max_rp_threshold=float(clustering_params.max_rp_threshold),
             sparse_search_volume=int(clustering_params.sparse_search_volume),
-            chunk_cluster_count=clustering_params.get('chunk_cluster_count', None),
-            embeddings_per_chunk=clustering_params.get('embeddings_per_chunk', None),
+            **long_form_kwargs,
         )
 
         del uniq_embs_and_timestamps
@@ -13,10 +13,14 @@
 # limitations under the License.
 
 import copy
+import math
 import os
-from typing import Optional
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
+import soundfile as sf
 import torch
 from omegaconf import OmegaConf
 from torch.utils.data import DataLoader
@@ -129,6 +133,70 @@ def longest_common_subsequence_merge(X, Y, filepath=None):
             else:
                 LCSuff[i][j] = 0
 
+    # Perfect alignment is found if the longest common subsequence extends to the final row of the old buffer
+    is_complete_merge = result_idx[0] == m
+    result_idx = _lcs_merge_slice(LCSuff, m, n, result_idx)
+
+    if filepath is not None:
+        extras = {
+            "is_complete_merge": is_complete_merge,
+            "X": X,
+            "Y": Y,
+            "slice_idx": result_idx,
+        }
+        write_lcs_alignment_to_pickle(LCSuff, filepath=filepath, extras=extras)
+        print("Wrote alignemnt to :", filepath)
+
+    return result_idx, LCSuff
+
+
+def _find_leftmost_lcs(LCSuff, m, n):
+    """
+    Backward search for the leftmost longest common subsequence in the alignment matrix `LCSuff`.
+
+    Returns:
+        A tuple (max_j, i_partial, j_partial) of the length of the subsequence and the indices of its last token
+        along the i-1 and ith chunks.
+    """
+    # backward linear search for leftmost j with longest subsequence
+    max_j = 0
+    max_j_idx = n
+
+    i_partial = m  # Starting index of i for partial merge
+    j_partial = -1  # Index holder of j for partial merge
+
+    # Select leftmost LCS
+    for i_idx in range(m, -1, -1):  # start from last timestep of old buffer
+        for j_idx in range(0, n + 1):  # start from first token from new buffer
+            # Select the longest LCSuff, while minimizing the index of j (token index for new buffer)
+            if LCSuff[i_idx][j_idx] > max_j and j_idx <= max_j_idx:
+                max_j = LCSuff[i_idx][j_idx]
+                max_j_idx = j_idx
+
+                # Update the starting indices of the partial merge
+                i_partial = i_idx
+                j_partial = j_idx
+
+    return max_j, i_partial, j_partial
+
+
+def _lcs_merge_slice(LCSuff, m, n, result_idx, leftmost_lcs=None):
+    """
+    Computes the slice of the ith chunk from the LCS alignment matrix of two consecutive buffers.
+    See longest_common_subsequence_merge() for details of the heuristics.
+
+    Args:
+        LCSuff: The LCS alignment matrix, indexable as LCSuff[i][j] for i <= m and j <= n.
+        m: Number of tokens of the subset of the i-1 chunk.
+        n: Number of tokens of the ith chunk.
+        result_idx: (i, j, slice_len) of the longest common subsequence ending last in the alignment matrix.
+        leftmost_lcs: Optional precomputed result of _find_leftmost_lcs().
+
+    Returns:
+        The list (i, j, slice_len).
+    """
+    result_idx = list(result_idx)
+
     # Check if perfect alignment was found or not
     # Perfect alignment is found if :
     # Longest common subsequence extends to the final row of of the old buffer
@@ -168,26 +236,12 @@ def longest_common_subsequence_merge(X, Y, filepath=None):
         # If we just chose the LCS (and not the leftmost LCS), then we can potentially
         # slice off major sections of text which are repeated between two overlapping buffers.
 
-        # backward linear search for leftmost j with longest subsequence
-        max_j = 0
-        max_j_idx = n
-
-        i_partial = m  # Starting index of i for partial merge
-        j_partial = -1  # Index holder of j for partial merge
         j_skip = 0  # Number of tokens that were skipped along the diagonal
         slice_count = 0  # Number of tokens that should be sliced
 
-        # Select leftmost LCS
-        for i_idx in range(m, -1, -1):  # start from last timestep of old buffer
-            for j_idx in range(0, n + 1):  # start from first token from new buffer
-                # Select the longest LCSuff, while minimizing the index of j (token index for new buffer)
-                if LCSuff[i_idx][j_idx] > max_j and j_idx <= max_j_idx:
-                    max_j = LCSuff[i_idx][j_idx]
-                    max_j_idx = j_idx
-
-                    # Update the starting indices of the partial merge
-                    i_partial = i_idx
-                    j_partial = j_idx
+        if leftmost_lcs is None:
+            leftmost_lcs = _find_leftmost_lcs(LCSuff, m, n)
+        max_j, i_partial, j_partial = leftmost_lcs
 
         # EARLY EXIT (if max subsequence length <= MIN merge length)
         # Important case where there is long silence
@@ -273,17 +327,97 @@ def longest_common_subsequence_merge(X, Y, filepath=None):
     result_idx[0] = i
     result_idx[1] = j
 
-    if filepath is not None:
-        extras = {
-            "is_complete_merge": is_complete_merge,
-            "X": X,
-            "Y": Y,
-            "slice_idx": result_idx,
-        }
-        write_lcs_alignment_to_pickle(LCSuff, filepath=filepath, extras=extras)
-        print("Wrote alignemnt to :", filepath)
+    return [int(idx) for idx in result_idx]
 
-    return result_idx, LCSuff
+
+def batched_longest_common_subsequence_merge(
+    X_batch: List[List[int]], Y_batch: List[List[int]], filepaths: Optional[List[Optional[str]]] = None
+):
+    """
+    Batched version of longest_common_subsequence_merge(), which aligns the pairs of consecutive buffers of
+    several independent streams at once.
+
+    The alignment matrices of all pairs are computed together with vectorized numpy operations, one row of the
+    matrices per step, instead of Python loops over every cell. The results are identical to calling
+    longest_common_subsequence_merge() on every pair.
+
+    Args:
+        X_batch: List of subsets of the previous chunks i-1, one per stream.
+        Y_batch: List of the current chunks i, one per stream.
+        filepaths: Optional list of filepaths (or None) to save the LCS alignment matrices for later introspection.
+
+    Returns:
+        A tuple containing -
+            - A list of (i, j, slice_len) for every stream.
+            - The padded LCS alignment matrices of shape [B, max(m) + 1, max(n) + 1]. The alignment matrix of
+              stream b is alignments[b, : m_b + 1, : n_b + 1].
+    """
+    batch_size = len(X_batch)
+    m = np.array([len(x) for x in X_batch], dtype=np.int64)
+    n = np.array([len(y) for y in Y_batch], dtype=np.int64)
+    max_m = int(m.max()) if batch_size > 0 else 0
+    max_n = int(n.max()) if batch_size > 0 else 0
+
+    # padding values never match each other, so padding does not change the alignment of the real tokens
+    X = np.full([batch_size, max_m], -1, dtype=np.int64)
+    Y = np.full([batch_size, max_n], -2, dtype=np.int64)
+    for b in range(batch_size):
+        X[b, : m[b]] = X_batch[b]
+        Y[b, : n[b]] = Y_batch[b]
+    matches = X[:, :, None] == Y[:, None, :]
+
+    LCSuff = np.zeros([batch_size, max_m + 1, max_n + 1], dtype=np.int64)
+    for i in range(1, max_m + 1):
+        LCSuff[:, i, 1:] = (LCSuff[:, i - 1, :-1] + 1) * matches[:, i - 1]
+
+    # the longest common subsequence ending last in row-major order
+    flat = LCSuff.reshape(batch_size, -1)
+    result = flat.max(axis=1, initial=0)
+    last = flat.shape[1] - 1 - np.argmax(flat[:, ::-1], axis=1)
+    result_i, result_j = np.divmod(last, max_n + 1)
+
+    # backward search for the leftmost longest common subsequence, there is at most one update per row
+    max_j = np.zeros(batch_size, dtype=np.int64)
+    max_j_idx = n.copy()
+    i_partial = m.copy()
+    j_partial = np.full(batch_size, -1, dtype=np.int64)
+    columns = np.arange(max_n + 1)
+    for i_idx in range(max_m, -1, -1):
+        row = LCSuff[:, i_idx]
+        candidates = (row > max_j[:, None]) & (columns[None, :] <= max_j_idx[:, None])
+        found = np.nonzero(candidates.any(axis=1))[0]
+        if len(found) == 0:
+            continue
+        j_first = np.argmax(candidates[found], axis=1)
+        max_j[found] = row[found, j_first]
+        max_j_idx[found] = j_first
+        i_partial[found] = i_idx
+        j_partial[found] = j_first
+
+    result_idxs = []
+    for b in range(batch_size):
+        if result[b] > 0:
+            result_idx = [int(result_i[b]), int(result_j[b]), int(result[b])]
+        else:
+            result_idx = [0, 0, 0]
+        alignment = LCSuff[b, : m[b] + 1, : n[b] + 1]
+        is_complete_merge = result_idx[0] == m[b]
+        result_idx = _lcs_merge_slice(
+            alignment, int(m[b]), int(n[b]), result_idx, (int(max_j[b]), int(i_partial[b]), int(j_partial[b]))
+        )
+        result_idxs.append(result_idx)
+
+        if filepaths is not None and filepaths[b] is not None:
+            extras = {
+                "is_complete_merge": bool(is_complete_merge),
+                "X": X_batch[b],
+                "Y": Y_batch[b],
+                "slice_idx": result_idx,
+            }
+            write_lcs_alignment_to_pickle(alignment.tolist(), filepath=filepaths[b], extras=extras)
+            print("Wrote alignemnt to :", filepaths[b])
+
+    return result_idxs, LCSuff
 
 
 def lcs_alignment_merge_buffer(buffer, data, delay, model, max_steps_per_timestep: int = 5, filepath: str = None):
@@ -321,6 +455,46 @@ def lcs_alignment_merge_buffer(buffer, data, delay, model, max_steps_per_timeste
     return buffer
 
 
+def batched_lcs_alignment_merge_buffer(
+    buffers: List[list],
+    data: List[list],
+    delay,
+    model,
+    max_steps_per_timestep: int = 5,
+    filepaths: Optional[List[Optional[str]]] = None,
+):
+    """
+    Batched version of lcs_alignment_merge_buffer(), which merges the new text of the current frame of every
+    stream with the previous text contained in its buffer. The buffers are updated in place and returned.
+    """
+    if filepaths is None:
+        filepaths = [None] * len(buffers)
+
+    # Streams without future context or with empty buffers simply concatenate the buffer and data.
+    merge_idxs = []
+    for idx, (buffer, new_data) in enumerate(zip(buffers, data)):
+        if delay < 1 or len(buffer) == 0:
+            buffer += new_data
+        else:
+            merge_idxs.append(idx)
+
+    if len(merge_idxs) == 0:
+        return buffers
+
+    # Prepare a subset of the buffers that will be LCS Merged with new data
+    search_size = int(delay * max_steps_per_timestep)
+    lcs_idxs, _ = batched_longest_common_subsequence_merge(
+        [buffers[idx][-search_size:] for idx in merge_idxs],
+        [data[idx] for idx in merge_idxs],
+        filepaths=[filepaths[idx] for idx in merge_idxs],
+    )
+
+    for idx, lcs_idx in zip(merge_idxs, lcs_idxs):
+        # Slice off new data, slice = j + slice_len
+        buffers[idx] += data[idx][lcs_idx[1] + lcs_idx[-1] :]
+    return buffers
+
+
 def inplace_buffer_merge(buffer, data, timesteps, model):
     """
     Merges the new text from the current frame with the previous text contained in the buffer.
@@ -509,6 +683,107 @@ class AudioFeatureIterator(IterableDataset):
         return frame
 
 
+class StreamingAudioFeatureIterator(IterableDataset):
+    """
+    Returns the same frames as AudioFeatureIterator, but reads the audio file in blocks of `block_len` seconds and
+    computes the features one block at a time, so that long recordings are never fully loaded in memory.
+
+    Every block of features is computed from the samples of the block plus a margin on both sides, large enough to
+    cover the STFT window and preemphasis of its frames, so the features match those of the whole signal.
+    The audio file must be single-channel at the sample rate of the preprocessor.
+    """
+
+    def __init__(
+        self,
+        audio_file,
+        frame_len,
+        preprocessor,
+        device,
+        pad_to_frame_len=True,
+        num_padding_samples=0,
+        block_len=60.0,
+    ):
+        self._audio_file = audio_file
+        self._preprocessor = preprocessor
+        self._device = device
+        self._frame_len = frame_len
+        self._start = 0
+        self.output = True
+        self.count = 0
+        self.pad_to_frame_len = pad_to_frame_len
+        timestep_duration = preprocessor._cfg['window_stride']
+        self._feature_frame_len = frame_len / timestep_duration
+
+        featurizer = preprocessor.featurizer
+        self._hop_length = featurizer.hop_length
+        self._margin = math.ceil((featurizer.n_fft + 1) / self._hop_length) + featurizer.frame_splicing
+        self._num_features = featurizer.nfilt * featurizer.frame_splicing
+        self._block_frames = max(1, int(block_len / timestep_duration))
+
+        self._reader = sf.SoundFile(audio_file, 'r')
+        self._num_file_samples = self._reader.frames
+        self._num_samples = self._num_file_samples + num_padding_samples
+        self._features_len = featurizer.get_seq_len(torch.tensor([self._num_samples]))
+
+        # features of frames [self._cache_start, self._computed)
+        self._cache = None
+        self._cache_start = 0
+        self._computed = 0
+
+    def __iter__(self):
+        return self
+
+    def _read_samples(self, start, end):
+        samples = np.zeros(end - start, dtype=np.float32)
+        file_end = min(end, self._num_file_samples)
+        if start < file_end:
+            self._reader.seek(start)
+            samples[: file_end - start] = self._reader.read(file_end - start, dtype='float32')
+        return samples
+
+    def _compute_block(self, first_frame, last_frame):
+        start = max(0, (first_frame - self._margin) * self._hop_length)
+        end = min(self._num_samples, (last_frame + self._margin) * self._hop_length)
+        samples = self._read_samples(start, end)
+        audio_signal = torch.from_numpy(samples).unsqueeze_(0).to(self._device)
+        audio_signal_len = torch.Tensor([samples.shape[0]]).to(self._device)
+        features, _ = self._preprocessor(input_signal=audio_signal, length=audio_signal_len)
+        offset = start // self._hop_length
+        return features.squeeze(0)[:, first_frame - offset : last_frame - offset]
+
+    def _get_features(self, start, end):
+        while self._computed < end:
+            last_frame = min(int(self._features_len[0]), self._computed + self._block_frames)
+            block = self._compute_block(self._computed, last_frame)
+            if self._cache is None:
+                self._cache = block
+            else:
+                # drop the features of the frames which were already returned
+                self._cache = torch.cat((self._cache[:, start - self._cache_start :], block), dim=-1)
+                self._cache_start = start
+            self._computed = last_frame
+        return self._cache[:, start - self._cache_start : end - self._cache_start]
+
+    def __next__(self):
+        if not self.output:
+            raise StopIteration
+        last = int(self._start + self._feature_frame_len)
+        if last <= self._features_len[0]:
+            frame = self._get_features(self._start, last).cpu()
+            self._start = last
+        else:
+            if not self.pad_to_frame_len:
+                frame = self._get_features(self._start, int(self._features_len[0])).cpu()
+            else:
+                frame = np.zeros([self._num_features, int(self._feature_frame_len)], dtype='float32')
+                segment = self._get_features(self._start, int(self._features_len[0])).cpu()
+                frame[:, : segment.shape[1]] = segment
+            self.output = False
+            self._reader.close()
+        self.count += 1
+        return frame
+
+
 def speech_collate_fn(batch):
     """collate batch of audio sig, audio len, tokens, tokens len
     Args:
@@ -822,10 +1097,7 @@ class FrameBatchASR:
 
     def transcribe(self, tokens_per_chunk: int, delay: int, keep_logits: bool = False):
         self.infer_logits(keep_logits)
-        self.unmerged = []
-        for pred in self.all_preds:
-            decoded = pred.tolist()
-            self.unmerged += decoded[len(decoded) - 1 - delay : len(decoded) - 1 - delay + tokens_per_chunk]
+        self.unmerged = self.merge_chunk_preds(self.all_preds, tokens_per_chunk, delay)
         hypothesis = self.greedy_merge(self.unmerged)
         if not keep_logits:
             return hypothesis
@@ -838,6 +1110,16 @@ class FrameBatchASR:
         all_logits = torch.concat(all_logits, 0)
         return hypothesis, all_logits
 
+    def merge_chunk_preds(self, all_preds, tokens_per_chunk: int, delay: int):
+        """
+        Concatenates the `tokens_per_chunk` predictions of every buffer which correspond to its frame.
+        """
+        unmerged = []
+        for pred in all_preds:
+            decoded = pred.tolist()
+            unmerged += decoded[len(decoded) - 1 - delay : len(decoded) - 1 - delay + tokens_per_chunk]
+        return unmerged
+
     def greedy_merge(self, preds):
         decoded_prediction = []
         previous = self.blank_id
@@ -849,6 +1131,104 @@ class FrameBatchASR:
         return hypothesis
 
 
+class MultiFileFrameBatchASR(FrameBatchASR):
+    """
+    FrameBatchASR which transcribes several audio files at once. The frame buffers of up to `num_files` files
+    are packed into every batch of the model, so batches stay full at the end of a file.
+    Audio files at the sample rate of the model are read and featurized in blocks of `block_len` seconds,
+    see StreamingAudioFeatureIterator.
+    """
+
+    def __init__(
+        self,
+        asr_model,
+        frame_len=1.6,
+        total_buffer=4.0,
+        batch_size=4,
+        pad_to_buffer_len=True,
+        num_files=4,
+        block_len=60.0,
+    ):
+        '''
+        Args:
+          frame_len: frame's duration, seconds
+          total_buffer: duration of total audio chunk size, seconds
+          batch_size: number of frame buffers processed by the model at once
+          num_files: number of files transcribed at once
+          block_len: duration of the audio blocks read from the files, seconds
+        '''
+        super().__init__(asr_model, frame_len, total_buffer, batch_size, pad_to_buffer_len)
+        self.total_buffer = total_buffer
+        self.pad_to_buffer_len = pad_to_buffer_len
+        self.num_files = num_files
+        self.block_len = block_len
+
+    def get_frame_reader(self, audio_filepath: str, delay, model_stride_in_secs):
+        sample_rate = self.asr_model._cfg.sample_rate
+        num_padding_samples = int(delay * model_stride_in_secs * sample_rate)
+        info = sf.info(audio_filepath)
+        if info.samplerate != sample_rate or info.channels != 1:
+            # resampling needs the whole signal
+            samples = get_samples(audio_filepath)
+            samples = np.pad(samples, (0, num_padding_samples))
+            return AudioFeatureIterator(samples, self.frame_len, self.raw_preprocessor, self.asr_model.device)
+        return StreamingAudioFeatureIterator(
+            audio_filepath,
+            self.frame_len,
+            self.raw_preprocessor,
+            self.asr_model.device,
+            num_padding_samples=num_padding_samples,
+            block_len=self.block_len,
+        )
+
+    def transcribe_files(
+        self, audio_filepaths: List[str], tokens_per_chunk: int, delay: int, model_stride_in_secs
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Transcribes `audio_filepaths`, and yields the tuple (index, hypothesis) of every file as soon as it is done.
+        """
+        pending = deque(enumerate(audio_filepaths))
+        # index of the file -> (frame bufferer, frame buffers not processed yet, predictions of the buffers)
+        active = {}
+        while len(pending) > 0 or len(active) > 0:
+            while len(pending) > 0 and len(active) < self.num_files:
+                idx, audio_filepath = pending.popleft()
+                frame_bufferer = FeatureFrameBufferer(
+                    asr_model=self.asr_model,
+                    frame_len=self.frame_len,
+                    batch_size=self.batch_size,
+                    total_buffer=self.total_buffer,
+                    pad_to_buffer_len=self.pad_to_buffer_len,
+                )
+                frame_bufferer.set_frame_reader(self.get_frame_reader(audio_filepath, delay, model_stride_in_secs))
+                active[idx] = (frame_bufferer, deque(), [])
+
+            # fill the batch with the frame buffers of the active files, in order
+            frame_buffers, owners, done = [], [], []
+            for idx, (frame_bufferer, buffers, _) in active.items():
+                while len(frame_buffers) < self.batch_size:
+                    if len(buffers) == 0:
+                        buffers.extend(frame_bufferer.get_buffers_batch())
+                        if len(buffers) == 0:
+                            done.append(idx)
+                            break
+                    frame_buffers.append(buffers.popleft())
+                    owners.append(idx)
+                if len(frame_buffers) == self.batch_size:
+                    break
+
+            if len(frame_buffers) > 0:
+                self.all_preds = []
+                self.data_layer.set_signal(frame_buffers)
+                self._get_batch_preds()
+                for idx, pred in zip(owners, self.all_preds):
+                    active[idx][2].append(pred)
+
+            for idx in done:
+                _, _, preds = active.pop(idx)
+                yield idx, self.greedy_merge(self.merge_chunk_preds(preds, tokens_per_chunk, delay))
+
+
 class BatchedFeatureFrameBufferer(FeatureFrameBufferer):
     """
     Batched variant of FeatureFrameBufferer where batch dimension is the independent audio samples.
@@ -1305,13 +1685,21 @@ class LongestCommonSubsequenceBatchedFrameASRRNNT(BatchedFrameASRRNNT):
         self.infer_logits()
 
         self.unmerged = [[] for _ in range(self.batch_size)]
-        for idx, alignments in enumerate(self.all_alignments):
-
-            signal_end_idx = self.frame_bufferer.signal_end_index[idx]
-            if signal_end_idx is None:
+        for idx in range(len(self.all_alignments)):
+            if self.frame_bufferer.signal_end_index[idx] is None:
                 raise ValueError("Signal did not end")
 
-            for a_idx, alignment in enumerate(alignments):
+        # Merges of consecutive chunks of a stream depend on each other, but streams are independent.
+        # Merge the a_idx-th chunk of all streams at once.
+        num_chunks = max([len(alignments) for alignments in self.all_alignments], default=0)
+        for a_idx in range(num_chunks):
+            merge_idxs, merge_ids, filepaths = [], [], []
+            for idx, alignments in enumerate(self.all_alignments):
+                if a_idx >= len(alignments):
+                    continue
+
+                signal_end_idx = self.frame_bufferer.signal_end_index[idx]
+                alignment = alignments[a_idx]
 
                 # Middle token first chunk
                 if a_idx == 0:
@@ -1344,14 +1732,21 @@ class LongestCommonSubsequenceBatchedFrameASRRNNT(BatchedFrameASRRNNT):
                         else:
                             filepath = None
 
-                        self.unmerged[idx] = lcs_alignment_merge_buffer(
-                            self.unmerged[idx],
-                            ids,
-                            self.lcs_delay,
-                            model=self.asr_model,
-                            max_steps_per_timestep=self.max_steps_per_timestep,
-                            filepath=filepath,
-                        )
+                        merge_idxs.append(idx)
+                        merge_ids.append(ids)
+                        filepaths.append(filepath)
+
+            if len(merge_idxs) > 0:
+                merged = batched_lcs_alignment_merge_buffer(
+                    [self.unmerged[idx] for idx in merge_idxs],
+                    merge_ids,
+                    self.lcs_delay,
+                    model=self.asr_model,
+                    max_steps_per_timestep=self.max_steps_per_timestep,
+                    filepaths=filepaths,
+                )
+                for idx, buffer in zip(merge_idxs, merged):
+                    self.unmerged[idx] = buffer
 
         output = []
         for idx in range(self.batch_size):
@@ -1399,102 +1794,128 @@ class CacheAwareStreamingAudioBuffer:
 
     def __iter__(self):
         while True:
-            if self.buffer_idx >= self.buffer.size(-1):
+            chunk = self.get_chunk(self.buffer, self.buffer_idx, self.streams_length)
+            if chunk is None:
                 return
 
-            if self.buffer_idx == 0 and isinstance(self.streaming_cfg.chunk_size, list):
-                if self.pad_and_drop_preencoded:
-                    chunk_size = self.streaming_cfg.chunk_size[1]
-                else:
-                    chunk_size = self.streaming_cfg.chunk_size[0]
+            audio_chunk, chunk_lengths, shift_size = chunk
+            self.buffer_idx += shift_size
+            self.step += 1
+            yield audio_chunk, chunk_lengths
+
+    def get_chunk_sizes(self, buffer_idx):
+        """
+        Returns the chunk size and the shift size in frames of the chunk starting at `buffer_idx`.
+        """
+        if buffer_idx == 0 and isinstance(self.streaming_cfg.chunk_size, list):
+            if self.pad_and_drop_preencoded:
+                chunk_size = self.streaming_cfg.chunk_size[1]
             else:
-                chunk_size = (
-                    self.streaming_cfg.chunk_size[1]
-                    if isinstance(self.streaming_cfg.chunk_size, list)
-                    else self.streaming_cfg.chunk_size
-                )
+                chunk_size = self.streaming_cfg.chunk_size[0]
+        else:
+            chunk_size = (
+                self.streaming_cfg.chunk_size[1]
+                if isinstance(self.streaming_cfg.chunk_size, list)
+                else self.streaming_cfg.chunk_size
+            )
 
-            if self.buffer_idx == 0 and isinstance(self.streaming_cfg.shift_size, list):
-                if self.pad_and_drop_preencoded:
-                    shift_size = self.streaming_cfg.shift_size[1]
-                else:
-                    shift_size = self.streaming_cfg.shift_size[0]
+        if buffer_idx == 0 and isinstance(self.streaming_cfg.shift_size, list):
+            if self.pad_and_drop_preencoded:
+                shift_size = self.streaming_cfg.shift_size[1]
             else:
-                shift_size = (
-                    self.streaming_cfg.shift_size[1]
-                    if isinstance(self.streaming_cfg.shift_size, list)
-                    else self.streaming_cfg.shift_size
-                )
+                shift_size = self.streaming_cfg.shift_size[0]
+        else:
+            shift_size = (
+                self.streaming_cfg.shift_size[1]
+                if isinstance(self.streaming_cfg.shift_size, list)
+                else self.streaming_cfg.shift_size
+            )
+        return chunk_size, shift_size
 
-            audio_chunk = self.buffer[:, :, self.buffer_idx : self.buffer_idx + chunk_size]
+    def get_chunk(self, buffer, buffer_idx, streams_length):
+        """
+        Extracts the chunk starting at `buffer_idx` of the streams in `buffer`, along with the cache needed for
+        the pre-encoder part of the model.
 
-            if self.sampling_frames is not None:
-                # checking to make sure the audio chunk has enough frames to produce at least one output after downsampling
-                if self.buffer_idx == 0 and isinstance(self.sampling_frames, list):
-                    cur_sampling_frames = self.sampling_frames[0]
-                else:
-                    cur_sampling_frames = (
-                        self.sampling_frames[1] if isinstance(self.sampling_frames, list) else self.sampling_frames
-                    )
-                if audio_chunk.size(-1) < cur_sampling_frames:
-                    return
-
-            # Adding the cache needed for the pre-encoder part of the model to the chunk
-            # if there is not enough frames to be used as the pre-encoding cache, zeros would be added
-            zeros_pads = None
-            if self.buffer_idx == 0 and isinstance(self.streaming_cfg.pre_encode_cache_size, list):
-                if self.pad_and_drop_preencoded:
-                    cache_pre_encode_num_frames = self.streaming_cfg.pre_encode_cache_size[1]
-                else:
-                    cache_pre_encode_num_frames = self.streaming_cfg.pre_encode_cache_size[0]
-                cache_pre_encode = torch.zeros(
-                    (audio_chunk.size(0), self.input_features, cache_pre_encode_num_frames),
+        Args:
+            buffer: processed signals of shape [B, D, T]
+            buffer_idx: index of the first frame of the chunk
+            streams_length: lengths of the streams in `buffer`
+
+        Returns:
+            A tuple (audio_chunk, chunk_lengths, shift_size), or None if there is no chunk left.
+        """
+        if buffer_idx >= buffer.size(-1):
+            return None
+
+        chunk_size, shift_size = self.get_chunk_sizes(buffer_idx)
+        audio_chunk = buffer[:, :, buffer_idx : buffer_idx + chunk_size]
+
+        if self.sampling_frames is not None:
+            # checking to make sure the audio chunk has enough frames to produce at least one output after downsampling
+            if buffer_idx == 0 and isinstance(self.sampling_frames, list):
+                cur_sampling_frames = self.sampling_frames[0]
+            else:
+                cur_sampling_frames = (
+                    self.sampling_frames[1] if isinstance(self.sampling_frames, list) else self.sampling_frames
+                )
+            if audio_chunk.size(-1) < cur_sampling_frames:
+                return None
+
+        # Adding the cache needed for the pre-encoder part of the model to the chunk
+        # if there is not enough frames to be used as the pre-encoding cache, zeros would be added
+        zeros_pads = None
+        if buffer_idx == 0 and isinstance(self.streaming_cfg.pre_encode_cache_size, list):
+            if self.pad_and_drop_preencoded:
+                cache_pre_encode_num_frames = self.streaming_cfg.pre_encode_cache_size[1]
+            else:
+                cache_pre_encode_num_frames = self.streaming_cfg.pre_encode_cache_size[0]
+            cache_pre_encode = torch.zeros(
+                (audio_chunk.size(0), self.input_features, cache_pre_encode_num_frames),
+                device=audio_chunk.device,
+                dtype=audio_chunk.dtype,
+            )
+        else:
+            if isinstance(self.streaming_cfg.pre_encode_cache_size, list):
+                pre_encode_cache_size = self.streaming_cfg.pre_encode_cache_size[1]
+            else:
+                pre_encode_cache_size = self.streaming_cfg.pre_encode_cache_size
+
+            start_pre_encode_cache = buffer_idx - pre_encode_cache_size
+            if start_pre_encode_cache < 0:
+                start_pre_encode_cache = 0
+            cache_pre_encode = buffer[:, :, start_pre_encode_cache:buffer_idx]
+            if cache_pre_encode.size(-1) < pre_encode_cache_size:
+                zeros_pads = torch.zeros(
+                    (
+                        audio_chunk.size(0),
+                        audio_chunk.size(-2),
+                        pre_encode_cache_size - cache_pre_encode.size(-1),
+                    ),
                     device=audio_chunk.device,
                     dtype=audio_chunk.dtype,
                 )
-            else:
-                if isinstance(self.streaming_cfg.pre_encode_cache_size, list):
-                    pre_encode_cache_size = self.streaming_cfg.pre_encode_cache_size[1]
-                else:
-                    pre_encode_cache_size = self.streaming_cfg.pre_encode_cache_size
-
-                start_pre_encode_cache = self.buffer_idx - pre_encode_cache_size
-                if start_pre_encode_cache < 0:
-                    start_pre_encode_cache = 0
-                cache_pre_encode = self.buffer[:, :, start_pre_encode_cache : self.buffer_idx]
-                if cache_pre_encode.size(-1) < pre_encode_cache_size:
-                    zeros_pads = torch.zeros(
-                        (
-                            audio_chunk.size(0),
-                            audio_chunk.size(-2),
-                            pre_encode_cache_size - cache_pre_encode.size(-1),
-                        ),
-                        device=audio_chunk.device,
-                        dtype=audio_chunk.dtype,
-                    )
 
-            added_len = cache_pre_encode.size(-1)
-            audio_chunk = torch.cat((cache_pre_encode, audio_chunk), dim=-1)
+        added_len = cache_pre_encode.size(-1)
+        audio_chunk = torch.cat((cache_pre_encode, audio_chunk), dim=-1)
 
-            if self.online_normalization:
-                audio_chunk, x_mean, x_std = normalize_batch(
-                    x=audio_chunk,
-                    seq_len=torch.tensor([audio_chunk.size(-1)] * audio_chunk.size(0)),
-                    normalize_type=self.model_normalize_type,
-                )
+        if self.online_normalization:
+            audio_chunk, x_mean, x_std = normalize_batch(
+                x=audio_chunk,
+                seq_len=torch.tensor([audio_chunk.size(-1)] * audio_chunk.size(0)),
+                normalize_type=self.model_normalize_type,
+            )
 
-            if zeros_pads is not None:
-                # TODO: check here when zero_pads is not None and added_len is already non-zero
-                audio_chunk = torch.cat((zeros_pads, audio_chunk), dim=-1)
-                added_len += zeros_pads.size(-1)
+        if zeros_pads is not None:
+            # TODO: check here when zero_pads is not None and added_len is already non-zero
+            audio_chunk = torch.cat((zeros_pads, audio_chunk), dim=-1)
+            added_len += zeros_pads.size(-1)
 
-            max_chunk_lengths = self.streams_length - self.buffer_idx
-            max_chunk_lengths = max_chunk_lengths + added_len
-            chunk_lengths = torch.clamp(max_chunk_lengths, min=0, max=audio_chunk.size(-1))
+        max_chunk_lengths = streams_length - buffer_idx
+        max_chunk_lengths = max_chunk_lengths + added_len
+        chunk_lengths = torch.clamp(max_chunk_lengths, min=0, max=audio_chunk.size(-1))
 
-            self.buffer_idx += shift_size
-            self.step += 1
-            yield audio_chunk, chunk_lengths
+        return audio_chunk, chunk_lengths, shift_size
 
     def is_buffer_empty(self):
         if self.buffer_idx >= self.buffer.size(-1):
@@ -1598,6 +2019,331 @@ class CacheAwareStreamingAudioBuffer:
         return processed_signal, self.streams_length
 
 
+@dataclass
+class StreamingSession:
+    """State of a single stream of CacheAwareStreamingSessionManager."""
+
+    slot: int
+    # frames of the stream which are not consumed yet, starting at frame `frame_offset` of the stream
+    features: Optional[torch.Tensor] = None
+    frame_offset: int = 0
+    buffer_idx: int = 0
+    step: int = 0
+    ended: bool = False
+    previous_hypothesis: Optional[Any] = None
+    previous_pred_out: Optional[torch.Tensor] = None
+    transcription: Optional[Any] = None
+    # audio samples still needed by the next frames, starting at sample `audio_offset` of the stream
+    audio: Optional[torch.Tensor] = None
+    audio_offset: int = 0
+    num_audio_frames: int = 0
+
+    @property
+    def num_frames(self) -> int:
+        return self.frame_offset + (0 if self.features is None else self.features.size(-1))
+
+
+class CacheAwareStreamingSessionManager:
+    """
+    Continuous batching of independent streams for cache-aware streaming models.
+
+    CacheAwareStreamingAudioBuffer iterates a fixed set of streams in lockstep. The session manager instead keeps
+    the encoder caches of up to `max_streams` streams in preallocated slots, lets streams join and leave between
+    steps, and at every step batches all the streams which have a full chunk ready. Streams at their first chunk and
+    streams at their last chunk need different encoder arguments, so one step runs up to one batch per kind.
+
+    Example:
+        manager = CacheAwareStreamingSessionManager(asr_model, max_streams=64)
+        stream_id = manager.add_stream()
+        manager.append_audio(stream_id, audio)  # any time new audio of the stream arrives
+        manager.end_stream(stream_id)  # once the stream has no more audio
+        while manager.has_streams():
+            transcriptions, finished = manager.step()
+
+    Audio appended with append_audio() is featurized incrementally: only the frames whose whole window has arrived
+    are computed, from the buffered samples they need, so the features are the same as the features of the whole
+    stream. This requires a preprocessor without utterance-level normalization (e.g. `normalize: NA`), or
+    `online_normalization=True`. Frames which were consumed by the encoder are dropped, except for the ones needed
+    as pre-encode cache.
+
+    Args:
+        model: An ASR model with a cache-aware streaming encoder.
+        max_streams: Maximum number of concurrent streams.
+        online_normalization: whether to perform online normalization per chunk.
+        pad_and_drop_preencoded: if true pad first audio chunk and always drop preencoded.
+    """
+
+    def __init__(self, model, max_streams=32, online_normalization=False, pad_and_drop_preencoded=False):
+        self.model = model
+        self.max_streams = max_streams
+        self.buffer = CacheAwareStreamingAudioBuffer(
+            model, online_normalization=online_normalization, pad_and_drop_preencoded=pad_and_drop_preencoded
+        )
+        (
+            self.cache_last_channel,
+            self.cache_last_time,
+            self.cache_last_channel_len,
+        ) = model.encoder.get_initial_cache_state(batch_size=max_streams)
+
+        self.streams: Dict[int, StreamingSession] = {}
+        self._free_slots = list(range(max_streams - 1, -1, -1))
+        self._next_stream_id = 0
+
+    def has_streams(self) -> bool:
+        return len(self.streams) > 0
+
+    def add_stream(self, audio=None) -> int:
+        """
+        Admits a new stream and returns its id. Raises a RuntimeError if all the slots are in use.
+        """
+        if len(self._free_slots) == 0:
+            raise RuntimeError(f"All {self.max_streams} stream slots are in use")
+        slot = self._free_slots.pop()
+        self.cache_last_channel[:, slot] = 0
+        self.cache_last_time[:, slot] = 0
+        self.cache_last_channel_len[slot] = 0
+
+        stream_id = self._next_stream_id
+        self._next_stream_id += 1
+        self.streams[stream_id] = StreamingSession(slot=slot)
+        if audio is not None:
+            self.append_audio(stream_id, audio)
+        return stream_id
+
+    def append_audio(self, stream_id, audio):
+        """
+        Appends audio samples of shape [T] to the stream `stream_id`, and featurizes the frames which are complete.
+        """
+        session = self.streams[stream_id]
+        if session.ended:
+            raise ValueError(f"Stream {stream_id} has already ended!")
+        featurizer = self.buffer.preprocessor.featurizer
+        normalize = getattr(featurizer, 'normalize', getattr(featurizer, '_normalize_strategy', None))
+        if normalize in ("per_feature", "all_features"):
+            raise ValueError(
+                f"Audio can not be featurized incrementally with `{normalize}` normalization of the whole signal, "
+                "use online_normalization=True or append processed signals instead."
+            )
+        if getattr(featurizer, 'frame_splicing', 1) > 1:
+            raise ValueError("Audio can not be featurized incrementally with frame splicing.")
+
+        audio = torch.as_tensor(audio, device=self.buffer.get_model_device())
+        if session.audio is None:
+            session.audio = audio
+        else:
+            session.audio = torch.cat((session.audio, audio))
+        self._featurize_audio(session, is_last=False)
+
+    def _featurize_audio(self, session: StreamingSession, is_last: bool):
+        """
+        Featurizes the frames of the buffered audio of `session` whose window is complete, or all the remaining
+        frames if `is_last`.
+        """
+        featurizer = self.buffer.preprocessor.featurizer
+        hop_length, n_fft = featurizer.hop_length, featurizer.n_fft
+        # number of samples of the window of a frame before its position
+        stft_pad_amount = getattr(featurizer, 'stft_pad_amount', None)
+        left_context = stft_pad_amount if stft_pad_amount is not None else n_fft // 2
+
+        num_samples = session.audio_offset + session.audio.size(-1)
+        if is_last:
+            num_frames = int(featurizer.get_seq_len(torch.tensor(num_samples)))
+        elif num_samples > left_context and num_samples + left_context >= n_fft:
+            num_frames = (num_samples + left_context - n_fft) // hop_length + 1
+        else:
+            num_frames = 0
+        if num_frames <= session.num_audio_frames:
+            return
+
+        # Start the segment early enough that the padding and pre-emphasis at its beginning do not change the new
+        # frames. Segments start at multiples of hop_length, so the frames of the segment are frames of the stream.
+        context_frames = left_context // hop_length + 1
+        start = max(0, (session.num_audio_frames - context_frames) * hop_length)
+        segment = session.audio[start - session.audio_offset :]
+        with torch.no_grad():
+            processed_signal, _ = self.buffer.preprocessor(
+                input_signal=segment.unsqueeze(0), length=torch.tensor([segment.size(-1)], device=segment.device)
+            )
+        first_frame = session.num_audio_frames - start // hop_length
+        num_new_frames = num_frames - session.num_audio_frames
+        self._append_features(session, processed_signal[:, :, first_frame:], num_new_frames)
+        session.num_audio_frames = num_frames
+
+        # drop the samples which are not needed by the next frames
+        keep_from = max(session.audio_offset, (num_frames - context_frames) * hop_length)
+        session.audio = session.audio[keep_from - session.audio_offset :]
+        session.audio_offset = keep_from
+
+    def append_processed_signal(self, stream_id, processed_signal, processed_signal_length=None):
+        """
+        Appends processed signal of shape [1, D, T] to the stream `stream_id`. Only the first
+        `processed_signal_length` frames are appended if it is given.
+        """
+        session = self.streams[stream_id]
+        if session.ended:
+            raise ValueError(f"Stream {stream_id} has already ended!")
+        self._append_features(session, processed_signal, processed_signal_length)
+
+    def _append_features(self, session: StreamingSession, processed_signal, processed_signal_length=None):
+        if processed_signal.size(1) != self.buffer.input_features:
+            raise ValueError("Buffer and the processed signal have different dimensions!")
+        if processed_signal_length is not None:
+            processed_signal = processed_signal[:, :, : int(processed_signal_length)]
+        if session.features is None:
+            session.features = processed_signal
+        else:
+            session.features = torch.cat((session.features, processed_signal), dim=-1)
+
+    def _drop_consumed_features(self, session: StreamingSession):
+        """Drops the frames before the current chunk of `session`, except for the pre-encode cache."""
+        pre_encode_cache_size = self.buffer.streaming_cfg.pre_encode_cache_size
+        if isinstance(pre_encode_cache_size, list):
+            pre_encode_cache_size = pre_encode_cache_size[1]
+        # keep at least one frame so that chunks after the first one are never taken as the first chunk
+        keep_from = session.buffer_idx - max(pre_encode_cache_size, 1)
+        if session.features is None or keep_from <= session.frame_offset:
+            return
+        session.features = session.features[:, :, keep_from - session.frame_offset :]
+        session.frame_offset = keep_from
+
+    def end_stream(self, stream_id):
+        """
+        Marks the end of the audio of the stream `stream_id`. Its remaining chunks are processed by the next steps,
+        after which the stream leaves the manager.
+        """
+        session = self.streams[stream_id]
+        if session.audio is not None and not session.ended:
+            self._featurize_audio(session, is_last=True)
+            session.audio = None
+        session.ended = True
+
+    def remove_stream(self, stream_id) -> StreamingSession:
+        """
+        Removes the stream `stream_id` immediately, and frees its slot.
+        """
+        session = self.streams.pop(stream_id)
+        self._free_slots.append(session.slot)
+        return session
+
+    def _is_ready(self, session: StreamingSession) -> bool:
+        if session.ended:
+            return True
+        chunk_size, _ = self.buffer.get_chunk_sizes(session.buffer_idx)
+        return session.num_frames >= session.buffer_idx + chunk_size
+
+    def step(self):
+        """
+        Runs one streaming step for all the streams which have a full chunk ready, or have ended.
+
+        Returns:
+            A tuple containing -
+                - A dictionary of the current transcriptions of the streams processed by this step.
+                - A dictionary of the final states of the streams which finished and left the manager.
+        """
+        batches = {}
+        finished = []
+        for stream_id, session in self.streams.items():
+            if not self._is_ready(session):
+                continue
+
+            chunk = None
+            if session.features is not None:
+                # the stored features start at frame_offset of the stream
+                chunk = self.buffer.get_chunk(
+                    session.features,
+                    session.buffer_idx - session.frame_offset,
+                    torch.tensor([session.features.size(-1)], device=session.features.device),
+                )
+            if chunk is None:
+                # the stream has ended and there are not enough frames left for another output
+                finished.append(stream_id)
+                continue
+
+            audio_chunk, chunk_lengths, shift_size = chunk
+            is_first = session.buffer_idx == 0
+            keep_all_outputs = session.ended and session.buffer_idx + shift_size >= session.num_frames
+            batches.setdefault((is_first, keep_all_outputs), []).append(
+                (stream_id, audio_chunk, chunk_lengths, shift_size)
+            )
+
+        transcriptions = {}
+        for (is_first, keep_all_outputs), batch in batches.items():
+            transcriptions.update(self._step_batch(batch, is_first, keep_all_outputs))
+            for stream_id, _, _, shift_size in batch:
+                session = self.streams[stream_id]
+                session.buffer_idx += shift_size
+                session.step += 1
+                if session.ended and session.buffer_idx >= session.num_frames:
+                    finished.append(stream_id)
+                else:
+                    self._drop_consumed_features(session)
+
+        finished_sessions = {}
+        for stream_id in finished:
+            transcriptions.setdefault(stream_id, self.streams[stream_id].transcription)
+            finished_sessions[stream_id] = self.remove_stream(stream_id)
+        return transcriptions, finished_sessions
+
+    def _step_batch(self, batch, is_first, keep_all_outputs):
+        sessions = [self.streams[stream_id] for stream_id, _, _, _ in batch]
+        max_len = max(audio_chunk.size(-1) for _, audio_chunk, _, _ in batch)
+        processed_signal = torch.cat(
+            [
+                torch.nn.functional.pad(audio_chunk, pad=(0, max_len - audio_chunk.size(-1)))
+                for _, audio_chunk, _, _ in batch
+            ]
+        )
+        processed_signal_length = torch.cat([chunk_lengths for _, _, chunk_lengths, _ in batch])
+
+        slots = torch.tensor([session.slot for session in sessions], device=self.cache_last_channel.device)
+        if is_first:
+            previous_hypotheses, previous_pred_out = None, None
+        else:
+            previous_hypotheses = [session.previous_hypothesis for session in sessions]
+            if any(hyp is None for hyp in previous_hypotheses):
+                previous_hypotheses = None
+            previous_pred_out = [session.previous_pred_out for session in sessions]
+
+        # for the first step there is no need to drop any tokens after the downsampling as no caching is being used
+        if is_first and not self.buffer.pad_and_drop_preencoded:
+            drop_extra_pre_encoded = 0
+        else:
+            drop_extra_pre_encoded = self.buffer.streaming_cfg.drop_extra_pre_encoded
+
+        with torch.no_grad():
+            (
+                pred_out,
+                transcribed_texts,
+                cache_last_channel,
+                cache_last_time,
+                cache_last_channel_len,
+                best_hyp,
+            ) = self.model.conformer_stream_step(
+                processed_signal=processed_signal,
+                processed_signal_length=processed_signal_length,
+                cache_last_channel=self.cache_last_channel.index_select(1, slots),
+                cache_last_time=self.cache_last_time.index_select(1, slots),
+                cache_last_channel_len=self.cache_last_channel_len.index_select(0, slots),
+                keep_all_outputs=keep_all_outputs,
+                previous_hypotheses=previous_hypotheses,
+                previous_pred_out=previous_pred_out,
+                drop_extra_pre_encoded=drop_extra_pre_encoded,
+                return_transcription=True,
+            )
+
+            self.cache_last_channel.index_copy_(1, slots, cache_last_channel.to(self.cache_last_channel.dtype))
+            self.cache_last_time.index_copy_(1, slots, cache_last_time.to(self.cache_last_time.dtype))
+            self.cache_last_channel_len.index_copy_(0, slots, cache_last_channel_len)
+
+        transcriptions = {}
+        for idx, ((stream_id, _, _, _), session) in enumerate(zip(batch, sessions)):
+            session.previous_pred_out = pred_out[idx]
+            session.previous_hypothesis = best_hyp[idx] if best_hyp is not None else None
+            session.transcription = transcribed_texts[idx]
+            transcriptions[stream_id] = session.transcription
+        return transcriptions
+
+
 class FrameBatchMultiTaskAED(FrameBatchASR):
     def __init__(self, asr_model, frame_len=4, total_buffer=4, batch_size=4):
         super().__init__(asr_model, frame_len, total_buffer, batch_size, pad_to_buffer_len=False)
@@ -13,6 +13,7 @@
 # limitations under the License.
 import glob
 import json
+import multiprocessing as mp
 import os
 import re
 from dataclasses import dataclass
@@ -27,7 +28,11 @@ import nemo.collections.asr as nemo_asr
 from nemo.collections.asr.metrics.wer import word_error_rate
 from nemo.collections.asr.models import ASRModel, EncDecHybridRNNTCTCModel, EncDecMultiTaskModel
 from nemo.collections.asr.parts.utils import manifest_utils, rnnt_utils
-from nemo.collections.asr.parts.utils.streaming_utils import FrameBatchASR, FrameBatchMultiTaskAED
+from nemo.collections.asr.parts.utils.streaming_utils import (
+    FrameBatchASR,
+    FrameBatchMultiTaskAED,
+    MultiFileFrameBatchASR,
+)
 from nemo.collections.common.metrics.punct_er import OccurancePunctuationErrorRate
 from nemo.collections.common.parts.preprocessing.manifest import get_full_path
 from nemo.utils import logging, model_utils
@@ -172,6 +177,117 @@ def get_buffered_pred_feat(
     return wrapped_hyps
 
 
+# arguments of the file-parallel transcription, inherited by forked worker processes
+_PARALLEL_TRANSCRIPTION_ARGS = None
+
+
+def _init_parallel_transcription_worker(num_threads: int):
+    torch.set_num_threads(num_threads)
+
+
+def _transcribe_files_shard(shard: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    asr, tokens_per_chunk, delay, model_stride_in_secs = _PARALLEL_TRANSCRIPTION_ARGS
+    audio_files = [audio_file for _, audio_file in shard]
+    return [
+        (shard[idx][0], hyp)
+        for idx, hyp in asr.transcribe_files(audio_files, tokens_per_chunk, delay, model_stride_in_secs)
+    ]
+
+
+def get_buffered_pred_feat_parallel(
+    asr: MultiFileFrameBatchASR,
+    tokens_per_chunk: int,
+    delay: int,
+    model_stride_in_secs: int,
+    manifest: str = None,
+    filepaths: List[str] = None,
+    num_processes: int = 1,
+    partial_manifest: Optional[str] = None,
+) -> List[rnnt_utils.Hypothesis]:
+    """
+    File-parallel version of get_buffered_pred_feat() for CPU inference over many long recordings.
+
+    Files are sharded across `num_processes` forked processes, longest files first, and every process packs the
+    frame buffers of `asr.num_files` files into each batch. If `partial_manifest` is given, the transcription of
+    every file is appended to it as soon as it is done, and files already present in it are not transcribed again,
+    so that an interrupted run can be resumed.
+    """
+    global _PARALLEL_TRANSCRIPTION_ARGS
+
+    if filepaths and manifest:
+        raise ValueError("Please select either filepaths or manifest")
+    if filepaths is None and manifest is None:
+        raise ValueError("Either filepaths or manifest shoud not be None")
+    if num_processes > 1 and asr.asr_model.device.type != 'cpu':
+        raise ValueError("File-parallel transcription with several processes is only supported on CPU")
+
+    if filepaths:
+        audio_files = list(filepaths)
+    else:
+        audio_files = []
+        with open(manifest, "r", encoding='utf_8') as mfst_f:
+            for l in mfst_f:
+                row = json.loads(l.strip())
+                audio_files.append(get_full_path(audio_file=row['audio_filepath'], manifest_file=manifest))
+
+    hyps = {}
+    if partial_manifest is not None and os.path.exists(partial_manifest):
+        complete_size = 0
+        with open(partial_manifest, "rb") as f:
+            for l in f:
+                if not l.endswith(b"\n"):
+                    # last line of an interrupted run
+                    break
+                complete_size += len(l)
+                try:
+                    row = json.loads(l.decode('utf_8'))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if row['idx'] < len(audio_files) and audio_files[row['idx']] == row['audio_filepath']:
+                    hyps[row['idx']] = row['pred_text']
+        # drop the incomplete last line, so that appended results start on a new line
+        if complete_size < os.path.getsize(partial_manifest):
+            os.truncate(partial_manifest, complete_size)
+        logging.info(f"Found {len(hyps)} transcribed files in {partial_manifest}")
+
+    todo = [(idx, audio_file) for idx, audio_file in enumerate(audio_files) if idx not in hyps]
+    todo.sort(key=lambda item: os.path.getsize(item[1]), reverse=True)
+
+    partial_f = open(partial_manifest, "a", encoding='utf_8') if partial_manifest is not None else None
+    try:
+        with tqdm(total=len(todo), desc="Sample:") as pbar:
+
+            def add_results(results):
+                for idx, hyp in results:
+                    hyps[idx] = hyp
+                    if partial_f is not None:
+                        row = {'idx': idx, 'audio_filepath': audio_files[idx], 'pred_text': hyp}
+                        partial_f.write(json.dumps(row) + "\n")
+                        partial_f.flush()
+                pbar.update(len(results))
+
+            if num_processes > 1:
+                shards = [todo[i : i + asr.num_files] for i in range(0, len(todo), asr.num_files)]
+                _PARALLEL_TRANSCRIPTION_ARGS = (asr, tokens_per_chunk, delay, model_stride_in_secs)
+                num_threads = max(1, torch.get_num_threads() // num_processes)
+                with mp.get_context('fork').Pool(
+                    num_processes, initializer=_init_parallel_transcription_worker, initargs=(num_threads,)
+                ) as pool:
+                    for results in pool.imap_unordered(_transcribe_files_shard, shards):
+                        add_results(results)
+                _PARALLEL_TRANSCRIPTION_ARGS = None
+            else:
+                for todo_idx, hyp in asr.transcribe_files(
+                    [audio_file for _, audio_file in todo], tokens_per_chunk, delay, model_stride_in_secs
+                ):
+                    add_results([(todo[todo_idx][0], hyp)])
+    finally:
+        if partial_f is not None:
+            partial_f.close()
+
+    return wrap_transcription([hyps[idx] for idx in range(len(audio_files))])
+
+
 def get_buffered_pred_feat_multitaskAED(
     asr: FrameBatchMultiTaskAED,
     preprocessor_cfg: DictConfig,
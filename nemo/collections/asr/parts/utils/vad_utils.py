@@ -324,7 +324,7 @@ def generate_overlap_vad_seq_per_tensor(
     See description in generate_overlap_vad_seq.
     Use this for single instance pipeline. 
     """
-    # This function will be refactor for vectorization but this is okay for now
+    # See generate_overlap_vad_seq_batch for the vectorized version working on batches of sequences
 
     overlap = per_args['overlap']
     window_length_in_sec = per_args['window_length_in_sec']
@@ -411,6 +411,83 @@ def generate_overlap_vad_seq_per_file(frame_filepath: str, per_args: dict) -> st
     return overlap_filepath
 
 
+def generate_overlap_vad_seq_batch(
+    frames: torch.Tensor, frame_lengths: Optional[torch.Tensor], per_args: Dict[str, float], smoothing_method: str
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Vectorized version of generate_overlap_vad_seq_per_tensor for a batch of in-memory frame predictions.
+    The predictions of the windows covering each target position are reduced with cumulative sums (mean) or
+    with nanquantile over unfolded windows (median), results match generate_overlap_vad_seq_per_tensor.
+    Args:
+        frames (torch.Tensor): padded frame predictions of shape [B, N].
+        frame_lengths (torch.Tensor): number of frames of each sequence of shape [B], None if none is padded.
+        per_args: overlap, window_length_in_sec, shift_length_in_sec and optional frame_len, see generate_overlap_vad_seq.
+        smoothing_method (str): median or mean smoothing filter.
+    Returns:
+        preds (torch.Tensor): padded smoothed predictions of shape [B, N * shift].
+        pred_lengths (torch.Tensor): number of smoothed predictions of each sequence of shape [B].
+    """
+    if smoothing_method not in ('mean', 'median'):
+        raise ValueError("smoothing_method should be either mean or median")
+
+    overlap = per_args['overlap']
+    frame_len = per_args.get('frame_len', 0.01)
+    shift = int(per_args['shift_length_in_sec'] / frame_len)  # number of units of shift
+    seg = int((per_args['window_length_in_sec'] / frame_len + 1))  # number of units of each window/segment
+    jump_on_target = int(seg * (1 - overlap))  # jump on target generated sequence
+    jump_on_frame = int(jump_on_target / shift)  # jump on input frame sequence
+    if jump_on_frame < 1:
+        raise ValueError(
+            f"Your input makes jump_on_frame={jump_on_frame} < 1 which is invalid because it cannot jump over "
+            f"the frame sequence. Please try different window_length_in_sec, shift_length_in_sec and overlap choices."
+        )
+
+    batch_size, num_frames = frames.shape
+    if frame_lengths is None:
+        frame_lengths = torch.full((batch_size,), num_frames, dtype=torch.long)
+    frame_lengths = frame_lengths.to(device=frames.device, dtype=torch.long)
+    pred_lengths = frame_lengths * shift
+    target_len = num_frames * shift
+
+    # windows start at every jump_on_frame-th frame, window k covers targets [k * step, k * step + seg)
+    step = jump_on_frame * shift
+    window_preds = frames[:, ::jump_on_frame]
+    num_windows = window_preds.shape[1]
+    # target k * step + r is covered by the windows (k - count[r], k], clipped at the first window
+    residual = torch.arange(step, device=frames.device)
+    count = torch.div(seg - residual + step - 1, step, rounding_mode='floor').clamp(min=0)
+    window_idx = torch.arange(num_windows, device=frames.device)
+
+    if smoothing_method == 'mean':
+        cumsum = torch.nn.functional.pad(window_preds.double().cumsum(dim=1), [1, 0])
+        high = (window_idx + 1).unsqueeze(1).expand(-1, step)
+        low = (high - count.unsqueeze(0)).clamp(min=0)
+        preds = (cumsum[:, high] - cumsum[:, low]) / (high - low)
+        preds = preds.to(frames.dtype)
+    else:
+        max_count = int(count.max())
+        windows = torch.nn.functional.pad(window_preds, [max_count - 1, 0], value=float('nan'))
+        windows = windows.unfold(1, max_count, 1)
+        preds = torch.full((batch_size, num_windows, step), float('nan'), dtype=frames.dtype, device=frames.device)
+        for num_covering in count.unique().tolist():
+            if num_covering == 0:
+                continue
+            median = torch.nanquantile(windows[:, :, max_count - num_covering :], q=0.5, dim=-1)
+            preds[:, :, count == num_covering] = median.unsqueeze(-1)
+
+    preds = preds.reshape(batch_size, num_windows * step)[:, :target_len]
+
+    # uncovered targets take the last covered prediction, padding is set to zero
+    valid = torch.arange(target_len, device=frames.device).unsqueeze(0) < pred_lengths.unsqueeze(1)
+    covered = valid & ~torch.isnan(preds)
+    positions = torch.arange(target_len, device=frames.device).expand(batch_size, -1)
+    last_covered = torch.where(covered, positions, torch.full_like(positions, -1)).max(dim=1, keepdim=True)[0]
+    fill = preds.gather(1, last_covered.clamp(min=0)).expand(-1, target_len)
+    preds = torch.where(covered, preds, fill)
+    preds = preds.masked_fill(~valid, 0.0)
+    return preds, pred_lengths
+
+
 @torch.jit.script
 def merge_overlap_segment(segments: torch.Tensor) -> torch.Tensor:
     """
@@ -773,6 +850,191 @@ def generate_vad_segment_table_per_file_star(args):
     return generate_vad_segment_table_per_file(*args)
 
 
+def cal_vad_onset_offset_batch(
+    scale: str, onset: float, offset: float, sequences: torch.Tensor, lengths: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Calculate onset and offset thresholds of each padded sequence given different scale, see cal_vad_onset_offset.
+    """
+    batch_size = sequences.shape[0]
+    valid = torch.arange(sequences.shape[1], device=sequences.device).unsqueeze(0) < lengths.unsqueeze(1)
+    if scale == "absolute":
+        mini = torch.zeros(batch_size, dtype=torch.float64, device=sequences.device)
+        maxi = torch.ones(batch_size, dtype=torch.float64, device=sequences.device)
+    elif scale == "relative":
+        # computed in the precision of the sequences as with min() and max() of a tensor
+        mini = sequences.masked_fill(~valid, float('inf')).min(dim=1)[0]
+        maxi = sequences.masked_fill(~valid, float('-inf')).max(dim=1)[0]
+    elif scale == "percentile":
+        sorted_sequences = sequences.masked_fill(~valid, float('inf')).sort(dim=1)[0].double()
+        low = (torch.ceil(lengths.double() * 1 / 100) - 1).long().clamp(min=0)
+        high = (torch.ceil(lengths.double() * 99 / 100) - 1).long().clamp(min=0)
+        mini = sorted_sequences.gather(1, low.unsqueeze(1)).squeeze(1)
+        maxi = sorted_sequences.gather(1, high.unsqueeze(1)).squeeze(1)
+    else:
+        raise ValueError(f"Unknown scale {scale}, should be absolute, relative or percentile")
+
+    onset = mini + onset * (maxi - mini)
+    offset = mini + offset * (maxi - mini)
+    return onset.double(), offset.double()
+
+
+def binarization_batch(
+    sequences: torch.Tensor,
+    lengths: torch.Tensor,
+    onset: torch.Tensor,
+    offset: torch.Tensor,
+    per_args: Dict[str, float],
+) -> List[torch.Tensor]:
+    """
+    Vectorized version of binarization for a batch of padded sequences of frame level predictions.
+    A frame is speech if the last frame above onset or below offset (up to and including it) was above onset,
+    so the hysteresis of binarization is computed without a loop over frames.
+    Args:
+        sequences (torch.Tensor): padded frame level predictions of shape [B, T].
+        lengths (torch.Tensor): number of predictions of each sequence of shape [B].
+        onset (torch.Tensor): onset threshold of each sequence of shape [B].
+        offset (torch.Tensor): offset threshold of each sequence of shape [B].
+        per_args: pad_onset, pad_offset and frame_length_in_sec, see binarization.
+    Returns:
+        speech_segments (List[torch.Tensor]): speech segments of each sequence, see binarization.
+    """
+    frame_length_in_sec = per_args.get('frame_length_in_sec', 0.01)
+    pad_onset = per_args.get('pad_onset', 0.0)
+    pad_offset = per_args.get('pad_offset', 0.0)
+
+    batch_size, max_len = sequences.shape
+    lengths = lengths.to(device=sequences.device, dtype=torch.long)
+    if (onset < offset).any():
+        # a frame can both start and end speech, keep the sequential decisions of binarization
+        speech_segments = []
+        for b in range(batch_size):
+            args = {**per_args, 'onset': float(onset[b]), 'offset': float(offset[b])}
+            speech_segments.append(binarization(sequences[b, : lengths[b]], args))
+        return speech_segments
+
+    # thresholds are compared in the precision of the sequences as with python floats in binarization
+    positions = torch.arange(max_len, device=sequences.device).expand(batch_size, -1)
+    valid = positions < lengths.unsqueeze(1)
+    is_onset = (sequences > onset.to(sequences.dtype).unsqueeze(1)) & valid
+    is_offset = (sequences < offset.to(sequences.dtype).unsqueeze(1)) & valid
+    last_decision = torch.where(is_onset | is_offset, positions, torch.full_like(positions, -1)).cummax(dim=1)[0]
+    speech = (last_decision >= 0) & is_onset.gather(1, last_decision.clamp(min=0))
+
+    previous = torch.nn.functional.pad(speech[:, :-1], [1, 0], value=False)
+    start_b, start_i = torch.nonzero(speech & ~previous, as_tuple=True)
+    end_b, end_i = torch.nonzero(~speech & previous & valid, as_tuple=True)
+    # speech at the end of a sequence ends on its last frame
+    final_b = torch.nonzero(speech.gather(1, (lengths - 1).clamp(min=0).unsqueeze(1)).squeeze(1) & (lengths > 0))
+    final_b = final_b.squeeze(1)
+    end_b = torch.cat((end_b, final_b))
+    end_i = torch.cat((end_i, lengths[final_b] - 1))
+    end_order = torch.argsort(end_b * max_len + end_i)
+    end_b, end_i = end_b[end_order], end_i[end_order]
+
+    # starts and ends alternate in each sequence, so they pair up in order
+    seg_start = (start_i.double() * frame_length_in_sec - pad_onset).clamp(min=0)
+    seg_end = end_i.double() * frame_length_in_sec + pad_offset
+    # only segments ended by an offset are dropped if empty, the final segment is always kept
+    is_final = speech[end_b, end_i]
+    keep = is_final | (seg_end > seg_start)
+    segments = torch.stack((seg_start, seg_end), dim=1)[keep].float()
+    num_segments = torch.bincount(start_b[keep], minlength=batch_size).tolist()
+
+    speech_segments = []
+    for seq_segments in torch.split(segments, num_segments):
+        if seq_segments.shape[0] == 0:
+            seq_segments = torch.empty(0)
+        # Merge the overlapped speech segments due to padding
+        speech_segments.append(merge_overlap_segment(seq_segments))
+    return speech_segments
+
+
+def generate_vad_segment_table_batch(
+    sequences: torch.Tensor, lengths: torch.Tensor, postprocessing_params: dict, frame_length_in_sec: float
+) -> List[torch.Tensor]:
+    """
+    Convert a batch of padded frame level predictions to speech segment tables in memory.
+    Same as generate_vad_segment_table_per_tensor applied to each sequence after prepare_gen_segment_table.
+    Args:
+        sequences (torch.Tensor): padded frame level predictions of shape [B, T].
+        lengths (torch.Tensor): number of predictions of each sequence of shape [B].
+        postprocessing_params (dict): dictionary of thresholds for prediction score. See details in binarization and filtering.
+        frame_length_in_sec (float): frame length.
+    Returns:
+        tables (List[torch.Tensor]): speech segments of each sequence in torch.Tensor([[start, end, dur], ...]) format.
+    """
+    UNIT_FRAME_LEN = 0.01
+
+    per_args = {"frame_length_in_sec": frame_length_in_sec, **postprocessing_params}
+    lengths = lengths.to(device=sequences.device, dtype=torch.long)
+    onset, offset = cal_vad_onset_offset_batch(
+        per_args.get('scale', 'absolute'), per_args['onset'], per_args['offset'], sequences, lengths
+    )
+    # cast 'filter_speech_first' for torch.jit.script
+    if 'filter_speech_first' in per_args:
+        per_args['filter_speech_first'] = 1.0 if per_args['filter_speech_first'] else 0.0
+    per_args_float: Dict[str, float] = {}
+    for i in per_args:
+        if type(per_args[i]) == float or type(per_args[i]) == int:
+            per_args_float[i] = per_args[i]
+
+    tables = []
+    for speech_segments in binarization_batch(sequences, lengths, onset, offset, per_args_float):
+        speech_segments = filtering(speech_segments, per_args_float)
+        if speech_segments.shape != torch.Size([0]):
+            speech_segments, _ = torch.sort(speech_segments, 0)
+            dur = speech_segments[:, 1:2] - speech_segments[:, 0:1] + UNIT_FRAME_LEN
+            speech_segments = torch.column_stack((speech_segments, dur))
+        tables.append(speech_segments)
+    return tables
+
+
+def generate_vad_segment_table_in_memory(
+    frame_preds: Dict[str, torch.Tensor],
+    postprocessing_params: dict,
+    frame_length_in_sec: float,
+    smoothing_method: Optional[str] = None,
+    overlap: float = 0.5,
+    window_length_in_sec: float = 0.63,
+    shift_length_in_sec: float = 0.01,
+    batch_size: int = 64,
+) -> Dict[str, torch.Tensor]:
+    """
+    Overlap smoothing (optional), binarization, filtering and segment table generation of in-memory frame predictions,
+    the in-memory equivalent of generate_overlap_vad_seq followed by generate_vad_segment_table.
+    Sequences are processed in batches with vectorized tensor operations, without intermediate files.
+    Args:
+        frame_preds (dict): frame level predictions of each audio, keyed by name.
+        postprocessing_params (dict): dictionary of thresholds for prediction score. See details in binarization and filtering.
+        frame_length_in_sec (float): frame length of the (smoothed) predictions.
+        smoothing_method (str): median or mean smoothing filter, None to binarize the frame predictions directly.
+        overlap (float): amounts of overlap of adjacent windows.
+        window_length_in_sec (float): length of window for generating the frame.
+        shift_length_in_sec (float): amount of shift of window for generating the frame.
+        batch_size (int): number of sequences processed at once.
+    Returns:
+        tables (dict): speech segments of each audio in torch.Tensor([[start, end, dur], ...]) format, keyed by name.
+    """
+    smoothing_args = {
+        "overlap": overlap,
+        "window_length_in_sec": window_length_in_sec,
+        "shift_length_in_sec": shift_length_in_sec,
+    }
+    names = list(frame_preds.keys())
+    tables = {}
+    for batch_start in range(0, len(names), batch_size):
+        batch_names = names[batch_start : batch_start + batch_size]
+        batch_preds = [frame_preds[name].flatten().float() for name in batch_names]
+        lengths = torch.tensor([len(pred) for pred in batch_preds], dtype=torch.long)
+        sequences = torch.nn.utils.rnn.pad_sequence(batch_preds, batch_first=True)
+        if smoothing_method:
+            sequences, lengths = generate_overlap_vad_seq_batch(sequences, lengths, smoothing_args, smoothing_method)
+        batch_tables = generate_vad_segment_table_batch(sequences, lengths, postprocessing_params, frame_length_in_sec)
+        tables.update(zip(batch_names, batch_tables))
+    return tables
+
+
 def vad_construct_pyannote_object_per_file(
     vad_table_filepath: str, groundtruth_RTTM_file: str
 ) -> Tuple[Annotation, Annotation]:
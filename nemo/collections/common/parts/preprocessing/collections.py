@@ -14,13 +14,22 @@
 
 import collections
 import json
+import multiprocessing
 import os
 from itertools import combinations
 from typing import Any, Dict, Iterable, List, Optional, Union
 import numpy as np
 import pandas as pd
 
-from nemo.collections.common.parts.preprocessing import manifest, parsers
+from nemo.collections.common.parts.preprocessing import manifest, manifest_cache, parsers
+from nemo.collections.common.parts.preprocessing.columnar import (
+    CategoricalColumn,
+    EntityColumns,
+    FileIdMapping,
+    NumericColumn,
+    RaggedIntColumn,
+    StringColumn,
+)
 from nemo.utils import logging, logging_mode
 
 
@@ -29,6 +38,43 @@ class _Collection(collections.UserList):
 
     OUTPUT_TYPE = None  # Single element output type.
 
+    def _init_compact(self, data: List, sort_by: Optional[str] = None):
+        """Stores entities as numpy columns instead of a list of namedtuples.
+
+        Entities are materialized on access, so dataloader workers do not hold (and touch the refcounts of)
+        one Python object per sample. The `mapping` dict, if any, is converted to a `FileIdMapping`.
+
+        Args:
+            data: List of `OUTPUT_TYPE` entities, emptied by this call.
+            sort_by: Optional numeric field to sort the entities by, with a stable argsort.
+        """
+        columns = EntityColumns.from_entities(self.OUTPUT_TYPE, data)
+        data.clear()
+        if sort_by is not None:
+            columns = columns.sort_by(sort_by)
+        if getattr(self, 'mapping', None) is not None:
+            self.mapping = FileIdMapping.from_dict(self.mapping)
+
+        # `UserList.__init__` would copy the columns into a list of entities
+        super().__init__()
+        self.data = columns
+
+
+def _tokenize_transcript(parser: parsers.CharParser, text: Union[str, List], lang: Optional[str]) -> Optional[List]:
+    """Tokenizes a manifest transcript, returning None if the parser rejects it."""
+    if text == '':
+        return []
+
+    if hasattr(parser, "is_aggregate") and parser.is_aggregate and isinstance(text, str):
+        if lang is not None:
+            return parser(text, lang)
+        # for future use if want to add language bypass to audio_to_text classes
+        # elif hasattr(parser, "lang") and parser.lang is not None:
+        #    return parser(text, parser.lang)
+        raise ValueError("lang required in manifest when using aggregate tokenizers")
+
+    return parser(text)
+
 
 class Text(_Collection):
     """Simple list of preprocessed text entries, result in list of tokens."""
@@ -113,6 +159,7 @@ class AudioText(_Collection):
         max_number: Optional[int] = None,
         do_sort_by_duration: bool = False,
         index_by_file_id: bool = False,
+        compact: bool = False,
     ):
         """Instantiates audio-text manifest with filters and preprocessing.
 
@@ -131,6 +178,8 @@ class AudioText(_Collection):
             max_number: Maximum number of samples to collect.
             do_sort_by_duration: True if sort samples list by duration. Not compatible with index_by_file_id.
             index_by_file_id: If True, saves a mapping from filename base (ID) to index in data.
+            compact: If True, stores samples as numpy columns which are materialized on access, instead
+                of a list of namedtuples, and sorts them with an argsort.
         """
 
         output_type = self.OUTPUT_TYPE
@@ -155,19 +204,7 @@ class AudioText(_Collection):
             if token_labels is not None:
                 text_tokens = token_labels
             else:
-                if text != '':
-                    if hasattr(parser, "is_aggregate") and parser.is_aggregate and isinstance(text, str):
-                        if lang is not None:
-                            text_tokens = parser(text, lang)
-                        # for future use if want to add language bypass to audio_to_text classes
-                        # elif hasattr(parser, "lang") and parser.lang is not None:
-                        #    text_tokens = parser(text, parser.lang)
-                        else:
-                            raise ValueError("lang required in manifest when using aggregate tokenizers")
-                    else:
-                        text_tokens = parser(text)
-                else:
-                    text_tokens = []
+                text_tokens = _tokenize_transcript(parser, text, lang)
 
                 if text_tokens is None:
                     duration_filtered += duration
@@ -190,13 +227,70 @@ class AudioText(_Collection):
         if do_sort_by_duration:
             if index_by_file_id:
                 logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
-            else:
+            elif not compact:
                 data.sort(key=lambda entity: entity.duration)
 
         logging.info("Dataset loaded with %d files totalling %.2f hours", len(data), total_duration / 3600)
         logging.info("%d files were filtered totalling %.2f hours", num_filtered, duration_filtered / 3600)
 
-        super().__init__(data)
+        if compact:
+            self._init_compact(data, sort_by='duration' if do_sort_by_duration and not index_by_file_id else None)
+        else:
+            super().__init__(data)
+
+    def _init_from_columns(
+        self,
+        columns: EntityColumns,
+        min_duration: Optional[float] = None,
+        max_duration: Optional[float] = None,
+        max_number: Optional[int] = None,
+        do_sort_by_duration: bool = False,
+        index_by_file_id: bool = False,
+    ):
+        """Instantiates the collection from columns of parsed entities, applying the same filters as `__init__`.
+
+        Filtering and sorting only build an index array over the columns and the `index_by_file_id` mapping is
+        a `FileIdMapping`, so no per-sample Python object is kept.
+
+        Args:
+            columns: Columns with the fields of `OUTPUT_TYPE` and a boolean `valid` column marking the
+                transcripts which were successfully parsed.
+            Other arguments are the same as in `__init__`.
+        """
+        durations = np.asarray(columns.columns['duration'].values)
+        keep = np.asarray(columns.columns['valid'].values, dtype=bool).copy()
+        if min_duration is not None:
+            keep &= durations >= min_duration
+        if max_duration is not None:
+            keep &= durations <= max_duration
+
+        kept = np.flatnonzero(keep)
+        num_seen = len(durations)
+        # Max number of entities filter, entries after the last kept one are neither kept nor filtered.
+        if max_number and len(kept) >= max_number:
+            kept = kept[:max_number]
+            num_seen = int(kept[-1]) + 1
+        filtered = ~keep[:num_seen]
+        num_filtered, duration_filtered = int(filtered.sum()), float(durations[:num_seen][filtered].sum())
+        total_duration = float(durations[kept].sum())
+
+        data = columns.select(kept)
+        if index_by_file_id:
+            file_ids = [os.path.splitext(os.path.basename(data.columns['audio_file'][row]))[0] for row in data.rows()]
+            self.mapping = FileIdMapping.from_keys(file_ids, multi=True)
+
+        if do_sort_by_duration:
+            if index_by_file_id:
+                logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
+            else:
+                data = data.sort_by('duration')
+
+        logging.info("Dataset loaded with %d files totalling %.2f hours", len(data), total_duration / 3600)
+        logging.info("%d files were filtered totalling %.2f hours", num_filtered, duration_filtered / 3600)
+
+        # `UserList.__init__` would copy the columns into a list of entities
+        super().__init__()
+        self.data = data
 
 
 class VideoText(_Collection):
@@ -310,15 +404,33 @@ class VideoText(_Collection):
 class ASRAudioText(AudioText):
     """`AudioText` collector from asr structured json files."""
 
-    def __init__(self, manifests_files: Union[str, List[str]], *args, **kwargs):
+    def __init__(
+        self,
+        manifests_files: Union[str, List[str]],
+        *args,
+        manifest_cache_dir: Optional[str] = None,
+        num_workers: int = 1,
+        **kwargs,
+    ):
         """Parse lists of audio files, durations and transcripts texts.
 
         Args:
             manifests_files: Either single string file or list of such -
                 manifests to yield items from.
             *args: Args to pass to `AudioText` constructor.
+            manifest_cache_dir: If set, the parsed and tokenized manifests are compiled into a memory-mapped
+                columnar cache under this directory (keyed by manifest and parser fingerprints) and loaded from
+                there on later runs. Samples are then stored as numpy columns instead of one namedtuple each.
+                On a cache miss, only rank zero builds the cache while the other ranks wait for it.
+            num_workers: Number of processes used to parse and tokenize the manifests. With more than one
+                worker, manifests are split into byte ranges which are compiled in parallel and merged in order,
+                and samples are stored as numpy columns.
             **kwargs: Kwargs to pass to `AudioText` constructor.
         """
+        if manifest_cache_dir is not None or num_workers > 1 or kwargs.get('compact', False):
+            # compiled manifests are always stored compactly, without building a namedtuple per sample
+            self._init_from_compiled_manifest(manifests_files, manifest_cache_dir, num_workers, *args, **kwargs)
+            return
 
         (
             ids,
@@ -348,6 +460,146 @@ class ASRAudioText(AudioText):
             ids, audio_files, durations, texts, offsets, speakers, orig_srs, token_labels, langs, *args, **kwargs
         )
 
+    def _init_from_compiled_manifest(
+        self,
+        manifests_files: Union[str, List[str]],
+        manifest_cache_dir: Optional[str],
+        num_workers: int,
+        parser: parsers.CharParser,
+        min_duration: Optional[float] = None,
+        max_duration: Optional[float] = None,
+        max_number: Optional[int] = None,
+        do_sort_by_duration: bool = False,
+        index_by_file_id: bool = False,
+        compact: bool = True,
+    ):
+        build_fn = lambda: self.compile_manifest(manifests_files, parser, num_workers=num_workers)
+        if manifest_cache_dir is None:
+            columns = build_fn()
+        else:
+            path = manifest_cache.get_cache_path(manifest_cache_dir, 'audio_text', manifests_files, parser)
+            columns = manifest_cache.load_or_build(path, self.OUTPUT_TYPE, build_fn, build_on_rank_zero=True)
+        self._init_from_columns(
+            columns,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            max_number=max_number,
+            do_sort_by_duration=do_sort_by_duration,
+            index_by_file_id=index_by_file_id,
+        )
+
+    @classmethod
+    def compile_manifest(
+        cls,
+        manifests_files: Union[str, List[str]],
+        parser: parsers.CharParser,
+        num_workers: int = 1,
+        chunks_per_worker: int = 4,
+    ) -> EntityColumns:
+        """Parses and tokenizes manifests into columns, without applying any filter.
+
+        Args:
+            manifests_files: Either single string file or list of such -
+                manifests to yield items from.
+            parser: Instance of `CharParser` to convert string to tokens. If it provides a `parse_batch`
+                method, transcripts are tokenized in batches with it.
+            num_workers: Number of processes to use. Manifests are split into byte ranges which are
+                compiled in parallel and concatenated in order, so the result does not depend on `num_workers`.
+            chunks_per_worker: Number of byte ranges per worker and manifest, for load balancing.
+
+        Returns:
+            Columns with the fields of `OUTPUT_TYPE` plus a boolean `valid` column, which is False
+            for the samples whose transcript was rejected by the parser.
+        """
+        if num_workers <= 1:
+            return _compile_audio_text_items(cls.OUTPUT_TYPE, manifest.item_iter(manifests_files), parser)
+
+        ranges = manifest.get_manifest_byte_ranges(
+            manifests_files, num_chunks_per_file=num_workers * chunks_per_worker
+        )
+        logging.info(f"Compiling {len(ranges)} manifest chunks with {num_workers} workers")
+        # parsers are often local classes, fork lets the workers inherit them without pickling
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        with multiprocessing.get_context(start_method).Pool(
+            processes=num_workers, initializer=_init_compile_worker, initargs=(cls.OUTPUT_TYPE, parser)
+        ) as pool:
+            chunks = pool.map(_compile_audio_text_range, ranges, chunksize=1)
+
+        columns = EntityColumns.concatenate(chunks)
+        # ids are positions in the concatenated manifests, as in `manifest.item_iter`
+        columns.columns['id'] = NumericColumn(np.arange(columns.num_rows, dtype=np.int64))
+        return EntityColumns(cls.OUTPUT_TYPE, columns.columns)
+
+
+_PARSE_BATCH_SIZE = 1024
+_compile_worker_state = {}
+
+
+def _tokenize_transcripts(parser: parsers.CharParser, texts: List, langs: List[Optional[str]]) -> List[Optional[List]]:
+    """Tokenizes a list of manifest transcripts, in batches if the parser provides a `parse_batch` method."""
+    parse_batch = getattr(parser, 'parse_batch', None)
+    if parse_batch is None:
+        return [_tokenize_transcript(parser, text, lang) for text, lang in zip(texts, langs)]
+
+    # transcripts which need the language or are empty are tokenized one by one
+    text_tokens = [None] * len(texts)
+    batch = []
+    aggregate = getattr(parser, 'is_aggregate', False)
+    for idx, (text, lang) in enumerate(zip(texts, langs)):
+        if isinstance(text, str) and text != '' and not aggregate:
+            batch.append(idx)
+        else:
+            text_tokens[idx] = _tokenize_transcript(parser, text, lang)
+    for batch_start in range(0, len(batch), _PARSE_BATCH_SIZE):
+        batch_idx = batch[batch_start : batch_start + _PARSE_BATCH_SIZE]
+        for idx, tokens in zip(batch_idx, parse_batch([texts[idx] for idx in batch_idx])):
+            text_tokens[idx] = tokens
+    return text_tokens
+
+
+def _compile_audio_text_items(output_type: type, items: Iterable[Dict[str, Any]], parser) -> EntityColumns:
+    """Builds `AudioText` columns from parsed manifest items."""
+    items = list(items)
+    pending = [idx for idx, item in enumerate(items) if item['token_labels'] is None]
+    all_text_tokens = [item['token_labels'] for item in items]
+    tokenized = _tokenize_transcripts(
+        parser, [items[idx]['text'] for idx in pending], [items[idx]['lang'] for idx in pending]
+    )
+    for idx, text_tokens in zip(pending, tokenized):
+        if text_tokens is not None and not isinstance(text_tokens, (list, tuple)):
+            raise ValueError(
+                f"Compiled manifests require the parser to return a list of token ids, got {type(text_tokens)}"
+            )
+        all_text_tokens[idx] = text_tokens
+
+    columns = {
+        'id': NumericColumn.from_list([item['id'] for item in items], dtype=np.int64),
+        'audio_file': StringColumn.from_list([item['audio_file'] for item in items]),
+        'duration': NumericColumn.from_list([item['duration'] for item in items]),
+        'text_tokens': RaggedIntColumn.from_list([text_tokens or [] for text_tokens in all_text_tokens]),
+        'offset': NumericColumn.from_list([item['offset'] for item in items]),
+        'text_raw': StringColumn.from_list([item['text'] for item in items]),
+        'speaker': CategoricalColumn.from_list([item['speaker'] for item in items]),
+        'orig_sr': CategoricalColumn.from_list([item['orig_sr'] for item in items]),
+        'lang': CategoricalColumn.from_list([item['lang'] for item in items]),
+        'valid': NumericColumn.from_list([text_tokens is not None for text_tokens in all_text_tokens], dtype=bool),
+    }
+    return EntityColumns(output_type, columns)
+
+
+def _init_compile_worker(output_type: type, parser):
+    _compile_worker_state['output_type'] = output_type
+    _compile_worker_state['parser'] = parser
+
+
+def _compile_audio_text_range(manifest_range) -> EntityColumns:
+    manifest_file, start, end = manifest_range
+    return _compile_audio_text_items(
+        _compile_worker_state['output_type'],
+        manifest.item_iter_range(manifest_file, start, end),
+        _compile_worker_state['parser'],
+    )
+
 
 class SpeechLLMAudioTextEntity(object):
     def __init__(self, sid, audio_file, duration, context, answer, offset, speaker, orig_sr, lang) -> None:
@@ -682,6 +934,7 @@ class SpeechLabel(_Collection):
         max_number: Optional[int] = None,
         do_sort_by_duration: bool = False,
         index_by_file_id: bool = False,
+        compact: bool = False,
     ):
         """Instantiates audio-label manifest with filters and preprocessing.
 
@@ -695,6 +948,8 @@ class SpeechLabel(_Collection):
             max_number: Maximum number of samples to collect.
             do_sort_by_duration: True if sort samples list by duration.
             index_by_file_id: If True, saves a mapping from filename base (ID) to index in data.
+            compact: If True, stores samples as numpy columns which are materialized on access, instead
+                of a list of namedtuples, and sorts them with an argsort.
         """
 
         if index_by_file_id:
@@ -726,7 +981,7 @@ class SpeechLabel(_Collection):
         if do_sort_by_duration:
             if index_by_file_id:
                 logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
-            else:
+            elif not compact:
                 data.sort(key=lambda entity: entity.duration)
 
         logging.info(f"Filtered duration for loading collection is {duration_filtered / 3600: .2f} hours.")
@@ -734,7 +989,10 @@ class SpeechLabel(_Collection):
         self.uniq_labels = sorted(set(map(lambda x: x.label, data)))
         logging.info("# {} files loaded accounting to # {} labels".format(len(data), len(self.uniq_labels)))
 
-        super().__init__(data)
+        if compact:
+            self._init_compact(data, sort_by='duration' if do_sort_by_duration and not index_by_file_id else None)
+        else:
+            super().__init__(data)
 
 
 class ASRSpeechLabel(SpeechLabel):
@@ -976,6 +1234,7 @@ class DiarizationLabel(_Collection):
         max_number: Optional[int] = None,
         do_sort_by_duration: bool = False,
         index_by_file_id: bool = False,
+        compact: bool = False,
     ):
         """Instantiates audio-label manifest with filters and preprocessing.
 
@@ -1002,6 +1261,8 @@ class DiarizationLabel(_Collection):
             max_number: Maximum number of samples to collect
             do_sort_by_duration: True if sort samples list by duration
             index_by_file_id: If True, saves a mapping from filename base (ID) to index in data.
+            compact: If True, stores samples as numpy columns which are materialized on access, instead
+                of a list of namedtuples, and sorts them with an argsort.
         """
 
         if index_by_file_id:
@@ -1050,7 +1311,7 @@ class DiarizationLabel(_Collection):
         if do_sort_by_duration:
             if index_by_file_id:
                 logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
-            else:
+            elif not compact:
                 data.sort(key=lambda entity: entity.duration)
 
         logging.info(
@@ -1059,7 +1320,10 @@ class DiarizationLabel(_Collection):
         )
         logging.info(f"Total {len(data)} session files loaded accounting to # {len(audio_files)} audio clips")
 
-        super().__init__(data)
+        if compact:
+            self._init_compact(data, sort_by='duration' if do_sort_by_duration and not index_by_file_id else None)
+        else:
+            super().__init__(data)
 
 
 class DiarizationSpeechLabel(DiarizationLabel):
@@ -1576,6 +1840,7 @@ class FeatureText(_Collection):
         max_number: Optional[int] = None,
         do_sort_by_duration: bool = False,
         index_by_file_id: bool = False,
+        compact: bool = False,
     ):
         """Instantiates feature-text manifest with filters and preprocessing.
 
@@ -1595,6 +1860,8 @@ class FeatureText(_Collection):
             max_number: Maximum number of samples to collect.
             do_sort_by_duration: True if sort samples list by duration. Not compatible with index_by_file_id.
             index_by_file_id: If True, saves a mapping from filename base (ID) to index in data.
+            compact: If True, stores samples as numpy columns which are materialized on access, instead
+                of a list of namedtuples, and sorts them with an argsort.
         """
 
         output_type = self.OUTPUT_TYPE
@@ -1662,13 +1929,16 @@ class FeatureText(_Collection):
         if do_sort_by_duration:
             if index_by_file_id:
                 logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
-            else:
+            elif not compact:
                 data.sort(key=lambda entity: entity.duration)
 
         logging.info("Dataset loaded with %d files totalling %.2f hours", len(data), total_duration / 3600)
         logging.info("%d files were filtered totalling %.2f hours", num_filtered, duration_filtered / 3600)
 
-        super().__init__(data)
+        if compact:
+            self._init_compact(data, sort_by='duration' if do_sort_by_duration and not index_by_file_id else None)
+        else:
+            super().__init__(data)
 
 
 class ASRFeatureText(FeatureText):
@@ -0,0 +1,578 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Struct-of-arrays storage for manifest collections.
+
+The collections in :mod:`nemo.collections.common.parts.preprocessing.collections` keep one namedtuple
+per sample. For very large manifests this costs several GB of Python objects per process. The classes
+below keep every field as a numpy column instead (strings as a single bytes blob plus offsets, token
+sequences as a single flat array plus offsets) and materialize the namedtuple lazily on access.
+"""
+
+import bisect
+import collections
+import collections.abc
+import functools
+import json
+import os
+import pickle
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Type
+
+import numpy as np
+
+__all__ = [
+    'NumericColumn',
+    'StringColumn',
+    'RaggedIntColumn',
+    'CategoricalColumn',
+    'ObjectColumn',
+    'EntityColumns',
+    'FileIdMapping',
+    'make_column',
+    'infer_column',
+]
+
+
+class _Column:
+    """Base class for a single field of an `EntityColumns` table."""
+
+    KIND = None
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def __getitem__(self, idx: int) -> Any:
+        raise NotImplementedError()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Returns the numpy arrays backing this column, keyed by a short suffix."""
+        raise NotImplementedError()
+
+    def meta(self) -> Dict[str, Any]:
+        """Returns JSON-serializable metadata needed to restore the column from its arrays."""
+        return {}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> '_Column':
+        raise NotImplementedError()
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['_Column']) -> '_Column':
+        """Concatenates columns of the same kind, in order."""
+        raise NotImplementedError()
+
+
+class NumericColumn(_Column):
+    """Column of numbers. If `nullable`, NaN is used to encode `None` (float columns only)."""
+
+    KIND = 'numeric'
+
+    def __init__(self, values: np.ndarray, nullable: bool = False):
+        self.values = values
+        self.nullable = nullable
+
+    @classmethod
+    def from_list(cls, values: Sequence[Optional[float]], dtype=np.float64) -> 'NumericColumn':
+        nullable = any(v is None for v in values)
+        if nullable:
+            values = [np.nan if v is None else v for v in values]
+            dtype = np.float64
+        return cls(np.asarray(values, dtype=dtype), nullable=nullable)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, idx: int) -> Any:
+        value = self.values[idx].item()
+        if self.nullable and value != value:
+            return None
+        return value
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {'values': self.values}
+
+    def meta(self) -> Dict[str, Any]:
+        return {'nullable': self.nullable}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> 'NumericColumn':
+        return cls(arrays['values'], nullable=meta.get('nullable', False))
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['NumericColumn']) -> 'NumericColumn':
+        return cls(np.concatenate([c.values for c in columns]), nullable=any(c.nullable for c in columns))
+
+
+class StringColumn(_Column):
+    """Column of strings stored as one concatenated UTF-8 blob with int64 offsets.
+
+    Values which are not strings (e.g. the list of language spans used with aggregate tokenizers) are
+    supported by JSON-encoding the whole column, which is recorded in `json_encoded`.
+    """
+
+    KIND = 'string'
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, json_encoded: bool = False):
+        self.blob = blob
+        self.offsets = offsets
+        self.json_encoded = json_encoded
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any], json_encoded: Optional[bool] = None) -> 'StringColumn':
+        if json_encoded is None:
+            json_encoded = not all(isinstance(v, str) for v in values)
+        if json_encoded:
+            encoded = [json.dumps(v).encode('utf-8') for v in values]
+        else:
+            encoded = [v.encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets, json_encoded=json_encoded)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> Any:
+        value = self.blob[self.offsets[idx] : self.offsets[idx + 1]].tobytes().decode('utf-8')
+        if self.json_encoded:
+            return json.loads(value)
+        return value
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {'blob': self.blob, 'offsets': self.offsets}
+
+    def meta(self) -> Dict[str, Any]:
+        return {'json_encoded': self.json_encoded}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> 'StringColumn':
+        return cls(arrays['blob'], arrays['offsets'], json_encoded=meta.get('json_encoded', False))
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['StringColumn']) -> 'StringColumn':
+        if any(c.json_encoded for c in columns):
+            # plain string columns are re-encoded so that the whole column is JSON
+            columns = [c if c.json_encoded else cls.from_list(list(c), json_encoded=True) for c in columns]
+        blob, offsets = _concatenate_ragged([c.blob for c in columns], [c.offsets for c in columns])
+        return cls(blob, offsets, json_encoded=any(c.json_encoded for c in columns))
+
+
+class RaggedIntColumn(_Column):
+    """Column of integer sequences (e.g. token ids) stored as one flat array with int64 offsets."""
+
+    KIND = 'ragged_int'
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray):
+        self.values = values
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, values: Sequence[Sequence[int]], dtype=np.int32) -> 'RaggedIntColumn':
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in values], out=offsets[1:])
+        flat = np.fromiter((t for v in values for t in v), dtype=dtype, count=int(offsets[-1]))
+        return cls(flat, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> List[int]:
+        return self.values[self.offsets[idx] : self.offsets[idx + 1]].tolist()
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {'values': self.values, 'offsets': self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> 'RaggedIntColumn':
+        return cls(arrays['values'], arrays['offsets'])
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['RaggedIntColumn']) -> 'RaggedIntColumn':
+        return cls(*_concatenate_ragged([c.values for c in columns], [c.offsets for c in columns]))
+
+
+class CategoricalColumn(_Column):
+    """Column with few distinct values (speakers, languages, sample rates, ...).
+
+    Stores an int32 code per sample and the table of distinct values once. Values may be any
+    JSON-serializable object, including `None`.
+    """
+
+    KIND = 'categorical'
+
+    def __init__(self, codes: np.ndarray, categories: List[Any]):
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any]) -> 'CategoricalColumn':
+        lookup, categories = {}, []
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            # lists and dicts are not hashable, key them by their JSON representation
+            key = value if isinstance(value, collections.abc.Hashable) else json.dumps(value, sort_keys=True)
+            code = lookup.get((type(value), key))
+            if code is None:
+                code = lookup[(type(value), key)] = len(categories)
+                categories.append(value)
+            codes[i] = code
+        return cls(codes, categories)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, idx: int) -> Any:
+        return self.categories[self.codes[idx]]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {'codes': self.codes}
+
+    def meta(self) -> Dict[str, Any]:
+        return {'categories': self.categories}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> 'CategoricalColumn':
+        return cls(arrays['codes'], meta['categories'])
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['CategoricalColumn']) -> 'CategoricalColumn':
+        merged = cls.from_list([category for c in columns for category in c.categories])
+        codes, start = [], 0
+        for c in columns:
+            # codes of the categories of `c` in the merged table
+            remap = merged.codes[start : start + len(c.categories)]
+            codes.append(remap[c.codes] if len(c.codes) else c.codes)
+            start += len(c.categories)
+        return cls(np.concatenate(codes).astype(np.int32), merged.categories)
+
+
+class ObjectColumn(_Column):
+    """Column of arbitrary Python objects (tuples, dicts, ...), each pickled into one concatenated blob.
+
+    Objects are unpickled on access, so they do not live on the Python heap. This column is meant for
+    in-memory storage and is not supported by `EntityColumns.save`.
+    """
+
+    KIND = 'object'
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, values: Sequence[Any]) -> 'ObjectColumn':
+        encoded = [pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL) for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> Any:
+        return pickle.loads(self.blob[self.offsets[idx] : self.offsets[idx + 1]].tobytes())
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        raise TypeError("Object columns hold pickled Python objects and cannot be saved")
+
+    @classmethod
+    def concatenate(cls, columns: Sequence['ObjectColumn']) -> 'ObjectColumn':
+        return cls(*_concatenate_ragged([c.blob for c in columns], [c.offsets for c in columns]))
+
+
+def _concatenate_ragged(values: Sequence[np.ndarray], offsets: Sequence[np.ndarray]):
+    """Concatenates flat value arrays and shifts their offsets accordingly."""
+    shifted, base = [np.zeros(1, dtype=np.int64)], 0
+    for value, offset in zip(values, offsets):
+        shifted.append(np.asarray(offset[1:], dtype=np.int64) + base)
+        base += int(offset[-1])
+    return np.concatenate(values), np.concatenate(shifted)
+
+
+_COLUMN_TYPES = {c.KIND: c for c in (NumericColumn, StringColumn, RaggedIntColumn, CategoricalColumn, ObjectColumn)}
+
+
+def make_column(kind: str, values: Sequence[Any], **kwargs) -> _Column:
+    """Builds a column of the given kind ('numeric', 'string', 'ragged_int', 'categorical' or 'object')."""
+    if kind not in _COLUMN_TYPES:
+        raise ValueError(f"Unknown column kind `{kind}`, expected one of {list(_COLUMN_TYPES.keys())}")
+    return _COLUMN_TYPES[kind].from_list(values, **kwargs)
+
+
+def infer_column(values: Sequence[Any], max_categories_ratio: float = 0.5) -> _Column:
+    """Picks the most compact column type which returns values equal to `values`.
+
+    Args:
+        values: values of one field for all the samples.
+        max_categories_ratio: values with at most this ratio of distinct values to samples (and strings with
+            few distinct values) are stored as a categorical column.
+
+    Returns:
+        A column holding `values`.
+    """
+    types = set(type(v) for v in values)
+    if types <= {bool}:
+        return NumericColumn.from_list(values, dtype=bool)
+    if types <= {int}:
+        return NumericColumn.from_list(values, dtype=np.int64)
+    if types <= {int, float, type(None)} and float in types:
+        return NumericColumn.from_list(values)
+    if types <= {list} and all(type(t) is int for v in values for t in v):
+        return RaggedIntColumn.from_list(values, dtype=np.int64)
+    try:
+        num_categories = len(set((type(v), v) for v in values))
+    except TypeError:
+        # unhashable values, e.g. lists of tuples or dicts
+        num_categories = None
+    if num_categories is not None and num_categories <= max(1, max_categories_ratio * len(values)):
+        return CategoricalColumn.from_list(values)
+    if types <= {str}:
+        return StringColumn.from_list(values)
+    return ObjectColumn.from_list(values)
+
+
+class EntityColumns(collections.abc.Sequence):
+    """Read-only sequence of `output_type` namedtuples backed by one column per field.
+
+    An optional `index` array selects and orders the rows, which makes filtering and sorting cheap
+    (no column is copied) and lets several views share the same memory-mapped columns.
+
+    Args:
+        output_type: namedtuple class to materialize on access.
+        columns: mapping from each field of `output_type` to its column.
+        index: optional int64 array of row ids into the columns.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, output_type: Type, columns: Dict[str, _Column], index: Optional[np.ndarray] = None):
+        missing = set(output_type._fields) - set(columns.keys())
+        if missing:
+            raise ValueError(f"Missing columns for fields {sorted(missing)} of {output_type.__name__}")
+        self.output_type = output_type
+        self.columns = columns
+        self.index = index
+        # directory the columns were loaded from, if any
+        self.path = None
+        self._ordered_columns = [columns[field] for field in output_type._fields]
+
+    @property
+    def num_rows(self) -> int:
+        """Number of rows stored in the columns, regardless of `index`."""
+        return len(self._ordered_columns[0]) if self._ordered_columns else 0
+
+    def __len__(self) -> int:
+        return self.num_rows if self.index is None else len(self.index)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.select(np.arange(len(self))[idx])
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError(f"Index {idx} is out of range for {len(self)} entities")
+        row = idx if self.index is None else int(self.index[idx])
+        return self.output_type(*(column[row] for column in self._ordered_columns))
+
+    def rows(self) -> np.ndarray:
+        """Returns the row ids of this view in order."""
+        return np.arange(self.num_rows, dtype=np.int64) if self.index is None else self.index
+
+    def select(self, positions: np.ndarray) -> 'EntityColumns':
+        """Returns a view with the entities at `positions` of this view."""
+        view = EntityColumns(self.output_type, self.columns, self.rows()[np.asarray(positions, dtype=np.int64)])
+        view.path = self.path
+        return view
+
+    def __reduce__(self):
+        # Entity types are namedtuples defined as class attributes, which pickle cannot look up by name,
+        # so they are pickled by name and fields. Memory-mapped columns are re-opened instead of being
+        # copied into the pickle (e.g. for spawned dataloader workers).
+        output_type_spec = (self.output_type.__name__, self.output_type._fields)
+        if self.path is not None:
+            return (_load_view, (self.path, output_type_spec, self.index))
+        return (_restore, (output_type_spec, self.columns, self.index))
+
+    def field(self, name: str) -> np.ndarray:
+        """Returns the values of a numeric field for this view as a numpy array."""
+        column = self.columns[name]
+        if not isinstance(column, NumericColumn):
+            raise TypeError(f"Field `{name}` is stored as a {column.KIND} column, not a numeric one")
+        return column.values[self.rows()]
+
+    def argsort(self, name: str) -> np.ndarray:
+        """Stable argsort of this view by a numeric field."""
+        return np.argsort(self.field(name), kind='stable')
+
+    def sort_by(self, name: str) -> 'EntityColumns':
+        """Equivalent of `list.sort(key=lambda entity: getattr(entity, name))` for a numeric field."""
+        return self.select(self.argsort(name))
+
+    def save(self, path: str):
+        """Saves every column as `.npy` files plus a `meta.json` under directory `path`."""
+        os.makedirs(path, exist_ok=True)
+        meta = {'version': self.FORMAT_VERSION, 'num_rows': self.num_rows, 'columns': {}}
+        for name, column in self.columns.items():
+            arrays = column.arrays()
+            meta['columns'][name] = {'kind': column.KIND, 'meta': column.meta(), 'arrays': list(arrays.keys())}
+            for suffix, array in arrays.items():
+                np.save(os.path.join(path, f'{name}.{suffix}.npy'), array, allow_pickle=False)
+        if self.index is not None:
+            np.save(os.path.join(path, 'index.npy'), self.index, allow_pickle=False)
+            meta['has_index'] = True
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path: str, output_type: Type, mmap: bool = True) -> 'EntityColumns':
+        """Loads columns saved with `save`. With `mmap`, arrays are memory-mapped and shared through the page cache."""
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format version {meta.get('version')} in {path}")
+        mmap_mode = 'r' if mmap else None
+        columns = {}
+        for name, spec in meta['columns'].items():
+            arrays = {
+                suffix: np.load(os.path.join(path, f'{name}.{suffix}.npy'), mmap_mode=mmap_mode)
+                for suffix in spec['arrays']
+            }
+            columns[name] = _COLUMN_TYPES[spec['kind']].from_arrays(arrays, spec['meta'])
+        index = None
+        if meta.get('has_index', False):
+            index = np.load(os.path.join(path, 'index.npy'), mmap_mode=mmap_mode)
+        entities = cls(output_type, columns, index=index)
+        if mmap:
+            entities.path = path
+        return entities
+
+    @classmethod
+    def concatenate(cls, tables: Sequence['EntityColumns']) -> 'EntityColumns':
+        """Concatenates tables with the same columns, in order. Row selections (`index`) are not supported."""
+        if any(table.index is not None for table in tables):
+            raise ValueError("Only tables without an index can be concatenated")
+        columns = {
+            name: type(column).concatenate([table.columns[name] for table in tables])
+            for name, column in tables[0].columns.items()
+        }
+        return cls(tables[0].output_type, columns)
+
+    @classmethod
+    def from_entities(
+        cls, output_type: Type, entities: Iterable, kinds: Optional[Dict[str, str]] = None
+    ) -> 'EntityColumns':
+        """Builds columns from an iterable of `output_type` namedtuples.
+
+        Args:
+            output_type: namedtuple class of the entities.
+            entities: entities to store.
+            kinds: optional column kind per field, inferred with `infer_column` for missing fields.
+        """
+        kinds = kinds or {}
+        values = {field: [] for field in output_type._fields}
+        for entity in entities:
+            for field, value in zip(output_type._fields, entity):
+                values[field].append(value)
+        columns = {}
+        for field in output_type._fields:
+            if field in kinds:
+                columns[field] = make_column(kinds[field], values[field])
+            else:
+                columns[field] = infer_column(values[field])
+            # release the Python objects of each field as soon as it is stored
+            values[field] = None
+        return cls(output_type, columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _output_type_from_spec(typename: str, field_names: tuple) -> Type:
+    return collections.namedtuple(typename, field_names)
+
+
+def _restore(output_type_spec: tuple, columns: Dict[str, _Column], index: Optional[np.ndarray]) -> EntityColumns:
+    return EntityColumns(_output_type_from_spec(*output_type_spec), columns, index=index)
+
+
+def _load_view(path: str, output_type_spec: tuple, index: Optional[np.ndarray]) -> EntityColumns:
+    entities = EntityColumns.load(path, _output_type_from_spec(*output_type_spec), mmap=True)
+    if index is not None:
+        entities.index = index
+    return entities
+
+
+class FileIdMapping(collections.abc.Mapping):
+    """Read-only replacement for the `mapping` dict of collections built with `index_by_file_id`.
+
+    Keys are stored sorted in a `StringColumn` and looked up with binary search. Values are either a
+    single index per key or a list of indices per key (`multi`), stored as numpy arrays.
+    """
+
+    def __init__(self, keys: StringColumn, values: _Column):
+        self.keys_column = keys
+        self.values_column = values
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[str, Any]) -> 'FileIdMapping':
+        """Converts a `{file_id: index}` or `{file_id: [indices]}` dict."""
+        keys = sorted(mapping.keys())
+        multi = any(isinstance(value, list) for value in mapping.values())
+        if multi:
+            values = RaggedIntColumn.from_list([mapping[key] for key in keys], dtype=np.int64)
+        else:
+            values = NumericColumn.from_list([mapping[key] for key in keys], dtype=np.int64)
+        return cls(StringColumn.from_list(keys, json_encoded=False), values)
+
+    @classmethod
+    def from_keys(cls, file_ids: Sequence[str], multi: bool = True) -> 'FileIdMapping':
+        """Builds the mapping from the file id of every entity, in entity order.
+
+        With `multi`, every key maps to the list of positions with this file id, otherwise to the last one.
+        """
+        order = sorted(range(len(file_ids)), key=file_ids.__getitem__)
+        keys, positions = [], []
+        for position in order:
+            if not keys or keys[-1] != file_ids[position]:
+                keys.append(file_ids[position])
+                positions.append([])
+            positions[-1].append(position)
+        if multi:
+            values = RaggedIntColumn.from_list(positions, dtype=np.int64)
+        else:
+            values = NumericColumn.from_list([p[-1] for p in positions], dtype=np.int64)
+        return cls(StringColumn.from_list(keys, json_encoded=False), values)
+
+    def _find(self, key: str) -> int:
+        idx = bisect.bisect_left(self.keys_column, key)
+        if idx < len(self.keys_column) and self.keys_column[idx] == key:
+            return idx
+        return -1
+
+    def __getitem__(self, key: str):
+        idx = self._find(key) if isinstance(key, str) else -1
+        if idx < 0:
+            raise KeyError(key)
+        return self.values_column[idx]
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self):
+        return (self.keys_column[idx] for idx in range(len(self.keys_column)))
+
+    def __len__(self) -> int:
+        return len(self.keys_column)
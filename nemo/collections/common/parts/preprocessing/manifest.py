@@ -17,7 +17,7 @@ import os
 import re
 from collections import defaultdict
 from os.path import expanduser
-from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from nemo.utils import logging
 from nemo.utils.data_utils import DataStoreObject, datastore_path_to_local_path, is_datastore_path
@@ -102,6 +102,99 @@ def item_iter(
         raise RuntimeError("Failed to parse some lines from manifest files. See logs for more details.")
 
 
+def get_manifest_byte_ranges(
+    manifests_files: Union[str, List[str]], num_chunks_per_file: int
+) -> List[Tuple[str, int, int]]:
+    """Splits manifests into byte ranges aligned to line boundaries, for parallel parsing.
+
+    Args:
+        manifests_files: Either single string file or list of such.
+        num_chunks_per_file: Maximum number of ranges to split each manifest into.
+
+    Returns:
+        List of `(manifest_file, start, end)` tuples covering all the manifests in order.
+    """
+    if isinstance(manifests_files, str):
+        manifests_files = [manifests_files]
+
+    ranges = []
+    for manifest_file in manifests_files:
+        cached_manifest_file = expanduser(DataStoreObject(manifest_file).get())
+        size = os.path.getsize(cached_manifest_file)
+        boundaries = [0]
+        with open(cached_manifest_file, 'rb') as f:
+            for n in range(1, max(num_chunks_per_file, 1)):
+                target = size * n // num_chunks_per_file
+                if target <= boundaries[-1]:
+                    continue
+                # move the boundary to the start of the next line
+                f.seek(target - 1)
+                f.readline()
+                boundary = f.tell()
+                if boundaries[-1] < boundary < size:
+                    boundaries.append(boundary)
+        boundaries.append(size)
+        ranges.extend((manifest_file, start, end) for start, end in zip(boundaries[:-1], boundaries[1:]))
+    return ranges
+
+
+def item_iter_range(
+    manifest_file: str,
+    start: int,
+    end: int,
+    parse_func: Callable[[str, Optional[str]], Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Iterate through json lines of a byte range of a manifest, see `get_manifest_byte_ranges`.
+
+    Items are parsed as in `item_iter`, with `id` counted from the start of the range.
+
+    Args:
+        manifest_file: manifest to yield items from.
+        start: offset of the first byte of the range, at the start of a line.
+        end: offset past the last byte of the range.
+        parse_func: A callable function which accepts as input a single line
+            of a manifest and optionally the manifest file itself,
+            and parses it, returning a dictionary mapping from str -> Any.
+
+    Yields:
+        Parsed key to value item dicts.
+
+    Raises:
+        RuntimeError: If met invalid json line structure.
+    """
+    if parse_func is None:
+        parse_func = __parse_item
+
+    errors = []
+    k = -1
+    cached_manifest_file = DataStoreObject(manifest_file).get()
+    with open(expanduser(cached_manifest_file), 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.decode('utf-8').strip()
+            if not line:
+                continue
+            k += 1
+            try:
+                item = parse_func(line, manifest_file)
+            except json.JSONDecodeError:
+                errors.append(line)
+                continue
+            item['id'] = k
+
+            yield item
+
+    if len(errors) > 0:
+        logging.error("=============================================")
+        logging.error(f"Failed to parse {len(errors)} lines from manifest file: {manifest_file}")
+        for line in errors:
+            logging.error(f"-- Failed to parse line: `{line}`")
+        raise RuntimeError("Failed to parse some lines from manifest files. See logs for more details.")
+
+
 def __parse_item(line: str, manifest_file: str) -> Dict[str, Any]:
     item = json.loads(line)
 
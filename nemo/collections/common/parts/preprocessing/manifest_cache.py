@@ -0,0 +1,191 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiled (columnar, memory-mapped) manifest cache.
+
+Parsing a JSON manifest and tokenizing every transcript is repeated by every rank at every launch.
+A compiled manifest stores the parsed and tokenized result as numpy columns (see
+:class:`~nemo.collections.common.parts.preprocessing.columnar.EntityColumns`) in a directory keyed by
+the manifest fingerprint and the parser/tokenizer fingerprint:
+
+    <cache_dir>/<kind>-<sha1(manifests, parser)>/
+        meta.json
+        <field>.<array>.npy
+
+Cache directories are written to a temporary location and atomically renamed, so concurrent builders
+never expose a partially written cache. Loaded arrays are memory-mapped and shared through the page cache.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import types
+import uuid
+from os.path import expanduser
+from typing import Any, Callable, List, Union
+
+from nemo.collections.common.parts.preprocessing.columnar import EntityColumns
+from nemo.utils import logging
+from nemo.utils.data_utils import DataStoreObject
+from nemo.utils.get_rank import is_global_rank_zero
+
+__all__ = [
+    'manifest_fingerprint',
+    'parser_fingerprint',
+    'get_cache_path',
+    'is_cached',
+    'save',
+    'wait_for_cache',
+    'load_or_build',
+]
+
+CACHE_VERSION = 1
+
+
+def manifest_fingerprint(manifests_files: Union[str, List[str]]) -> str:
+    """Fingerprint of a list of manifests, based on their absolute path, size and modification time.
+
+    Stat-based fingerprinting keeps cache lookups O(1) in the manifest size; a manifest rewritten
+    in place gets a new modification time and therefore a new cache entry.
+    """
+    if isinstance(manifests_files, str):
+        manifests_files = [manifests_files]
+
+    state = []
+    for manifest_file in manifests_files:
+        local_file = os.path.abspath(expanduser(DataStoreObject(manifest_file).get()))
+        stat = os.stat(local_file)
+        state.append([str(manifest_file), local_file, stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(state).encode('utf-8')).hexdigest()
+
+
+def _describe(obj: Any, depth: int = 0, max_depth: int = 4) -> Any:
+    """JSON-serializable, deterministic description of a parser or tokenizer state."""
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [_describe(o, depth + 1, max_depth) for o in obj]
+        return sorted(items, key=repr) if isinstance(obj, (set, frozenset)) else items
+    if isinstance(obj, dict):
+        return {str(k): _describe(v, depth + 1, max_depth) for k, v in obj.items()}
+
+    if isinstance(obj, (types.FunctionType, types.MethodType, types.BuiltinFunctionType)):
+        return {'__function__': f'{obj.__module__}.{obj.__qualname__}'}
+
+    description = {'__type__': f'{type(obj).__module__}.{type(obj).__qualname__}'}
+    if depth >= max_depth:
+        return description
+    vocab = getattr(obj, 'vocab', None)
+    if isinstance(vocab, (list, dict)):
+        description['__vocab__'] = _describe(vocab, max_depth, max_depth)
+    try:
+        attributes = vars(obj)
+    except TypeError:
+        return description
+    for name, value in attributes.items():
+        description[name] = _describe(value, depth + 1, max_depth)
+    return description
+
+
+def parser_fingerprint(parser: Callable) -> str:
+    """Fingerprint of a text parser (`CharParser`, a tokenizer wrapper, ...) from its attributes and vocabulary."""
+    description = json.dumps(_describe(parser), sort_keys=True, default=lambda o: type(o).__qualname__)
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+def get_cache_path(cache_dir: str, kind: str, manifests_files: Union[str, List[str]], parser: Callable) -> str:
+    """Returns the cache directory of a compiled manifest of type `kind` for the given manifests and parser."""
+    key = hashlib.sha1(
+        f'{CACHE_VERSION}:{manifest_fingerprint(manifests_files)}:{parser_fingerprint(parser)}'.encode('utf-8')
+    ).hexdigest()
+    return os.path.join(expanduser(cache_dir), f'{kind}-{key}')
+
+
+def is_cached(path: str) -> bool:
+    """Checks whether a complete compiled manifest exists at `path`."""
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def save(columns: EntityColumns, path: str):
+    """Saves `columns` to `path` through a temporary directory and an atomic rename.
+
+    If another process finished writing the same cache first, the freshly written copy is discarded.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex}'
+    try:
+        columns.save(tmp_path)
+        os.rename(tmp_path, path)
+    except OSError:
+        if not is_cached(path):
+            raise
+        logging.info(f"Compiled manifest {path} was written by another process, discarding local copy")
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _is_builder_rank(shared_filesystem: bool) -> bool:
+    if shared_filesystem:
+        return is_global_rank_zero()
+    return int(os.environ.get("LOCAL_RANK", 0)) == 0
+
+
+def wait_for_cache(path: str, timeout: float, poll_interval: float = 1.0) -> bool:
+    """Waits until the compiled manifest at `path` is complete. Returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    while not is_cached(path):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(poll_interval)
+    return True
+
+
+def load_or_build(
+    path: str,
+    output_type: type,
+    build_fn: Callable[[], EntityColumns],
+    build_on_rank_zero: bool = False,
+    shared_filesystem: bool = True,
+    timeout: float = 7200.0,
+) -> EntityColumns:
+    """Loads the compiled manifest at `path`, building and saving it with `build_fn` on a cache miss.
+
+    Args:
+        path: cache directory, usually obtained with `get_cache_path`.
+        output_type: namedtuple type of the collection entities.
+        build_fn: callable which parses the manifests and returns the columns to cache.
+        build_on_rank_zero: if True, only rank zero builds a missing cache while the other ranks wait for
+            its completion marker (`meta.json`) and memory-map the result. Waiting uses the file system
+            rather than a collective, so it also works before `torch.distributed` is initialized.
+        shared_filesystem: if True, `path` is visible to all nodes and global rank zero builds the cache,
+            otherwise local rank zero of every node builds its own copy.
+        timeout: seconds to wait for rank zero before building the cache locally.
+
+    Returns:
+        Memory-mapped columns.
+    """
+    if is_cached(path):
+        logging.info(f"Loading compiled manifest from {path}")
+    elif build_on_rank_zero and not _is_builder_rank(shared_filesystem):
+        logging.info(f"Waiting for rank zero to build compiled manifest {path}")
+        if not wait_for_cache(path, timeout):
+            logging.warning(f"Timed out after {timeout}s waiting for compiled manifest {path}, building it locally")
+            save(build_fn(), path)
+    else:
+        logging.info(f"Compiled manifest not found, building {path}")
+        save(build_fn(), path)
+    return EntityColumns.load(path, output_type, mmap=True)
@@ -121,6 +121,12 @@ class SentencePieceTokenizer(TokenizerSpec):
         else:
             return self.tokenizer.encode_as_ids(text)
 
+    def batch_text_to_ids(self, texts: List[str]) -> List[List[int]]:
+        """Tokenizes a list of texts, with a single call to SentencePiece when possible."""
+        if self.legacy:
+            return [self.text_to_ids(text) for text in texts]
+        return self.tokenizer.encode_as_ids(texts)
+
     def tokens_to_text(self, tokens):
         if isinstance(tokens, np.ndarray):
             tokens = tokens.tolist()
@@ -44,17 +44,12 @@ class BlendableDataset(torch.utils.data.Dataset):
         self.dataset_index = np.zeros(self.size, dtype=np.uint8)
         self.dataset_sample_index = np.zeros(self.size, dtype=np.int64)
         app_state = AppState()
-        try:
-            if app_state.local_rank == 0:
-                from nemo.collections.nlp.data.language_modeling.megatron.dataset_utils import compile_helper
-
-                compile_helper()
-            torch.distributed.barrier()
-            from nemo.collections.nlp.data.language_modeling.megatron import helpers
-        except ImportError:
-            raise ImportError(
-                f'Could not compile megatron dataset C++ helper functions and therefore cannot import helpers python file.'
-            )
+        from nemo.collections.nlp.data.language_modeling.megatron.dataset_utils import compile_helper, import_helpers
+
+        if app_state.local_rank == 0:
+            compile_helper()
+        torch.distributed.barrier()
+        helpers = import_helpers()
 
         helpers.build_blending_indices(
             self.dataset_index,
@@ -76,15 +76,33 @@ DSET_TYPES = [DSET_TYPE_BERT, DSET_TYPE_ICT, DSET_TYPE_T5, DSET_TYPE_T5_LM, DSET
 
 def compile_helper():
     """Compile helper function ar runtime. Make sure this
-    is invoked on a single process."""
+    is invoked on a single process.
+
+    Returns False if the helpers could not be compiled, e.g. without a compiler
+    or on a read-only file system. `import_helpers` then falls back to their
+    numpy implementation."""
 
     path = os.path.abspath(os.path.dirname(__file__))
-    ret = subprocess.run(['make', '-C', path])
+    try:
+        ret = subprocess.run(['make', '-C', path])
+    except OSError as e:
+        logging.warning(f"Making C++ dataset helpers module failed: {e}")
+        return False
     if ret.returncode != 0:
-        logging.error("Making C++ dataset helpers module failed, exiting.")
-        import sys
+        logging.warning("Making C++ dataset helpers module failed.")
+        return False
+    return True
+
 
-        sys.exit(1)
+def import_helpers():
+    """Import the compiled C++ dataset helpers, or their numpy implementation
+    with bit-identical results if the C++ helpers are not available."""
+    try:
+        from nemo.collections.nlp.data.language_modeling.megatron import helpers
+    except ImportError:
+        logging.warning("C++ dataset helpers are not available, using their numpy implementation.")
+        from nemo.collections.nlp.data.language_modeling.megatron import numpy_helpers as helpers
+    return helpers
 
 
 def get_a_and_b_segments(sample, np_rng):
@@ -1302,14 +1320,9 @@ def get_samples_mapping(
         start_time = time.time()
         logging.info(' > building samples index mapping for {} ...'.format(name))
         # First compile and then import.
-        try:
-            if is_global_rank_zero():
-                compile_helper()
-            from nemo.collections.nlp.data.language_modeling.megatron import helpers
-        except ImportError:
-            raise ImportError(
-                f'Could not compile megatron dataset C++ helper functions and therefore cannot import helpers python file.'
-            )
+        if is_global_rank_zero():
+            compile_helper()
+        helpers = import_helpers()
         samples_mapping = helpers.build_mapping(
             indexed_dataset.doc_idx,
             indexed_dataset.sizes,
@@ -16,6 +16,7 @@
 
 import os
 import time
+from functools import lru_cache
 
 import numpy as np
 import torch
@@ -342,55 +343,76 @@ class GPTDataset(Dataset):
                     os.makedirs(self.index_mapping_dir)
             torch.distributed.barrier()
 
+        # compute the index mappings on demand instead of building them for the entire training horizon
+        self.online_index_mapping = cfg.data.get('online_index_mapping', False)
+
         # Build index mappings.
-        self.doc_idx, self.sample_idx, self.shuffle_idx = _build_index_mappings(
-            self.name,
-            data_prefix,
-            documents,
-            self.indexed_dataset.sizes,
-            num_samples,
-            seq_length,
-            seed,
-            index_mapping_dir=self.index_mapping_dir,
-            drop_last=drop_last,
-            add_extra_token=self.add_extra_token,
-            shuffle_documents=self.shuffle_documents,
-            exchange_indices_distributed=self.exchange_indices_distributed,
-        )
+        if self.online_index_mapping:
+            self.index_mapping = OnlineIndexMapping(
+                documents,
+                self.indexed_dataset.sizes,
+                num_samples,
+                seq_length,
+                seed,
+                block_size=cfg.data.get('online_index_mapping_block_size', 1000000),
+                cache_maxsize=cfg.data.get('online_index_mapping_cache_maxsize', 2),
+                drop_last=drop_last,
+                add_extra_token=self.add_extra_token,
+                shuffle_documents=self.shuffle_documents,
+            )
+        else:
+            self.doc_idx, self.sample_idx, self.shuffle_idx = _build_index_mappings(
+                self.name,
+                data_prefix,
+                documents,
+                self.indexed_dataset.sizes,
+                num_samples,
+                seq_length,
+                seed,
+                index_mapping_dir=self.index_mapping_dir,
+                drop_last=drop_last,
+                add_extra_token=self.add_extra_token,
+                shuffle_documents=self.shuffle_documents,
+                exchange_indices_distributed=self.exchange_indices_distributed,
+            )
         deallocate_indexed_dataset_memory(self.indexed_dataset)
 
     def create_data_mmap(self):
         self.indexed_dataset.create_data_mmap()
 
     def __len__(self):
+        if self.online_index_mapping:
+            return len(self.index_mapping)
         # -1 is due to data structure used to retieve the index:
         #    sample i --> [sample_idx[i], sample_idx[i+1])
         return self.sample_idx.shape[0] - 1
 
     def _get_text(self, idx: int) -> np.ndarray:
 
-        # Get the shuffled index.
-        idx = self.shuffle_idx[idx]
-        # Start and end documents and offsets.
-        doc_index_f = self.sample_idx[idx][0]
-        doc_index_l = self.sample_idx[idx + 1][0]
-        offset_f = self.sample_idx[idx][1]
-        offset_l = self.sample_idx[idx + 1][1]
+        if self.online_index_mapping:
+            doc_idx, doc_index_f, offset_f, doc_index_l, offset_l = self.index_mapping[idx]
+        else:
+            doc_idx = self.doc_idx
+            # Get the shuffled index.
+            idx = self.shuffle_idx[idx]
+            # Start and end documents and offsets.
+            doc_index_f = self.sample_idx[idx][0]
+            doc_index_l = self.sample_idx[idx + 1][0]
+            offset_f = self.sample_idx[idx][1]
+            offset_l = self.sample_idx[idx + 1][1]
         # If we are within the same document, just extract the chunk.
         if doc_index_f == doc_index_l:
             sample = self.indexed_dataset.get(
-                self.doc_idx[doc_index_f], offset=offset_f, length=offset_l - offset_f + self.add_extra_token
+                doc_idx[doc_index_f], offset=offset_f, length=offset_l - offset_f + self.add_extra_token
             )
         else:
             # Otherwise, get the rest of the initial document.
-            sample_list = [self.indexed_dataset.get(self.doc_idx[doc_index_f], offset=offset_f)]
+            sample_list = [self.indexed_dataset.get(doc_idx[doc_index_f], offset=offset_f)]
             # Loop over all in between documents and add the entire document.
             for i in range(doc_index_f + 1, doc_index_l):
-                sample_list.append(self.indexed_dataset.get(self.doc_idx[i]))
+                sample_list.append(self.indexed_dataset.get(doc_idx[i]))
             # And finally add the relevant portion of last document.
-            sample_list.append(
-                self.indexed_dataset.get(self.doc_idx[doc_index_l], length=offset_l + self.add_extra_token)
-            )
+            sample_list.append(self.indexed_dataset.get(doc_idx[doc_index_l], length=offset_l + self.add_extra_token))
             sample = np.concatenate(sample_list)
         if len(sample) != (self.seq_length + self.add_extra_token):
             logging.info(
@@ -651,19 +673,17 @@ def _build_index_mappings(
             )
             # sample-idx.
             start_time = time.time()
-            # Use C++ implementation for speed.
+            # Use C++ implementation for speed, or its numpy implementation if it cannot be compiled.
             # First compile and then import.
             assert doc_idx.dtype == np.int32
             assert sizes.dtype == np.int32
-            try:
-                from nemo.collections.nlp.data.language_modeling.megatron.dataset_utils import compile_helper
+            from nemo.collections.nlp.data.language_modeling.megatron.dataset_utils import (
+                compile_helper,
+                import_helpers,
+            )
 
-                compile_helper()
-                from nemo.collections.nlp.data.language_modeling.megatron import helpers
-            except ImportError:
-                raise ImportError(
-                    f'Could not compile megatron dataset C++ helper functions and therefore cannot import helpers python file.'
-                )
+            compile_helper()
+            helpers = import_helpers()
 
             sample_idx = helpers.build_sample_idx(
                 sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch, drop_last, add_extra_token
@@ -840,3 +860,162 @@ def _build_shuffle_idx(num_samples, total_size, np_rng):
     np_rng.shuffle(shuffle_idx_last)
 
     return np.concatenate((shuffle_idx_first, shuffle_idx_last))
+
+
+class OnlineIndexMapping:
+    """
+    Replaces the doc-idx, sample-idx and shuffle-idx of `_build_index_mappings`, which are materialized for the
+    entire training horizon, by index mappings computed on demand.
+    Documents are split into blocks of `block_size` consecutive documents. In every epoch the blocks are shuffled,
+    and the documents and samples of each block are shuffled within the block, similar to `OnlineSampleMapping`.
+    Samples do not cross block boundaries, so the last tokens of each block that do not fill a sample are dropped.
+    Only the number of samples of each block is computed at startup, the index mappings of a block are built when
+    one of its samples is accessed and kept in an LRU cache.
+    """
+
+    def __init__(
+        self,
+        documents: np.ndarray,
+        sizes: np.ndarray,
+        num_samples: int,
+        seq_length: int,
+        seed: int,
+        block_size: int = 1000000,
+        cache_maxsize: int = 2,
+        drop_last: bool = True,
+        add_extra_token: int = 1,
+        shuffle_documents: bool = True,
+    ):
+        """
+        Args:
+            documents (np.ndarray): Indices of the documents of the dataset.
+            sizes (np.ndarray): Number of tokens of each document of the indexed dataset.
+            num_samples (int): Number of samples the dataset should contain at least.
+            seq_length (int): Sequence length of the samples.
+            seed (int): Seed for the random number generators used for shuffling.
+            block_size (int): Number of documents of each block. None will be replaced with the number of documents.
+            cache_maxsize (int): Maximum number of blocks kept in the cache of get_block.
+            drop_last (bool): Whether to drop the last incomplete sample of each block.
+            add_extra_token (int): Number of tokens fetched in addition to seq_length for each sample.
+            shuffle_documents (bool): Whether to shuffle the documents of each block. Samples are always shuffled.
+        """
+        self.documents = documents
+        self.sizes = sizes
+        self.num_samples = num_samples
+        self.seq_length = seq_length
+        self.seed = seed
+        self.block_size = block_size if block_size is not None else len(documents)
+        self.cache_maxsize = cache_maxsize
+        self.drop_last = drop_last
+        self.add_extra_token = add_extra_token
+        self.shuffle_documents = shuffle_documents
+
+        from nemo.collections.nlp.data.language_modeling.megatron.numpy_helpers import get_num_samples
+
+        # only the number of tokens and samples of each block are stored
+        block_starts = range(0, len(documents), self.block_size)
+        self.block_tokens = np.array(
+            [sizes[documents[start : start + self.block_size]].sum(dtype=np.int64) for start in block_starts],
+            dtype=np.int64,
+        )
+        self.block_num_samples = np.array(
+            [
+                max(get_num_samples(int(tokens), seq_length, drop_last, add_extra_token), 0) if tokens > 1 else 0
+                for tokens in self.block_tokens
+            ],
+            dtype=np.int64,
+        )
+        self.num_blocks = len(self.block_tokens)
+        self.num_samples_per_epoch = int(self.block_num_samples.sum())
+        assert self.num_samples_per_epoch > 0, 'documents do not contain a single sample.'
+        self.num_epochs = max(-(-num_samples // self.num_samples_per_epoch), 1)
+
+        logging.info(f' > {self}')
+        logging.info(f'    number of blocks: {self.num_blocks}')
+        logging.info(f'    number of samples per epoch: {self.num_samples_per_epoch}')
+        logging.info(f'    total number of epochs: {self.num_epochs}')
+
+        # consecutive samples are mostly in the same block, so only a few recent blocks need to be cached
+        self.get_epoch_blocks = lru_cache(maxsize=2, typed=False)(self.get_epoch_blocks)
+        self.get_block = lru_cache(maxsize=cache_maxsize, typed=False)(self.get_block)
+
+    def __str__(self):
+        return f"OnlineIndexMapping(num_documents={len(self.documents)}, num_samples={self.num_samples}, seq_length={self.seq_length}, seed={self.seed}, block_size={self.block_size}, cache_maxsize={self.cache_maxsize}, drop_last={self.drop_last}, add_extra_token={self.add_extra_token}, shuffle_documents={self.shuffle_documents})"
+
+    def __len__(self) -> int:
+        # all samples of the required epochs, like the sample-idx of `_build_index_mappings`
+        return self.num_epochs * self.num_samples_per_epoch
+
+    def __getitem__(self, idx: int):
+        """
+        Returns the doc-idx of the block of sample idx, the indices into doc-idx of the first and last documents
+        of the sample and the offsets of the sample in these documents.
+        """
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Index out of range")
+
+        epoch, local_idx = divmod(idx, self.num_samples_per_epoch)
+        block_order, block_bins = self.get_epoch_blocks(epoch)
+        block_pos = np.searchsorted(block_bins, local_idx, side='right')
+        block_idx = int(block_order[block_pos])
+        local_idx -= block_bins[block_pos] - self.block_num_samples[block_idx]
+
+        doc_idx, sample_idx, shuffle_idx = self.get_block(epoch, block_idx)
+        local_idx = shuffle_idx[local_idx]
+        doc_index_f, offset_f = sample_idx[local_idx]
+        doc_index_l, offset_l = sample_idx[local_idx + 1]
+        return doc_idx, doc_index_f, offset_f, doc_index_l, offset_l
+
+    def get_epoch_blocks(self, epoch: int):
+        """Returns the shuffled order of the blocks in epoch and the cumulative number of samples in this order."""
+        np_rng = np.random.RandomState(seed=[self.seed, epoch])
+        block_order = np_rng.permutation(self.num_blocks)
+        block_bins = np.cumsum(self.block_num_samples[block_order])
+        return block_order, block_bins
+
+    def get_block(self, epoch: int, block_idx: int):
+        """Builds the doc-idx, sample-idx and shuffle-idx of block block_idx in epoch."""
+        from nemo.collections.nlp.data.language_modeling.megatron.numpy_helpers import build_sample_idx
+
+        np_rng = np.random.RandomState(seed=[self.seed, epoch, block_idx])
+        start = block_idx * self.block_size
+        doc_idx = np.array(self.documents[start : start + self.block_size], dtype=np.int32)
+        if self.shuffle_documents:
+            np_rng.shuffle(doc_idx)
+
+        num_samples = int(self.block_num_samples[block_idx])
+        if num_samples:
+            sample_idx = build_sample_idx(
+                self.sizes,
+                doc_idx,
+                self.seq_length,
+                1,
+                int(self.block_tokens[block_idx]),
+                self.drop_last,
+                self.add_extra_token,
+                verbose=False,
+            )
+        else:
+            sample_idx = np.zeros([1, 2], dtype=np.int32)
+        shuffle_idx = np_rng.permutation(num_samples)
+        return doc_idx, sample_idx, shuffle_idx
+
+    def __reduce__(self):
+        """Add support for pickling. Needed due to functools.lru_cache."""
+        return (
+            self.__class__,
+            (
+                self.documents,
+                self.sizes,
+                self.num_samples,
+                self.seq_length,
+                self.seed,
+                self.block_size,
+                self.cache_maxsize,
+                self.drop_last,
+                self.add_extra_token,
+                self.shuffle_documents,
+            ),
+        )
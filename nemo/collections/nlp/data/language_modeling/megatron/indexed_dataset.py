@@ -27,6 +27,7 @@
 # Added document index to index file and made it accessible.
 #    An empty sentence no longer separates documents.
 
+import json
 import os
 import shutil
 import struct
@@ -52,11 +53,11 @@ def __best_fitting_dtype(vocab_size=None):
 
 
 def get_available_dataset_impl():
-    return ['lazy', 'cached', 'mmap', "retmmap"]
+    return ['lazy', 'cached', 'mmap', "retmmap", "multi_mmap"]
 
 
 def infer_dataset_impl(path):
-    if IndexedDataset.exists(path):
+    if IndexedDataset.exists(path) or MultiMMapIndexedDataset.exists(path):
         with open(index_file_path(path), 'rb') as f:
             magic = f.read(8)
             if magic == IndexedDataset._HDR_MAGIC:
@@ -65,6 +66,8 @@ def infer_dataset_impl(path):
                 return 'mmap'
             elif magic == MMapRetrievalIndexedDataset.Index._HDR_MAGIC[:8]:
                 return 'retmmap'
+            elif magic == MultiMMapIndexedDataset.Index._HDR_MAGIC[:8]:
+                return 'multi_mmap'
             else:
                 return None
     else:
@@ -117,6 +120,10 @@ def make_dataset(path, impl, skip_warmup=False, impl_kwargs={}, delay_data_mmap=
     elif impl == 'csv_mmap':
         return CSVMemMapDataset(path, **impl_kwargs)
 
+    # a multi-shard index has no .bin file of its own, it is read with the shards' mmap implementation
+    if impl in ('mmap', 'multi_mmap', 'infer') and MultiMMapIndexedDataset.exists(path):
+        return MultiMMapIndexedDataset(path, skip_warmup, delay_data_mmap)
+
     # now handle bin memap
     if not IndexedDataset.exists(path):
         print(f"Dataset does not exist: {path}")
@@ -137,7 +144,9 @@ def make_dataset(path, impl, skip_warmup=False, impl_kwargs={}, delay_data_mmap=
 
 def dataset_exists(path, impl):
     if impl == 'mmap':
-        return MMapIndexedDataset.exists(path)
+        return MMapIndexedDataset.exists(path) or MultiMMapIndexedDataset.exists(path)
+    elif impl == 'multi_mmap':
+        return MultiMMapIndexedDataset.exists(path)
     elif impl == 'retmmap':
         return MMapRetrievalIndexedDataset.exists(path)
     else:
@@ -396,12 +405,9 @@ class MMapIndexedDataset(torch.utils.data.Dataset):
                 @staticmethod
                 def _get_pointers(sizes):
                     dtype_size = dtype().itemsize
-                    address = 0
-                    pointers = []
-
-                    for size in sizes:
-                        pointers.append(address)
-                        address += size * dtype_size
+                    sizes = np.asarray(sizes, dtype=np.int64)
+                    pointers = np.zeros(len(sizes), dtype=np.int64)
+                    np.cumsum(sizes[:-1] * dtype_size, out=pointers[1:])
 
                     return pointers
 
@@ -603,16 +609,25 @@ class MMapIndexedDatasetBuilder(object):
         self._data_file.write(np_array.tobytes(order='C'))
         self._sizes.append(np_array.size)
 
+    def add_doc(self, tokens, sizes):
+        """Add a whole document at once, `tokens` are the concatenated tokens of its items of lengths `sizes`."""
+        np_array = np.asarray(tokens, dtype=self._dtype)
+        self._data_file.write(np_array.tobytes(order='C'))
+        self._sizes.extend(sizes)
+        self._doc_idx.append(len(self._sizes))
+
     def end_document(self):
         self._doc_idx.append(len(self._sizes))
 
     def merge_file_(self, another_file):
         # Concatenate index
-        index = MMapIndexedDataset.Index(index_file_path(another_file))
+        index = MMapIndexedDataset.Index(index_file_path(another_file), skip_warmup=True)
         assert index.dtype == self._dtype
 
-        for size in index.sizes:
-            self._sizes.append(size)
+        offset = len(self._sizes)
+        self._sizes.extend(index.sizes.tolist())
+        # the first document of another file starts where the documents of this file end
+        self._doc_idx.extend((offset + index.doc_idx[1:]).tolist())
 
         # Concatenate data
         with open(data_file_path(another_file), 'rb') as f:
@@ -623,3 +638,219 @@ class MMapIndexedDatasetBuilder(object):
 
         with MMapIndexedDataset.Index.writer(index_file, self._dtype) as index:
             index.write(self._sizes, self._doc_idx)
+
+
+def make_multi_index(path, shard_paths):
+    """Write a multi-shard index at `path` that presents the mmap datasets `shard_paths` as one dataset.
+
+    Only the index is written, the data of the shards is not copied. Shard paths in the same directory tree
+    as the index are stored relative to it, so that the index and its shards can be moved together.
+
+    Args:
+        path: prefix of the multi-shard index, `.idx` is appended to it.
+        shard_paths: prefixes of the mmap datasets in the order of the combined dataset.
+    """
+    if len(shard_paths) == 0:
+        raise ValueError("A multi-shard index needs at least one shard")
+    index_dir = os.path.dirname(os.path.abspath(index_file_path(path)))
+    dtype = None
+    sizes, pointers, doc_idx = [], [], [np.zeros(1, dtype=np.int64)]
+    shard_offsets = [0]
+    stored_paths = []
+    for shard_path in shard_paths:
+        index = MMapIndexedDataset.Index(index_file_path(shard_path), skip_warmup=True)
+        if dtype is None:
+            dtype = index.dtype
+        elif index.dtype != dtype:
+            raise ValueError(f"Shard {shard_path} has dtype {index.dtype}, expected {dtype}")
+        sizes.append(np.array(index.sizes))
+        pointers.append(np.array(index._pointers))
+        # the first document of a shard starts where the documents of the previous shards end
+        doc_idx.append(np.array(index.doc_idx[1:]) + shard_offsets[-1])
+        shard_offsets.append(shard_offsets[-1] + len(index))
+        del index
+
+        shard_path = os.path.abspath(shard_path)
+        relative_path = os.path.relpath(shard_path, index_dir)
+        stored_paths.append(shard_path if relative_path.startswith(os.pardir) else relative_path)
+
+    with MultiMMapIndexedDataset.Index.writer(index_file_path(path), dtype) as index:
+        index.write(
+            stored_paths, np.concatenate(sizes), np.concatenate(pointers), np.concatenate(doc_idx), shard_offsets
+        )
+
+
+class MultiMMapIndexedDataset(MMapIndexedDataset):
+    """MMapIndexedDataset over several mmap datasets (shards) without merging their data.
+
+    The sizes, pointers and document index of all shards are concatenated once by `make_multi_index`.
+    Items are read from the `.bin` file of their shard, which is memory-mapped on first access.
+    """
+
+    class Index(object):
+        _HDR_MAGIC = b'MMIDMUL\x00\x00'
+
+        @classmethod
+        def writer(cls, path, dtype):
+            class _Writer(object):
+                def __enter__(self):
+                    self._file = open(path, 'wb')
+
+                    self._file.write(cls._HDR_MAGIC)
+                    self._file.write(struct.pack('<Q', 1))
+                    self._file.write(struct.pack('<B', code(dtype)))
+
+                    return self
+
+                def write(self, shard_paths, sizes, pointers, doc_idx, shard_offsets):
+                    shard_paths = json.dumps(shard_paths).encode('utf-8')
+
+                    self._file.write(struct.pack('<Q', len(shard_offsets) - 1))
+                    self._file.write(struct.pack('<Q', len(sizes)))
+                    self._file.write(struct.pack('<Q', len(doc_idx)))
+                    self._file.write(struct.pack('<Q', len(shard_paths)))
+                    self._file.write(shard_paths)
+
+                    self._file.write(np.array(shard_offsets, dtype=np.int64).tobytes(order='C'))
+                    self._file.write(np.array(sizes, dtype=np.int32).tobytes(order='C'))
+                    self._file.write(np.array(pointers, dtype=np.int64).tobytes(order='C'))
+                    self._file.write(np.array(doc_idx, dtype=np.int64).tobytes(order='C'))
+
+                def __exit__(self, exc_type, exc_val, exc_tb):
+                    self._file.close()
+
+            return _Writer()
+
+        def __init__(self, path, skip_warmup=False):
+            with open(path, 'rb') as stream:
+                magic_test = stream.read(9)
+                assert self._HDR_MAGIC == magic_test, (
+                    'Index file doesn\'t match expected format. '
+                    'Make sure that --dataset-impl is configured properly.'
+                )
+                version = struct.unpack('<Q', stream.read(8))
+                assert (1,) == version
+
+                (dtype_code,) = struct.unpack('<B', stream.read(1))
+                self._dtype = dtypes[dtype_code]
+                self._dtype_size = self._dtype().itemsize
+
+                self._num_shards = struct.unpack('<Q', stream.read(8))[0]
+                self._len = struct.unpack('<Q', stream.read(8))[0]
+                self._doc_count = struct.unpack('<Q', stream.read(8))[0]
+                shard_paths_nbytes = struct.unpack('<Q', stream.read(8))[0]
+                shard_paths = json.loads(stream.read(shard_paths_nbytes).decode('utf-8'))
+                offset = stream.tell()
+
+            index_dir = os.path.dirname(os.path.abspath(path))
+            self._shard_paths = [os.path.join(index_dir, shard_path) for shard_path in shard_paths]
+
+            if not skip_warmup:
+                logging.info("    warming up index mmap file...")
+                _warmup_mmap_file(path)
+
+            self._bin_buffer_mmap = np.memmap(path, mode='r', order='C')
+            self._bin_buffer = memoryview(self._bin_buffer_mmap)
+            self._shard_offsets = np.frombuffer(
+                self._bin_buffer, dtype=np.int64, count=self._num_shards + 1, offset=offset
+            )
+            offset += self._shard_offsets.nbytes
+            logging.info("    reading sizes...")
+            self._sizes = np.frombuffer(self._bin_buffer, dtype=np.int32, count=self._len, offset=offset)
+            logging.info("    reading pointers...")
+            self._pointers = np.frombuffer(
+                self._bin_buffer, dtype=np.int64, count=self._len, offset=offset + self._sizes.nbytes
+            )
+            logging.info("    reading document index...")
+            self._doc_idx = np.frombuffer(
+                self._bin_buffer,
+                dtype=np.int64,
+                count=self._doc_count,
+                offset=offset + self._sizes.nbytes + self._pointers.nbytes,
+            )
+
+        def __del__(self):
+            self._bin_buffer_mmap._mmap.close()
+            del self._bin_buffer_mmap
+
+        @property
+        def dtype(self):
+            return self._dtype
+
+        @property
+        def sizes(self):
+            return self._sizes
+
+        @property
+        def doc_idx(self):
+            return self._doc_idx
+
+        @property
+        def shard_paths(self):
+            return self._shard_paths
+
+        @lru_cache(maxsize=8)
+        def __getitem__(self, i):
+            shard = int(np.searchsorted(self._shard_offsets, i, side='right')) - 1
+            return shard, self._pointers[i], self._sizes[i]
+
+        def __len__(self):
+            return self._len
+
+    def _do_init(self, path, skip_warmup=True, delay_data_mmap=False):
+        self._path = path
+        self._skip_warmup = skip_warmup
+        self._index = self.Index(index_file_path(self._path), skip_warmup)
+        # shards are memory-mapped on first access, `delay_data_mmap` is implied
+        self._bin_buffer_mmaps = [None] * len(self._index.shard_paths)
+        self._bin_buffers = [None] * len(self._index.shard_paths)
+
+    def _create_data_mmap(self, skip_warmup):
+        for shard in range(len(self._index.shard_paths)):
+            self._get_bin_buffer(shard)
+
+    def _get_bin_buffer(self, shard):
+        if self._bin_buffers[shard] is None:
+            shard_data_path = data_file_path(self._index.shard_paths[shard])
+            if not self._skip_warmup:
+                _warmup_mmap_file(shard_data_path)
+            self._bin_buffer_mmaps[shard] = np.memmap(shard_data_path, mode='r', order='C')
+            self._bin_buffers[shard] = memoryview(self._bin_buffer_mmaps[shard])
+        return self._bin_buffers[shard]
+
+    def __del__(self):
+        for bin_buffer_mmap in getattr(self, '_bin_buffer_mmaps', []):
+            if bin_buffer_mmap is not None:
+                bin_buffer_mmap._mmap.close()
+        self._bin_buffer_mmaps = None
+        self._bin_buffers = None
+        del self._index
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            shard, ptr, size = self._index[idx]
+            return np.frombuffer(self._get_bin_buffer(shard), dtype=self._index.dtype, count=size, offset=ptr)
+        elif isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                raise ValueError("Slices into indexed_dataset must be contiguous")
+            return [self[i] for i in range(start, stop)]
+
+    def get(self, idx, offset=0, length=None):
+        """ Retrieves a single item from the dataset with the option to only
+        return a portion of the item.
+
+        get(idx) is the same as [idx] but get() does not support slicing.
+        """
+        shard, ptr, size = self._index[idx]
+        if length is None:
+            length = size - offset
+        ptr += offset * np.dtype(self._index.dtype).itemsize
+        return np.frombuffer(self._get_bin_buffer(shard), dtype=self._index.dtype, count=length, offset=ptr)
+
+    @staticmethod
+    def exists(path):
+        if not os.path.exists(index_file_path(path)):
+            return False
+        with open(index_file_path(path), 'rb') as f:
+            return f.read(9) == MultiMMapIndexedDataset.Index._HDR_MAGIC
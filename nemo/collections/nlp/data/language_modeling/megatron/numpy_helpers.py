@@ -0,0 +1,441 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Numpy implementation of the index mapping helpers in `helpers.cpp`.
+
+It is used when the C++ helpers cannot be compiled at runtime, see `dataset_utils.import_helpers`.
+The functions have the same signatures and return bit-identical results, including the random
+number streams of `std::mt19937` and `std::mt19937_64` used for short sequences and shuffling.
+`build_sample_idx` is vectorized, the other builders are sequential by nature and are jit-compiled
+with numba (a plain Python fallback is used if numba is not installed).
+"""
+
+import math
+
+import numpy as np
+
+from nemo.utils import logging
+
+try:
+    from numba import njit
+
+    HAVE_NUMBA = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_NUMBA = False
+
+    def njit(func):
+        return func
+
+
+LONG_SENTENCE_LEN = 512
+
+# number of samples of `build_sample_idx` computed at once
+SAMPLE_IDX_CHUNK_SIZE = 1 << 24
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+@njit
+def _mt19937_seed(seed):
+    """State of `std::mt19937(seed)`, 32-bit words are kept in uint64."""
+    mt = np.empty(624, dtype=np.uint64)
+    mt[0] = np.uint64(seed) & _MASK32
+    for i in range(1, 624):
+        mt[i] = (np.uint64(1812433253) * (mt[i - 1] ^ (mt[i - 1] >> np.uint64(30))) + np.uint64(i)) & _MASK32
+    return mt, np.zeros(1, dtype=np.int64) + 624
+
+
+@njit
+def _mt19937_next(mt, pos):
+    if pos[0] >= 624:
+        for i in range(624):
+            y = (mt[i] & np.uint64(0x80000000)) | (mt[(i + 1) % 624] & np.uint64(0x7FFFFFFF))
+            value = mt[(i + 397) % 624] ^ (y >> np.uint64(1))
+            if y & np.uint64(1):
+                value ^= np.uint64(0x9908B0DF)
+            mt[i] = value
+        pos[0] = 0
+    y = mt[pos[0]]
+    pos[0] += 1
+    y ^= y >> np.uint64(11)
+    y ^= (y << np.uint64(7)) & np.uint64(0x9D2C5680)
+    y ^= (y << np.uint64(15)) & np.uint64(0xEFC60000)
+    y ^= y >> np.uint64(18)
+    return y & _MASK32
+
+
+@njit
+def _mt19937_64_seed(seed):
+    """State of `std::mt19937_64(seed)`."""
+    mt = np.empty(312, dtype=np.uint64)
+    mt[0] = np.uint64(seed)
+    for i in range(1, 312):
+        mt[i] = np.uint64(6364136223846793005) * (mt[i - 1] ^ (mt[i - 1] >> np.uint64(62))) + np.uint64(i)
+    return mt, np.zeros(1, dtype=np.int64) + 312
+
+
+@njit
+def _mt19937_64_next(mt, pos):
+    if pos[0] >= 312:
+        for i in range(312):
+            y = (mt[i] & np.uint64(0xFFFFFFFF80000000)) | (mt[(i + 1) % 312] & np.uint64(0x7FFFFFFF))
+            value = mt[(i + 156) % 312] ^ (y >> np.uint64(1))
+            if y & np.uint64(1):
+                value ^= np.uint64(0xB5026F5AA96619E9)
+            mt[i] = value
+        pos[0] = 0
+    y = mt[pos[0]]
+    pos[0] += 1
+    y ^= (y >> np.uint64(29)) & np.uint64(0x5555555555555555)
+    y ^= (y << np.uint64(17)) & np.uint64(0x71D67FFFEDA60000)
+    y ^= (y << np.uint64(37)) & np.uint64(0xFFF7EEE000000000)
+    y ^= y >> np.uint64(43)
+    return y
+
+
+@njit
+def _shuffle_rows(maps, seed):
+    """Fisher-Yates shuffle of the rows of `maps` with `std::mt19937_64(seed)` as in `helpers.cpp`."""
+    mt, pos = _mt19937_64_seed(seed)
+    for i in range(maps.shape[0] - 1, 0, -1):
+        j = np.int64(_mt19937_64_next(mt, pos) % np.uint64(i + 1))
+        for k in range(maps.shape[1]):
+            value = maps[i, k]
+            maps[i, k] = maps[j, k]
+            maps[j, k] = value
+
+
+@njit
+def _build_blending_indices(dataset_index, dataset_sample_index, weights, num_datasets, size):
+    current_samples = np.zeros(num_datasets, dtype=np.int64)
+    for sample_idx in range(size):
+        # determine where the max error in sampling is happening
+        sample_idx_double = max(float(sample_idx), 1.0)
+        max_error_index = 0
+        max_error = weights[0] * sample_idx_double - float(current_samples[0])
+        for dataset_idx in range(1, num_datasets):
+            error = weights[dataset_idx] * sample_idx_double - float(current_samples[dataset_idx])
+            if error > max_error:
+                max_error = error
+                max_error_index = dataset_idx
+
+        dataset_index[sample_idx] = max_error_index
+        dataset_sample_index[sample_idx] = current_samples[max_error_index]
+        current_samples[max_error_index] += 1
+    return current_samples
+
+
+def build_blending_indices(dataset_index, dataset_sample_index, weights, num_datasets, size, verbose):
+    """Given multiple datasets and a weighting array, build samples such that it follows those weights.
+
+    `dataset_index` and `dataset_sample_index` are filled in place.
+    """
+    if verbose:
+        print("> building indices for blendable datasets ...", flush=True)
+
+    with np.errstate(over='ignore'):
+        current_samples = _build_blending_indices(
+            dataset_index, dataset_sample_index, np.asarray(weights, dtype=np.float64), num_datasets, size
+        )
+
+    if verbose:
+        print(" > sample ratios:")
+        for dataset_idx in range(num_datasets):
+            ratio = current_samples[dataset_idx] / size
+            print(f"   dataset {dataset_idx}, input: {weights[dataset_idx]}, achieved: {ratio}", flush=True)
+
+
+def get_num_samples(num_tokens, seq_length, drop_last=True, add_extra_token=1):
+    """Number of samples of `build_sample_idx` for `num_tokens` tokens."""
+    num_tokens = num_tokens - add_extra_token
+    if not drop_last:
+        # helpers.cpp computes the number of samples in single precision
+        return int(np.ceil(np.float32(num_tokens) / np.float32(seq_length)))
+    return num_tokens // seq_length
+
+
+def build_sample_idx(
+    sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch, drop_last=True, add_extra_token=1, verbose=True
+):
+    """Sample index mapping is a 2D array with sizes [number-of-samples + 1, 2] where [..., 0] contains
+    the index into `doc_idx` and [..., 1] is the starting offset in that document.
+
+    Sample `i` starts at token `i * seq_length` of the documents of `doc_idx` concatenated, so the
+    documents of all samples are found at once with a binary search over the document end positions.
+    """
+    assert seq_length > 1
+    assert num_epochs > 0
+    assert tokens_per_epoch > 1
+
+    num_samples = get_num_samples(num_epochs * tokens_per_epoch, seq_length, drop_last, add_extra_token)
+
+    if verbose:
+        print("    using:", flush=True)
+        print(f"     number of documents:       {doc_idx.shape[0] // num_epochs}", flush=True)
+        print(f"     number of epochs:          {num_epochs}", flush=True)
+        print(f"     sequence length:           {seq_length}", flush=True)
+        print(f"     total number of samples:   {num_samples}", flush=True)
+
+    doc_sizes = sizes[doc_idx].astype(np.int64)
+    doc_ends = np.cumsum(doc_sizes)
+    doc_starts = doc_ends - doc_sizes
+    del doc_sizes
+    # the last sample may run past the end of the documents when `drop_last=False`
+    last_doc_offset = int(sizes[doc_idx[-1]]) - add_extra_token
+
+    sample_idx = np.empty((num_samples + 1, 2), dtype=np.int32)
+    sample_idx[0] = 0
+    for chunk_start in range(1, num_samples + 1, SAMPLE_IDX_CHUNK_SIZE):
+        chunk_end = min(chunk_start + SAMPLE_IDX_CHUNK_SIZE, num_samples + 1)
+        starts = np.arange(chunk_start, chunk_end, dtype=np.int64) * seq_length
+        # a sample ends in the first document whose end is not before the end of the sample
+        doc_idx_index = np.searchsorted(doc_ends, starts + add_extra_token, side='left')
+        past_end = doc_idx_index == len(doc_ends)
+        doc_idx_index[past_end] = len(doc_ends) - 1
+        doc_offset = starts - doc_starts[doc_idx_index]
+        doc_offset[past_end] = last_doc_offset
+        sample_idx[chunk_start:chunk_end, 0] = doc_idx_index
+        sample_idx[chunk_start:chunk_end, 1] = doc_offset
+    return sample_idx
+
+
+def _round_half_away_from_zero(x):
+    return int(math.copysign(math.floor(abs(x) + 0.5), x))
+
+
+@njit
+def _get_target_sample_len(short_seq_ratio, max_length, mt, pos):
+    if short_seq_ratio == 0:
+        return max_length
+    random_number = _mt19937_next(mt, pos)
+    if random_number % np.uint64(short_seq_ratio) == 0:
+        return 2 + np.int64(random_number % np.uint64(max_length - 1))
+    return max_length
+
+
+@njit
+def _build_mapping(
+    docs, sizes, num_epochs, max_num_samples, max_seq_length, short_seq_ratio, seed, min_num_sent, maps, counts
+):
+    """One iteration of `build_mapping_impl`, samples are written to `maps` if it is not empty."""
+    second = maps.shape[0] > 0
+    # set the seed so both iterations produce the same results
+    mt, pos = _mt19937_seed(seed)
+    map_index = 0
+    for epoch in range(num_epochs):
+        if map_index >= max_num_samples:
+            counts[3] = epoch
+            break
+        for doc in range(docs.shape[0] - 1):
+            # document sentences are in [sent_index_first, sent_index_last)
+            sent_index_first = docs[doc]
+            sent_index_last = docs[doc + 1]
+            prev_start_index = sent_index_first
+            num_remain_sent = sent_index_last - sent_index_first
+
+            if epoch == 0 and not second:
+                if num_remain_sent == 0:
+                    counts[0] += 1
+                if num_remain_sent == 1:
+                    counts[1] += 1
+
+            # detect documents with long sentences
+            contains_long_sentence = False
+            if num_remain_sent > 1:
+                for sent_index in range(sent_index_first, sent_index_last):
+                    if sizes[sent_index] > LONG_SENTENCE_LEN:
+                        if epoch == 0 and not second:
+                            counts[2] += 1
+                        contains_long_sentence = True
+                        break
+
+            if num_remain_sent >= min_num_sent and not contains_long_sentence:
+                seq_len = 0
+                num_sent = 0
+                target_seq_len = _get_target_sample_len(short_seq_ratio, max_seq_length, mt, pos)
+                for sent_index in range(sent_index_first, sent_index_last):
+                    seq_len += sizes[sent_index]
+                    num_sent += 1
+                    num_remain_sent -= 1
+                    if (
+                        seq_len >= target_seq_len and num_remain_sent > 1 and num_sent >= min_num_sent
+                    ) or num_remain_sent == 0:
+                        if second:
+                            maps[map_index, 0] = prev_start_index
+                            maps[map_index, 1] = sent_index + 1
+                            maps[map_index, 2] = target_seq_len
+                        map_index += 1
+                        prev_start_index = sent_index + 1
+                        target_seq_len = _get_target_sample_len(short_seq_ratio, max_seq_length, mt, pos)
+                        seq_len = 0
+                        num_sent = 0
+    return map_index
+
+
+def _mapping_dtype(sizes, verbose):
+    if sizes.size > np.iinfo(np.uint32).max:
+        if verbose:
+            print("    using uint64 for data mapping...", flush=True)
+        return np.uint64
+    if verbose:
+        print("    using uint32 for data mapping...", flush=True)
+    return np.uint32
+
+
+def _print_mapping_counts(counts, num_samples, max_num_samples):
+    if counts[3] >= 0:
+        print(f"    reached {max_num_samples} samples after {counts[3]} epochs ...", flush=True)
+    print(f"   number of empty documents: {counts[0]}", flush=True)
+    print(f"   number of documents with one sentence: {counts[1]}", flush=True)
+    print(f"   number of documents with long sentences: {counts[2]}", flush=True)
+    print(f"   will create mapping for {num_samples} samples", flush=True)
+
+
+def build_mapping(
+    docs, sizes, num_epochs, max_num_samples, max_seq_length, short_seq_prob, seed, verbose, min_num_sent
+):
+    """Build a mapping of (start-index, end-index, sequence-length) where start and end index are the indices
+    of the sentences in the sample and sequence-length is the target sequence length.
+    """
+    assert num_epochs > 0
+    assert max_seq_length > 1
+    assert 0.0 <= short_seq_prob <= 1.0
+    assert seed > 0
+
+    dtype = _mapping_dtype(sizes, verbose)
+    # for efficiency, convert probability to ratio
+    short_seq_ratio = 0
+    if short_seq_prob > 0:
+        short_seq_ratio = _round_half_away_from_zero(1.0 / short_seq_prob)
+
+    if verbose:
+        print("    using:", flush=True)
+        print(f"     number of documents:            {docs.shape[0] - 1}", flush=True)
+        print(f"     sentences range:                [{docs[0]}, {docs[-1]})", flush=True)
+        print(f"     total number of sentences:      {docs[-1] - docs[0]}", flush=True)
+        print(f"     number of epochs:               {num_epochs}", flush=True)
+        print(f"     maximum number of samples:      {max_num_samples}", flush=True)
+        print(f"     maximum sequence length:        {max_seq_length}", flush=True)
+        print(f"     short sequence probability:     {short_seq_prob}", flush=True)
+        print(f"     short sequence ration (1/prob): {short_seq_ratio}", flush=True)
+        print(f"     seed:                           {seed}", flush=True)
+
+    args = (docs, sizes, num_epochs, max_num_samples, max_seq_length, short_seq_ratio, seed, min_num_sent)
+    with np.errstate(over='ignore'):
+        # the first iteration gets the number of samples, the second one populates the map
+        counts = np.array([0, 0, 0, -1], dtype=np.int64)
+        num_samples = _build_mapping(*args, np.zeros((0, 3), dtype=dtype), counts)
+        if verbose:
+            _print_mapping_counts(counts, num_samples, max_num_samples)
+        maps = np.zeros((num_samples, 3), dtype=dtype)
+        _build_mapping(*args, maps, np.zeros(4, dtype=np.int64))
+        _shuffle_rows(maps, seed + 1)
+    return maps
+
+
+@njit
+def _build_blocks_mapping(
+    docs, sizes, titles_sizes, num_epochs, max_num_samples, max_seq_length, min_num_sent, maps, counts
+):
+    """One iteration of `build_blocks_mapping_impl`, samples are written to `maps` if it is not empty."""
+    second = maps.shape[0] > 0
+    map_index = 0
+    for epoch in range(num_epochs):
+        # assign every block a unique id
+        block_id = 0
+        if map_index >= max_num_samples:
+            counts[3] = epoch
+            break
+        for doc in range(docs.shape[0] - 1):
+            sent_index_first = docs[doc]
+            sent_index_last = docs[doc + 1]
+            target_seq_len = max_seq_length - titles_sizes[doc]
+            prev_start_index = sent_index_first
+            num_remain_sent = sent_index_last - sent_index_first
+
+            if epoch == 0 and not second:
+                if num_remain_sent == 0:
+                    counts[0] += 1
+                if num_remain_sent == 1:
+                    counts[1] += 1
+
+            contains_long_sentence = False
+            if num_remain_sent >= min_num_sent:
+                for sent_index in range(sent_index_first, sent_index_last):
+                    if sizes[sent_index] > LONG_SENTENCE_LEN:
+                        if epoch == 0 and not second:
+                            counts[2] += 1
+                        contains_long_sentence = True
+                        break
+
+            if num_remain_sent >= min_num_sent and not contains_long_sentence:
+                seq_len = 0
+                num_sent = 0
+                for sent_index in range(sent_index_first, sent_index_last):
+                    seq_len += sizes[sent_index]
+                    num_sent += 1
+                    num_remain_sent -= 1
+                    if (
+                        seq_len >= target_seq_len and num_remain_sent >= min_num_sent and num_sent >= min_num_sent
+                    ) or num_remain_sent == 0:
+                        if second:
+                            maps[map_index, 0] = prev_start_index
+                            maps[map_index, 1] = sent_index + 1
+                            maps[map_index, 2] = doc
+                            maps[map_index, 3] = block_id
+                        map_index += 1
+                        block_id += 1
+                        prev_start_index = sent_index + 1
+                        seq_len = 0
+                        num_sent = 0
+    return map_index
+
+
+def build_blocks_mapping(
+    docs, sizes, titles_sizes, num_epochs, max_num_samples, max_seq_length, seed, verbose, use_one_sent_blocks
+):
+    """Build a mapping of (start-index, end-index, document-index, block-id) of blocks of sentences."""
+    assert num_epochs > 0
+    assert max_seq_length > 1
+    assert seed > 0
+
+    dtype = _mapping_dtype(sizes, verbose)
+    if verbose:
+        print("    using:", flush=True)
+        print(f"     number of documents:            {docs.shape[0] - 1}", flush=True)
+        print(f"     sentences range:                [{docs[0]}, {docs[-1]})", flush=True)
+        print(f"     total number of sentences:      {docs[-1] - docs[0]}", flush=True)
+        print(f"     number of epochs:               {num_epochs}", flush=True)
+        print(f"     maximum number of samples:      {max_num_samples}", flush=True)
+        print(f"     maximum sequence length:        {max_seq_length}", flush=True)
+        print(f"     seed:                           {seed}", flush=True)
+
+    min_num_sent = 1 if use_one_sent_blocks else 2
+    args = (docs, sizes, titles_sizes, num_epochs, max_num_samples, max_seq_length, min_num_sent)
+    with np.errstate(over='ignore'):
+        counts = np.array([0, 0, 0, -1], dtype=np.int64)
+        num_samples = _build_blocks_mapping(*args, np.zeros((0, 4), dtype=dtype), counts)
+        if verbose:
+            _print_mapping_counts(counts, num_samples, max_num_samples)
+        maps = np.zeros((num_samples, 4), dtype=dtype)
+        _build_blocks_mapping(*args, maps, np.zeros(4, dtype=np.int64))
+        _shuffle_rows(maps, seed + 1)
+    return maps
+
+
+if not HAVE_NUMBA:
+    logging.warning(
+        "numba is not installed, the numpy dataset helpers run the sequential index builders in plain Python "
+        "which is slow for large datasets."
+    )
@@ -18,6 +18,7 @@ import multiprocessing as mp
 import os
 import pickle
 import time
+import uuid
 from functools import lru_cache, partial
 from typing import Callable, List, Optional, Type
 
@@ -27,7 +28,13 @@ import torch
 from nemo.core import Dataset
 from nemo.utils import AppState, logging
 
-__all__ = ["TextMemMapDataset", "CSVMemMapDataset", "build_index_files"]
+__all__ = [
+    "TextMemMapDataset",
+    "CSVMemMapDataset",
+    "build_index_files",
+    "build_index_file_chunked",
+    "shard_index_files",
+]
 __idx_version__ = "0.2"  # index file version
 __idx_suffix__ = "idx"  # index file suffix
 
@@ -62,6 +69,127 @@ def _build_index_from_memdata(fn, newline_int):
     return midx
 
 
+def _index_window(fn, newline_int, window):
+    """
+    Save delimiter positions of the byte range window = (start, end, out_fn) of fn to out_fn.
+    Returns the number of delimiters.
+    """
+    start, end, out_fn = window
+    mdata = np.memmap(fn, dtype=np.uint8, mode="r")
+    positions = np.flatnonzero(mdata[start:end] == newline_int).astype(np.int64) + start
+    np.save(out_fn, positions)
+    mdata._mmap.close()
+    del mdata
+    return len(positions)
+
+
+def _num_trimmed_items(mdata, newline_int, num_newlines):
+    """
+    Return the number of entries _build_index_from_memdata would keep, given the total
+    number of delimiters in mdata. Only the tail of the file is scanned.
+    """
+    size = len(mdata)
+    block = 1 << 16
+    while True:
+        start = max(0, size - block)
+        tail = np.flatnonzero(mdata[start:] == newline_int) + start
+        if (len(tail) == 0) or (tail[-1] + 1 != size):
+            tail = np.append(tail, size + 1)
+            num_items = num_newlines + 1
+        else:
+            num_items = num_newlines
+        # entries are kept up to the last gap of at least 2 (i.e., the last non-empty line)
+        gaps = np.flatnonzero(np.diff(tail) >= 2)
+        if len(gaps):
+            return num_items - (len(tail) - int(gaps[-1]) - 2)
+        if start == 0:
+            return min(num_items, 1)
+        block *= 4
+
+
+def build_index_file_chunked(
+    fn: str,
+    idx_fn: str,
+    newline_int: int,
+    pool=None,
+    window_size: int = 1 << 28,
+    resume_from: Optional[np.ndarray] = None,
+    resume_size: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Build the index of delimiter positions of fn by scanning fixed-size windows, and write it
+    to idx_fn + ".npy". Produces the same index as _build_index_from_memdata.
+
+    Windows are scanned independently and their int64 delimiter positions are copied straight
+    into the memory-mapped output file, so the index is never materialized as a Python list
+    nor as a single array in memory.
+
+    Args:
+        fn: file to index.
+        idx_fn: base name of the index files.
+        newline_int: ASCII code of the delimiter.
+        pool: optional multiprocessing pool used to scan windows in parallel.
+        window_size: size of the scanned windows in bytes.
+        resume_from: index of a previous version of fn, which fn extends by appending data.
+            Only the bytes after the last indexed delimiter are scanned.
+        resume_size: size in bytes of the previous version of fn.
+
+    Returns:
+        The memory-mapped index.
+    """
+    mdata = np.memmap(fn, dtype=np.uint8, mode="r")
+    size = len(mdata)
+
+    # keep the delimiters of the previous index, dropping the end-of-file entry
+    num_prefix = 0
+    if resume_from is not None:
+        num_prefix = int(np.searchsorted(resume_from, min(resume_size, size)))
+        if num_prefix and mdata[resume_from[num_prefix - 1]] != newline_int:
+            raise ValueError(f"Cannot resume index of {fn}, file was modified and not only appended to")
+    scan_start = int(resume_from[num_prefix - 1]) + 1 if num_prefix else 0
+
+    # write to temporary files and rename, so interrupted builds never leave a partial index
+    tmp_fn = f"{idx_fn}.npy.{uuid.uuid4().hex}.tmp"
+    windows = [
+        (start, min(start + window_size, size), f"{tmp_fn}.{i}.npy")
+        for i, start in enumerate(range(scan_start, size, window_size))
+    ]
+    try:
+        if pool is not None:
+            counts = pool.map(partial(_index_window, fn, newline_int), windows)
+        else:
+            counts = [_index_window(fn, newline_int, window) for window in windows]
+        num_newlines = num_prefix + sum(counts)
+        num_items = _num_trimmed_items(mdata, newline_int, num_newlines)
+
+        midx = np.lib.format.open_memmap(tmp_fn, mode="w+", dtype=np.int64, shape=(num_items,))
+        offset = 0
+        for start in range(0, num_prefix, window_size):
+            block = resume_from[start : min(start + window_size, num_prefix)]
+            midx[offset : offset + len(block)] = block
+            offset += len(block)
+        for _, _, window_fn in windows:
+            positions = np.load(window_fn)[: max(0, num_items - offset)]
+            midx[offset : offset + len(positions)] = positions
+            offset += len(positions)
+            os.remove(window_fn)
+        if num_items > num_newlines:
+            # no delimiter at the end of the file
+            midx[-1] = size + 1
+        midx.flush()
+        del midx
+        os.replace(tmp_fn, idx_fn + ".npy")
+    finally:
+        for path in [tmp_fn] + [window_fn for _, _, window_fn in windows]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    mdata._mmap.close()
+    del mdata
+
+    return np.load(idx_fn + ".npy", mmap_mode="r")
+
+
 class TextMemMapDataset(Dataset):
     """
     Allow per-line lazy access to multiple text files using numpy memmap.
@@ -77,6 +205,8 @@ class TextMemMapDataset(Dataset):
         build_index_fn: Optional[Callable[[str, Optional[int]], bool]] = _build_index_from_memdata,
         sort_dataset_paths: Optional[bool] = True,
         index_mapping_dir: Optional[str] = None,
+        index_window_size: Optional[int] = None,
+        shard_index_building: Optional[bool] = False,
     ):
         """
         Args:
@@ -91,6 +221,11 @@ class TextMemMapDataset(Dataset):
             sort_dataset_paths: whether to sort datasets by paths.
             index_mapping_dir: directory to save the index mapping to.
                 If None, will write to the same folder as the dataset.
+            index_window_size: if given, index files are built by scanning windows of this many bytes
+                in parallel (see build_index_file_chunked) instead of using build_index_fn.
+            shard_index_building: if True and torch.distributed is initialized, missing index files
+                are built by all ranks, each rank indexing a subset of files (see shard_index_files),
+                instead of by global rank 0 only.
         """
         super().__init__()
         self.mdata_midx_list = []
@@ -117,7 +252,21 @@ class TextMemMapDataset(Dataset):
         # load all files into memmap
         is_distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
 
-        if not is_distributed or (is_distributed and torch.distributed.get_rank() == 0):
+        if is_distributed and shard_index_building:
+            # Create index files on all ranks, each rank building a shard of the files.
+            # Index files are written with atomic renames and the metadata file is written last,
+            # so ranks (or concurrent jobs) indexing the same file never expose partial files.
+            shard = shard_index_files(dataset_paths, torch.distributed.get_rank(), torch.distributed.get_world_size())
+            if shard:
+                build_index_files(
+                    shard,
+                    newline_int,
+                    workers=self._worker,
+                    build_index_fn=build_index_fn,
+                    index_mapping_dir=index_mapping_dir,
+                    window_size=index_window_size,
+                )
+        elif not is_distributed or (is_distributed and torch.distributed.get_rank() == 0):
             # Create index files on global rank 0.
             build_index_files(
                 dataset_paths,
@@ -125,6 +274,7 @@ class TextMemMapDataset(Dataset):
                 workers=self._worker,
                 build_index_fn=build_index_fn,
                 index_mapping_dir=index_mapping_dir,
+                window_size=index_window_size,
             )
 
         if is_distributed:
@@ -139,6 +289,7 @@ class TextMemMapDataset(Dataset):
             #
             # 1. case of a shared filesystem, or global_rank==0: the index files are present in
             #    the locally available filesystem, calling build_index_files() again is a no-op.
+            #    With shard_index_building, this holds once all ranks finished their shards.
             # 2. case of a non-shared filesystem, and global_rank>0: the index files are not
             #    present in the locally available filesystem, calling build_index_files() again
             #    will create them.
@@ -150,6 +301,7 @@ class TextMemMapDataset(Dataset):
                 workers=self._worker,
                 build_index_fn=build_index_fn,
                 index_mapping_dir=index_mapping_dir,
+                window_size=index_window_size,
             )
 
         if is_distributed:
@@ -299,6 +451,8 @@ class CSVMemMapDataset(TextMemMapDataset):
         data_col=1,
         data_sep=",",
         index_mapping_dir: Optional[str] = None,
+        index_window_size: Optional[int] = None,
+        shard_index_building: Optional[bool] = False,
     ):
         """
         Args:
@@ -312,6 +466,8 @@ class CSVMemMapDataset(TextMemMapDataset):
             data_sep: data separator.
             index_mapping_dir: directory to save the index mapping to.
                 If None, will write to the same folder as the dataset.
+            index_window_size: if given, size in bytes of the windows scanned in parallel to build index files.
+            shard_index_building: whether to shard index building across all distributed ranks.
         """
         super().__init__(
             dataset_paths=dataset_paths,
@@ -321,6 +477,8 @@ class CSVMemMapDataset(TextMemMapDataset):
             tokenizer=tokenizer,
             sort_dataset_paths=sort_dataset_paths,
             index_mapping_dir=index_mapping_dir,
+            index_window_size=index_window_size,
+            shard_index_building=shard_index_building,
         )
         self._data_col = data_col
         self._data_sep = data_sep
@@ -350,6 +508,8 @@ class CSVFieldsMemmapDataset(TextMemMapDataset):
         data_sep=',',
         data_fields={"data": 0},
         index_mapping_dir: Optional[str] = None,
+        index_window_size: Optional[int] = None,
+        shard_index_building: Optional[bool] = False,
     ):
         """
         Args:
@@ -363,6 +523,8 @@ class CSVFieldsMemmapDataset(TextMemMapDataset):
             data_fields:  dict of field names and their corresponding column indices
             index_mapping_dir: directory to save the index mapping to.
                 If None, will write to the same folder as the dataset.
+            index_window_size: if given, size in bytes of the windows scanned in parallel to build index files.
+            shard_index_building: whether to shard index building across all distributed ranks.
         """
         super().__init__(
             dataset_paths=dataset_paths,
@@ -372,6 +534,8 @@ class CSVFieldsMemmapDataset(TextMemMapDataset):
             tokenizer=tokenizer,
             sort_dataset_paths=sort_dataset_paths,
             index_mapping_dir=index_mapping_dir,
+            index_window_size=index_window_size,
+            shard_index_building=shard_index_building,
         )
 
         self._data_fields = data_fields
@@ -404,6 +568,8 @@ class JSONLMemMapDataset(TextMemMapDataset):
         tokenizer: Optional[Type["TokenizerSpec"]] = None,
         sort_dataset_paths: Optional[bool] = True,
         index_mapping_dir: Optional[str] = None,
+        index_window_size: Optional[int] = None,
+        shard_index_building: Optional[bool] = False,
     ):
         """
         Args:
@@ -415,6 +581,8 @@ class JSONLMemMapDataset(TextMemMapDataset):
             sort_dataset_paths: whether to sort datasets by paths.
             index_mapping_dir: directory to save the index mapping to.
                 If None, will write to the same folder as the dataset.
+            index_window_size: if given, size in bytes of the windows scanned in parallel to build index files.
+            shard_index_building: whether to shard index building across all distributed ranks.
         """
         super().__init__(
             dataset_paths=dataset_paths,
@@ -424,6 +592,8 @@ class JSONLMemMapDataset(TextMemMapDataset):
             tokenizer=tokenizer,
             sort_dataset_paths=sort_dataset_paths,
             index_mapping_dir=index_mapping_dir,
+            index_window_size=index_window_size,
+            shard_index_building=shard_index_building,
         )
 
     def _build_data_from_text(self, text):
@@ -484,6 +654,17 @@ def _index_fn(fn: str, index_mapping_dir: str) -> str:
     return idx_fn
 
 
+def _save_index_info(idx_fn, data):
+    """
+    Atomically write the metadata file of an index. The metadata file is written last and
+    marks the index as complete, so concurrent readers never see a partially written index.
+    """
+    tmp_fn = f"{idx_fn}.info.{uuid.uuid4().hex}.tmp"
+    with open(tmp_fn, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_fn, idx_fn + ".info")
+
+
 def _build_memmap_index_files(newline_int, build_index_fn, fn, index_mapping_dir: str):
     """Helper function to build an index file"""
     idx_fn = _index_fn(fn, index_mapping_dir)
@@ -501,21 +682,78 @@ def _build_memmap_index_files(newline_int, build_index_fn, fn, index_mapping_dir
             raise TypeError(f"midx must be an integer array, but got type = {midx.dtype}")
 
         # create e metadata file
-        data = dict(newline_int=newline_int, version=__idx_version__)
+        data = dict(newline_int=newline_int, version=__idx_version__, file_size=os.path.getsize(fn))
 
         # save index as numpy array to enable memmap reading
         logging.info(f"Saving idx file = {idx_fn}.npy")
-        np.save(idx_fn + ".npy", midx, allow_pickle=True)
+        tmp_fn = f"{idx_fn}.npy.{uuid.uuid4().hex}.tmp"
+        with open(tmp_fn, "wb") as f:
+            np.save(f, midx, allow_pickle=True)
+        os.replace(tmp_fn, idx_fn + ".npy")
         logging.info(f"Saving metadata file = {idx_fn}.info")
-        pickle.dump(data, open(idx_fn + ".info", "wb"))
+        _save_index_info(idx_fn, data)
 
         return True
 
 
+def _build_memmap_index_files_chunked(newline_int, fn, index_mapping_dir: str, pool=None, window_size=1 << 28):
+    """
+    Helper function to build an index file with build_index_file_chunked.
+    An existing index is extended if the file was appended to since the index was built.
+    """
+    idx_fn = _index_fn(fn, index_mapping_dir)
+    file_size = os.path.getsize(fn)
+
+    resume_from = resume_size = None
+    if _index_file_exists(idx_fn):
+        idx_info_dict = pickle.load(open(idx_fn + ".info", "rb"))
+        resume_size = idx_info_dict.get("file_size", None)
+        if (
+            resume_size is None
+            or resume_size >= file_size
+            or idx_info_dict.get("newline_int", None) != newline_int
+            or idx_info_dict.get("version", "0.0") != __idx_version__
+        ):
+            return False
+        logging.info(f"Extending indexing for fn = {fn} from {resume_size} to {file_size} bytes")
+        resume_from = np.load(idx_fn + ".npy", allow_pickle=True, mmap_mode="r")
+    else:
+        logging.info(f"Building indexing for fn = {fn}")
+
+    logging.info(f"Saving idx file = {idx_fn}.npy")
+    build_index_file_chunked(
+        fn,
+        idx_fn,
+        newline_int,
+        pool=pool,
+        window_size=window_size,
+        resume_from=resume_from,
+        resume_size=resume_size,
+    )
+    data = dict(newline_int=newline_int, version=__idx_version__, file_size=file_size)
+    logging.info(f"Saving metadata file = {idx_fn}.info")
+    _save_index_info(idx_fn, data)
+
+    return True
+
+
 def build_index_files(
-    dataset_paths, newline_int, workers=None, build_index_fn=_build_index_from_memdata, index_mapping_dir: str = None,
+    dataset_paths,
+    newline_int,
+    workers=None,
+    build_index_fn=_build_index_from_memdata,
+    index_mapping_dir: str = None,
+    window_size: Optional[int] = None,
 ):
-    """Auxiliary method to build multiple index files"""
+    """
+    Auxiliary method to build multiple index files
+
+    By default files are indexed in parallel with build_index_fn, one file per worker.
+    If window_size is given, files are indexed one after the other with build_index_file_chunked,
+    and the windows of window_size bytes of each file are scanned in parallel instead (build_index_fn
+    is ignored). This bounds memory usage for very large files, and extends the index of files which
+    grew since they were indexed.
+    """
     if len(dataset_paths) < 1:
         raise ValueError("files_list must contain at leat one file name")
 
@@ -527,16 +765,46 @@ def build_index_files(
     start_time = time.time()
     ctx = mp.get_context("fork")
     with ctx.Pool(workers) as p:
-        build_status = p.map(
-            partial(_build_memmap_index_files, newline_int, build_index_fn, index_mapping_dir=index_mapping_dir,),
-            dataset_paths,
-        )
+        if window_size is not None:
+            build_status = [
+                _build_memmap_index_files_chunked(newline_int, fn, index_mapping_dir, pool=p, window_size=window_size)
+                for fn in dataset_paths
+            ]
+        else:
+            build_status = p.map(
+                partial(
+                    _build_memmap_index_files,
+                    newline_int,
+                    build_index_fn,
+                    index_mapping_dir=index_mapping_dir,
+                ),
+                dataset_paths,
+            )
 
     logging.info(
         f"Time building {sum(build_status)} / {len(build_status)} mem-mapped files: {datetime.timedelta(seconds=time.time() - start_time)}"
     )
 
 
+def shard_index_files(dataset_paths: List[str], rank: int, world_size: int) -> List[str]:
+    """
+    Return the files whose index files are built by rank out of world_size ranks.
+
+    Files are assigned greedily by decreasing size to the least loaded rank, so every rank
+    indexes roughly the same number of bytes. The assignment only depends on the file
+    paths and sizes, so all ranks compute the same shards without communicating.
+    """
+    sizes = [os.path.getsize(fn) for fn in dataset_paths]
+    loads = [0] * world_size
+    shard = []
+    for i in sorted(range(len(dataset_paths)), key=lambda i: (-sizes[i], dataset_paths[i])):
+        target = min(range(world_size), key=lambda r: (loads[r], r))
+        loads[target] += sizes[i]
+        if target == rank:
+            shard.append(dataset_paths[i])
+    return shard
+
+
 def handle_index(dataset, idx):
     """
     Remaps negative indices and handles numpy int indices.
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
 import collections
 from typing import Dict, List
 
@@ -20,7 +21,14 @@ from tqdm import tqdm
 
 from nemo.utils import logging
 
-PACKING_ALGOS = ['first_fit_decreasing', 'first_fit_shuffle']
+PACKING_ALGOS = [
+    'first_fit_decreasing',
+    'first_fit_shuffle',
+    'best_fit_decreasing',
+    'best_fit_decreasing_histogram',
+]
+# packing algorithms that take the histogram of sequence lengths instead of the list of sequence lengths
+HISTOGRAM_PACKING_ALGOS = ['best_fit_decreasing_histogram']
 
 
 def find_first_bin_that_fits(bins: List[List[int]], s: int, bin_size: int) -> int:
@@ -52,13 +60,32 @@ def first_fit(seqlens: List[int], pack_size: int) -> List[List[int]]:
     Returns:
       A list of lists, where each inner list represents a bin and contains the indices of the sequences assigned to that bin.
     """
+    # Max segment tree over the remaining capacities of the bins, so the first bin that fits is found in
+    # O(log n). At most one bin is opened per sequence, and bins that are not open yet have the full capacity,
+    # so the first of them is the new bin whenever no open bin fits.
+    tree_size = 1
+    while tree_size < len(seqlens):
+        tree_size *= 2
+    capacities = [pack_size] * (2 * tree_size)
+
     res = []
     for s in seqlens:
-        first_bin = find_first_bin_that_fits(res, s, pack_size)
-        if first_bin == -1:  # open a new bin
+        if capacities[1] >= s:
+            node = 1
+            while node < tree_size:
+                node = 2 * node if capacities[2 * node] >= s else 2 * node + 1
+        else:  # the sequence is longer than pack_size
+            node = tree_size + len(res)
+        first_bin = node - tree_size
+        if first_bin == len(res):  # open a new bin
             res.append([s])
         else:
             res[first_bin].append(s)
+        capacities[node] -= s
+        node //= 2
+        while node:
+            capacities[node] = max(capacities[2 * node], capacities[2 * node + 1])
+            node //= 2
     return res
 
 
@@ -97,6 +124,116 @@ def first_fit_shuffle(seqlens: List[int], pack_size: int) -> List[List[int]]:
     return first_fit(shuffled_seqlens, pack_size)
 
 
+def best_fit_decreasing(seqlens: List[int], pack_size: int) -> List[List[int]]:
+    """
+    Packs sequences of varying lengths into bins using the Best-Fit Decreasing algorithm.
+
+    The sequences are sorted by decreasing length, and each sequence is placed in the bin with the smallest remaining
+    capacity that can fit it. Bins are kept in buckets by remaining capacity, so the best bin is found with a binary
+    search over the sorted remaining capacities.
+
+    Args:
+      seqlens: A list of integers, representing the lengths of the sequences to be packed.
+      pack_size: The maximum capacity of each bin.
+
+    Returns:
+      A list of lists, similar to the output of the 'first_fit' function.
+    """
+    res = []
+    # sorted remaining capacities and the bins with each of these capacities
+    capacities = []
+    bins_by_capacity = collections.defaultdict(list)
+    for s in sorted(seqlens, reverse=True):
+        i = bisect.bisect_left(capacities, s)
+        if i == len(capacities):  # open a new bin
+            best_bin = len(res)
+            res.append([])
+            capacity = pack_size
+        else:
+            capacity = capacities[i]
+            best_bin = bins_by_capacity[capacity].pop()
+            if not bins_by_capacity[capacity]:
+                del capacities[i]
+        res[best_bin].append(s)
+        capacity -= s
+        if capacity >= 0:
+            if not bins_by_capacity[capacity]:
+                bisect.insort(capacities, capacity)
+            bins_by_capacity[capacity].append(best_bin)
+    return res
+
+
+def best_fit_decreasing_histogram(histogram: List[int], pack_size: int) -> List[List[int]]:
+    """
+    Packs sequences into bins using the Best-Fit Decreasing algorithm on the histogram of sequence lengths.
+
+    The result has the same number of bins as 'best_fit_decreasing', but the sequences are placed one length at a time
+    into groups of bins with identical contents. Best-fit places consecutive sequences of the same length into the same
+    bin until it is full, so a whole group of bins is filled at once. The packing time only depends on the number of
+    sequence lengths and bin groups, not on the number of sequences.
+
+    Args:
+      histogram: A list representing the histogram data (number of sequences for each length).
+      pack_size: The maximum capacity of each bin.
+
+    Returns:
+      A list of lists, similar to the output of the 'first_fit' function.
+    """
+    # groups of bins as [number of bins, sequence lengths of each bin], kept in buckets by remaining capacity
+    capacities = [pack_size]
+    groups_by_capacity = collections.defaultdict(list)
+    # the group of empty bins has as many bins as needed, so it is never used up
+    empty_bins = [float('inf'), ()]
+    groups_by_capacity[pack_size].append(empty_bins)
+    overflow_groups = []
+
+    for seq_len in reversed(range(len(histogram))):
+        count = histogram[seq_len]
+        if count and seq_len > pack_size:
+            overflow_groups.append([count, (seq_len,)])
+            continue
+        while count:
+            i = bisect.bisect_left(capacities, seq_len)
+            capacity = capacities[i]
+            groups = groups_by_capacity[capacity]
+            group = groups[-1]
+            # number of sequences placed into each bin of the group
+            per_bin = min(capacity // seq_len, count) if seq_len else count
+            num_bins = min(group[0], count // per_bin)
+            group[0] -= num_bins
+            count -= num_bins * per_bin
+            if not group[0]:
+                groups.pop()
+                if not groups:
+                    del capacities[i]
+
+            new_capacity = capacity - per_bin * seq_len
+            if not groups_by_capacity[new_capacity]:
+                bisect.insort(capacities, new_capacity)
+            groups_by_capacity[new_capacity].append([num_bins, group[1] + (seq_len,) * per_bin])
+
+    res = []
+    for groups in [overflow_groups] + list(groups_by_capacity.values()):
+        for num_bins, seq_lens in groups:
+            if seq_lens:
+                res.extend([list(seq_lens) for _ in range(num_bins)])
+    return res
+
+
+def get_packing_efficiency(assignments: List[List[int]], pack_size: int) -> float:
+    """
+    Computes the packing efficiency, i.e. the fraction of the tokens of the packed sequences that are not padding.
+
+    Args:
+      assignments: A list of lists, where each inner list represents a bin and contains the sequence lengths in it.
+      pack_size: The maximum capacity of each bin.
+
+    Returns:
+      The sum of all sequence lengths divided by the total capacity of the bins.
+    """
+    return sum(sum(x) for x in assignments) / (len(assignments) * pack_size)
+
+
 def create_hist(dataset: np.array, truncate_seq_len: int):
     """
     Creates a histogram of sequence lengths from a tokenized dataset.
@@ -145,7 +282,7 @@ def create_packing_strategy(
     Args:
           histogram: A list representing the histogram data (number of sequences for each length).
           pack_size: The maximum capacity of each bin.
-          packing_algorithm: One of the supported packing algorithms from ['first_fit_decreasing', 'first_fit_shuffle']
+          packing_algorithm: One of the supported packing algorithms from PACKING_ALGOS
 
     Returns:
           assignments: A list of lists, where each inner list represents a bin and contains the indices of the
@@ -154,18 +291,20 @@ def create_packing_strategy(
 
     logging.info(f"Packing sequences to length {pack_size}...")
 
-    all_seq_lens = []
-    for i, count in enumerate(histogram):
-        all_seq_lens.extend([i] * count)
-
     packing_fn = globals()[packing_algorithm]
-    assignments = packing_fn(all_seq_lens, pack_size)
+    if packing_algorithm in HISTOGRAM_PACKING_ALGOS:
+        assignments = packing_fn(histogram, pack_size)
+    else:
+        all_seq_lens = []
+        for i, count in enumerate(histogram):
+            all_seq_lens.extend([i] * count)
+        assignments = packing_fn(all_seq_lens, pack_size)
     packed_seq_lens = [sum(x) for x in assignments]
-    packing_factor = len(all_seq_lens) / len(packed_seq_lens)
+    packing_factor = sum(histogram) / len(packed_seq_lens)
 
     logging.debug("Packed sequence lengths:")
     logging.debug(packed_seq_lens)
-    logging.info(f"Packing is {sum(packed_seq_lens)/len(packed_seq_lens)/pack_size*100:.2f}% efficient")
+    logging.info(f"Packing is {get_packing_efficiency(assignments, pack_size)*100:.2f}% efficient")
     logging.info(
         f">>>>> For pack size {pack_size}, average number of sequences per pack is n = {packing_factor:.3f} <<<<<"
     )
@@ -64,12 +64,13 @@ For grid search, you can provide a list of arguments as follows -
 
 
 import contextlib
+import hashlib
 import json
 import os
 import tempfile
 from dataclasses import dataclass, field, is_dataclass
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Union
 
 import editdistance
 import numpy as np
@@ -116,6 +117,10 @@ class EvalContextBiasingConfig:
         default_factory=lambda: [0.6]
     )  # weight of CTC tokens to prevent false accept errors
     print_cb_stats: bool = False  # print context biasing stats (mostly for debugging)
+    ws_batch_size: int = 0  # batch size of the batched ctc-ws (run_word_spotter_batch), 0 spots words file by file
+    # directory of the compiled context graph, which is loaded instead of tokenizing context_file and updated
+    # incrementally when context_file changes (uses the batched ctc-ws)
+    context_graph_path: Optional[str] = None
 
     # Auxiliary parameters
     sort_logits: bool = True  # do logits sorting before decoding - it reduces computation on puddings
@@ -134,13 +139,30 @@ def decoding_step(
     preds_output_manifest: str,
     beam_batch_size: int = 128,
     progress_bar: bool = True,
-    context_graph: context_biasing.ContextGraphCTC = None,
+    context_graph: Union[context_biasing.ContextGraphCTC, context_biasing.CSRContextGraph] = None,
     blank_idx: int = 0,
     hp: Optional[Dict] = None,
 ) -> tuple[float, float]:
 
     # run CTC-based Word Spotter:
-    if cfg.apply_context_biasing:
+    if cfg.apply_context_biasing and isinstance(context_graph, context_biasing.CSRContextGraph):
+        ws_results = {}
+        ws_batch_size = max(cfg.ws_batch_size, 1)
+        for start in tqdm(
+            range(0, len(ctc_logprobs), ws_batch_size), desc=f"Eval batched CTC-based Word Spotter...", ncols=120
+        ):
+            batch_ws_results = context_biasing.run_word_spotter_batch(
+                ctc_logprobs[start : start + ws_batch_size],
+                context_graph,
+                asr_model,
+                blank_idx=blank_idx,
+                beam_threshold=hp['beam_threshold'],
+                cb_weight=hp['context_score'],
+                ctc_ali_token_weight=hp['ctc_ali_token_weight'],
+            )
+            for idx, ws_result in enumerate(batch_ws_results, start=start):
+                ws_results[audio_file_paths[idx]] = ws_result
+    elif cfg.apply_context_biasing:
         ws_results = {}
         for idx, logits in tqdm(
             enumerate(ctc_logprobs), desc=f"Eval CTC-based Word Spotter...", ncols=120, total=len(ctc_logprobs)
@@ -316,6 +338,51 @@ def decoding_step(
         return wer_dist_first / words_count, cer_dist_first / chars_count
 
 
+def get_tokenizer_fingerprint(tokenizer) -> str:
+    """Returns a hash of the vocabulary of the tokenizer, which determines the token ids of a context graph."""
+    vocabulary = tokenizer.ids_to_tokens(list(range(tokenizer.vocab_size)))
+    return hashlib.sha1(json.dumps(vocabulary, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def load_compiled_context_graph(
+    path: str,
+    context_spellings: List[list],
+    tokenize: Callable[[List[list]], List[list]],
+    blank_idx: int,
+    tokenizer_fingerprint: str,
+) -> context_biasing.CompiledContextGraph:
+    """
+    Loads the compiled context graph from path and brings it up to date with the context biasing words:
+    only new or changed words are tokenized and inserted, removed or changed words are deleted.
+    The graph is rebuilt if it was compiled with another tokenizer vocabulary (see `get_tokenizer_fingerprint`).
+    """
+    spellings = {}
+    for word, word_spellings in context_spellings:
+        spellings.setdefault(word, []).extend(word_spellings)
+
+    context_graph = None
+    if context_biasing.CompiledContextGraph.exists(path):
+        context_graph = context_biasing.CompiledContextGraph.load(path)
+        if context_graph.metadata.get('tokenizer') != tokenizer_fingerprint or context_graph.blank_id != blank_idx:
+            logging.info(f"Context graph {path} was compiled with another tokenizer, rebuilding it")
+            context_graph = None
+    if context_graph is None:
+        context_graph = context_biasing.CompiledContextGraph.empty(
+            blank_idx, metadata={'tokenizer': tokenizer_fingerprint}
+        )
+
+    compiled_spellings = context_graph.metadata.get('spellings', {})
+    deleted_words = [word for word in compiled_spellings if spellings.get(word) != compiled_spellings[word]]
+    inserted_words = [[word, s] for word, s in spellings.items() if compiled_spellings.get(word) != s]
+    if deleted_words or inserted_words:
+        logging.info(f"Updating context graph {path}: {len(deleted_words)} deleted, {len(inserted_words)} inserted")
+        context_graph.delete(deleted_words)
+        context_graph.insert(tokenize(inserted_words))
+        context_graph.metadata['spellings'] = spellings
+        context_graph.save(path)
+    return context_graph
+
+
 @hydra_runner(config_path=None, config_name='EvalContextBiasingConfig', schema=EvalContextBiasingConfig)
 def main(cfg: EvalContextBiasingConfig):
     if is_dataclass(cfg):
@@ -413,17 +480,30 @@ def main(cfg: EvalContextBiasingConfig):
                     blank_idx = asr_model.decoder.blank_idx
 
     # load context biasing words
-    context_transcripts = []
+    context_spellings = []
     for line in open(cfg.context_file).readlines():
         item = line.strip().lower().split(cfg.spelling_separator)
-        word = item[0]
-        word_tokenization = [asr_model.tokenizer.text_to_ids(x) for x in item[1:]]
-        context_transcripts.append([word, word_tokenization])
-    context_words = [item[0] for item in context_transcripts]
+        context_spellings.append([item[0], item[1:]])
+    context_words = [item[0] for item in context_spellings]
+
+    def tokenize(word_spellings):
+        return [[word, [asr_model.tokenizer.text_to_ids(x) for x in spellings]] for word, spellings in word_spellings]
+
     # build context graph:
-    if cfg.apply_context_biasing:
+    if cfg.apply_context_biasing and cfg.context_graph_path:
+        context_graph = load_compiled_context_graph(
+            cfg.context_graph_path,
+            context_spellings,
+            tokenize,
+            blank_idx,
+            tokenizer_fingerprint=get_tokenizer_fingerprint(asr_model.tokenizer),
+        )
+    elif cfg.apply_context_biasing:
+        context_transcripts = tokenize(context_spellings)
         context_graph = context_biasing.ContextGraphCTC(blank_id=blank_idx)
         context_graph.add_to_graph(context_transcripts)
+        if cfg.ws_batch_size > 0:
+            context_graph = context_biasing.CSRContextGraph.from_context_graph(context_graph)
     else:
         context_graph = None
 
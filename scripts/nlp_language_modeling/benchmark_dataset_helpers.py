@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the C++ dataset helpers with their numpy implementation and checks that the results are identical.
+
+    python benchmark_dataset_helpers.py --num_samples 1000000000 --num_datasets 4
+
+The C++ helpers are compiled first if necessary. Synthetic documents are used for the index mappings.
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from nemo.collections.nlp.data.language_modeling.megatron import numpy_helpers
+from nemo.collections.nlp.data.language_modeling.megatron.dataset_utils import compile_helper
+
+
+def timed(func, *args):
+    # the helpers print their progress, only the timings are of interest here
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.time()
+        result = func(*args)
+        return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark C++ and numpy dataset helpers")
+    parser.add_argument('--num_samples', type=int, default=1_000_000_000, help='Number of GPT and blended samples')
+    parser.add_argument('--num_datasets', type=int, default=4, help='Number of blended datasets')
+    parser.add_argument('--seq_length', type=int, default=2048, help='GPT sequence length')
+    parser.add_argument('--mean_doc_length', type=int, default=1024, help='Mean number of tokens of a document')
+    parser.add_argument('--num_sentences', type=int, default=100_000_000, help='Number of BERT sentences')
+    args = parser.parse_args()
+
+    if not compile_helper():
+        raise RuntimeError("C++ dataset helpers could not be compiled")
+    from nemo.collections.nlp.data.language_modeling.megatron import helpers
+
+    rng = np.random.default_rng(0)
+    # warm up numba on a small input so that compilation is not measured
+    numpy_helpers.build_blending_indices(
+        np.zeros(2, dtype=np.uint8), np.zeros(2, dtype=np.int64), np.array([0.5, 0.5]), 2, 2, False
+    )
+    docs = np.array([0, 2, 4], dtype=np.int64)
+    timed(numpy_helpers.build_mapping, docs, np.ones(4, dtype=np.int32), 1, 10, 8, 0.1, 1, False, 2)
+
+    results = {}
+
+    weights = rng.random(args.num_datasets)
+    weights /= weights.sum()
+    outputs = []
+    for name, module in (('cpp', helpers), ('numpy', numpy_helpers)):
+        dataset_index = np.zeros(args.num_samples, dtype=np.uint8)
+        dataset_sample_index = np.zeros(args.num_samples, dtype=np.int64)
+        _, results[('build_blending_indices', name)] = timed(
+            module.build_blending_indices,
+            dataset_index,
+            dataset_sample_index,
+            weights,
+            args.num_datasets,
+            args.num_samples,
+            False,
+        )
+        outputs.append((dataset_index, dataset_sample_index))
+    if not all(np.array_equal(a, b) for a, b in zip(*outputs)):
+        raise RuntimeError("build_blending_indices results differ")
+    del outputs
+
+    tokens_per_epoch = args.num_samples * args.seq_length + 1
+    num_docs = tokens_per_epoch // args.mean_doc_length + 1
+    sizes = rng.integers(1, 2 * args.mean_doc_length, size=num_docs).astype(np.int32)
+    tokens_per_epoch = int(sizes.sum(dtype=np.int64))
+    doc_idx = rng.permutation(num_docs).astype(np.int32)
+    outputs = []
+    for name, module in (('cpp', helpers), ('numpy', numpy_helpers)):
+        sample_idx, results[('build_sample_idx', name)] = timed(
+            module.build_sample_idx, sizes, doc_idx, args.seq_length, 1, tokens_per_epoch, True, 1
+        )
+        outputs.append(sample_idx)
+    if not np.array_equal(*outputs):
+        raise RuntimeError("build_sample_idx results differ")
+    del outputs, sizes, doc_idx
+
+    num_sentences = rng.integers(1, 16, size=args.num_sentences // 8)
+    docs = np.concatenate([[0], np.cumsum(num_sentences)]).astype(np.int64)
+    sizes = rng.integers(1, 128, size=int(docs[-1])).astype(np.int32)
+    outputs = []
+    for name, module in (('cpp', helpers), ('numpy', numpy_helpers)):
+        maps, results[('build_mapping', name)] = timed(
+            module.build_mapping, docs, sizes, 1, np.iinfo(np.int64).max - 1, 512, 0.1, 1234, False, 2
+        )
+        outputs.append(maps)
+    if not np.array_equal(*outputs):
+        raise RuntimeError("build_mapping results differ")
+
+    for function in ('build_blending_indices', 'build_sample_idx', 'build_mapping'):
+        cpp_time, numpy_time = results[(function, 'cpp')], results[(function, 'numpy')]
+        print(f"{function}: C++ {cpp_time:.2f} s, numpy {numpy_time:.2f} s ({cpp_time / numpy_time:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the default index builder of TextMemMapDataset with the windowed, parallel builder.
+
+    python benchmark_index_memmap_data.py --size_mb 2048 --workers 8 --window_size 268435456
+
+A synthetic JSONL file is generated unless an existing file is given with --input.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from nemo.collections.nlp.data.language_modeling.text_memmap_dataset import (
+    _build_index_from_memdata,
+    build_index_file_chunked,
+)
+
+
+def write_synthetic_file(fn, size_mb, seed=0):
+    rng = np.random.default_rng(seed)
+    block = np.frombuffer(b'{"text": "' + b'x' * 4096 + b'"}', dtype=np.uint8)
+    with open(fn, 'wb') as f:
+        for _ in range(size_mb):
+            # 1 MB of lines with random lengths
+            lengths = rng.integers(16, 4096, size=1024)
+            lengths = lengths[np.cumsum(lengths) < (1 << 20)]
+            f.write(b''.join(block[:n].tobytes() + b'\n' for n in lengths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index builders of TextMemMapDataset")
+    parser.add_argument('--input', type=str, default=None, help='File to index (default: synthetic JSONL file)')
+    parser.add_argument('--size_mb', type=int, default=1024, help='Size of the synthetic file in MB')
+    parser.add_argument('--workers', type=int, default=max(1, os.cpu_count() // 2), help='Number of workers')
+    parser.add_argument('--window_size', type=int, default=1 << 28, help='Window size in bytes')
+    parser.add_argument('--newline_int', type=int, default=10, help='Delimiter')
+    args = parser.parse_args()
+
+    import multiprocessing as mp
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fn = args.input
+        if fn is None:
+            fn = os.path.join(tmp_dir, 'data.jsonl')
+            write_synthetic_file(fn, args.size_mb)
+        size_mb = os.path.getsize(fn) / (1 << 20)
+        idx_fn = os.path.join(tmp_dir, 'data.jsonl.idx')
+
+        # warm up the page cache so both builders read from memory
+        _build_index_from_memdata(fn, args.newline_int)
+
+        start = time.time()
+        reference = _build_index_from_memdata(fn, args.newline_int)
+        reference_time = time.time() - start
+
+        with mp.get_context("fork").Pool(args.workers) as pool:
+            start = time.time()
+            midx = build_index_file_chunked(fn, idx_fn, args.newline_int, pool=pool, window_size=args.window_size)
+            chunked_time = time.time() - start
+
+        if not np.array_equal(reference, midx):
+            raise RuntimeError("Index mismatch between builders")
+
+        print(f"File size: {size_mb:.1f} MB, {len(reference)} lines")
+        print(f"_build_index_from_memdata: {reference_time:.3f} s ({size_mb / reference_time:.1f} MB/s)")
+        print(
+            f"build_index_file_chunked ({args.workers} workers): {chunked_time:.3f} s "
+            f"({size_mb / chunked_time:.1f} MB/s)"
+        )
+
+
+if __name__ == '__main__':
+    main()
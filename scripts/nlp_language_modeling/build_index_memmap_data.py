@@ -35,6 +35,13 @@ def main():
         default=None,
         help='Number of workers to parse files in parallel (default: max(cpu num // 2, 1)',
     )
+    parser.add_argument(
+        '--window_size',
+        type=int,
+        default=None,
+        help='If given, scan windows of this many bytes of each file in parallel instead of one file per worker. '
+        'Indices of files which were appended to since they were indexed are extended.',
+    )
     args = parser.parse_args()
 
     # expand all dataset_paths
@@ -44,7 +51,10 @@ def main():
 
     # build index files in parallel
     build_index_files(
-        dataset_paths=dataset_paths, newline_int=args.newline_int, workers=args.workers,
+        dataset_paths=dataset_paths,
+        newline_int=args.newline_int,
+        workers=args.workers,
+        window_size=args.window_size,
     )
 
 
@@ -34,12 +34,16 @@ Two main steps are run in this script:
 sequence length truncation, tokenization, etc) and the result is an array of tokenized sequences, 
 represented by indices). 
 2. The sequences are grouped by length, and a packing algorithm is run. (https://en.wikipedia.org/wiki/Bin_packing_problem#Offline_algorithms)
-Currently, two variants of "first fit" are supported.
+Currently, two variants of "first fit" and two variants of "best fit" are supported.
 "first_fit_decreasing" sorts the sequences in decreasing order before applying first-fit. 
 It generates a more optimal packing, but it tends to keep all short sequences together, which may affect convergence.
 "first_fit_shuffle" runs first-fit in a random order. Packing is less optimal but it keeps the dataset order random.
-The recommendation is to run "first_fit_shuffle" and check the packed sequence lengths in the printout. 
-If they are similar to the target length (i.e. packing is efficient), then use shuffle. Otherwise try first_fit_decreasing.
+"best_fit_decreasing" places each sequence, in decreasing order, into the fullest bin that can fit it. It packs about as
+tightly as first_fit_decreasing and is much faster for millions of sequences.
+"best_fit_decreasing_histogram" computes an equivalent packing directly from the histogram of sequence lengths, so its run
+time does not depend on the number of sequences.
+The recommendation is to run "first_fit_shuffle" and check the packing efficiency in the printout. 
+If it is close to 100% (i.e. packing is efficient), then use shuffle. Otherwise try best_fit_decreasing_histogram.
 
 Example usage:
 
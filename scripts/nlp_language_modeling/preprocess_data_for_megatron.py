@@ -48,6 +48,10 @@ python scripts/nlp_language_modeling/preprocess_data_for_megatron.py \
     --workers=48
 ```
 
+Add `--sharded` to let every worker write its own part of the output, the parts are concatenated at the end.
+This keeps the workers busy when a single writer process would be the bottleneck.
+With `--keep-shards` the parts are not concatenated, the output is an index over them instead.
+
 Example script to preprocess the loose JSON file for retrieval DB Dataset
 
 ```python
@@ -84,6 +88,7 @@ python scripts/nlp_language_modeling/preprocess_data_for_megatron.py \
 
 import argparse
 import gzip
+import itertools
 import json
 import multiprocessing
 import os
@@ -92,6 +97,7 @@ import sys
 import time
 
 import ftfy
+import numpy as np
 import torch
 
 from nemo.collections.nlp.data.language_modeling.megatron import indexed_dataset
@@ -196,6 +202,81 @@ class Encoder(object):
             ids['text'] = doc_ids
         return ids, len(json_line)
 
+    def write_shard(self, shard):
+        """Encode the lines of a shard of an input file and write them to the shard's own `.bin/.idx` files.
+
+        Args:
+            shard: tuple of the shard output prefix, the input file and the byte range of the shard in it.
+                A line belongs to the shard if it starts inside the byte range, `end=None` reads the file to its end.
+
+        Returns:
+            the shard output prefix, the number of processed documents and bytes.
+        """
+        shard_prefix, json_file, start, end = shard
+        builders = {
+            key: indexed_dataset.make_builder(
+                data_file_path(shard_prefix, key), impl='mmap', vocab_size=Encoder.tokenizer.vocab_size
+            )
+            for key in self.args.json_keys
+        }
+        num_docs, bytes_processed = 0, 0
+        with open_input_file(json_file) as fin:
+            if start > 0:
+                # skip the line started by the previous shard
+                fin.seek(start - 1)
+                fin.readline()
+            while end is None or fin.tell() < end:
+                line = fin.readline()
+                if not line:
+                    break
+                doc, line_bytes = self.encode(line.decode('utf-8') if self.args.text_file else line)
+                num_docs += 1
+                bytes_processed += line_bytes
+                for key, sentences in doc.items():
+                    if len(sentences) == 0:
+                        continue
+                    builders[key].add_doc(
+                        np.fromiter(itertools.chain.from_iterable(sentences), dtype=np.int64),
+                        [len(sentence) for sentence in sentences],
+                    )
+        for key, builder in builders.items():
+            builder.finalize(index_file_path(shard_prefix, key))
+        return shard_prefix, num_docs, bytes_processed
+
+
+def open_input_file(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def data_file_path(prefix, key):
+    return indexed_dataset.data_file_path(f"{prefix}_{key}")
+
+
+def index_file_path(prefix, key):
+    return indexed_dataset.index_file_path(f"{prefix}_{key}")
+
+
+def get_shards(json_files, args, level):
+    """Split the input files into shards of whole lines for `Encoder.write_shard`.
+
+    Plain files are split into `--workers` byte ranges of similar size, gzipped files cannot be seeked
+    efficiently and are a single shard each.
+    """
+    shards = []
+    for json_file in json_files:
+        if json_file.endswith('.gz'):
+            ranges = [(0, None)]
+        else:
+            file_size = os.path.getsize(json_file)
+            bounds = [file_size * i // args.workers for i in range(args.workers + 1)]
+            ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if start < end]
+        for start, end in ranges:
+            shard_prefix = "{}_shard{:05d}_{}".format(args.output_prefix, len(shards), level)
+            shards.append((shard_prefix, json_file, start, end))
+    return shards
+
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -239,6 +320,18 @@ def get_args():
 
     group = parser.add_argument_group(title='runtime')
     group.add_argument('--workers', type=int, default=1, help='Number of worker processes to launch')
+    group.add_argument(
+        '--sharded',
+        action='store_true',
+        help='If set, every worker writes the documents of its part of the input files to its own .bin and .idx '
+        'shard, the shards are then concatenated into the output files. Only supported with --dataset-impl=mmap',
+    )
+    group.add_argument(
+        '--keep-shards',
+        action='store_true',
+        help='If set with --sharded, the shards are kept and the output .idx file is a multi-shard index '
+        'over them instead of a concatenated copy. It can be used as a data prefix like any mmap dataset',
+    )
     group.add_argument('--chunk_size', type=int, default=64, help='chunk size used for retrieval')
     group.add_argument(
         '--chunk_stride_size', type=int, default=64, help='the stride size for neighbor chunks used for retrieval'
@@ -254,6 +347,11 @@ def get_args():
     args = parser.parse_args()
     args.keep_empty = False
 
+    if args.sharded and args.dataset_impl != 'mmap':
+        raise ValueError("--sharded is only supported with --dataset-impl=mmap")
+    if args.keep_shards and not args.sharded:
+        raise ValueError("--keep-shards requires --sharded")
+
     if args.tokenizer_type is not None and args.tokenizer_type.lower().startswith('bert'):
         if not args.split_sentences:
             print("Bert tokenizer detected, are you sure you don't want to split sentences?")
@@ -305,6 +403,8 @@ def main():
     for key in args.json_keys:
         output_bin_files[key] = "{}_{}_{}.bin".format(args.output_prefix, key, level)
         output_idx_files[key] = "{}_{}_{}.idx".format(args.output_prefix, key, level)
+        if args.keep_shards:
+            continue
         builders[key] = indexed_dataset.make_builder(
             output_bin_files[key],
             impl=args.dataset_impl,
@@ -322,6 +422,38 @@ def main():
 
     pool = multiprocessing.Pool(args.workers, initializer=encoder.initializer)
 
+    if args.sharded:
+        # shards are written in parallel and concatenated in order as soon as they are ready
+        shards = get_shards(json_files, args, level)
+        print(f'Processing {len(json_files)} files in {len(shards)} shards')
+        total_docs = 0
+        for idx, (shard_prefix, num_docs, bytes_processed) in enumerate(pool.imap(encoder.write_shard, shards)):
+            total_docs += num_docs
+            total_bytes_processed += bytes_processed
+            if not args.keep_shards:
+                for key in args.json_keys:
+                    shard_key_prefix = f"{shard_prefix}_{key}"
+                    builders[key].merge_file_(shard_key_prefix)
+                    os.remove(indexed_dataset.data_file_path(shard_key_prefix))
+                    os.remove(indexed_dataset.index_file_path(shard_key_prefix))
+            elapsed = time.time() - proc_start
+            mbs = total_bytes_processed / elapsed / 1024 / 1024
+            print(
+                f"Processed shard {idx + 1}/{len(shards)}, {total_docs} documents",
+                f"({total_docs/elapsed} docs/s, {mbs} MB/s).",
+                file=sys.stderr,
+            )
+        pool.close()
+        pool.join()
+        for key in args.json_keys:
+            if args.keep_shards:
+                # the output is an index over the shards, their data is not copied
+                output_prefix = "{}_{}_{}".format(args.output_prefix, key, level)
+                indexed_dataset.make_multi_index(output_prefix, [f"{shard[0]}_{key}" for shard in shards])
+            else:
+                builders[key].finalize(output_idx_files[key])
+        return
+
     for idx, json_file in enumerate(json_files):
         print(f'Processing file {json_file} {idx + 1}/{len(json_files)}')
         if json_file.endswith('.gz'):
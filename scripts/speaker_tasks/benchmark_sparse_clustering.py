@@ -0,0 +1,126 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import time
+
+import torch
+
+from nemo.collections.asr.parts.utils.offline_clustering import SpeakerClustering
+from nemo.collections.asr.parts.utils.online_clustering import stitch_cluster_labels
+from nemo.collections.asr.parts.utils.sparse_clustering import SparseSpeakerClustering
+
+"""
+This script benchmarks speaker clustering with the sparse k-NN affinity graph (`SparseSpeakerClustering`)
+against the dense affinity matrix (`SpeakerClustering`) on synthetic multiscale embeddings.
+Speakers take turns of random length, and the embedding of each segment is the speaker centroid with noise.
+
+Usage:
+    python scripts/speaker_tasks/benchmark_sparse_clustering.py \
+        --num_segments 10000 50000 200000 \
+        --num_speakers 4 \
+        --eig_solver lobpcg \
+        --max_dense_segments 10000
+"""
+
+
+def generate_synthetic_session(
+    num_segments: int,
+    num_speakers: int,
+    emb_dim: int = 192,
+    ms_window=(1.5, 1.0, 0.5),
+    ms_shift=(0.75, 0.5, 0.25),
+    turn_sec=(5.0, 60.0),
+    noise_sigma: float = 0.5,
+    seed: int = 0,
+):
+    """
+    Generate multiscale embeddings of a session with `num_segments` base-scale segments, in the input format
+    of `SpeakerClustering.forward_infer`, and the ground-truth speaker labels of the base-scale segments.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    duration = num_segments * ms_shift[-1]
+    # speaker turns with random lengths, adjacent turns have different speakers
+    turn_ends, turn_speakers, end, speaker = [], [], 0.0, 0
+    while end < duration + max(ms_window):
+        end += float(torch.empty(1).uniform_(*turn_sec, generator=generator))
+        speaker = (speaker + int(torch.randint(1, max(num_speakers, 2), (1,), generator=generator))) % num_speakers
+        turn_ends.append(end)
+        turn_speakers.append(speaker)
+    turn_ends, turn_speakers = torch.tensor(turn_ends), torch.tensor(turn_speakers)
+    centroids = torch.nn.functional.normalize(torch.randn(num_speakers, emb_dim, generator=generator), dim=1)
+
+    embs, timestamps, counts = [], [], []
+    for window, shift in zip(ms_window, ms_shift):
+        count = num_segments if shift == ms_shift[-1] else int(duration / shift)
+        starts = torch.arange(count) * shift
+        stamps = torch.stack((starts, starts + window), dim=1)
+        speakers = turn_speakers[torch.searchsorted(turn_ends, stamps.mean(dim=1))]
+        embs.append(
+            centroids[speakers] + noise_sigma / emb_dim ** 0.5 * torch.randn(count, emb_dim, generator=generator)
+        )
+        timestamps.append(stamps)
+        counts.append(count)
+    multiscale_weights = torch.ones(len(ms_window)).unsqueeze(0)
+    return torch.cat(embs), torch.cat(timestamps), torch.tensor(counts), multiscale_weights, speakers
+
+
+def run_clustering(speaker_clustering, session, num_speakers: int, oracle: bool):
+    embs, timestamps, counts, weights, ground_truth = session
+    start = time.perf_counter()
+    labels = speaker_clustering.forward_infer(
+        embeddings_in_scales=embs,
+        timestamps_in_scales=timestamps,
+        multiscale_segment_counts=counts,
+        multiscale_weights=weights,
+        oracle_num_speakers=num_speakers if oracle else -1,
+        max_num_speakers=8,
+        max_rp_threshold=0.15,
+        sparse_search_volume=10,
+    )
+    elapsed = time.perf_counter() - start
+    accuracy = (stitch_cluster_labels(Y_old=ground_truth, Y_new=labels) == ground_truth).float().mean().item()
+    return elapsed, len(set(labels.tolist())), accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sparse and dense speaker clustering on CPU")
+    parser.add_argument("--num_segments", type=int, nargs="+", default=[10000, 20000, 50000, 100000, 200000])
+    parser.add_argument("--num_speakers", type=int, default=4)
+    parser.add_argument("--eig_solver", type=str, default="lobpcg", choices=["lobpcg", "lanczos"])
+    parser.add_argument("--max_neighbors", type=int, default=64)
+    parser.add_argument("--max_dense_segments", type=int, default=10000, help="skip dense clustering above this")
+    parser.add_argument("--oracle_num_speakers", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sparse_clustering = SparseSpeakerClustering(
+        max_neighbors=args.max_neighbors, eig_solver=args.eig_solver, max_dense_segments=0
+    )
+    dense_clustering = SpeakerClustering()
+    print(f"{'segments':>9} {'method':>7} {'time (s)':>9} {'speakers':>8} {'accuracy':>8}")
+    for num_segments in args.num_segments:
+        session = generate_synthetic_session(num_segments, args.num_speakers, seed=args.seed)
+        methods = [('sparse', sparse_clustering)]
+        if num_segments <= args.max_dense_segments:
+            methods.append(('dense', dense_clustering))
+        for name, speaker_clustering in methods:
+            elapsed, est_num_speakers, accuracy = run_clustering(
+                speaker_clustering, session, args.num_speakers, args.oracle_num_speakers
+            )
+            print(f"{num_segments:>9} {name:>7} {elapsed:>9.2f} {est_num_speakers:>8} {accuracy:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the per-sample LCS merge of buffered RNNT inference with the batched merge.
+
+    python benchmark_lcs_merge.py --batch_size 32 --delay 16 --max_steps_per_timestep 5 --chunk_tokens 48
+
+Every step merges one chunk of synthetic token ids per stream, as LongestCommonSubsequenceBatchedFrameASRRNNT does.
+"""
+
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from nemo.collections.asr.parts.utils.streaming_utils import (
+    batched_lcs_alignment_merge_buffer,
+    lcs_alignment_merge_buffer,
+)
+
+
+def make_chunks(rng, batch_size, num_steps, chunk_tokens, overlap_tokens, vocab_size):
+    """Synthetic chunks of token ids, where consecutive chunks of a stream overlap by `overlap_tokens`."""
+    chunks = []
+    for _ in range(batch_size):
+        text = rng.integers(0, vocab_size, size=num_steps * (chunk_tokens - overlap_tokens) + overlap_tokens)
+        step = chunk_tokens - overlap_tokens
+        chunks.append([text[t * step : t * step + chunk_tokens].tolist() for t in range(num_steps)])
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LCS merge of buffered RNNT inference")
+    parser.add_argument('--batch_size', type=int, default=32, help='Number of streams')
+    parser.add_argument('--num_steps', type=int, default=50, help='Number of chunks per stream')
+    parser.add_argument('--chunk_tokens', type=int, default=48, help='Number of tokens per chunk')
+    parser.add_argument('--overlap_tokens', type=int, default=24, help='Number of tokens shared by two chunks')
+    parser.add_argument('--delay', type=int, default=16, help='LCS delay in timesteps')
+    parser.add_argument('--max_steps_per_timestep', type=int, default=5, help='Max symbols per timestep')
+    parser.add_argument('--vocab_size', type=int, default=1024, help='Vocabulary size')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    chunks = make_chunks(rng, args.batch_size, args.num_steps, args.chunk_tokens, args.overlap_tokens, args.vocab_size)
+
+    start = time.perf_counter()
+    reference = [copy.copy(stream[0]) for stream in chunks]
+    for t in range(1, args.num_steps):
+        for b in range(args.batch_size):
+            reference[b] = lcs_alignment_merge_buffer(
+                reference[b], chunks[b][t], args.delay, None, max_steps_per_timestep=args.max_steps_per_timestep
+            )
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    merged = [copy.copy(stream[0]) for stream in chunks]
+    for t in range(1, args.num_steps):
+        merged = batched_lcs_alignment_merge_buffer(
+            merged,
+            [stream[t] for stream in chunks],
+            args.delay,
+            None,
+            max_steps_per_timestep=args.max_steps_per_timestep,
+        )
+    batched_time = time.perf_counter() - start
+
+    if merged != reference:
+        raise RuntimeError("Batched merge does not match the reference merge")
+    print(f"per-sample merge: {reference_time:.3f}s")
+    print(f"batched merge:    {batched_time:.3f}s ({reference_time / batched_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -20,6 +20,8 @@ import torch
 from nemo.collections.asr.parts.utils.asr_confidence_utils import (
     get_confidence_aggregation_bank,
     get_confidence_measure_bank,
+    get_confidence_segment_aggregation_bank,
+    get_span_indices,
 )
 
 # Initialize probability vectors
@@ -140,3 +142,26 @@ class TestConfidenceAggregationBank:
             assert aggregation(AGGREGATION_VEC_SIMPLE) == 1.0
         if aggregation_name == "prod":
             assert aggregation(AGGREGATION_VEC_SIMPLE) == 0.0
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('aggregation_name', aggregation_bank.keys())
+    def test_confidence_segment_aggregation(self, aggregation_name):
+        aggregation = self.aggregation_bank[aggregation_name]
+        segment_aggregation = get_confidence_segment_aggregation_bank()[aggregation_name]
+        confidence = torch.rand(20, dtype=torch.float64)
+        starts = torch.tensor([0, 3, 3, 10, 19])
+        lengths = torch.tensor([3, 1, 7, 9, 1])
+        indices, span_ids = get_span_indices(starts, lengths)
+        result = segment_aggregation(confidence[indices], span_ids, len(lengths))
+
+        expected = [aggregation(confidence[s : s + l].tolist()) for s, l in zip(starts.tolist(), lengths.tolist())]
+        assert torch.allclose(result, torch.tensor(expected, dtype=torch.float64), atol=TOL)
+
+        # empty segments are aggregated as by the per-span functions
+        indices, span_ids = get_span_indices(torch.tensor([0, 5, 7]), torch.tensor([2, 0, 3]))
+        if aggregation_name == "prod":
+            result = segment_aggregation(confidence[indices], span_ids, 3)
+            assert result[1].item() == aggregation([]) == 1.0
+        else:
+            with pytest.raises(ValueError):
+                segment_aggregation(confidence[indices], span_ids, 3)
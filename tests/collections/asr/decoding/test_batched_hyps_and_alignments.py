@@ -12,13 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 from contextlib import contextmanager
 from typing import List
 
 import pytest
 import torch
 
-from nemo.collections.asr.parts.utils.rnnt_utils import BatchedAlignments, BatchedHyps, batched_hyps_to_hypotheses
+from nemo.collections.asr.parts.utils.rnnt_utils import (
+    BatchedAlignments,
+    BatchedBeamHyps,
+    BatchedHyps,
+    batched_beam_hyps_to_hypotheses,
+    batched_hyps_to_hypotheses,
+)
 
 
 @contextmanager
@@ -214,6 +221,84 @@ class TestBatchedHyps:
         assert torch.allclose(hyps.scores, scores)
 
 
+class TestBatchedBeamHyps:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("device", DEVICES)
+    def test_instantiate(self, device: torch.device):
+        hyps = BatchedBeamHyps(batch_size=2, beam_size=3, init_length=4, device=device)
+        assert hyps.transcript.device.type == device.type
+        assert hyps.transcript.shape == (2, 3, 4)
+        # only the empty hypothesis is valid initially
+        assert hyps.scores.tolist() == [[0.0, float('-inf'), float('-inf')]] * 2
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("beam_size", [-1, 0])
+    def test_instantiate_incorrect_beam_size(self, beam_size):
+        with pytest.raises(ValueError):
+            _ = BatchedBeamHyps(batch_size=1, beam_size=beam_size, init_length=3)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("device", DEVICES)
+    def test_add_results_and_select(self, device: torch.device):
+        hyps = BatchedBeamHyps(batch_size=1, beam_size=2, init_length=1, device=device)
+        hyps = hyps.select(torch.tensor([[0, 0]], device=device))
+        hyps.add_results_(
+            labels=torch.tensor([[1, 2]], device=device),
+            time_indices=torch.tensor([[0, 0]], device=device),
+            scores=torch.tensor([[-0.5, -1.0]], device=device),
+        )
+        hyps.add_results_(
+            labels=torch.tensor([[3, 3]], device=device),
+            time_indices=torch.tensor([[1, 2]], device=device),
+            scores=torch.tensor([[-0.5, -0.5]], device=device),
+        )
+        assert hyps.current_lengths.tolist() == [[2, 2]]
+        assert hyps.transcript[:, :, :2].tolist() == [[[1, 3], [2, 3]]]
+        assert hyps.timesteps[:, :, :2].tolist() == [[[0, 1], [0, 2]]]
+        assert hyps.scores[0].tolist() == pytest.approx([-1.0, -1.5])
+
+        selected, beam_indices = hyps.topk(1)
+        assert beam_indices.tolist() == [[0]]
+        assert selected.transcript[0, 0, :2].tolist() == [1, 3]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("device", DEVICES)
+    def test_recombine(self, device: torch.device):
+        hyps = BatchedBeamHyps(batch_size=2, beam_size=1, init_length=2, device=device)
+        hyps = hyps.select(torch.zeros([2, 4], dtype=torch.long, device=device))
+        hyps.add_results_(
+            labels=torch.tensor([[1, 2, 1, 1], [1, 2, 3, 4]], device=device),
+            time_indices=torch.zeros([2, 4], dtype=torch.long, device=device),
+            scores=torch.tensor([[-1.0, -1.0, -2.0, float('-inf')], [-1.0, -2.0, -3.0, -4.0]], device=device),
+        )
+        hyps.recombine_()
+        # equal transcripts are merged into the first hypothesis, invalid hypotheses are ignored
+        assert hyps.scores[0].tolist() == pytest.approx(
+            [math.log(math.exp(-1.0) + math.exp(-2.0)), -1.0, float('-inf'), float('-inf')]
+        )
+        assert hyps.scores[1].tolist() == pytest.approx([-1.0, -2.0, -3.0, -4.0])
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("device", DEVICES)
+    def test_concat_and_replace_masked(self, device: torch.device):
+        hyps = BatchedBeamHyps(batch_size=2, beam_size=1, init_length=1, device=device)
+        other = BatchedBeamHyps(batch_size=2, beam_size=1, init_length=1, device=device)
+        for _ in range(3):
+            other.add_results_(
+                labels=torch.tensor([[1], [2]], device=device),
+                time_indices=torch.tensor([[0], [0]], device=device),
+                scores=torch.tensor([[-1.0], [-1.0]], device=device),
+            )
+        concatenated = hyps.concat(other)
+        assert concatenated.current_lengths.tolist() == [[0, 3], [0, 3]]
+        assert concatenated.scores.tolist() == [[0.0, -3.0], [0.0, -3.0]]
+
+        hyps.replace_masked_(other, torch.tensor([False, True], device=device))
+        assert hyps.current_lengths.tolist() == [[0], [3]]
+        assert hyps.transcript[1, 0, :3].tolist() == [2, 2, 2]
+        assert hyps.scores.tolist() == [[0.0], [-3.0]]
+
+
 class TestBatchedAlignments:
     @pytest.mark.unit
     @pytest.mark.parametrize("device", DEVICES)
@@ -466,3 +551,22 @@ class TestConvertToHypotheses:
                 for step, (label, current_logits) in enumerate(group_for_timestep):
                     assert torch.allclose(hypotheses[batch_i].alignments[t][step][0], current_logits)
                     assert hypotheses[batch_i].alignments[t][step][1] == label
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("device", DEVICES)
+    @pytest.mark.parametrize("score_norm", [True, False])
+    def test_convert_beam_hyps_to_hypotheses(self, device: torch.device, score_norm: bool):
+        hyps = BatchedBeamHyps(batch_size=1, beam_size=1, init_length=1, device=device)
+        hyps = hyps.select(torch.tensor([[0, 0, 0]], device=device))
+        hyps.add_results_(
+            labels=torch.tensor([[1, 2, 3]], device=device),
+            time_indices=torch.tensor([[0, 1, 1]], device=device),
+            scores=torch.tensor([[-2.0, -1.5, float('-inf')]], device=device),
+        )
+        hyps = hyps.concat(BatchedBeamHyps(batch_size=1, beam_size=1, init_length=1, device=device))
+        hyps.scores[0, -1] = -1.8
+        nbest = batched_beam_hyps_to_hypotheses(hyps, score_norm=score_norm)[0].n_best_hypotheses
+        # invalid hypotheses are skipped, normalization uses the length including the start of sequence
+        assert [hyp.y_sequence.tolist() for hyp in nbest] == ([[2], [1], []] if score_norm else [[2], [], [1]])
+        assert nbest[0].score == pytest.approx(-1.5)
+        assert nbest[0].timestep.tolist() == [1]
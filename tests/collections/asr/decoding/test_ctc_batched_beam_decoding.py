@@ -0,0 +1,216 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+import numpy as np
+import pytest
+import torch
+
+from nemo.collections.asr.parts.submodules.ctc_batched_beam_decoding import (
+    TokenNGramLM,
+    batched_ctc_prefix_beam_search,
+)
+from nemo.collections.asr.parts.submodules.ctc_decoding import CTCDecoding, CTCDecodingConfig
+
+VOCAB = ['a', 'b', 'c', 'd']
+
+ARPA = """
+\\data\\
+ngram 1=7
+ngram 2=7
+ngram 3=3
+
+\\1-grams:
+-1.0\t<unk>
+-99\t<s>\t-0.5
+-0.7\t</s>
+-0.6\ta\t-0.3
+-0.8\tb\t-0.2
+-0.9\tc\t-0.4
+-0.5\tz
+
+\\2-grams:
+-0.3\t<s> a\t-0.1
+-0.4\ta b\t-0.2
+-0.5\tb a
+-0.2\tb </s>
+-0.6\ta c\t-0.3
+-0.3\tc a
+-0.1\tz a
+
+\\3-grams:
+-0.1\t<s> a b
+-0.2\ta b a
+-0.05\ta c a
+
+\\end\\
+"""
+
+
+def read_reference_arpa(path):
+    ngrams, order = {}, None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('\\'):
+                order = int(line[1]) if line.endswith('-grams:') else None
+            elif line and order is not None:
+                fields = line.split()
+                backoff = float(fields[order + 1]) if len(fields) > order + 1 else 0.0
+                ngrams[tuple(fields[1 : order + 1])] = (float(fields[0]), backoff)
+    return ngrams
+
+
+def reference_lm_score(ngrams, context, word):
+    """Natural log probability of `word` after `context` with ARPA backoff."""
+    context = tuple(context[-2:])
+    backoff = 0.0
+    for start in range(len(context) + 1):
+        ngram = context[start:] + (word,)
+        if ngram in ngrams:
+            return (backoff + ngrams[ngram][0]) * math.log(10)
+        backoff += ngrams.get(context[start:], (0.0, 0.0))[1]
+    return (backoff + ngrams[('<unk>',)][0]) * math.log(10)
+
+
+def reference_prefix_beam_search(log_probs, beam_size, ngrams=None, alpha=1.0, beta=0.0):
+    """Textbook CTC prefix beam search with the blank as the last label."""
+    blank = log_probs.shape[1] - 1
+
+    def lm_score(prefix):
+        if ngrams is None:
+            return 0.0
+        words = ['<s>'] + [VOCAB[label] for label in prefix]
+        return sum(reference_lm_score(ngrams, words[: i + 1], words[i + 1]) for i in range(len(prefix)))
+
+    def score(prefix, probs):
+        return np.logaddexp(*probs) + alpha * lm_score(prefix) + beta * len(prefix)
+
+    beams = {(): (0.0, -np.inf)}
+    for frame in log_probs.tolist():
+        candidates = {}
+
+        def add(prefix, p_b, p_nb):
+            old_b, old_nb = candidates.get(prefix, (-np.inf, -np.inf))
+            candidates[prefix] = (np.logaddexp(old_b, p_b), np.logaddexp(old_nb, p_nb))
+
+        for prefix, (p_b, p_nb) in beams.items():
+            p_total = np.logaddexp(p_b, p_nb)
+            add(prefix, p_total + frame[blank], -np.inf)
+            if prefix:
+                add(prefix, -np.inf, p_nb + frame[prefix[-1]])
+            for label in range(blank):
+                if prefix and prefix[-1] == label:
+                    add(prefix + (label,), -np.inf, p_b + frame[label])
+                else:
+                    add(prefix + (label,), -np.inf, p_total + frame[label])
+        beams = dict(sorted(candidates.items(), key=lambda kv: -score(*kv))[:beam_size])
+
+    results = []
+    for prefix, probs in beams.items():
+        final = score(prefix, probs)
+        if ngrams is not None:
+            words = ['<s>'] + [VOCAB[label] for label in prefix]
+            final += alpha * reference_lm_score(ngrams, words, '</s>')
+        results.append((final, list(prefix)))
+    return sorted(results, key=lambda x: -x[0])
+
+
+@pytest.fixture()
+def arpa_path(tmp_path):
+    path = str(tmp_path / 'lm.arpa')
+    with open(path, 'w') as f:
+        f.write(ARPA)
+    return path
+
+
+def random_log_probs(batch_size, max_time, num_classes, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    logits = torch.randn(batch_size, max_time, num_classes, generator=generator) * 3
+    return torch.log_softmax(logits, dim=-1)
+
+
+class TestTokenNGramLM:
+    @pytest.mark.unit
+    def test_scores_match_arpa_backoff(self, arpa_path):
+        lm = TokenNGramLM.from_arpa(arpa_path, {symbol: idx for idx, symbol in enumerate(VOCAB)})
+        ngrams = read_reference_arpa(arpa_path)
+        assert lm.order == 3 and lm.vocab_size == len(VOCAB)
+
+        # follow every sequence of up to 3 tokens from <s> and compare all continuations
+        words = VOCAB + ['</s>']
+        sequences = [[]] + [[w] for w in VOCAB]
+        sequences += [s + [w] for s in sequences[1:] for w in VOCAB]
+        sequences += [s + [w] for s in sequences[5:] for w in VOCAB]
+        for sequence in sequences:
+            state = torch.tensor([lm.bos_state])
+            for word in sequence:
+                _, next_states = lm.score_all(state)
+                state = next_states[:, VOCAB.index(word)]
+            scores, _ = lm.score_all(state)
+            context = ['<s>'] + sequence
+            expected = [reference_lm_score(ngrams, context, word) for word in words]
+            np.testing.assert_allclose(scores[0].numpy(), expected, rtol=1e-5, err_msg=str(sequence))
+
+
+class TestBatchedCTCPrefixBeamSearch:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('beam_size', [1, 4, 8])
+    def test_matches_reference(self, beam_size):
+        log_probs = random_log_probs(3, 12, len(VOCAB) + 1)
+        lengths = torch.tensor([12, 7, 1])
+        results = batched_ctc_prefix_beam_search(log_probs, lengths, blank_id=len(VOCAB), beam_size=beam_size)
+        for b in range(3):
+            expected = reference_prefix_beam_search(log_probs[b, : lengths[b]], beam_size)
+            assert [tokens for _, tokens in results[b]] == [tokens for _, tokens in expected]
+            np.testing.assert_allclose([s for s, _ in results[b]], [s for s, _ in expected], rtol=1e-4)
+
+    @pytest.mark.unit
+    def test_matches_reference_with_lm(self, arpa_path):
+        lm = TokenNGramLM.from_arpa(arpa_path, {symbol: idx for idx, symbol in enumerate(VOCAB)})
+        ngrams = read_reference_arpa(arpa_path)
+        log_probs = random_log_probs(4, 10, len(VOCAB) + 1, seed=1)
+        lengths = torch.tensor([10, 10, 6, 3])
+        results = batched_ctc_prefix_beam_search(
+            log_probs, lengths, blank_id=len(VOCAB), beam_size=6, lm=lm, beam_alpha=0.5, beam_beta=1.0
+        )
+        for b in range(4):
+            expected = reference_prefix_beam_search(log_probs[b, : lengths[b]], 6, ngrams, alpha=0.5, beta=1.0)
+            assert [tokens for _, tokens in results[b]] == [tokens for _, tokens in expected]
+            np.testing.assert_allclose([s for s, _ in results[b]], [s for s, _ in expected], rtol=1e-4)
+
+    @pytest.mark.unit
+    def test_batch_independence(self):
+        log_probs = random_log_probs(5, 20, 9, seed=2)
+        lengths = torch.tensor([20, 3, 17, 11, 20])
+        batched = batched_ctc_prefix_beam_search(log_probs, lengths, blank_id=8, beam_size=4)
+        for b in range(5):
+            single = batched_ctc_prefix_beam_search(log_probs[b : b + 1, : lengths[b]], lengths[b : b + 1], 8, 4)
+            assert [tokens for _, tokens in single[0]] == [tokens for _, tokens in batched[b]]
+            np.testing.assert_allclose([s for s, _ in single[0]], [s for s, _ in batched[b]], rtol=1e-5)
+
+    @pytest.mark.unit
+    def test_ctc_decoding_strategy(self, arpa_path):
+        cfg = CTCDecodingConfig(strategy='beam')
+        cfg.beam.search_type = 'batched'
+        cfg.beam.beam_size = 4
+        cfg.beam.kenlm_path = arpa_path
+        decoding = CTCDecoding(decoding_cfg=cfg, vocabulary=VOCAB)
+
+        # peaky outputs: the beam search finds the greedy transcript
+        labels = torch.tensor([[0, 0, 4, 1, 4, 1, 2, 4], [2, 4, 4, 0, 3, 3, 4, 4]])
+        log_probs = torch.log_softmax(torch.nn.functional.one_hot(labels, len(VOCAB) + 1).float() * 20, dim=-1)
+        texts, _ = decoding.ctc_decoder_predictions_tensor(log_probs, torch.tensor([8, 6]))
+        assert texts == ['abbc', 'cad']
@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
+import random
 from functools import lru_cache
 
 import pytest
@@ -75,6 +77,46 @@ def check_subword_timestamps(hyp: Hypothesis, decoding: CTCBPEDecoding):
     assert len(chars) == len(all_chars)
 
 
+def make_ctc_hypotheses(blank_id, num_hyps, max_frames=12, seed=0):
+    """Random greedy CTC hypotheses with frame confidence, the first one is empty and the second one all blank."""
+    rng = random.Random(seed)
+    hypotheses = []
+    for n in range(num_hyps):
+        num_frames = 0 if n == 0 else rng.randint(1, max_frames)
+        if n == 1:
+            labels = [blank_id] * num_frames
+        else:
+            labels = [
+                rng.choice([blank_id, rng.randrange(blank_id), rng.randrange(blank_id)]) for _ in range(num_frames)
+            ]
+        hyp = Hypothesis(score=0.0, y_sequence=torch.tensor(labels, dtype=torch.long), length=num_frames)
+        hyp.frame_confidence = [rng.random() for _ in range(num_frames)]
+        hyp.timestep = [t for t, label in enumerate(labels) if label != blank_id]
+        hypotheses.append(hyp)
+    return hypotheses
+
+
+def reference_ctc_token_confidence(decoding, hyp):
+    """Per-hypothesis token confidence aggregation of `compute_confidence` before it was batched."""
+    token_repetitions = hyp.text[2]
+    token_confidence = []
+    if decoding.exclude_blank_from_confidence:
+        non_blank_frame_confidence = hyp.non_blank_frame_confidence
+        i = 0
+        for tr in token_repetitions:
+            j = i + tr
+            token_confidence.append(decoding._aggregate_confidence(non_blank_frame_confidence[i:j]))
+            i = j
+    else:
+        token_lengths = hyp.text[1]
+        if len(token_lengths) > 0:
+            ts = token_lengths[0]
+            for tl in token_lengths[1:] + [len(hyp.frame_confidence)]:
+                token_confidence.append(decoding._aggregate_confidence(hyp.frame_confidence[ts : ts + tl]))
+                ts += tl
+    return token_confidence
+
+
 class TestCTCDecoding:
     @pytest.mark.unit
     def test_constructor(self):
@@ -342,3 +384,32 @@ class TestCTCDecoding:
                 assert torch.all(hyp.y_sequence == batched_hyp.y_sequence)
                 if timestamps:
                     assert hyp.timestep == batched_hyp.timestep
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('exclude_blank', [True, False])
+    @pytest.mark.parametrize('aggregation', ['min', 'max', 'mean', 'prod'])
+    def test_compute_confidence_matches_per_hypothesis(self, exclude_blank, aggregation):
+        confidence_cfg = ConfidenceConfig(
+            preserve_frame_confidence=True,
+            preserve_token_confidence=True,
+            preserve_word_confidence=True,
+            exclude_blank=exclude_blank,
+            aggregation=aggregation,
+        )
+        cfg = CTCDecodingConfig(strategy='greedy', compute_timestamps=True, confidence_cfg=confidence_cfg)
+        decoding = CTCDecoding(decoding_cfg=cfg, vocabulary=char_vocabulary())
+
+        hypotheses = decoding.decode_hypothesis(make_ctc_hypotheses(decoding.blank_id, 16), fold_consecutive=True)
+        expected = copy.deepcopy(hypotheses)
+        for hyp in expected:
+            hyp.token_confidence = reference_ctc_token_confidence(decoding, hyp)
+            hyp.text = hyp.text[:2]
+            hyp.word_confidence = decoding._aggregate_token_confidence(hyp)
+
+        hypotheses = decoding.compute_confidence(hypotheses)
+        assert hypotheses[0].token_confidence == hypotheses[0].word_confidence == []
+        assert hypotheses[1].token_confidence == hypotheses[1].word_confidence == []
+        for hyp, expected_hyp in zip(hypotheses, expected):
+            assert hyp.text == expected_hyp.text
+            assert hyp.token_confidence == pytest.approx(expected_hyp.token_confidence, abs=1e-12)
+            assert hyp.word_confidence == pytest.approx(expected_hyp.word_confidence, abs=1e-12)
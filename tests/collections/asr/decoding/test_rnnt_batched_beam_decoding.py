@@ -0,0 +1,139 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import torch
+
+from nemo.collections.asr.modules import RNNTDecoder, RNNTJoint, StatelessTransducerDecoder
+from nemo.collections.asr.parts.submodules.rnnt_batched_beam_decoding import ModifiedAESBatchedRNNTComputer
+from nemo.collections.asr.parts.submodules.rnnt_beam_decoding import BeamRNNTInfer
+from nemo.collections.asr.parts.submodules.rnnt_decoding import RNNTDecoding, RNNTDecodingConfig
+from nemo.collections.asr.parts.utils import rnnt_utils
+
+VOCAB = [' ', 'a', 'b', 'c', 'd', 'e', 'f']
+HIDDEN = 8
+
+
+def get_decoder_and_joint(stateless: bool):
+    torch.manual_seed(0)
+    prednet_cfg = {'pred_hidden': HIDDEN, 'pred_rnn_layers': 1}
+    if stateless:
+        decoder = StatelessTransducerDecoder(prednet=prednet_cfg, vocab_size=len(VOCAB), context_size=2)
+    else:
+        decoder = RNNTDecoder(prednet=prednet_cfg, vocab_size=len(VOCAB))
+    jointnet_cfg = {'encoder_hidden': HIDDEN, 'pred_hidden': HIDDEN, 'joint_hidden': HIDDEN, 'activation': 'relu'}
+    joint = RNNTJoint(jointnet_cfg, len(VOCAB))
+    decoder.freeze()
+    joint.freeze()
+    return decoder, joint
+
+
+def get_encoder_output(batch_size, max_time, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(batch_size, HIDDEN, max_time, generator=generator) * 2
+
+
+def as_lists(nbest_hyps: rnnt_utils.NBestHypotheses):
+    return [hyp.y_sequence.tolist() for hyp in nbest_hyps.n_best_hypotheses]
+
+
+class TestModifiedAESBatched:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('stateless', [False, True])
+    @pytest.mark.parametrize('beam_size', [2, 4])
+    def test_batch_independence(self, stateless, beam_size):
+        decoder, joint = get_decoder_and_joint(stateless)
+        encoder_output = get_encoder_output(5, 20)
+        lengths = torch.tensor([20, 1, 13, 20, 7])
+        search = BeamRNNTInfer(
+            decoder, joint, beam_size=beam_size, search_type='maes_batch', return_best_hypothesis=False
+        )
+        batched = search(encoder_output=encoder_output, encoded_lengths=lengths)[0]
+        for b in range(5):
+            single = search(
+                encoder_output=encoder_output[b : b + 1, :, : lengths[b]], encoded_lengths=lengths[b : b + 1]
+            )
+            assert as_lists(single[0][0]) == as_lists(batched[b])
+            scores = [hyp.score for hyp in single[0][0].n_best_hypotheses]
+            assert scores == pytest.approx([hyp.score for hyp in batched[b].n_best_hypotheses], abs=1e-4)
+
+    @pytest.mark.unit
+    def test_hypotheses(self):
+        decoder, joint = get_decoder_and_joint(stateless=False)
+        encoder_output = get_encoder_output(3, 15, seed=1)
+        lengths = torch.tensor([15, 10, 4])
+        search = BeamRNNTInfer(decoder, joint, beam_size=4, search_type='maes_batch', return_best_hypothesis=False)
+        nbest = search(encoder_output=encoder_output, encoded_lengths=lengths)[0]
+        for b in range(3):
+            transcripts = as_lists(nbest[b])
+            # hypotheses with equal transcripts are recombined
+            assert len(transcripts) == len(set(map(tuple, transcripts))) <= 4
+            norm_scores = [hyp.score / (len(hyp.y_sequence) + 1) for hyp in nbest[b].n_best_hypotheses]
+            assert norm_scores == sorted(norm_scores, reverse=True)
+            for hyp in nbest[b].n_best_hypotheses:
+                assert len(hyp.timestep) == len(hyp.y_sequence)
+                assert all(0 <= t < lengths[b] for t in hyp.timestep.tolist())
+                assert all(label < len(VOCAB) for label in hyp.y_sequence.tolist())
+
+    @pytest.mark.unit
+    def test_expansions_bounded_by_steps(self):
+        decoder, joint = get_decoder_and_joint(stateless=False)
+        encoder_output = get_encoder_output(2, 6, seed=2).transpose(1, 2)
+        computer = ModifiedAESBatchedRNNTComputer(decoder, joint, beam_size=3, maes_num_steps=2)
+        hyps = computer(encoder_output, torch.tensor([6, 3]))
+        valid = hyps.scores > float('-inf')
+        # at most `maes_num_steps` labels are emitted per frame
+        assert (hyps.current_lengths[valid] <= 12).all()
+        assert (hyps.current_lengths[1][valid[1]] <= 6).all()
+
+    @pytest.mark.unit
+    def test_unsupported_options(self):
+        decoder, joint = get_decoder_and_joint(stateless=False)
+        with pytest.raises(NotImplementedError):
+            BeamRNNTInfer(decoder, joint, beam_size=2, search_type='maes_batch', preserve_alignments=True)
+        search = BeamRNNTInfer(decoder, joint, beam_size=2, search_type='maes_batch')
+        with pytest.raises(NotImplementedError):
+            search(
+                encoder_output=get_encoder_output(1, 3),
+                encoded_lengths=torch.tensor([3]),
+                partial_hypotheses=[rnnt_utils.Hypothesis(score=0.0, y_sequence=[])],
+            )
+
+    @pytest.mark.unit
+    def test_rnnt_decoding_strategy(self):
+        decoder, joint = get_decoder_and_joint(stateless=False)
+        cfg = RNNTDecodingConfig(strategy='maes_batch')
+        cfg.beam.beam_size = 3
+        decoding = RNNTDecoding(decoding_cfg=cfg, decoder=decoder, joint=joint, vocabulary=VOCAB)
+        encoder_output = get_encoder_output(2, 10, seed=3)
+        lengths = torch.tensor([10, 6])
+        texts, _ = decoding.rnnt_decoder_predictions_tensor(encoder_output=encoder_output, encoded_lengths=lengths)
+
+        search = BeamRNNTInfer(decoder, joint, beam_size=3, search_type='maes_batch')
+        best_hyps = search(encoder_output=encoder_output, encoded_lengths=lengths)[0]
+        assert texts == [''.join(VOCAB[label] for label in hyp.y_sequence.tolist()) for hyp in best_hyps]
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "option", [dict(ngram_lm_model='lm.arpa', ngram_lm_alpha=0.3), dict(hat_subtract_ilm=True)]
+    )
+    def test_rnnt_decoding_strategy_unsupported_options(self, option):
+        decoder, joint = get_decoder_and_joint(stateless=False)
+        cfg = RNNTDecodingConfig(strategy='maes_batch')
+        cfg.beam.beam_size = 3
+        for key, value in option.items():
+            setattr(cfg.beam, key, value)
+        # the options are passed through and rejected, not ignored
+        with pytest.raises(NotImplementedError):
+            RNNTDecoding(decoding_cfg=cfg, decoder=decoder, joint=joint, vocabulary=VOCAB)
@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
+import random
 from functools import lru_cache
 
 import pytest
@@ -26,6 +28,7 @@ from nemo.collections.asr.parts.submodules import rnnt_beam_decoding as beam_dec
 from nemo.collections.asr.parts.submodules import rnnt_greedy_decoding as greedy_decode
 from nemo.collections.asr.parts.submodules.rnnt_decoding import RNNTBPEDecoding, RNNTDecoding, RNNTDecodingConfig
 from nemo.collections.asr.parts.utils import rnnt_utils
+from nemo.collections.asr.parts.utils.asr_confidence_utils import ConfidenceConfig
 from nemo.core.utils import numba_utils
 from nemo.core.utils.numba_utils import __NUMBA_MINIMUM_VERSION__
 
@@ -117,6 +120,49 @@ def decode_text_from_nbest_hypotheses(hyps, decoding):
     return hypotheses, all_hypotheses
 
 
+def make_rnnt_hypotheses(vocab_size, num_hyps, max_frames=10, seed=0):
+    """
+    Random RNNT hypotheses with up to 3 tokens per frame and frame confidence of every emitted token and the final
+    blank of every frame. The first hypothesis is empty and the second one only emits blanks.
+    """
+    rng = random.Random(seed)
+    hypotheses = []
+    for n in range(num_hyps):
+        num_frames = 0 if n == 0 else rng.randint(1, max_frames)
+        labels, timestep, frame_confidence = [], [], []
+        for t in range(num_frames):
+            num_tokens = 0 if n == 1 else rng.choice([0, 0, 1, 1, 2, 3])
+            labels += [rng.randrange(vocab_size) for _ in range(num_tokens)]
+            timestep += [t] * num_tokens
+            frame_confidence.append([rng.random() for _ in range(num_tokens + 1)])
+        hyp = rnnt_utils.Hypothesis(score=0.0, y_sequence=torch.tensor(labels, dtype=torch.long), length=num_frames)
+        hyp.timestep = timestep
+        hyp.frame_confidence = frame_confidence
+        hypotheses.append(hyp)
+    return hypotheses
+
+
+def reference_rnnt_token_confidence(decoding, hyp):
+    """Per-hypothesis token confidence aggregation of `compute_confidence` before it was batched."""
+    if decoding.exclude_blank_from_confidence:
+        return hyp.non_blank_frame_confidence
+    offset = 0
+    token_confidence = []
+    if len(hyp.timestep) > 0:
+        for ts, te in zip(hyp.timestep, hyp.timestep[1:] + [len(hyp.frame_confidence)]):
+            if ts != te:
+                token_confidence.append(
+                    decoding._aggregate_confidence(
+                        [hyp.frame_confidence[ts][offset]] + [fc[0] for fc in hyp.frame_confidence[ts + 1 : te]]
+                    )
+                )
+                offset = 0
+            else:
+                token_confidence.append(hyp.frame_confidence[ts][offset])
+                offset += 1
+    return token_confidence
+
+
 class TestRNNTDecoding:
     @pytest.mark.unit
     def test_constructor(self):
@@ -309,3 +355,99 @@ class TestRNNTDecoding:
                 assert len(hyp_.timestep) > 0
                 print("Timesteps", hyp_.timestep)
                 print()
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('exclude_blank', [True, False])
+    @pytest.mark.parametrize('aggregation', ['min', 'max', 'mean', 'prod'])
+    def test_compute_confidence_matches_per_hypothesis(self, exclude_blank, aggregation):
+        confidence_cfg = ConfidenceConfig(
+            preserve_frame_confidence=True,
+            preserve_token_confidence=True,
+            preserve_word_confidence=True,
+            exclude_blank=exclude_blank,
+            aggregation=aggregation,
+        )
+        cfg = RNNTDecodingConfig(strategy='greedy_batch', confidence_cfg=confidence_cfg)
+        vocab = char_vocabulary()
+        decoder = get_rnnt_decoder(vocab_size=len(vocab))
+        joint = get_rnnt_joint(vocab_size=len(vocab))
+        decoding = RNNTDecoding(decoding_cfg=cfg, decoder=decoder, joint=joint, vocabulary=vocab)
+
+        hypotheses = decoding.decode_hypothesis(make_rnnt_hypotheses(len(vocab), 16))
+        expected = copy.deepcopy(hypotheses)
+        for hyp in expected:
+            hyp.token_confidence = reference_rnnt_token_confidence(decoding, hyp)
+            hyp.word_confidence = decoding._aggregate_token_confidence(hyp)
+        # batched greedy decoding stores the timesteps as a tensor
+        for hyp in hypotheses[::2]:
+            hyp.timestep = torch.tensor(hyp.timestep, dtype=torch.long)
+
+        hypotheses = decoding.compute_confidence(hypotheses)
+        assert hypotheses[0].token_confidence == hypotheses[0].word_confidence == []
+        assert hypotheses[1].token_confidence == hypotheses[1].word_confidence == []
+        for hyp, expected_hyp in zip(hypotheses, expected):
+            assert hyp.token_confidence == pytest.approx(expected_hyp.token_confidence, abs=1e-12)
+            assert hyp.word_confidence == pytest.approx(expected_hyp.word_confidence, abs=1e-12)
+
+
+class TestDecoderStateCache:
+    @pytest.mark.unit
+    def test_lru_eviction_and_counters(self):
+        cache = rnnt_utils.DecoderStateCache(max_size=2)
+        cache[(1,)] = 'a'
+        cache[(1, 2)] = 'b'
+        assert (1,) in cache  # (1,) becomes the most recently used prefix
+        cache[(1, 3)] = 'c'
+        assert (1, 2) not in cache
+        assert (1,) in cache and cache[(1,)] == 'a'
+        assert cache.stats() == dict(hits=2, misses=1, evictions=1, size=2, hit_rate=pytest.approx(2 / 3))
+
+        cache.clear()
+        assert len(cache) == 0 and cache.hits == 2
+        cache.reset_stats()
+        assert cache.hit_rate == 0.0
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("max_size", [-1, 0])
+    def test_incorrect_max_size(self, max_size):
+        with pytest.raises(ValueError):
+            rnnt_utils.DecoderStateCache(max_size=max_size)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("search_type", ["default", "maes"])
+    @pytest.mark.parametrize("decoder_cache_size", [None, 4])
+    def test_beam_search_with_shared_cache(self, search_type, decoder_cache_size):
+        vocab = char_vocabulary()
+        decoder = get_rnnt_decoder(vocab_size=len(vocab))
+        joint = get_rnnt_joint(vocab_size=len(vocab))
+        beam = beam_decode.BeamRNNTInfer(
+            decoder,
+            joint,
+            beam_size=3,
+            search_type=search_type,
+            return_best_hypothesis=False,
+            decoder_cache_size=decoder_cache_size,
+        )
+        torch.manual_seed(1)
+        encoded = torch.randn(3, 4, 8)
+        encoded_len = torch.tensor([8, 5, 3])
+
+        # the cache is shared by all samples of the batch, results must not depend on the batch composition
+        hyps = beam(encoder_output=encoded, encoded_lengths=encoded_len)[0]
+        stats = beam.decoder_cache.stats()
+        assert stats['hits'] + stats['misses'] > 0
+        if decoder_cache_size is not None:
+            assert stats['size'] <= decoder_cache_size
+        # the counts of every sample are attached to its hypotheses and add up to the counts of the batch
+        sample_stats = [nbest.n_best_hypotheses[0].decoder_cache_stats for nbest in hyps]
+        for nbest, counts in zip(hyps, sample_stats):
+            assert all(hyp.decoder_cache_stats == counts for hyp in nbest.n_best_hypotheses)
+        for key in ('hits', 'misses', 'evictions'):
+            assert sum(counts[key] for counts in sample_stats) == stats[key]
+        for idx in range(3):
+            single_hyps = beam(
+                encoder_output=encoded[idx : idx + 1, :, : encoded_len[idx]],
+                encoded_lengths=encoded_len[idx : idx + 1],
+            )[0]
+            expected = [hyp.y_sequence.tolist() for hyp in single_hyps[0].n_best_hypotheses]
+            assert [hyp.y_sequence.tolist() for hyp in hyps[idx].n_best_hypotheses] == expected
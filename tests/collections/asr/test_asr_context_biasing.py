@@ -27,6 +27,40 @@ from nemo.collections.asr.parts.context_biasing.ctc_based_word_spotter import WS
 from nemo.collections.asr.parts.utils import rnnt_utils
 
 
+class MockTokenizer:
+    """Tokens with ids divisible by 4 start a word."""
+
+    def ids_to_tokens(self, ids):
+        return [('▁' if idx % 4 == 0 else '') + f't{idx}' for idx in ids]
+
+
+class MockASRModel:
+    tokenizer = MockTokenizer()
+
+
+def generate_word_spotting_data(seed, vocab_size=64, num_words=50, num_frames=200):
+    """Context biasing words and CTC logprobs with some of the words (and random tokens) over mostly blank frames."""
+    rng = np.random.default_rng(seed)
+    context_biasing_list = []
+    for w in range(num_words):
+        tokens = [int(rng.integers(0, vocab_size // 4)) * 4] + rng.integers(0, vocab_size, rng.integers(1, 5)).tolist()
+        context_biasing_list.append([f'word{w}', [tokens]])
+    logits = rng.normal(size=(num_frames, vocab_size + 1))
+    logits[:, vocab_size] += 4
+    frame = 0
+    while frame < num_frames - 20:
+        frame += int(rng.integers(3, 15))
+        if rng.random() < 0.5:
+            tokens = context_biasing_list[rng.integers(num_words)][1][0]
+        else:
+            tokens = rng.integers(0, vocab_size, 3).tolist()
+        for token in tokens:
+            logits[frame, token] += rng.uniform(4, 9)
+            frame += int(rng.integers(1, 3))
+    logprobs = torch.log_softmax(torch.tensor(logits, dtype=torch.float32), dim=-1).numpy()
+    return context_biasing_list, logprobs
+
+
 @pytest.fixture(scope="module")
 def conformer_ctc_bpe_model():
     model = EncDecCTCModelBPE.from_pretrained(model_name="stt_en_conformer_ctc_small")
@@ -49,6 +83,104 @@ class TestContextGraphCTC:
         assert context_graph.root.next['▁g'].next['▁p'].next['▁u'].is_end
         assert context_graph.root.next['▁g'].next['▁p'].next['▁u'].word == 'gpu'
 
+    @pytest.mark.unit
+    def test_csr_graph_building(self):
+        context_biasing_list = [["gp", [[1, 2]]], ["gpu", [[1, 2, 3], [1, 4, 5]]], ["aa", [[6, 6]]]]
+        context_graph = context_biasing.ContextGraphCTC(blank_id=10)
+        context_graph.add_to_graph(context_biasing_list)
+        csr_graph = context_biasing.CSRContextGraph.from_context_graph(context_graph)
+        assert csr_graph.num_states == context_graph.num_nodes + 1
+        assert csr_graph.blank_id == 10
+        assert sorted(csr_graph.words) == ["aa", "gp", "gpu"]
+
+        # walk the CSR arrays along the same paths as the context graph
+        def walk(tokens):
+            csr_state, state = 0, context_graph.root
+            for token in tokens:
+                transitions = slice(csr_graph.row_ptr[csr_state], csr_graph.row_ptr[csr_state + 1])
+                assert csr_graph.tokens[transitions].tolist() == list(state.next)
+                csr_state = csr_graph.next_states[transitions][list(state.next).index(token)]
+                state = state.next[token]
+                assert csr_graph.is_end[csr_state] == state.is_end
+            return csr_state
+
+        for tokens, word in [
+            ([1, 2, 3], "gpu"),
+            ([1, 10, 4, 5], "gpu"),
+            ([1, 2, 2], "gp"),
+            ([1, 2, 10, 3], "gpu"),
+            ([6, 10, 6], "aa"),
+        ]:
+            assert csr_graph.words[csr_graph.word_ids[walk(tokens)]] == word
+        assert csr_graph.word_ids[walk([1, 10])] == -1
+
+        context_graph = context_biasing.ContextGraphCTC(blank_id=1024)
+        context_graph.add_to_graph([["gpu", [['▁g', 'p', 'u']]]])
+        with pytest.raises(ValueError):
+            context_biasing.CSRContextGraph.from_context_graph(context_graph)
+
+
+class TestCompiledContextGraph:
+    @pytest.mark.unit
+    def test_incremental_updates(self, tmp_path):
+        vocab_size = 64
+        asr_model = MockASRModel()
+        context_biasing_list, logprobs = generate_word_spotting_data(0, vocab_size, num_words=100)
+        context_biasing_list += [["aab", [[8, 8, 5], [8, 5, 5]]], ["word1", [[4, 4, 4]]]]
+
+        def spot(context_graph):
+            return context_biasing.run_word_spotter_batch([logprobs], context_graph, asr_model, blank_idx=vocab_size)[0]
+
+        def reference(word_items):
+            context_graph = context_biasing.ContextGraphCTC(blank_id=vocab_size)
+            context_graph.add_to_graph(word_items)
+            return context_graph
+
+        compiled_graph = context_biasing.CompiledContextGraph.empty(blank_id=vocab_size, metadata={'model': 'mock'})
+        for start in range(0, len(context_biasing_list), 30):
+            compiled_graph.insert(context_biasing_list[start : start + 30])
+        context_graph = reference(context_biasing_list)
+        assert compiled_graph.num_states == context_graph.num_nodes + 1
+        assert compiled_graph.num_phrases == 103
+        assert compiled_graph.revision == 4
+        ws_results = spot(context_graph)
+        assert len(ws_results) > 0
+        assert spot(compiled_graph) == ws_results
+
+        path = str(tmp_path / 'graph')
+        assert not context_biasing.CompiledContextGraph.exists(path)
+        compiled_graph.save(path)
+        loaded_graph = context_biasing.CompiledContextGraph.load(path)
+        assert isinstance(loaded_graph.tokens, np.memmap)
+        assert loaded_graph.revision == 4
+        assert loaded_graph.metadata == {'model': 'mock'}
+        assert list(loaded_graph.phrases()) == list(compiled_graph.phrases())
+        assert spot(loaded_graph) == ws_results
+
+        # delete the spotted words and a word with several tokenizations, then save a new revision
+        deleted_words = {hyp.word for hyp in ws_results} | {"aab"}
+        loaded_graph.delete(deleted_words)
+        loaded_graph.save(path)
+        loaded_graph = context_biasing.CompiledContextGraph.load(path)
+        assert loaded_graph.revision == 5
+        remaining = [[word, [tokens]] for word, tokens in compiled_graph.phrases() if word not in deleted_words]
+        assert loaded_graph.num_states == reference(remaining).num_nodes + 1
+        assert not set(loaded_graph.words) & deleted_words
+        assert spot(loaded_graph) == spot(reference(remaining))
+        assert len([name for name in os.listdir(path) if name.startswith('rev-')]) == 2
+
+        # a graph rebuilt from scratch continues the revision numbers, older revisions are removed
+        rebuilt_graph = context_biasing.CompiledContextGraph.empty(blank_id=vocab_size, metadata={'model': 'other'})
+        rebuilt_graph.insert(context_biasing_list[:10])
+        rebuilt_graph.save(path)
+        assert rebuilt_graph.revision == 6
+        rebuilt_graph.insert(context_biasing_list[10:20])
+        rebuilt_graph.save(path)
+        loaded_graph = context_biasing.CompiledContextGraph.load(path)
+        assert loaded_graph.revision == 7 and loaded_graph.metadata == {'model': 'other'}
+        revisions = sorted(name for name in os.listdir(path) if name.startswith('rev-'))
+        assert [int(name.split('-')[1]) for name in revisions] == [6, 7]
+
 
 class TestCTCWordSpotter:
     @pytest.mark.unit
@@ -93,6 +225,35 @@ class TestCTCWordSpotter:
         assert ws_results[0].end_frame == 19
         assert round(ws_results[0].score, 4) == 8.9967
 
+    @pytest.mark.unit
+    def test_run_word_spotter_batch(self):
+        vocab_size = 64
+        asr_model = MockASRModel()
+        for seed in range(4):
+            batch = [generate_word_spotting_data(seed * 3 + i, vocab_size, num_frames=150 + 30 * i) for i in range(3)]
+            # all utterances share the context graph of the first one
+            context_graph = context_biasing.ContextGraphCTC(blank_id=vocab_size)
+            context_graph.add_to_graph(batch[0][0])
+            logprobs = [item[1] for item in batch]
+
+            ws_results = [
+                context_biasing.run_word_spotter(x, context_graph, asr_model, blank_idx=vocab_size) for x in logprobs
+            ]
+            assert sum(len(hyps) for hyps in ws_results) > 0
+            batch_ws_results = context_biasing.run_word_spotter_batch(
+                logprobs, context_graph, asr_model, blank_idx=vocab_size
+            )
+            assert batch_ws_results == ws_results
+
+            # padded tensor input with a precompiled graph
+            csr_graph = context_biasing.CSRContextGraph.from_context_graph(context_graph)
+            lengths = torch.tensor([len(x) for x in logprobs])
+            padded = torch.nn.utils.rnn.pad_sequence([torch.from_numpy(x) for x in logprobs], batch_first=True)
+            batch_ws_results = context_biasing.run_word_spotter_batch(
+                padded, csr_graph, asr_model, logprobs_lengths=lengths, blank_idx=vocab_size
+            )
+            assert batch_ws_results == ws_results
+
 
 class TestContextBiasingUtils:
     @pytest.mark.unit
@@ -13,6 +13,7 @@
 # limitations under the License.
 import dataclasses
 import io
+import json
 import random
 import string
 from copy import deepcopy
@@ -24,6 +25,13 @@ import torch
 from torchmetrics.audio.snr import SignalNoiseRatio
 
 from nemo.collections.asr.metrics.audio import AudioMetricWrapper
+from nemo.collections.asr.metrics.corpus_wer import (
+    ErrorCounts,
+    ErrorRateAggregator,
+    count_errors,
+    iter_error_counts,
+    score_manifest,
+)
 from nemo.collections.asr.metrics.wer import WER, word_error_rate, word_error_rate_detail, word_error_rate_per_utt
 from nemo.collections.asr.parts.submodules.ctc_decoding import (
     CTCBPEDecoding,
@@ -667,3 +675,102 @@ class TestAudioMetricWrapper:
 
             ref_metric.reset()
             wrapped_metric.reset()
+
+
+def random_text_pairs(num_pairs: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ['a', 'b', 'cat', 'dog', 'ab', 'c']
+    pairs = []
+    for _ in range(num_pairs):
+        reference = ' '.join(rng.choice(words) for _ in range(rng.randint(0, 8)))
+        hypothesis = ' '.join(rng.choice(words + ['x']) for _ in range(rng.randint(0, 8)))
+        pairs.append((hypothesis, reference))
+    return pairs
+
+
+class TestCorpusErrorRate:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("use_cer", [False, True])
+    def test_matches_word_error_rate(self, use_cer):
+        pairs = random_text_pairs(300)
+        hypotheses, references = [h for h, _ in pairs], [r for _, r in pairs]
+        total = sum(iter_error_counts(pairs, use_cer=use_cer, chunk_size=7), ErrorCounts())
+        assert total.utterances == len(pairs)
+        assert total.error_rate == word_error_rate(hypotheses, references, use_cer=use_cer)
+
+        assert count_errors('cat', '').as_dict() == dict(
+            samples=1, tokens=0, wer=float('inf'), ins_rate=float('inf'), del_rate=float('inf'), sub_rate=float('inf')
+        )
+        assert sum(iter_error_counts([('', '')]), ErrorCounts()).error_rate == float('inf')
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("num_workers", [0, 2])
+    def test_unstripped_cer_matches_word_error_rate(self, num_workers):
+        hypotheses = ['hello world ', 'ab', ' cat sat', 'dog']
+        references = ['hello world', 'ab ', 'the cat  ', '  dog']
+        pairs = list(zip(hypotheses, references))
+        expected = word_error_rate(hypotheses, references, use_cer=True)
+        total = sum(iter_error_counts(pairs, use_cer=True, num_workers=num_workers, strip=False), ErrorCounts())
+        assert total.error_rate == expected
+        # stripped texts are aligned as in jiwer, which gives a different CER for these texts
+        assert sum(iter_error_counts(pairs, use_cer=True), ErrorCounts()).error_rate != expected
+        assert count_errors('hello world ', 'hello world', use_cer=True, strip=False).insertions == 1
+        assert count_errors('hello world ', 'hello world', use_cer=True).insertions == 0
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("use_cer", [False, True])
+    def test_matches_jiwer_operations(self, use_cer):
+        jiwer = pytest.importorskip("jiwer")
+        if not hasattr(jiwer, 'process_words'):
+            pytest.skip("jiwer>=3.0 is required")
+        pairs = random_text_pairs(300, seed=1) + [(' cat sat ', 'the cat  '), ('dog', '  dog'), ('a  b', ' a b')]
+        for hypothesis, reference in pairs:
+            if not reference:
+                continue
+            counts = count_errors(hypothesis, reference, use_cer=use_cer)
+            output = (jiwer.process_characters if use_cer else jiwer.process_words)(reference, hypothesis)
+            assert (counts.insertions, counts.deletions, counts.substitutions) == (
+                output.insertions,
+                output.deletions,
+                output.substitutions,
+            )
+
+    @pytest.mark.unit
+    def test_bounded_read_ahead(self):
+        num_read = 0
+
+        def pairs():
+            nonlocal num_read
+            for hypothesis, reference in random_text_pairs(200, seed=3):
+                num_read += 1
+                yield hypothesis, reference
+
+        counts = iter_error_counts(pairs(), num_workers=2, chunk_size=5, max_pending_chunks=3)
+        next(counts)
+        assert num_read <= 3 * 5
+        assert len(list(counts)) == 199
+        assert num_read == 200
+
+    @pytest.mark.unit
+    def test_score_manifest_groups(self, tmp_path):
+        pairs = random_text_pairs(50, seed=2)
+        manifests = []
+        for shard in range(2):
+            manifests.append(str(tmp_path / f'manifest_{shard}.json'))
+            with open(manifests[-1], 'w') as f:
+                for idx, (hypothesis, reference) in enumerate(pairs[shard * 25 : (shard + 1) * 25]):
+                    sample = dict(pred_text=hypothesis, text=reference, speaker=f'spk{idx % 3}')
+                    if idx % 5 == 0:
+                        sample.pop('speaker')
+                    f.write(json.dumps(sample) + '\n')
+
+        aggregator = score_manifest(manifests, group_by=['speaker'], chunk_size=4)
+        assert aggregator.total == sum((count_errors(h, r) for h, r in pairs), ErrorCounts())
+        assert set(aggregator.groups['speaker']) == {'spk0', 'spk1', 'spk2'}
+        assert sum(aggregator.groups['speaker'].values(), ErrorCounts()).utterances == 40
+
+        # shards scored separately merge into the same counts, also when scored in worker processes
+        merged = ErrorRateAggregator(group_by=['speaker'])
+        for manifest in manifests:
+            merged.merge(score_manifest(manifest, group_by=['speaker'], num_workers=2, chunk_size=4))
+        assert merged.as_dict() == aggregator.as_dict()
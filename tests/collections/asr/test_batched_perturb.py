@@ -0,0 +1,231 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+
+from nemo.collections.asr.parts.preprocessing.batched_perturb import (
+    AudioBank,
+    BatchedAudioAugmentor,
+    BatchedImpulsePerturbation,
+    BatchedNoisePerturbation,
+    BatchedRirAndNoisePerturbation,
+    BatchedShiftPerturbation,
+    BatchedSpeedPerturbation,
+    PerSamplePerturbation,
+    process_batched_augmentations,
+    sinc_resample,
+)
+from nemo.collections.asr.parts.preprocessing.perturb import (
+    AudioAugmentor,
+    GainPerturbation,
+    ImpulsePerturbation,
+    NoisePerturbation,
+    RirAndNoisePerturbation,
+    ShiftPerturbation,
+)
+from nemo.collections.asr.parts.preprocessing.segment import AudioSegment
+
+SAMPLE_RATE = 16000
+
+
+def write_audio_manifest(tmp_path, name, signal):
+    audio_file = str(tmp_path / f'{name}.wav')
+    sf.write(audio_file, signal, SAMPLE_RATE, 'float')
+    manifest_file = str(tmp_path / f'{name}.json')
+    with open(manifest_file, 'w') as f:
+        f.write(json.dumps({'audio_filepath': audio_file, 'duration': len(signal) / SAMPLE_RATE, 'text': ''}) + '\n')
+    return manifest_file
+
+
+def make_batch(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    signal = torch.zeros(len(lengths), max(lengths))
+    for i, length in enumerate(lengths):
+        signal[i, :length] = torch.from_numpy(rng.uniform(-0.5, 0.5, size=length).astype(np.float32))
+    return signal, torch.tensor(lengths)
+
+
+def perturb_rows(perturbation, signal, lengths):
+    outputs = []
+    for row, length in zip(signal, lengths):
+        segment = AudioSegment(row[:length].numpy().copy(), SAMPLE_RATE)
+        perturbation.perturb(segment)
+        outputs.append(segment.samples)
+    return outputs
+
+
+class TestBatchedPerturbations:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('shift_ms', [-3.0, 2.0, 500.0])
+    def test_shift(self, shift_ms):
+        signal, lengths = make_batch([4000, 16000, 8000])
+        reference = perturb_rows(ShiftPerturbation(shift_ms, shift_ms), signal, lengths)
+        batched = BatchedShiftPerturbation(shift_ms, shift_ms)
+        output, output_lengths = batched.perturb(signal, lengths, SAMPLE_RATE, torch.ones(3, dtype=torch.bool))
+        assert torch.equal(output_lengths, lengths)
+        for row, ref in enumerate(reference):
+            np.testing.assert_allclose(output[row, : lengths[row]].numpy(), ref)
+            assert torch.all(output[row, lengths[row] :] == 0)
+
+    @pytest.mark.unit
+    def test_gain_and_mask(self):
+        signal, lengths = make_batch([100, 300])
+        augmentor = BatchedAudioAugmentor.from_augmentor(AudioAugmentor([(1.0, GainPerturbation(6.0, 6.0))]))
+        output, _ = augmentor.perturb(signal, lengths, SAMPLE_RATE)
+        np.testing.assert_allclose(output.numpy(), signal.numpy() * 10 ** (6.0 / 20), rtol=1e-6)
+
+        augmentor = BatchedAudioAugmentor.from_augmentor(AudioAugmentor([(0.0, GainPerturbation(6.0, 6.0))]))
+        output, _ = augmentor.perturb(signal, lengths, SAMPLE_RATE)
+        assert torch.equal(output, signal)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('target_sr', [14400, 15200, 17600])
+    def test_sinc_resample(self, target_sr):
+        freq = 440.0
+        time = torch.arange(SAMPLE_RATE, dtype=torch.float64)
+        signal = torch.sin(2 * np.pi * freq * time / SAMPLE_RATE)[None].repeat(2, 1)
+        resampled = sinc_resample(signal, SAMPLE_RATE, target_sr)
+        assert resampled.shape == (2, int(np.ceil(SAMPLE_RATE * target_sr / SAMPLE_RATE)))
+        expected = torch.sin(2 * np.pi * freq * torch.arange(resampled.shape[-1], dtype=torch.float64) / target_sr)
+        # ignore the edges, where the signal is padded with zeros
+        assert torch.max(torch.abs(resampled[:, 200:-200] - expected[200:-200])) < 1e-3
+
+    @pytest.mark.unit
+    def test_impulse_matches_per_sample(self, tmp_path):
+        rng = np.random.default_rng(1)
+        impulse = np.zeros(800, dtype=np.float32)
+        impulse[10] = 1.0
+        impulse[10:] += rng.normal(scale=0.05, size=790).astype(np.float32) * np.exp(-np.arange(790) / 100)
+        manifest = write_audio_manifest(tmp_path, 'rir', impulse)
+        signal, lengths = make_batch([4000, 3000, 1000])
+
+        for kwargs in [{}, {'shift_impulse': True, 'normalize_impulse': True}]:
+            perturbation = ImpulsePerturbation(manifest_path=manifest, **kwargs)
+            reference = perturb_rows(perturbation, signal, lengths)
+            batched = BatchedImpulsePerturbation.from_perturbation(perturbation, bank_size=2)
+            output, _ = batched.perturb(signal, lengths, SAMPLE_RATE, torch.ones(3, dtype=torch.bool))
+            for row, ref in enumerate(reference):
+                np.testing.assert_allclose(output[row, : lengths[row]].numpy(), ref, atol=1e-5)
+                assert torch.all(output[row, lengths[row] :] == 0)
+
+    @pytest.mark.unit
+    def test_noise_matches_per_sample(self, tmp_path):
+        noise = np.random.default_rng(2).normal(scale=0.1, size=2000).astype(np.float32)
+        manifest = write_audio_manifest(tmp_path, 'noise', noise)
+        # noise and signals have the same length, so the noise window is deterministic
+        signal, lengths = make_batch([2000, 2000])
+
+        perturbation = NoisePerturbation(manifest_path=manifest, min_snr_db=10, max_snr_db=10)
+        reference = perturb_rows(perturbation, signal, lengths)
+        batched = BatchedNoisePerturbation.from_perturbation(perturbation, bank_size=1)
+        output, _ = batched.perturb(signal, lengths, SAMPLE_RATE, torch.tensor([True, False]))
+        np.testing.assert_allclose(output[0].numpy(), reference[0], atol=1e-5)
+        assert torch.equal(output[1], signal[1])
+
+    @pytest.mark.unit
+    def test_rir_and_noise(self, tmp_path):
+        rir_manifest = write_audio_manifest(tmp_path, 'rir', np.array([0.0, 1.0, 0.5, 0.25], dtype=np.float32))
+        noise = np.random.default_rng(3).normal(scale=0.1, size=SAMPLE_RATE).astype(np.float32)
+        noise_manifest = write_audio_manifest(tmp_path, 'noise', noise)
+        perturbation = RirAndNoisePerturbation(
+            rir_manifest_path=rir_manifest,
+            rir_prob=1.0,
+            noise_manifest_paths=[noise_manifest],
+            min_snr_db=[0],
+            max_snr_db=[20],
+            noise_tar_filepaths=[None],
+            apply_noise_rir=True,
+            bg_noise_manifest_paths=[noise_manifest],
+            bg_min_snr_db=[10],
+            bg_max_snr_db=[20],
+            bg_noise_tar_filepaths=[None],
+        )
+        batched = BatchedRirAndNoisePerturbation.from_perturbation(perturbation, bank_size=2)
+        signal, lengths = make_batch([8000, 16000, 12000])
+        output, output_lengths = batched.perturb(signal, lengths, SAMPLE_RATE, torch.ones(3, dtype=torch.bool))
+        assert output.shape == signal.shape and torch.equal(output_lengths, lengths)
+        assert torch.all(torch.isfinite(output))
+        for row in range(3):
+            assert torch.all(output[row, lengths[row] :] == 0)
+
+    @pytest.mark.unit
+    def test_process_batched_augmentations(self):
+        config = {
+            'speed': {'prob': 1.0, 'sr': SAMPLE_RATE, 'resample_type': 'kaiser_fast', 'min_speed_rate': 0.9},
+            'silence': {'prob': 1.0, 'min_start_silence_secs': 0.5, 'max_start_silence_secs': 0.5},
+            'white_noise': {'prob': 1.0, 'min_level': -90, 'max_level': -46},
+        }
+        augmentor = process_batched_augmentations(config)
+        assert isinstance(augmentor._pipeline[1][1], PerSamplePerturbation)
+
+        signal, lengths = make_batch([16000, 8000, 4000])
+        output, output_lengths = augmentor.perturb(signal, lengths, SAMPLE_RATE)
+        for length, out_length in zip(lengths.tolist(), output_lengths.tolist()):
+            speed_lengths = {
+                int(np.ceil(length * int(SAMPLE_RATE * r) / SAMPLE_RATE)) for r in np.linspace(0.9, 1.1, 5)
+            }
+            assert out_length - SAMPLE_RATE // 2 in speed_lengths
+        assert output.shape == (3, max(output_lengths))
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('num_rates', [5, 7, -1])
+    def test_speed_rates_are_quantized(self, num_rates):
+        batched = BatchedSpeedPerturbation(SAMPLE_RATE, 0.9, 1.1, num_rates)
+        target_sr = batched._sample_target_sr(1000)
+        assert np.all(target_sr % (SAMPLE_RATE // 100) == 0)
+        assert np.all((target_sr >= 0.9 * SAMPLE_RATE) & (target_sr <= 1.1 * SAMPLE_RATE))
+
+    @pytest.mark.unit
+    def test_audio_bank_refresh(self, tmp_path):
+        manifest = str(tmp_path / 'noise.json')
+        with open(manifest, 'w') as f:
+            for idx in range(20):
+                audio_file = str(tmp_path / f'noise_{idx}.wav')
+                sf.write(audio_file, np.full(100 + idx, 0.1, dtype=np.float32), SAMPLE_RATE, 'float')
+                f.write(json.dumps({'audio_filepath': audio_file, 'duration': (100 + idx) / SAMPLE_RATE}) + '\n')
+        perturbation = NoisePerturbation(manifest_path=manifest)
+
+        def bank_lengths(bank):
+            return sorted(bank.get(SAMPLE_RATE, torch.device('cpu'))[1].tolist())
+
+        bank = AudioBank(perturbation, bank_size=4)
+        loaded = bank_lengths(bank)
+        for _ in range(10):
+            bank.sample(2, SAMPLE_RATE, torch.device('cpu'))
+        assert bank_lengths(bank) == loaded
+
+        bank = AudioBank(perturbation, bank_size=4, refresh_interval=2)
+        banks = []
+        for _ in range(10):
+            banks.append(bank_lengths(bank))
+            bank.sample(2, SAMPLE_RATE, torch.device('cpu'))
+            bank.sample(2, SAMPLE_RATE, torch.device('cpu'))
+        assert len(set(map(tuple, banks))) > 1
+
+    @pytest.mark.unit
+    def test_audio_bank_config(self, tmp_path):
+        manifest = write_audio_manifest(tmp_path, 'noise', np.full(100, 0.1, dtype=np.float32))
+        config = {
+            'noise': {'prob': 1.0, 'manifest_path': manifest, 'bank_size': 3, 'bank_refresh_interval': 10},
+            'impulse': {'prob': 1.0, 'manifest_path': manifest},
+        }
+        augmentor = process_batched_augmentations(config, bank_size=2)
+        noise_bank, impulse_bank = augmentor._pipeline[0][1]._bank, augmentor._pipeline[1][1]._bank
+        assert len(noise_bank) == 3 and noise_bank._refresh_interval == 10
+        assert len(impulse_bank) == 2 and impulse_bank._refresh_interval is None
@@ -0,0 +1,152 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from omegaconf import OmegaConf
+
+from nemo.collections.asr.models.clustering_diarizer import ClusteringDiarizer
+from nemo.collections.asr.parts.utils.embedding_cache import (
+    EmbeddingStore,
+    audio_file_fingerprint,
+    model_fingerprint,
+    subsegment_keys,
+)
+
+EMB_DIM = 8
+
+
+def write_audio(tmp_path, name, seed=0):
+    audio_file = str(tmp_path / name)
+    sf.write(audio_file, np.random.default_rng(seed).normal(scale=0.1, size=16000).astype(np.float32), 16000)
+    return audio_file
+
+
+def fake_embedding(subsegment):
+    """Deterministic embedding of a subsegment, stands in for the speaker model."""
+    return np.sin(np.arange(1, EMB_DIM + 1) * (subsegment['offset'] + 10 * subsegment['duration']))
+
+
+class TestEmbeddingStore:
+    @pytest.mark.unit
+    def test_keys(self, tmp_path):
+        audio_file = write_audio(tmp_path, 'a.wav')
+        copy_file = str(tmp_path / 'copy.wav')
+        with open(audio_file, 'rb') as src, open(copy_file, 'wb') as dst:
+            dst.write(src.read())
+        other_file = write_audio(tmp_path, 'b.wav', seed=1)
+
+        fingerprints = [audio_file_fingerprint(f) for f in (audio_file, copy_file, other_file)]
+        assert fingerprints[0] == fingerprints[1] != fingerprints[2]
+        keys = subsegment_keys(fingerprints * 2, [0.0, 0.0, 0.0, 0.5, 0.5, 0.5], [1.5] * 6)
+        assert keys.dtype == np.uint64
+        assert keys[0] == keys[1] and keys[3] == keys[4]
+        assert len(np.unique(keys)) == 4
+        # offsets are rounded to milliseconds
+        assert (
+            subsegment_keys(fingerprints[:1], [0.1 + 0.2], [1.5])[0]
+            == subsegment_keys(fingerprints[:1], [0.3], [1.5])[0]
+        )
+
+    @pytest.mark.unit
+    def test_model_fingerprint(self):
+        model = torch.nn.Linear(4, 2)
+        fingerprint = model_fingerprint(model, sample_rate=16000)
+        assert fingerprint == model_fingerprint(model, sample_rate=16000)
+        assert fingerprint != model_fingerprint(model, sample_rate=8000)
+        with torch.no_grad():
+            model.weight[0, 0] += 1
+        assert fingerprint != model_fingerprint(model, sample_rate=16000)
+
+    @pytest.mark.unit
+    def test_add_flush_lookup(self, tmp_path):
+        rng = np.random.default_rng(0)
+        keys = rng.integers(0, 2 ** 63, size=100, dtype=np.uint64)
+        embs = rng.normal(size=(100, EMB_DIM)).astype(np.float32)
+
+        store = EmbeddingStore(str(tmp_path), 'model')
+        store.add(keys[:60], embs[:60])
+        assert len(store) == 0
+        store.flush()
+        store.add(keys[40:], embs[40:])
+        store.flush()
+        assert len(store) == 100
+        assert len(os.listdir(store.path)) == 2
+
+        # a new store sees the shards of other processes
+        store = EmbeddingStore(str(tmp_path), 'model')
+        query = np.concatenate([keys[::-1], rng.integers(0, 2 ** 63, size=10, dtype=np.uint64)])
+        found, result = store.lookup(query)
+        assert found.tolist() == [True] * 100 + [False] * 10
+        assert result.dtype == np.float16
+        np.testing.assert_array_equal(result[:100], embs[::-1].astype(np.float16))
+        assert not result[100:].any()
+        assert not EmbeddingStore(str(tmp_path), 'other_model').contains(keys).any()
+
+        with pytest.raises(ValueError):
+            store.add(keys[:2], embs[:2, :4])
+
+
+class TestClusteringDiarizerEmbeddingCache:
+    @pytest.mark.unit
+    def test_rerun_skips_cached_subsegments(self, tmp_path):
+        audio_files = [write_audio(tmp_path, f'{n}.wav', seed=n) for n in range(2)]
+        manifest_file = str(tmp_path / 'subsegments.json')
+        with open(manifest_file, 'w') as f:
+            for audio_file in audio_files:
+                for offset in (0.0, 0.25, 0.5):
+                    f.write(json.dumps({'audio_filepath': audio_file, 'offset': offset, 'duration': 0.5}) + '\n')
+
+        extracted = []
+        speaker_model = torch.nn.Linear(4, EMB_DIM)
+
+        def run_embedding_extraction(manifest_file, scale_idx, num_scales):
+            with open(manifest_file, 'r') as f:
+                subsegments = [json.loads(line) for line in f]
+            extracted.append(len(subsegments))
+            return torch.tensor(np.stack([fake_embedding(dic) for dic in subsegments]), dtype=torch.float32)
+
+        def extract(embedding_cache_dir):
+            diarizer = ClusteringDiarizer.__new__(ClusteringDiarizer)
+            torch.nn.Module.__init__(diarizer)
+            diarizer._cfg = OmegaConf.create({'sample_rate': 16000})
+            diarizer._speaker_params = OmegaConf.create(
+                {'save_embeddings': False, 'embedding_cache_dir': embedding_cache_dir}
+            )
+            diarizer._speaker_model = speaker_model
+            diarizer._embedding_store = None
+            diarizer._run_embedding_extraction = run_embedding_extraction
+            diarizer._extract_embeddings(manifest_file, 0, 1)
+            return diarizer.embeddings, diarizer.time_stamps
+
+        reference, reference_time_stamps = extract(None)
+        cache_dir = str(tmp_path / 'cache')
+        first, _ = extract(cache_dir)
+        second, time_stamps = extract(cache_dir)
+        assert extracted == [6, 6]
+        assert time_stamps == reference_time_stamps
+        for uniq_name in reference:
+            np.testing.assert_allclose(first[uniq_name], reference[uniq_name], atol=1e-3)
+            torch.testing.assert_close(first[uniq_name], second[uniq_name], rtol=0, atol=0)
+
+        # new subsegments are extracted, the others are read from the store
+        with open(manifest_file, 'a') as f:
+            f.write(json.dumps({'audio_filepath': audio_files[0], 'offset': 0.75, 'duration': 0.25}) + '\n')
+        extract(cache_dir)
+        assert extracted == [6, 6, 1]
@@ -23,6 +23,8 @@ from nemo.collections.asr.data.audio_to_label import repeat_signal
 from nemo.collections.asr.parts.utils.longform_clustering import LongFormSpeakerClustering
 from nemo.collections.asr.parts.utils.offline_clustering import (
     SpeakerClustering,
+    cos_similarity,
+    get_argmin_mat,
     get_scale_interpolated_embs,
     getCosAffinityMatrix,
     getKneighborsConnections,
@@ -39,6 +41,13 @@ from nemo.collections.asr.parts.utils.online_clustering import (
 )
 from nemo.collections.asr.parts.utils.optimization_utils import LinearSumAssignmentSolver
 from nemo.collections.asr.parts.utils.optimization_utils import linear_sum_assignment as nemo_linear_sum_assignment
+from nemo.collections.asr.parts.utils.sparse_clustering import (
+    SparseSpeakerClustering,
+    get_argmin_mat_sorted,
+    get_knn_multiscale_cos_affinity,
+    getSparseAffinityGraphMat,
+    sparseEigDecompose,
+)
 from nemo.collections.asr.parts.utils.speaker_utils import (
     OnlineSegmentor,
     check_ranges,
@@ -818,6 +827,62 @@ class TestSpeakerClustering:
         assert Y_out.shape[0] == mc[-1]
         assert all(permuted_Y == gt)
 
+    @pytest.mark.unit
+    @pytest.mark.parametrize("n_spks, spk_dur", [(2, 30), (3, 20)])
+    @pytest.mark.parametrize("block_size", [None, 7])
+    def test_knn_multiscale_cos_affinity(self, n_spks, spk_dur, block_size):
+        em, ts, mc, mw, _, _ = generate_toy_data(n_spks=n_spks, spk_dur=spk_dur, perturb_sigma=0.1, torch_seed=0)
+        em_s, ts_s = split_input_data(em, ts, mc)
+        mapping_list = get_argmin_mat(ts_s)
+        assert all(torch.equal(x, y) for x, y in zip(get_argmin_mat_sorted(ts_s), mapping_list))
+
+        fused_sim = sum(
+            weight * cos_similarity(emb[mapping], emb[mapping])
+            for weight, emb, mapping in zip(mw.squeeze(0), em_s, mapping_list)
+        )
+        knn_sim, knn_index = get_knn_multiscale_cos_affinity(mw, em_s, ts_s, n_neighbors=5, block_size=block_size)
+        expected_sim, _ = torch.topk(fused_sim, 5, dim=1)
+        assert torch.allclose(knn_sim, expected_sim, atol=1e-5)
+        assert torch.allclose(fused_sim.gather(1, knn_index), expected_sim, atol=1e-5)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("eig_solver", ['lobpcg', 'lanczos'])
+    def test_sparse_eig_decompose(self, eig_solver):
+        em, ts, mc, mw, _, _ = generate_toy_data(n_spks=3, spk_dur=20, perturb_sigma=0.1, torch_seed=0)
+        em_s, ts_s = split_input_data(em, ts, mc)
+        _, knn_index = get_knn_multiscale_cos_affinity(mw, em_s, ts_s, n_neighbors=10)
+        affinity_mat = getSparseAffinityGraphMat(knn_index, 10)
+        lambdas, diffusion_map = sparseEigDecompose(affinity_mat, n_eigs=4, eig_solver=eig_solver)
+        dense_laplacian = torch.diag(torch.tensor(affinity_mat.sum(axis=1)).squeeze(1)) - affinity_mat.toarray()
+        expected = torch.linalg.eigvalsh(dense_laplacian.double())[:4]
+        assert torch.allclose(lambdas.double(), expected, atol=1e-4)
+        assert torch.allclose(dense_laplacian.float() @ diffusion_map, diffusion_map * lambdas, atol=1e-3)
+
+    @pytest.mark.run_only_on('CPU')
+    @pytest.mark.unit
+    @pytest.mark.parametrize("n_spks, spk_dur", [(2, 120), (4, 60)])
+    @pytest.mark.parametrize("eig_solver", ['lobpcg', 'lanczos'])
+    @pytest.mark.parametrize("oracle_num_speakers", [False, True])
+    def test_sparse_speaker_clustering_cpu(self, n_spks, spk_dur, eig_solver, oracle_num_speakers):
+        em, ts, mc, mw, spk_ts, gt = generate_toy_data(n_spks=n_spks, spk_dur=spk_dur, perturb_sigma=0.1, torch_seed=0)
+        sparse_speaker_clustering = SparseSpeakerClustering(
+            max_neighbors=32, eig_solver=eig_solver, max_dense_segments=0, nme_mat_size=128, cuda=False
+        )
+        Y_out = sparse_speaker_clustering.forward_infer(
+            embeddings_in_scales=em,
+            timestamps_in_scales=ts,
+            multiscale_segment_counts=mc,
+            multiscale_weights=mw,
+            oracle_num_speakers=n_spks if oracle_num_speakers else -1,
+            max_num_speakers=8,
+            sparse_search_volume=10,
+            max_rp_threshold=0.15,
+        )
+        permuted_Y = stitch_cluster_labels(Y_old=gt, Y_new=Y_out)
+        # mc[-1] is the number of base scale segments
+        assert Y_out.shape[0] == mc[-1]
+        assert all(permuted_Y == gt)
+
     @pytest.mark.run_only_on('GPU')
     @pytest.mark.unit
     @pytest.mark.parametrize("n_spks", [1, 2, 3])
@@ -0,0 +1,135 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from nemo.collections.asr.parts.preprocessing.noise_bank import NoiseBank, get_noise_bank_path
+from nemo.collections.asr.parts.preprocessing.perturb import NoisePerturbation
+from nemo.collections.asr.parts.preprocessing.segment import AudioSegment
+
+SAMPLE_RATE = 16000
+
+
+def write_noise_manifest(tmp_path, lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    manifest_file = str(tmp_path / 'noise.json')
+    signals = []
+    with open(manifest_file, 'w') as f:
+        for n, length in enumerate(lengths):
+            signal = rng.normal(scale=0.1, size=length).astype(np.float32)
+            audio_file = str(tmp_path / f'noise_{n}.wav')
+            sf.write(audio_file, signal, SAMPLE_RATE, 'float')
+            f.write(json.dumps({'audio_filepath': audio_file, 'duration': length / SAMPLE_RATE, 'text': ''}) + '\n')
+            signals.append(signal)
+    return manifest_file, signals
+
+
+class TestNoiseBank:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('sample_rate', [SAMPLE_RATE, 8000])
+    def test_bank_matches_decoded_audio(self, tmp_path, sample_rate):
+        manifest, _ = write_noise_manifest(tmp_path, [1600, 3200, 800])
+        bank = NoiseBank(manifest, str(tmp_path / 'bank')).get(sample_rate)
+        assert len(bank) == 3
+        for n in range(3):
+            reference = AudioSegment.from_file(str(tmp_path / f'noise_{n}.wav'), target_sr=sample_rate).samples
+            assert bank[n].dtype == np.float16
+            np.testing.assert_allclose(bank[n].astype(np.float32), reference, atol=1e-3)
+
+    @pytest.mark.unit
+    def test_bank_is_reused(self, tmp_path):
+        manifest, _ = write_noise_manifest(tmp_path, [1600, 800])
+        bank_dir = str(tmp_path / 'bank')
+        NoiseBank(manifest, bank_dir).get(SAMPLE_RATE)
+        NoiseBank(manifest, bank_dir).get(SAMPLE_RATE)
+        NoiseBank(manifest, bank_dir).get(8000)
+        assert len([name for name in os.listdir(bank_dir) if name.startswith('noise-bank-')]) == 2
+
+    @pytest.mark.unit
+    def test_pickle_keeps_memory_map(self, tmp_path):
+        manifest, signals = write_noise_manifest(tmp_path, [1600, 800])
+        noise_bank = NoiseBank(manifest, str(tmp_path / 'bank'))
+        bank = noise_bank.get(SAMPLE_RATE)
+
+        restored = pickle.loads(pickle.dumps(bank))
+        assert isinstance(restored.audio, np.memmap)
+        np.testing.assert_array_equal(restored[1], bank[1])
+        assert pickle.loads(pickle.dumps(noise_bank))._banks == {}
+
+    @pytest.mark.unit
+    def test_waits_for_other_builder(self, tmp_path):
+        manifest, _ = write_noise_manifest(tmp_path, [1600])
+        bank_dir = str(tmp_path / 'bank')
+        path = get_noise_bank_path(bank_dir, manifest, SAMPLE_RATE)
+        os.makedirs(bank_dir)
+        open(f'{path}.lock', 'w').close()
+
+        # the other builder never finishes, the bank is built locally after the timeout
+        bank = NoiseBank(manifest, bank_dir, timeout=0).get(SAMPLE_RATE)
+        assert len(bank) == 1
+
+    @pytest.mark.unit
+    def test_removes_stale_lock(self, tmp_path):
+        manifest, _ = write_noise_manifest(tmp_path, [1600])
+        bank_dir = str(tmp_path / 'bank')
+        path = get_noise_bank_path(bank_dir, manifest, SAMPLE_RATE)
+        os.makedirs(bank_dir)
+
+        # lock of a dead process on this host
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        with open(f'{path}.lock', 'w') as f:
+            json.dump(dict(host=socket.gethostname(), pid=process.pid), f)
+        bank = NoiseBank(manifest, bank_dir).get(SAMPLE_RATE)
+        assert len(bank) == 1
+        assert not os.path.exists(f'{path}.lock')
+
+        # lock of another host which was not refreshed
+        path = get_noise_bank_path(bank_dir, manifest, 8000)
+        with open(f'{path}.lock', 'w') as f:
+            json.dump(dict(host='other-host', pid=1), f)
+        os.utime(f'{path}.lock', (time.time() - 3600, time.time() - 3600))
+        bank = NoiseBank(manifest, bank_dir).get(8000)
+        assert len(bank) == 1
+        assert not os.path.exists(f'{path}.lock')
+
+    @pytest.mark.unit
+    def test_noise_perturbation_with_bank(self, tmp_path):
+        manifest, _ = write_noise_manifest(tmp_path, [2000])
+        rng = np.random.default_rng(1)
+        signal = rng.uniform(-0.5, 0.5, size=2000).astype(np.float32)
+
+        reference = AudioSegment(signal.copy(), SAMPLE_RATE)
+        NoisePerturbation(manifest_path=manifest, min_snr_db=10, max_snr_db=10).perturb(reference)
+        banked = AudioSegment(signal.copy(), SAMPLE_RATE)
+        perturbation = NoisePerturbation(
+            manifest_path=manifest, min_snr_db=10, max_snr_db=10, bank_dir=str(tmp_path / 'bank')
+        )
+        perturbation.perturb(banked)
+        np.testing.assert_allclose(banked.samples, reference.samples, atol=1e-3)
+        perturbation = NoisePerturbation(manifest_path=manifest, bank_dir=str(tmp_path / 'bank'), bank_timeout=5)
+        assert perturbation._noise_bank._timeout == 5
+
+        with pytest.raises(ValueError):
+            NoisePerturbation(manifest_path=manifest, audio_tar_filepaths='noise.tar', bank_dir=str(tmp_path))
@@ -0,0 +1,498 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+import math
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from omegaconf import DictConfig
+
+from nemo.collections.asr.models import EncDecCTCModel, EncDecCTCModelBPE
+from nemo.collections.asr.parts.utils.audio_utils import get_samples
+from nemo.collections.asr.parts.utils.streaming_utils import (
+    AudioFeatureIterator,
+    BatchedFrameASRRNNT,
+    CacheAwareStreamingAudioBuffer,
+    CacheAwareStreamingSessionManager,
+    FrameBatchASR,
+    LongestCommonSubsequenceBatchedFrameASRRNNT,
+    MultiFileFrameBatchASR,
+    StreamingAudioFeatureIterator,
+    batched_lcs_alignment_merge_buffer,
+    batched_longest_common_subsequence_merge,
+    inplace_buffer_merge,
+    lcs_alignment_merge_buffer,
+    longest_common_subsequence_merge,
+)
+from nemo.collections.asr.parts.utils.transcribe_utils import get_buffered_pred_feat, get_buffered_pred_feat_parallel
+
+
+@pytest.fixture()
+def streaming_model():
+    torch.manual_seed(0)
+    cfg = DictConfig(
+        {
+            'preprocessor': {
+                '_target_': 'nemo.collections.asr.modules.AudioToMelSpectrogramPreprocessor',
+                'features': 64,
+                'dither': 0.0,
+                'normalize': 'per_feature',
+            },
+            'encoder': {
+                '_target_': 'nemo.collections.asr.modules.ConformerEncoder',
+                'feat_in': 64,
+                'n_layers': 2,
+                'd_model': 32,
+                'n_heads': 2,
+                'subsampling': 'striding',
+                'subsampling_factor': 4,
+                'subsampling_conv_channels': 16,
+                'att_context_size': [20, 3],
+                'att_context_style': 'chunked_limited',
+                'conv_context_size': 'causal',
+                'conv_kernel_size': 9,
+                'causal_downsampling': True,
+            },
+            'decoder': {
+                '_target_': 'nemo.collections.asr.modules.ConvASRDecoder',
+                'feat_in': 32,
+                'num_classes': 10,
+                'vocabulary': list('abcdefghij'),
+            },
+        }
+    )
+    model = EncDecCTCModel(cfg=cfg)
+    model.eval()
+    return model
+
+
+@pytest.fixture()
+def chunked_model(test_data_dir):
+    torch.manual_seed(0)
+    cfg = DictConfig(
+        {
+            'sample_rate': 16000,
+            'preprocessor': {
+                '_target_': 'nemo.collections.asr.modules.AudioToMelSpectrogramPreprocessor',
+                'sample_rate': 16000,
+                'window_size': 0.025,
+                'window_stride': 0.01,
+                'features': 64,
+                'normalize': 'per_feature',
+            },
+            'encoder': {
+                '_target_': 'nemo.collections.asr.modules.ConvASREncoder',
+                'feat_in': 64,
+                'activation': 'relu',
+                'conv_mask': True,
+                'jasper': [
+                    {
+                        'filters': 64,
+                        'repeat': 1,
+                        'kernel': [11],
+                        'stride': [2],
+                        'dilation': [1],
+                        'dropout': 0.0,
+                        'residual': False,
+                        'separable': True,
+                    }
+                ],
+            },
+            'decoder': {
+                '_target_': 'nemo.collections.asr.modules.ConvASRDecoder',
+                'feat_in': 64,
+                'num_classes': -1,
+                'vocabulary': None,
+            },
+            'tokenizer': {'dir': os.path.join(test_data_dir, "asr", "tokenizers", "an4_spe_128"), 'type': 'bpe'},
+        }
+    )
+    model = EncDecCTCModelBPE(cfg=cfg)
+    model.eval()
+    return model
+
+
+def write_audio_files(tmp_path, durations, sample_rate=16000):
+    rng = np.random.default_rng(0)
+    audio_files = []
+    for idx, duration in enumerate(durations):
+        audio_file = str(tmp_path / f'audio_{idx}.wav')
+        sf.write(audio_file, rng.normal(scale=0.1, size=int(duration * sample_rate)).astype(np.float32), sample_rate)
+        audio_files.append(audio_file)
+    return audio_files
+
+
+def stream_single(model, processed_signal=None, audio=None, online_normalization=False):
+    """Greedy predictions of a single stream streamed with CacheAwareStreamingAudioBuffer."""
+    streaming_buffer = CacheAwareStreamingAudioBuffer(model, online_normalization=online_normalization)
+    if audio is not None:
+        streaming_buffer.append_audio(audio)
+    else:
+        streaming_buffer.append_processed_signal(processed_signal)
+    cache_last_channel, cache_last_time, cache_last_channel_len = model.encoder.get_initial_cache_state(batch_size=1)
+    pred_out = None
+    for step, (chunk_audio, chunk_lengths) in enumerate(streaming_buffer):
+        with torch.no_grad():
+            pred_out, _, cache_last_channel, cache_last_time, cache_last_channel_len, _ = model.conformer_stream_step(
+                processed_signal=chunk_audio,
+                processed_signal_length=chunk_lengths,
+                cache_last_channel=cache_last_channel,
+                cache_last_time=cache_last_time,
+                cache_last_channel_len=cache_last_channel_len,
+                keep_all_outputs=streaming_buffer.is_buffer_empty(),
+                previous_pred_out=pred_out,
+                drop_extra_pre_encoded=0 if step == 0 else model.encoder.streaming_cfg.drop_extra_pre_encoded,
+            )
+    return pred_out[0]
+
+
+def make_consecutive_buffers(rng, batch_size, vocab_size=8):
+    """Random pairs of buffers where the beginning of Y overlaps the end of X, with some token errors."""
+    X_batch, Y_batch = [], []
+    for _ in range(batch_size):
+        text = rng.integers(0, vocab_size, size=rng.integers(0, 40)).tolist()
+        overlap = int(rng.integers(0, len(text) + 1))
+        X = text
+        Y = text[len(text) - overlap :] + rng.integers(0, vocab_size, size=rng.integers(0, 20)).tolist()
+        for _ in range(rng.integers(0, 3)):
+            if len(Y) > 0:
+                Y[rng.integers(0, len(Y))] = int(rng.integers(0, vocab_size))
+        X_batch.append(X)
+        Y_batch.append(Y)
+    return X_batch, Y_batch
+
+
+class TestLCSMerge:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('vocab_size', [2, 8, 100])
+    def test_batched_merge_matches_reference(self, vocab_size):
+        rng = np.random.default_rng(vocab_size)
+        for _ in range(20):
+            X_batch, Y_batch = make_consecutive_buffers(rng, batch_size=16, vocab_size=vocab_size)
+            result_idxs, alignments = batched_longest_common_subsequence_merge(X_batch, Y_batch)
+            for X, Y, result_idx, alignment in zip(X_batch, Y_batch, result_idxs, alignments):
+                reference_idx, reference_alignment = longest_common_subsequence_merge(X, Y)
+                assert result_idx == reference_idx
+                assert alignment[: len(X) + 1, : len(Y) + 1].tolist() == reference_alignment
+
+    @pytest.mark.unit
+    def test_batched_merge_writes_alignments(self, tmp_path):
+        X_batch, Y_batch = [[1, 2, 3, 4], [5, 6]], [[3, 4, 7], [6, 5, 6, 8]]
+        filepaths = [str(tmp_path / 'first.pt'), None]
+        batched_longest_common_subsequence_merge(X_batch, Y_batch, filepaths=filepaths)
+
+        reference_path = str(tmp_path / 'reference.pt')
+        longest_common_subsequence_merge(X_batch[0], Y_batch[0], filepath=reference_path)
+        assert torch.load(filepaths[0]) == torch.load(reference_path)
+        assert not (tmp_path / 'None').exists()
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('delay', [0, 2, 6])
+    def test_batched_merge_buffer_matches_reference(self, delay):
+        rng = np.random.default_rng(delay)
+        buffers, data = make_consecutive_buffers(rng, batch_size=32)
+        buffers[0] = []
+
+        reference = [
+            lcs_alignment_merge_buffer(copy.copy(buffer), new_data, delay, model=None, max_steps_per_timestep=2)
+            for buffer, new_data in zip(buffers, data)
+        ]
+        merged = batched_lcs_alignment_merge_buffer(buffers, data, delay, model=None, max_steps_per_timestep=2)
+        assert merged == reference
+
+
+class FakeTokenizer:
+    def ids_to_tokens(self, ids):
+        return [str(token_id) for token_id in ids]
+
+    def ids_to_text(self, ids):
+        return ' '.join(str(token_id) for token_id in ids)
+
+
+def make_frame_asr_rnnt(cls, rng, num_streams, blank_id=0):
+    """RNNT frame ASR with random alignments instead of a model, alignments are lists of (logprob, token_id)."""
+    frame_asr = cls.__new__(cls)
+    frame_asr.asr_model = SimpleNamespace(tokenizer=FakeTokenizer())
+    frame_asr.blank_id = blank_id
+    frame_asr.batch_size = num_streams
+    frame_asr.max_steps_per_timestep = 2
+    frame_asr.alignment_basepath = None
+    frame_asr.sample_offset = 0
+    frame_asr.infer_logits = lambda: None
+    frame_asr.all_alignments = [
+        [
+            [
+                [(0.0, int(token_id)) for token_id in rng.integers(0, 6, size=rng.integers(1, 3))]
+                for _ in range(rng.integers(6, 12))
+            ]
+            for _ in range(rng.integers(1, 6))
+        ]
+        for _ in range(num_streams)
+    ]
+    frame_asr.frame_bufferer = SimpleNamespace(
+        signal_end_index=[len(alignments) - int(rng.integers(0, 2)) for alignments in frame_asr.all_alignments]
+    )
+    return frame_asr
+
+
+def decode_alignment(alignment, blank_id=0):
+    return [int(token_id) for step in alignment for _, token_id in step if token_id != blank_id]
+
+
+class TestBatchedFrameASRRNNT:
+    @pytest.mark.unit
+    def test_middle_token_merge(self):
+        tokens_per_chunk, delay = 2, 3
+        frame_asr = make_frame_asr_rnnt(BatchedFrameASRRNNT, np.random.default_rng(0), num_streams=8)
+
+        references = []
+        for alignments, signal_end_idx in zip(frame_asr.all_alignments, frame_asr.frame_bufferer.signal_end_index):
+            buffer = []
+            for a_idx, alignment in enumerate(alignments):
+                offset = 0 if delay == len(alignment) else 1
+                start = len(alignment) - offset - delay
+                ids = decode_alignment(alignment[start : start + tokens_per_chunk])
+                if len(ids) > 0 and a_idx < signal_end_idx:
+                    buffer = inplace_buffer_merge(buffer, ids, delay, model=None)
+            references.append(FakeTokenizer().ids_to_text(buffer))
+
+        assert frame_asr.transcribe(tokens_per_chunk, delay) == references
+
+    @pytest.mark.unit
+    def test_lcs_merge(self):
+        tokens_per_chunk, delay = 2, 3
+        frame_asr = make_frame_asr_rnnt(
+            LongestCommonSubsequenceBatchedFrameASRRNNT, np.random.default_rng(1), num_streams=8
+        )
+        frame_asr.lcs_delay = 4
+
+        references = []
+        for alignments, signal_end_idx in zip(frame_asr.all_alignments, frame_asr.frame_bufferer.signal_end_index):
+            buffer = []
+            for a_idx, alignment in enumerate(alignments):
+                if a_idx == 0:
+                    ids = decode_alignment(alignment[len(alignment) - 1 - delay :])
+                    if len(ids) > 0:
+                        buffer = inplace_buffer_merge(buffer, ids, delay, model=None)
+                else:
+                    ids = decode_alignment(alignment)
+                    if len(ids) > 0 and a_idx < signal_end_idx:
+                        buffer = lcs_alignment_merge_buffer(buffer, ids, 4, model=None, max_steps_per_timestep=2)
+            references.append(FakeTokenizer().ids_to_text(buffer))
+
+        assert frame_asr.transcribe(tokens_per_chunk, delay) == references
+
+        frame_asr.lcs_delay = -1
+        with pytest.raises(ValueError):
+            frame_asr.transcribe(tokens_per_chunk, delay)
+
+
+class TestCacheAwareStreamingSessionManager:
+    @pytest.mark.unit
+    def test_matches_single_stream(self, streaming_model):
+        rng = np.random.default_rng(0)
+        signals = []
+        for num_samples in [16000, 9000, 23000, 5000]:
+            audio = rng.normal(scale=0.1, size=num_samples).astype(np.float32)
+            processed_signal, _ = streaming_model.preprocessor(
+                input_signal=torch.from_numpy(audio)[None], length=torch.tensor([num_samples])
+            )
+            signals.append(processed_signal)
+        references = [stream_single(streaming_model, processed_signal) for processed_signal in signals]
+
+        # streams join at different steps and their features arrive in pieces of 13 frames
+        manager = CacheAwareStreamingSessionManager(streaming_model, max_streams=2)
+        pending = list(range(len(signals)))
+        active, results, num_steps = {}, {}, 0
+        while manager.has_streams() or pending:
+            if pending and num_steps % 3 == 0 and len(active) < 2:
+                signal_idx = pending.pop(0)
+                active[manager.add_stream()] = [signal_idx, 0]
+            for stream_id, (signal_idx, offset) in active.items():
+                if offset < signals[signal_idx].size(-1):
+                    manager.append_processed_signal(stream_id, signals[signal_idx][:, :, offset : offset + 13])
+                    active[stream_id][1] += 13
+                    if active[stream_id][1] >= signals[signal_idx].size(-1):
+                        manager.end_stream(stream_id)
+
+            _, finished = manager.step()
+            num_steps += 1
+            for stream_id, session in finished.items():
+                results[active.pop(stream_id)[0]] = session.previous_pred_out
+
+        assert len(results) == len(signals)
+        for signal_idx, reference in enumerate(references):
+            assert torch.equal(results[signal_idx], reference)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('piece_size', [1, 333, 1600])
+    def test_append_audio_matches_whole_audio_features(self, streaming_model, piece_size):
+        audio = np.random.default_rng(0).normal(scale=0.1, size=7919).astype(np.float32)
+        manager = CacheAwareStreamingSessionManager(streaming_model, online_normalization=True)
+        reference, _ = manager.buffer.preprocess_audio(audio)
+
+        stream_id = manager.add_stream()
+        session = manager.streams[stream_id]
+        for offset in range(0, len(audio), piece_size):
+            manager.append_audio(stream_id, audio[offset : offset + piece_size])
+            # only complete frames are featurized, and the buffered audio stays bounded
+            assert session.num_frames <= reference.size(-1)
+            assert session.audio.size(-1) <= piece_size + 1024
+        manager.end_stream(stream_id)
+
+        assert session.num_frames == reference.size(-1)
+        torch.testing.assert_close(session.features, reference, atol=1e-4, rtol=1e-4)
+
+    @pytest.mark.unit
+    def test_append_audio_matches_single_stream(self, streaming_model):
+        rng = np.random.default_rng(1)
+        audios = [rng.normal(scale=0.1, size=num_samples).astype(np.float32) for num_samples in [16000, 9000]]
+        references = [stream_single(streaming_model, audio=audio, online_normalization=True) for audio in audios]
+
+        manager = CacheAwareStreamingSessionManager(streaming_model, max_streams=2, online_normalization=True)
+        stream_ids = [manager.add_stream() for _ in audios]
+        offsets = [0] * len(audios)
+        results, max_frames = {}, 0
+        while manager.has_streams():
+            for idx, (stream_id, audio) in enumerate(zip(stream_ids, audios)):
+                if stream_id in manager.streams and not manager.streams[stream_id].ended:
+                    manager.append_audio(stream_id, audio[offsets[idx] : offsets[idx] + 1000])
+                    offsets[idx] += 1000
+                    if offsets[idx] >= len(audio):
+                        manager.end_stream(stream_id)
+            _, finished = manager.step()
+            max_frames = max([max_frames] + [session.features.size(-1) for session in manager.streams.values()])
+            for stream_id, session in finished.items():
+                results[stream_ids.index(stream_id)] = session.previous_pred_out
+
+        for idx, reference in enumerate(references):
+            assert torch.equal(results[idx], reference)
+        # consumed frames are dropped
+        assert max_frames < 30
+
+    @pytest.mark.unit
+    def test_append_processed_signal_length(self, streaming_model):
+        manager = CacheAwareStreamingSessionManager(streaming_model)
+        stream_id = manager.add_stream()
+        processed_signal = torch.randn(1, 64, 20)
+        manager.append_processed_signal(stream_id, processed_signal, torch.tensor([13]))
+        manager.append_processed_signal(stream_id, processed_signal)
+        features = manager.streams[stream_id].features
+        assert torch.equal(features, torch.cat([processed_signal[:, :, :13], processed_signal], dim=-1))
+
+        with pytest.raises(ValueError):
+            manager.append_audio(stream_id, np.zeros(1600, dtype=np.float32))
+
+    @pytest.mark.unit
+    def test_slots(self, streaming_model):
+        manager = CacheAwareStreamingSessionManager(streaming_model, max_streams=1)
+        stream_id = manager.add_stream()
+        with pytest.raises(RuntimeError):
+            manager.add_stream()
+
+        manager.remove_stream(stream_id)
+        stream_id = manager.add_stream()
+        manager.end_stream(stream_id)
+        transcriptions, finished = manager.step()
+        assert stream_id in finished and not manager.has_streams()
+
+
+class TestMultiFileFrameBatchASR:
+    @pytest.mark.with_downloads()
+    @pytest.mark.unit
+    @pytest.mark.parametrize('num_padding_samples', [0, 1234])
+    def test_streaming_features_match(self, chunked_model, tmp_path, num_padding_samples):
+        audio_file = write_audio_files(tmp_path, [7.3])[0]
+        frame_asr = FrameBatchASR(chunked_model, frame_len=1.6, total_buffer=4.0)
+        samples = np.pad(get_samples(audio_file), (0, num_padding_samples))
+        reference = list(AudioFeatureIterator(samples, 1.6, frame_asr.raw_preprocessor, 'cpu'))
+        frames = list(
+            StreamingAudioFeatureIterator(
+                audio_file,
+                1.6,
+                frame_asr.raw_preprocessor,
+                'cpu',
+                num_padding_samples=num_padding_samples,
+                block_len=1.1,
+            )
+        )
+        assert len(frames) == len(reference)
+        for frame, ref in zip(frames, reference):
+            np.testing.assert_allclose(np.asarray(frame), np.asarray(ref), atol=1e-4)
+
+    @pytest.mark.with_downloads()
+    @pytest.mark.unit
+    @pytest.mark.parametrize('num_processes', [1, 2])
+    def test_matches_single_file(self, chunked_model, tmp_path, num_processes):
+        audio_files = write_audio_files(tmp_path, [5.0, 1.0, 9.5, 3.2, 0.4])
+        manifest = str(tmp_path / 'manifest.json')
+        with open(manifest, 'w') as f:
+            for audio_file in audio_files:
+                f.write(json.dumps({'audio_filepath': audio_file, 'text': ''}) + '\n')
+
+        frame_len, total_buffer, model_stride_in_secs = 1.6, 4.0, 0.02
+        tokens_per_chunk = math.ceil(frame_len / model_stride_in_secs)
+        delay = math.ceil((frame_len + (total_buffer - frame_len) / 2) / model_stride_in_secs)
+        reference = get_buffered_pred_feat(
+            FrameBatchASR(chunked_model, frame_len=frame_len, total_buffer=total_buffer, batch_size=4),
+            frame_len,
+            tokens_per_chunk,
+            delay,
+            copy.deepcopy(chunked_model.cfg.preprocessor),
+            model_stride_in_secs,
+            'cpu',
+            manifest=manifest,
+        )
+
+        frame_asr = MultiFileFrameBatchASR(
+            chunked_model, frame_len=frame_len, total_buffer=total_buffer, batch_size=4, num_files=2, block_len=2.0
+        )
+        partial_manifest = str(tmp_path / 'partial.json')
+        hyps = get_buffered_pred_feat_parallel(
+            frame_asr,
+            tokens_per_chunk,
+            delay,
+            model_stride_in_secs,
+            manifest=manifest,
+            num_processes=num_processes,
+            partial_manifest=partial_manifest,
+        )
+        assert [hyp.text for hyp in hyps] == [hyp.text for hyp in reference]
+        with open(partial_manifest) as f:
+            assert len(f.readlines()) == len(audio_files)
+
+        # finished files are not transcribed again, the file of an interrupted write is
+        with open(partial_manifest) as f:
+            rows = [row for row in f if json.loads(row)['idx'] != 1]
+        with open(partial_manifest, 'w') as f:
+            f.writelines(rows)
+            f.write('{"idx": 1, "audio')
+        os.remove(audio_files[0])
+        hyps = get_buffered_pred_feat_parallel(
+            frame_asr,
+            tokens_per_chunk,
+            delay,
+            model_stride_in_secs,
+            manifest=manifest,
+            partial_manifest=partial_manifest,
+        )
+        assert [hyp.text for hyp in hyps] == [hyp.text for hyp in reference]
+        with open(partial_manifest) as f:
+            assert sorted(json.loads(row)['idx'] for row in f) == list(range(len(audio_files)))
@@ -14,16 +14,23 @@
 
 import numpy as np
 import pytest
+import torch
 from pyannote.core import Annotation, Segment
 
 from nemo.collections.asr.parts.utils.vad_utils import (
     align_labels_to_frames,
     convert_labels_to_speech_segments,
     frame_vad_construct_pyannote_object_per_file,
+    generate_overlap_vad_seq_batch,
+    generate_overlap_vad_seq_per_tensor,
+    generate_vad_segment_table_batch,
+    generate_vad_segment_table_in_memory,
+    generate_vad_segment_table_per_tensor,
     get_frame_labels,
     get_nonspeech_segments,
     load_speech_overlap_segments_from_rttm,
     load_speech_segments_from_rttm,
+    prepare_gen_segment_table,
     read_rttm_as_pyannote_object,
 )
 
@@ -124,3 +131,64 @@ class TestVADUtils:
         assert speech_segments_new == speech_segments
         ref, hyp = frame_vad_construct_pyannote_object_per_file(frame_labels, frame_labels, 0.02)
         assert ref == hyp == pyannote_object_gt
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("smoothing_method", ["mean", "median"])
+    @pytest.mark.parametrize(
+        ["overlap", "shift_length_in_sec"], [(0.5, 0.01), (0.875, 0.01), (0.875, 0.02), (0.0, 0.04)]
+    )
+    def test_generate_overlap_vad_seq_batch(self, smoothing_method, overlap, shift_length_in_sec):
+        per_args = {"overlap": overlap, "window_length_in_sec": 0.63, "shift_length_in_sec": shift_length_in_sec}
+        frames = torch.rand(3, 120, generator=torch.Generator().manual_seed(0))
+        lengths = torch.tensor([120, 45, 7])
+        preds, pred_lengths = generate_overlap_vad_seq_batch(frames, lengths, per_args, smoothing_method)
+        for b in range(3):
+            expected = generate_overlap_vad_seq_per_tensor(frames[b, : lengths[b]], per_args, smoothing_method)
+            assert pred_lengths[b] == len(expected)
+            assert torch.allclose(preds[b, : pred_lengths[b]], expected, atol=1e-6)
+            assert (preds[b, pred_lengths[b] :] == 0).all()
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("scale", ["absolute", "relative", "percentile"])
+    @pytest.mark.parametrize(["onset", "offset"], [(0.5, 0.5), (0.7, 0.3), (0.3, 0.6)])
+    @pytest.mark.parametrize("filter_speech_first", [True, False])
+    def test_generate_vad_segment_table_batch(self, scale, onset, offset, filter_speech_first):
+        postprocessing_params = {
+            "onset": onset,
+            "offset": offset,
+            "pad_onset": 0.05,
+            "pad_offset": 0.1,
+            "min_duration_on": 0.1,
+            "min_duration_off": 0.2,
+            "filter_speech_first": filter_speech_first,
+            "scale": scale,
+        }
+        sequences = torch.rand(4, 200, generator=torch.Generator().manual_seed(1))
+        sequences = torch.nn.functional.avg_pool1d(sequences.unsqueeze(1), 5, 1, 2).squeeze(1)
+        lengths = torch.tensor([200, 150, 77, 1])
+        tables = generate_vad_segment_table_batch(sequences, lengths, postprocessing_params, 0.02)
+        for b in range(4):
+            sequence = sequences[b, : lengths[b]]
+            per_args = {"frame_length_in_sec": 0.02, **postprocessing_params}
+            _, per_args_float = prepare_gen_segment_table(sequence, per_args)
+            expected = generate_vad_segment_table_per_tensor(sequence, per_args_float)
+            assert torch.equal(tables[b], expected)
+
+    @pytest.mark.unit
+    def test_generate_vad_segment_table_in_memory(self):
+        postprocessing_params = {"onset": 0.6, "offset": 0.4, "min_duration_on": 0.1, "min_duration_off": 0.1}
+        per_args = {"overlap": 0.875, "window_length_in_sec": 0.63, "shift_length_in_sec": 0.01}
+        generator = torch.Generator().manual_seed(2)
+        frame_preds = {
+            f"audio_{i}": torch.rand(length, generator=generator) for i, length in enumerate([300, 20, 170])
+        }
+        tables = generate_vad_segment_table_in_memory(
+            frame_preds, postprocessing_params, 0.01, smoothing_method="median", batch_size=2, **per_args
+        )
+        assert list(tables.keys()) == list(frame_preds.keys())
+        for name, frame in frame_preds.items():
+            sequence = generate_overlap_vad_seq_per_tensor(frame, per_args, "median")
+            _, per_args_float = prepare_gen_segment_table(
+                sequence, {"frame_length_in_sec": 0.01, **postprocessing_params}
+            )
+            assert torch.equal(tables[name], generate_vad_segment_table_per_tensor(sequence, per_args_float))
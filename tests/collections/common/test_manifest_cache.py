@@ -0,0 +1,225 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from nemo.collections.common.parts.preprocessing import collections, manifest, manifest_cache, parsers
+from nemo.collections.common.parts.preprocessing.columnar import EntityColumns
+
+
+def write_manifest(path, num_samples=20):
+    rng = np.random.default_rng(0)
+    with open(path, 'w') as f:
+        for n in range(num_samples):
+            item = {
+                'audio_filepath': f'/data/audio_{n % 7}.wav',
+                'duration': round(float(rng.uniform(0.5, 5.0)), 3),
+                'text': 'hello world' if n % 3 else 'abc',
+            }
+            if n % 4 == 0:
+                item['offset'] = n * 0.5
+                item['speaker'] = f'spk{n % 2}'
+            if n == 5:
+                item['text'] = 'reject'
+            f.write(json.dumps(item) + '\n')
+
+
+@pytest.fixture()
+def manifest_path(tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    write_manifest(path)
+    return path
+
+
+class RejectingParser(parsers.CharParser):
+    def __call__(self, text):
+        if text == 'reject':
+            return None
+        return super().__call__(text)
+
+
+def make_parser():
+    return RejectingParser(labels=list(' abcdefghijklmnopqrstuvwxyz'))
+
+
+class TestManifestCache:
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        'kwargs',
+        [
+            {},
+            {'min_duration': 1.0, 'max_duration': 4.0},
+            {'max_number': 5},
+            {'do_sort_by_duration': True},
+            {'index_by_file_id': True},
+        ],
+    )
+    def test_compiled_matches_reference(self, manifest_path, tmp_path, kwargs):
+        cache_dir = str(tmp_path / 'cache')
+        reference = collections.ASRAudioText(manifest_path, parser=make_parser(), **kwargs)
+
+        # first call builds the cache, second call loads it
+        for _ in range(2):
+            compiled = collections.ASRAudioText(
+                manifest_path, parser=make_parser(), manifest_cache_dir=cache_dir, **kwargs
+            )
+            assert isinstance(compiled.data, EntityColumns)
+            assert len(compiled) == len(reference)
+            for ref, hyp in zip(reference, compiled):
+                assert ref == hyp
+            if kwargs.get('index_by_file_id', False):
+                assert compiled.mapping == reference.mapping
+
+        assert len(os.listdir(cache_dir)) == 1
+
+    @pytest.mark.unit
+    def test_cache_key(self, manifest_path, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        path = manifest_cache.get_cache_path(cache_dir, 'audio_text', manifest_path, make_parser())
+        assert path == manifest_cache.get_cache_path(cache_dir, 'audio_text', manifest_path, make_parser())
+
+        other_parser = RejectingParser(labels=list(' abc'))
+        assert path != manifest_cache.get_cache_path(cache_dir, 'audio_text', manifest_path, other_parser)
+
+        # rewriting the manifest invalidates the cache
+        write_manifest(manifest_path, num_samples=3)
+        os.utime(manifest_path, ns=(0, 0))
+        assert path != manifest_cache.get_cache_path(cache_dir, 'audio_text', manifest_path, make_parser())
+
+    @pytest.mark.unit
+    def test_pickle_keeps_memory_map(self, manifest_path, tmp_path):
+        compiled = collections.ASRAudioText(
+            manifest_path, parser=make_parser(), manifest_cache_dir=str(tmp_path / 'cache'), do_sort_by_duration=True
+        )
+        restored = pickle.loads(pickle.dumps(compiled.data))
+        assert isinstance(restored.columns['duration'].values, np.memmap)
+        assert list(restored) == list(compiled)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('num_chunks', [1, 3, 64])
+    def test_byte_ranges_cover_manifest(self, manifest_path, num_chunks):
+        ranges = manifest.get_manifest_byte_ranges([manifest_path, manifest_path], num_chunks_per_file=num_chunks)
+        assert len(ranges) <= 2 * num_chunks
+        items = [item for manifest_range in ranges for item in manifest.item_iter_range(*manifest_range)]
+        reference = list(manifest.item_iter([manifest_path, manifest_path]))
+        assert len(items) == len(reference)
+        for item, ref in zip(items, reference):
+            item.pop('id'), ref.pop('id')
+            assert item == ref
+
+    @pytest.mark.unit
+    def test_parallel_compile_matches_serial(self, manifest_path):
+        serial = collections.ASRAudioText.compile_manifest([manifest_path, manifest_path], make_parser())
+        parallel = collections.ASRAudioText.compile_manifest(
+            [manifest_path, manifest_path], make_parser(), num_workers=3
+        )
+        assert list(parallel) == list(serial)
+        assert parallel.columns['valid'].values.tolist() == serial.columns['valid'].values.tolist()
+
+        reference = collections.ASRAudioText(manifest_path, parser=make_parser(), do_sort_by_duration=True)
+        compiled = collections.ASRAudioText(
+            manifest_path, parser=make_parser(), num_workers=2, do_sort_by_duration=True
+        )
+        assert list(compiled) == list(reference)
+
+    @pytest.mark.unit
+    def test_non_zero_rank_waits_for_cache(self, manifest_path, tmp_path, monkeypatch):
+        path = manifest_cache.get_cache_path(str(tmp_path / 'cache'), 'audio_text', manifest_path, make_parser())
+        monkeypatch.setenv('RANK', '1')
+
+        def build_fn():
+            raise AssertionError("Only rank zero should build the cache")
+
+        manifest_cache.save(collections.ASRAudioText.compile_manifest(manifest_path, make_parser()), path)
+        columns = manifest_cache.load_or_build(
+            path, collections.ASRAudioText.OUTPUT_TYPE, build_fn, build_on_rank_zero=True, timeout=1
+        )
+        assert len(columns) == 20
+
+        # rank zero never produced the cache, build it locally after the timeout
+        other_path = path + '-other'
+        columns = manifest_cache.load_or_build(
+            other_path,
+            collections.ASRAudioText.OUTPUT_TYPE,
+            lambda: collections.ASRAudioText.compile_manifest(manifest_path, make_parser()),
+            build_on_rank_zero=True,
+            timeout=0,
+        )
+        assert len(columns) == 20 and manifest_cache.is_cached(other_path)
+
+
+class TestEntityColumns:
+    @pytest.mark.unit
+    def test_concatenate(self):
+        entity = collections.collections.namedtuple('Entity', 'name tokens speaker value')
+        kinds = {'name': 'string', 'tokens': 'ragged_int', 'speaker': 'categorical', 'value': 'numeric'}
+        first = [entity('a', [1, 2], 'x', 1.0), entity('b', [], None, 2.0)]
+        second = [entity(['span'], [3], 'y', None), entity('d', [4, 5, 6], 'x', 4.0)]
+        merged = EntityColumns.concatenate(
+            [EntityColumns.from_entities(entity, first, kinds), EntityColumns.from_entities(entity, second, kinds)]
+        )
+        assert list(merged) == first + second
+        assert merged.sort_by('value')[0] == first[0]
+
+
+class TestCompactCollections:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('kwargs', [{}, {'do_sort_by_duration': True}, {'index_by_file_id': True}])
+    def test_speech_label(self, kwargs):
+        num_samples = 50
+        audio_files = [f'/data/file_{n % 20}.wav' for n in range(num_samples)]
+        durations = [float((n * 7) % 11) for n in range(num_samples)]
+        labels = [f'label_{n % 3}' for n in range(num_samples)]
+        offsets = [None if n % 2 else n * 0.1 for n in range(num_samples)]
+
+        reference = collections.SpeechLabel(audio_files, durations, labels, offsets, max_duration=9.0, **kwargs)
+        compact = collections.SpeechLabel(
+            audio_files, durations, labels, offsets, max_duration=9.0, compact=True, **kwargs
+        )
+        assert isinstance(compact.data, EntityColumns)
+        assert list(compact) == list(reference)
+        assert compact.uniq_labels == reference.uniq_labels
+        if kwargs.get('index_by_file_id', False):
+            assert compact.mapping == reference.mapping
+            assert 'file_3' in compact.mapping and 'file_30' not in compact.mapping
+
+    @pytest.mark.unit
+    def test_diarization_label(self):
+        num_samples = 10
+        args = (
+            [f'/data/session_{n}.wav' for n in range(num_samples)],
+            [float(n % 4) for n in range(num_samples)],
+            [f'/data/session_{n}.rttm' for n in range(num_samples)],
+            [0.0] * num_samples,
+            [[(0, 1), (0, 2), (1, 2)]] * num_samples,
+            [{'speaker_0': 0, 1: 'speaker_1'} for _ in range(num_samples)],
+            [(0, 1, 2)] * num_samples,
+            [(0, 1)] * num_samples,
+        )
+        reference = collections.DiarizationLabel(*args, do_sort_by_duration=True)
+        compact = collections.DiarizationLabel(*args, do_sort_by_duration=True, compact=True)
+        assert list(compact) == list(reference)
+        assert isinstance(compact[0].target_spks[0], tuple)
+
+    @pytest.mark.unit
+    def test_audio_text(self, manifest_path):
+        reference = collections.ASRAudioText(manifest_path, parser=make_parser(), index_by_file_id=True)
+        compact = collections.ASRAudioText(manifest_path, parser=make_parser(), index_by_file_id=True, compact=True)
+        assert isinstance(compact.data, EntityColumns)
+        assert list(compact) == list(reference)
+        assert compact.mapping == reference.mapping
@@ -0,0 +1,98 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from nemo.collections.nlp.data.language_modeling.megatron.gpt_dataset import OnlineIndexMapping
+
+
+def get_tokens(tokens, mapping, idx, add_extra_token):
+    """Same retrieval as GPTDataset._get_text, with document i consisting of tokens[i]."""
+    doc_idx, doc_index_f, offset_f, doc_index_l, offset_l = mapping[idx]
+    if doc_index_f == doc_index_l:
+        return tokens[doc_idx[doc_index_f]][offset_f : offset_l + add_extra_token]
+    sample = [tokens[doc_idx[doc_index_f]][offset_f:]]
+    sample += [tokens[doc_idx[i]] for i in range(doc_index_f + 1, doc_index_l)]
+    sample.append(tokens[doc_idx[doc_index_l]][: offset_l + add_extra_token])
+    return np.concatenate(sample)
+
+
+class TestOnlineIndexMapping:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("add_extra_token", [0, 1])
+    @pytest.mark.parametrize("shuffle_documents", [True, False])
+    def test_samples(self, add_extra_token, shuffle_documents):
+        rng = np.random.default_rng(0)
+        sizes = rng.integers(0, 30, size=103).astype(np.int32)
+        documents = np.arange(3, 100, dtype=np.int32)
+        # token values encode the document and position, so every token of an epoch is unique
+        tokens = [np.arange(size) + 1000 * doc for doc, size in enumerate(sizes)]
+        seq_length, block_size = 8, 10
+
+        mapping = OnlineIndexMapping(
+            documents,
+            sizes,
+            500,
+            seq_length,
+            1234,
+            block_size=block_size,
+            add_extra_token=add_extra_token,
+            shuffle_documents=shuffle_documents,
+        )
+        assert mapping.num_blocks == 10
+        assert len(mapping) == mapping.num_epochs * mapping.num_samples_per_epoch
+        assert len(mapping) >= 500 > len(mapping) - mapping.num_samples_per_epoch
+
+        for epoch in range(mapping.num_epochs):
+            start = epoch * mapping.num_samples_per_epoch
+            samples = [
+                get_tokens(tokens, mapping, idx, add_extra_token)
+                for idx in range(start, start + mapping.num_samples_per_epoch)
+            ]
+            assert all(len(sample) == seq_length + add_extra_token for sample in samples)
+            # samples do not overlap except for the extra token and only contain tokens of the documents
+            epoch_tokens = np.concatenate([sample[:seq_length] for sample in samples])
+            assert len(np.unique(epoch_tokens)) == len(epoch_tokens)
+            assert np.all(np.isin(epoch_tokens // 1000, documents))
+
+    @pytest.mark.unit
+    def test_shuffling(self):
+        sizes = np.full(50, 16, dtype=np.int32)
+        documents = np.arange(50, dtype=np.int32)
+        mapping = OnlineIndexMapping(documents, sizes, 200, 4, 1, block_size=10)
+
+        epochs = [[mapping[idx][1:] for idx in range(start, start + 150)] for start in (0, 150)]
+        assert epochs[0] != epochs[1]
+        assert epochs[0] != sorted(epochs[0])
+        # the mapping only depends on the seed and not on the blocks that are cached
+        other = OnlineIndexMapping(documents, sizes, 200, 4, 1, block_size=10, cache_maxsize=1)
+        for idx in reversed(range(len(mapping))):
+            doc_idx, *location = other[idx]
+            expected_doc_idx, *expected_location = mapping[idx]
+            assert_array_equal(doc_idx, expected_doc_idx)
+            assert location == expected_location
+
+    @pytest.mark.unit
+    def test_pickle(self):
+        sizes = np.arange(1, 31, dtype=np.int32)
+        mapping = OnlineIndexMapping(np.arange(30, dtype=np.int32), sizes, 20, 8, 7, block_size=4)
+        mapping[0]
+        unpickled = pickle.loads(pickle.dumps(mapping))
+        for idx in range(len(mapping)):
+            assert_array_equal(unpickled[idx][0], mapping[idx][0])
+            assert unpickled[idx][1:] == mapping[idx][1:]
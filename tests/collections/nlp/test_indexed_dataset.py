@@ -0,0 +1,115 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+import torch
+from numpy.testing import assert_array_equal
+
+from nemo.collections.nlp.data.language_modeling.megatron.indexed_dataset import (
+    MMapIndexedDataset,
+    MMapIndexedDatasetBuilder,
+    MultiMMapIndexedDataset,
+    data_file_path,
+    index_file_path,
+    make_dataset,
+    make_multi_index,
+)
+
+DOCS = [
+    [[1, 2, 3], [4]],
+    [[5, 6]],
+    [[7], [8, 9], [10, 11, 12, 13]],
+    [[14]],
+]
+
+
+def build_dataset(prefix, docs, with_add_doc=False):
+    builder = MMapIndexedDatasetBuilder(data_file_path(prefix), dtype=np.uint16)
+    for doc in docs:
+        if with_add_doc:
+            builder.add_doc(np.concatenate(doc), [len(sentence) for sentence in doc])
+        else:
+            for sentence in doc:
+                builder.add_item(torch.IntTensor(sentence))
+            builder.end_document()
+    builder.finalize(index_file_path(prefix))
+    return MMapIndexedDataset(prefix, skip_warmup=True)
+
+
+class TestMMapIndexedDatasetBuilder:
+    @pytest.mark.unit
+    def test_add_doc(self, tmp_path):
+        expected = build_dataset(str(tmp_path / "items"), DOCS)
+        ds = build_dataset(str(tmp_path / "docs"), DOCS, with_add_doc=True)
+
+        assert len(ds) == len(expected)
+        assert_array_equal(ds.sizes, expected.sizes)
+        assert_array_equal(ds.doc_idx, expected.doc_idx)
+        for i in range(len(ds)):
+            assert_array_equal(ds[i], expected[i])
+
+    @pytest.mark.unit
+    def test_merge_file(self, tmp_path):
+        expected = build_dataset(str(tmp_path / "full"), DOCS)
+        build_dataset(str(tmp_path / "shard0"), DOCS[:1], with_add_doc=True)
+        build_dataset(str(tmp_path / "shard1"), DOCS[1:], with_add_doc=True)
+
+        prefix = str(tmp_path / "merged")
+        builder = MMapIndexedDatasetBuilder(data_file_path(prefix), dtype=np.uint16)
+        builder.merge_file_(str(tmp_path / "shard0"))
+        builder.merge_file_(str(tmp_path / "shard1"))
+        builder.finalize(index_file_path(prefix))
+        ds = MMapIndexedDataset(prefix, skip_warmup=True)
+
+        assert_array_equal(ds.sizes, expected.sizes)
+        assert_array_equal(ds.doc_idx, expected.doc_idx)
+        assert_array_equal(ds._index._pointers, expected._index._pointers)
+        for i in range(len(ds)):
+            assert_array_equal(ds[i], expected[i])
+
+
+class TestMultiMMapIndexedDataset:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("impl", ["mmap", "multi_mmap", "infer"])
+    def test_matches_merged_dataset(self, tmp_path, impl):
+        expected = build_dataset(str(tmp_path / "full"), DOCS)
+        shard_paths = [str(tmp_path / "shards" / f"shard{i}") for i in range(3)]
+        (tmp_path / "shards").mkdir()
+        for shard_path, docs in zip(shard_paths, [DOCS[:1], DOCS[1:3], DOCS[3:]]):
+            build_dataset(shard_path, docs)
+
+        make_multi_index(str(tmp_path / "multi"), shard_paths)
+        ds = make_dataset(str(tmp_path / "multi"), impl, skip_warmup=True)
+
+        assert isinstance(ds, MultiMMapIndexedDataset)
+        assert len(ds) == len(expected)
+        assert_array_equal(ds.sizes, expected.sizes)
+        assert_array_equal(ds.doc_idx, expected.doc_idx)
+        for i in range(len(ds)):
+            assert_array_equal(ds[i], expected[i])
+            assert_array_equal(ds.get(i, offset=1), expected.get(i, offset=1))
+        for merged, item in zip(ds[1:5], expected[1:5]):
+            assert_array_equal(merged, item)
+
+    @pytest.mark.unit
+    def test_relative_shard_paths(self, tmp_path):
+        (tmp_path / "a").mkdir()
+        shard_path = str(tmp_path / "a" / "shard")
+        build_dataset(shard_path, DOCS)
+        make_multi_index(str(tmp_path / "a" / "multi"), [shard_path])
+
+        (tmp_path / "a").rename(tmp_path / "b")
+        ds = MultiMMapIndexedDataset(str(tmp_path / "b" / "multi"), skip_warmup=True)
+        assert_array_equal(ds[len(ds) - 1], DOCS[-1][-1])
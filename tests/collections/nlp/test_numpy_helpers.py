@@ -0,0 +1,145 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from nemo.collections.nlp.data.language_modeling.megatron import numpy_helpers
+
+try:
+    from nemo.collections.nlp.data.language_modeling.megatron import helpers as cpp_helpers
+except ImportError:
+    cpp_helpers = None
+
+
+def random_sample_idx_args(rng, drop_last, add_extra_token):
+    num_docs = int(rng.integers(1, 50))
+    sizes = rng.integers(0, 40, size=num_docs).astype(np.int32)
+    sizes[0] += 5
+    num_epochs = int(rng.integers(1, 4))
+    doc_idx = np.concatenate([rng.permutation(num_docs) for _ in range(num_epochs)]).astype(np.int32)
+    seq_length = int(rng.integers(2, min(20, num_epochs * int(sizes.sum()))))
+    return sizes, doc_idx, seq_length, num_epochs, int(sizes.sum()), drop_last, add_extra_token
+
+
+def random_mapping_args(rng):
+    num_sentences = rng.integers(0, 8, size=int(rng.integers(1, 200)))
+    docs = np.concatenate([[0], np.cumsum(num_sentences)]).astype(np.int64)
+    sizes = rng.integers(1, 600, size=int(docs[-1])).astype(np.int32)
+    num_epochs = int(rng.integers(1, 4))
+    max_num_samples = int(rng.integers(1, 2000))
+    max_seq_length = int(rng.integers(2, 300))
+    seed = int(rng.integers(1, 1000))
+    return docs, sizes, num_epochs, max_num_samples, max_seq_length, seed
+
+
+def reference_sample_idx(sizes, doc_idx, seq_length, num_epochs, tokens_per_epoch, drop_last, add_extra_token):
+    """Sequential loop of `helpers.cpp`."""
+    num_tokens = num_epochs * tokens_per_epoch - add_extra_token
+    num_samples = int(np.ceil(np.float32(num_tokens) / seq_length)) if not drop_last else num_tokens // seq_length
+    sample_idx = np.zeros([num_samples + 1, 2], dtype=np.int32)
+    doc_idx_index, doc_offset = 0, 0
+    for sample_index in range(1, num_samples + 1):
+        remaining_seq_length = seq_length + add_extra_token
+        while remaining_seq_length != 0:
+            doc_length = sizes[doc_idx[doc_idx_index]] - doc_offset
+            remaining_seq_length -= doc_length
+            if remaining_seq_length <= 0:
+                doc_offset += remaining_seq_length + doc_length - add_extra_token
+                remaining_seq_length = 0
+            else:
+                if doc_idx_index == len(doc_idx) - 1:
+                    doc_offset = sizes[doc_idx[doc_idx_index]] - add_extra_token
+                    break
+                doc_idx_index += 1
+                doc_offset = 0
+        sample_idx[sample_index] = doc_idx_index, doc_offset
+    return sample_idx
+
+
+class TestNumpyHelpers:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("drop_last", [True, False])
+    @pytest.mark.parametrize("add_extra_token", [0, 1])
+    def test_build_sample_idx(self, drop_last, add_extra_token):
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            args = random_sample_idx_args(rng, drop_last, add_extra_token)
+            sample_idx = numpy_helpers.build_sample_idx(*args)
+            assert sample_idx.dtype == np.int32
+            assert_array_equal(sample_idx, reference_sample_idx(*args))
+
+    @pytest.mark.unit
+    def test_build_sample_idx_chunks(self, monkeypatch):
+        args = random_sample_idx_args(np.random.default_rng(1), True, 1)
+        expected = numpy_helpers.build_sample_idx(*args)
+        monkeypatch.setattr(numpy_helpers, "SAMPLE_IDX_CHUNK_SIZE", 3)
+        assert_array_equal(numpy_helpers.build_sample_idx(*args), expected)
+
+    @pytest.mark.unit
+    def test_build_blending_indices(self):
+        weights = np.array([0.5, 0.3, 0.2])
+        dataset_index = np.zeros(1000, dtype=np.uint8)
+        dataset_sample_index = np.zeros(1000, dtype=np.int64)
+        numpy_helpers.build_blending_indices(dataset_index, dataset_sample_index, weights, 3, 1000, False)
+
+        assert_array_equal(np.bincount(dataset_index), [500, 300, 200])
+        for dataset in range(3):
+            assert_array_equal(dataset_sample_index[dataset_index == dataset], np.arange(weights[dataset] * 1000))
+
+    @pytest.mark.unit
+    def test_mt19937(self):
+        # values of std::mt19937(5489) and std::mt19937_64(5489), the 10000th values are given by the C++ standard
+        mt, pos = numpy_helpers._mt19937_seed(5489)
+        assert [int(numpy_helpers._mt19937_next(mt, pos)) for _ in range(10000)][-1] == 4123659995
+        mt, pos = numpy_helpers._mt19937_64_seed(5489)
+        assert [int(numpy_helpers._mt19937_64_next(mt, pos)) for _ in range(10000)][-1] == 9981545732273789042
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("short_seq_prob", [0.0, 0.1, 1.0])
+    def test_build_mapping(self, short_seq_prob):
+        docs, sizes, num_epochs, max_num_samples, max_seq_length, seed = random_mapping_args(np.random.default_rng(0))
+        maps = numpy_helpers.build_mapping(
+            docs, sizes, num_epochs, max_num_samples, max_seq_length, short_seq_prob, seed, False, 2
+        )
+        assert maps.dtype == np.uint32
+        assert maps.shape[1] == 3
+        assert np.all(maps[:, 0] < maps[:, 1])
+        if short_seq_prob == 0.0:
+            assert np.all(maps[:, 2] == max_seq_length)
+
+    @pytest.mark.unit
+    @pytest.mark.skipif(cpp_helpers is None, reason="C++ dataset helpers are not compiled")
+    def test_matches_cpp_helpers(self):
+        rng = np.random.default_rng(0)
+        for drop_last in (True, False):
+            args = random_sample_idx_args(rng, drop_last, 1)
+            assert_array_equal(numpy_helpers.build_sample_idx(*args), cpp_helpers.build_sample_idx(*args))
+
+        weights = rng.random(5)
+        weights /= weights.sum()
+        indices = [(np.zeros(5000, dtype=np.uint8), np.zeros(5000, dtype=np.int64)) for _ in range(2)]
+        for helpers, (dataset_index, dataset_sample_index) in zip((numpy_helpers, cpp_helpers), indices):
+            helpers.build_blending_indices(dataset_index, dataset_sample_index, weights, 5, 5000, False)
+        assert_array_equal(indices[0][0], indices[1][0])
+        assert_array_equal(indices[0][1], indices[1][1])
+
+        for short_seq_prob in (0.0, 0.1, 1.0):
+            docs, sizes, num_epochs, max_num_samples, max_seq_length, seed = random_mapping_args(rng)
+            args = (docs, sizes, num_epochs, max_num_samples, max_seq_length, short_seq_prob, seed, False, 2)
+            assert_array_equal(numpy_helpers.build_mapping(*args), cpp_helpers.build_mapping(*args))
+            titles_sizes = rng.integers(0, 20, size=len(docs) - 1).astype(np.int32)
+            args = (docs, sizes, titles_sizes, num_epochs, max_num_samples, max_seq_length, seed, False, True)
+            assert_array_equal(numpy_helpers.build_blocks_mapping(*args), cpp_helpers.build_blocks_mapping(*args))
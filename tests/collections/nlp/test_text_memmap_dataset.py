@@ -0,0 +1,109 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+
+from nemo.collections.nlp.data.language_modeling.text_memmap_dataset import (
+    TextMemMapDataset,
+    _build_index_from_memdata,
+    build_index_file_chunked,
+    build_index_files,
+    shard_index_files,
+)
+
+CONTENTS = [
+    b"a\nbb\nccc\n",
+    b"a\nbb\nccc",
+    b"a\nbb\n\n\n",
+    b"a\n\nbb\n\n\nccc\n\n",
+    b"\n\n\n",
+    b"x",
+    b"\n",
+    b"\nabc",
+]
+
+
+def write_file(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+class TestChunkedIndex:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("content", CONTENTS)
+    @pytest.mark.parametrize("window_size", [1, 2, 3, 1 << 20])
+    def test_matches_reference(self, tmp_path, content, window_size):
+        fn = write_file(tmp_path / "data.txt", content)
+        midx = build_index_file_chunked(fn, str(tmp_path / "data.txt.idx"), 10, window_size=window_size)
+        assert midx.dtype == np.int64
+        assert_array_equal(midx, _build_index_from_memdata(fn, 10))
+
+    @pytest.mark.unit
+    def test_random_file_in_parallel(self, tmp_path):
+        rng = np.random.default_rng(0)
+        data = rng.choice([ord("a"), ord("b"), 10], size=100_000, p=[0.45, 0.45, 0.1]).astype(np.uint8)
+        data[-50:] = 10
+        fn = write_file(tmp_path / "data.txt", data.tobytes())
+        with mp.get_context("fork").Pool(3) as pool:
+            midx = build_index_file_chunked(fn, str(tmp_path / "data.txt.idx"), 10, pool=pool, window_size=777)
+        assert_array_equal(midx, _build_index_from_memdata(fn, 10))
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("appended", [b"ddd\n", b"\n\neee", b"\n", b"ff\n\n"])
+    def test_append(self, tmp_path, appended):
+        fn = write_file(tmp_path / "data.txt", b"a\nbb\n\n")
+        build_index_files([fn], 10, workers=2, window_size=2)
+        with open(fn, "ab") as f:
+            f.write(appended)
+        build_index_files([fn], 10, workers=2, window_size=2)
+        assert_array_equal(np.load(fn + ".idx.npy"), _build_index_from_memdata(fn, 10))
+
+    @pytest.mark.unit
+    def test_dataset(self, tmp_path):
+        fn = write_file(tmp_path / "data.txt", b"first\nsecond\n\nfourth\n\n")
+        reference = TextMemMapDataset([fn], index_mapping_dir=str(tmp_path / "reference"), workers=1)
+        dataset = TextMemMapDataset([fn], index_mapping_dir=str(tmp_path / "chunked"), index_window_size=4, workers=2)
+        assert len(dataset) == len(reference) == 4
+        assert [dataset[i] for i in range(len(dataset))] == ["first", "second", "", "fourth"]
+
+
+class TestShardedIndexBuilding:
+    @pytest.mark.unit
+    @pytest.mark.parametrize("world_size", [1, 3, 8])
+    def test_shards_partition_files(self, tmp_path, world_size):
+        paths = [write_file(tmp_path / f"data_{n}.txt", b"line\n" * (n % 4 + 1)) for n in range(6)]
+        shards = [shard_index_files(paths, rank, world_size) for rank in range(world_size)]
+        assert sorted(fn for shard in shards for fn in shard) == sorted(paths)
+        if world_size == 3:
+            assert all(len(shard) == 2 for shard in shards)
+
+    @pytest.mark.unit
+    def test_sharded_build(self, tmp_path):
+        paths = [write_file(tmp_path / f"data_{n}.txt", b"a\nbb\n" * (n + 1)) for n in range(5)]
+        index_mapping_dir = str(tmp_path / "index")
+        for rank in range(2):
+            build_index_files(shard_index_files(paths, rank, 2), 10, workers=1, index_mapping_dir=index_mapping_dir)
+        # no temporary files are left behind, and every index is complete
+        index_files = os.listdir(os.path.join(index_mapping_dir, str(tmp_path).lstrip("/")))
+        assert sorted(index_files) == sorted(
+            os.path.basename(fn) + suffix for fn in paths for suffix in (".idx.npy", ".idx.info")
+        )
+        dataset = TextMemMapDataset(paths, index_mapping_dir=index_mapping_dir, workers=1)
+        assert len(dataset) == 2 * sum(range(1, 6))
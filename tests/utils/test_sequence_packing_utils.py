@@ -0,0 +1,84 @@
+# Copyright (c) 2024, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from nemo.utils.sequence_packing_utils import (
+    PACKING_ALGOS,
+    best_fit_decreasing,
+    best_fit_decreasing_histogram,
+    create_packing_strategy,
+    find_first_bin_that_fits,
+    first_fit,
+    get_packing_efficiency,
+)
+
+
+def random_histogram(rng, max_seq_len):
+    histogram = rng.integers(0, 20, size=max_seq_len) * (rng.random(max_seq_len) < 0.5)
+    return histogram.tolist()
+
+
+def histogram_to_seqlens(histogram):
+    return [seq_len for seq_len, count in enumerate(histogram) for _ in range(count)]
+
+
+def check_assignments(assignments, histogram, pack_size):
+    assert all(sum(x) <= pack_size for x in assignments)
+    assert np.bincount(sum(assignments, []), minlength=len(histogram)).tolist() == histogram
+
+
+class TestSequencePacking:
+    @pytest.mark.unit
+    def test_first_fit(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            seqlens = rng.integers(0, 120, size=int(rng.integers(1, 300))).tolist()
+            expected = []
+            for s in seqlens:
+                first_bin = find_first_bin_that_fits(expected, s, 100)
+                if first_bin == -1:
+                    expected.append([s])
+                else:
+                    expected[first_bin].append(s)
+            assert first_fit(seqlens, 100) == expected
+
+    @pytest.mark.unit
+    def test_best_fit_decreasing(self):
+        assert best_fit_decreasing([5, 6, 3, 2, 4], 10) == [[6, 4], [5, 3, 2]]
+        # best fit puts the 1 into the fullest bin, first fit into the first one
+        assert best_fit_decreasing([1, 4, 5, 7, 8], 10) == [[8], [7], [5, 4, 1]]
+        assert first_fit([8, 7, 5, 4, 1], 10) == [[8, 1], [7], [5, 4]]
+
+    @pytest.mark.unit
+    def test_best_fit_decreasing_histogram(self):
+        rng = np.random.default_rng(0)
+        for pack_size in (64, 100, 128):
+            histogram = random_histogram(rng, 128)
+            assignments = best_fit_decreasing_histogram(histogram, pack_size)
+            expected = best_fit_decreasing(histogram_to_seqlens(histogram), pack_size)
+            overflow = sorted(x for x in assignments if sum(x) > pack_size)
+            assert overflow == [[seq_len] for seq_len in histogram_to_seqlens(histogram) if seq_len > pack_size]
+            assert len(assignments) == len(expected)
+            assert sorted(map(sum, assignments)) == sorted(map(sum, expected))
+            check_assignments([x for x in assignments if sum(x) <= pack_size], histogram[: pack_size + 1], pack_size)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("packing_algorithm", PACKING_ALGOS)
+    def test_create_packing_strategy(self, packing_algorithm):
+        histogram = random_histogram(np.random.default_rng(0), 64)
+        assignments = create_packing_strategy(histogram, 64, packing_algorithm)
+        check_assignments(assignments, histogram, 64)
+        assert 0.9 < get_packing_efficiency(assignments, 64) <= 1.0
@@ -76,6 +76,7 @@ def main(cfg):
             ignore_punctuation=cfg.analyst.metric_calculator.get("ignore_punctuation", False),
             punctuations=cfg.analyst.metric_calculator.get("punctuations", None),
             strip_punc_space=cfg.analyst.metric_calculator.get("strip_punc_space", False),
+            num_workers=cfg.analyst.metric_calculator.get("num_workers", 0),
         )
     else:
         output_manifest_w_wer, total_res, eval_metric = cal_write_text_metric(